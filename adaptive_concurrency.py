@@ -0,0 +1,312 @@
+"""
+Adaptive concurrency control (AIMD) for the stress testers and other clients of the server
+Grows the number of requests allowed in flight by a fixed step while a latency percentile
+stays under its target, and cuts it by a factor when the target is breached or the server
+pushes back (HTTP 429 / 503, timeouts). The stress testers use it to find the highest
+concurrency the server sustains; any caller of the kCode endpoint can use it as an
+admission limiter:
+
+    async with controller.slot() as slot:
+        async with session.post(url, json=payload) as response:
+            if response.status in BACKPRESSURE_STATUSES:
+                slot.overloaded = f"HTTP {response.status}"
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from histogram import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_STATUSES = (429, 503)
+MIN_WINDOW = 10  # Fewest latency samples a decision is based on
+TRACE_ROWS = 20  # Decisions shown in the report
+
+
+class ServerOverloaded(RuntimeError):
+    """The server turned a request away with 429 / 503"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def http_error(status: int, body: str) -> RuntimeError:
+    """Exception for a non-200 response, ServerOverloaded for backpressure statuses"""
+    message = f"HTTP {status}: {body}"
+    return ServerOverloaded(status, message) if status in BACKPRESSURE_STATUSES else RuntimeError(message)
+
+
+def backpressure_reason(error: BaseException) -> Optional[str]:
+    """Why a failed request counts as server backpressure, or None for other failures"""
+    if isinstance(error, ServerOverloaded):
+        return f"HTTP {error.status}"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return None
+
+
+class Slot:
+    def __init__(self, epoch: int):
+        self.epoch = epoch  # Controller decisions made before this request was admitted
+        self.started = time.perf_counter()
+        self.latency: Optional[float] = None  # Latency to judge; the slot's own duration when unset
+        self.overloaded: Optional[str] = None  # Backpressure reason, e.g. "HTTP 429"
+
+
+class AIMDController:
+    def __init__(self, target_latency: float, percentile: float = 95, metric: str = 'ttft',
+                 initial: int = 1, min_limit: int = 1, max_limit: int = 256,
+                 increase: float = 1.0, decrease: float = 0.5, window: int = 0):
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        self.target_latency = target_latency  # Seconds, at `percentile`
+        self.percentile = percentile
+        self.metric = metric  # Result field judged by the testers ('ttft' or 'duration')
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase  # Requests added per decision while under target
+        self.decrease = decrease  # Factor the limit is multiplied by on breach or backpressure
+        self.window = window  # Samples per decision; 0 uses the current limit (one round of requests)
+
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.epoch = 0
+        self.samples = LogHistogram()  # Latencies of requests admitted since the last decision
+        self.saturated = False  # Whether in-flight reached the limit since the last decision
+        self.waiters: deque = deque()
+        self.started: Optional[float] = None
+        self.last_release = 0.0
+        self.trace: List[Dict] = []
+        self.backpressure = 0  # Requests the server pushed back on
+
+    @property
+    def allowed(self) -> int:
+        """Requests currently allowed in flight"""
+        return max(self.min_limit, min(self.max_limit, int(self.limit)))
+
+    def window_size(self) -> int:
+        return self.window or max(MIN_WINDOW, self.allowed)
+
+    def split(self, workers: int, index: int) -> "AIMDController":
+        """Return this worker's controller when the load is split across processes"""
+        def share(value: int) -> int:
+            return max(1, value // workers + (1 if index < value % workers else 0))
+        return AIMDController(
+            target_latency=self.target_latency, percentile=self.percentile, metric=self.metric,
+            initial=share(self.initial), min_limit=share(self.min_limit), max_limit=share(self.max_limit),
+            increase=self.increase, decrease=self.decrease, window=self.window
+        )
+
+    def describe(self) -> str:
+        """Short human-readable description for the configuration log"""
+        return (f"AIMD {self.min_limit}-{self.max_limit} from {self.initial}, "
+                f"{self.metric} p{self.percentile:g} <= {self.target_latency:g}s, "
+                f"+{self.increase:g} / x{self.decrease:g}")
+
+    def wake(self):
+        """Admit waiting requests while the limit allows"""
+        while self.waiters and self.in_flight < self.allowed:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.admit()
+                waiter.set_result(None)
+
+    def admit(self):
+        self.in_flight += 1
+        if self.in_flight >= self.allowed:
+            self.saturated = True
+
+    async def acquire(self) -> Slot:
+        """Wait until the limit allows another request in flight"""
+        if self.started is None:
+            self.started = time.time()
+            self.trace.append({"t": 0.0, "action": "start", "limit": self.allowed, "reason": "initial limit"})
+        if self.in_flight < self.allowed and not self.waiters:
+            self.admit()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Admitted just before the cancellation: hand the place on
+                if waiter.done() and not waiter.cancelled():
+                    self.in_flight -= 1
+                    self.wake()
+                raise
+        return Slot(self.epoch)
+
+    def release(self, slot: Slot, failed: bool = False):
+        """Free a slot and feed its outcome to the controller
+
+        Only requests admitted since the last decision count, so one overload episode cuts the
+        limit once rather than once per request that was already in flight.
+        """
+        self.in_flight -= 1
+        self.last_release = time.time()
+        if slot.overloaded:
+            self.backpressure += 1
+            if slot.epoch == self.epoch:
+                self.decide("decrease", slot.overloaded)
+        elif not failed and slot.epoch == self.epoch:
+            self.samples.record(slot.latency if slot.latency is not None else time.perf_counter() - slot.started)
+            if self.samples.count >= self.window_size():
+                observed = self.samples.percentile(self.percentile)
+                if observed > self.target_latency:
+                    self.decide("decrease", f"p{self.percentile:g} {observed:.3f}s > {self.target_latency:g}s", observed)
+                elif self.saturated and self.allowed < self.max_limit:
+                    self.decide("increase", f"p{self.percentile:g} {observed:.3f}s", observed)
+                else:
+                    # Under target but the limit was not the constraint (or is at its maximum)
+                    self.decide("hold", f"p{self.percentile:g} {observed:.3f}s", observed)
+        self.wake()
+
+    def release_result(self, slot: Slot, result: Dict):
+        """Release a tester's slot from its result dict"""
+        if result["status"] == "SUCCESS":
+            # Non-streaming requests have no TTFT, fall back to the whole request
+            slot.latency = result.get(self.metric) or result["duration"]
+        slot.overloaded = result.get("backpressure")
+        self.release(slot, failed=result["status"] != "SUCCESS")
+
+    @asynccontextmanager
+    async def slot(self):
+        """Admission-limited section for any caller; timeouts and ServerOverloaded count as backpressure"""
+        slot = await self.acquire()
+        try:
+            yield slot
+        except BaseException as e:
+            slot.overloaded = slot.overloaded or backpressure_reason(e)
+            self.release(slot, failed=True)
+            raise
+        self.release(slot)
+
+    def decide(self, action: str, reason: str, observed: Optional[float] = None):
+        """Apply one control decision and start a new observation window"""
+        before = self.allowed
+        if action == "increase":
+            self.limit = min(self.max_limit, self.limit + self.increase)
+        elif action == "decrease":
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            logger.debug(f"Concurrency {before} -> {self.allowed}: {reason}")
+        self.epoch += 1
+        self.samples = LogHistogram()
+        self.saturated = self.in_flight >= self.allowed
+        self.trace.append({"t": time.time() - self.started, "action": action, "before": before,
+                           "limit": self.allowed, "reason": reason, "observed": observed})
+
+    def report(self) -> Optional[Dict]:
+        """Converged concurrency (time-weighted over the second half of the run) and the decision trace"""
+        if self.started is None:
+            return None
+        end = max(self.last_release - self.started, 1e-9)
+        half = end / 2
+        # The limit is piecewise constant between decisions
+        weighted = 0.0
+        levels = []
+        for entry, following in zip(self.trace, self.trace[1:] + [{"t": end}]):
+            low, high = max(entry["t"], half), min(following["t"], end)
+            if high > low:
+                weighted += entry["limit"] * (high - low)
+                levels.append(entry["limit"])
+        counts = {action: sum(1 for entry in self.trace if entry["action"] == action)
+                  for action in ("increase", "decrease", "hold")}
+        return {
+            "description": self.describe(),
+            "converged": weighted / (end - half) if levels else float(self.allowed),
+            "range": (min(levels), max(levels)) if levels else (self.allowed, self.allowed),
+            "final": self.allowed,
+            "decisions": counts,
+            "backpressure": self.backpressure,
+            "trace": self.trace,
+            "workers": 1
+        }
+
+
+def merge_adaptive_reports(reports: List[Dict]) -> Dict:
+    """Combine the controllers of several worker processes; limits add up, the trace is the first worker's"""
+    merged = dict(reports[0])
+    merged["converged"] = sum(report["converged"] for report in reports)
+    merged["range"] = (sum(report["range"][0] for report in reports), sum(report["range"][1] for report in reports))
+    merged["final"] = sum(report["final"] for report in reports)
+    merged["decisions"] = {action: sum(report["decisions"][action] for report in reports)
+                           for action in merged["decisions"]}
+    merged["backpressure"] = sum(report["backpressure"] for report in reports)
+    merged["workers"] = sum(report["workers"] for report in reports)
+    return merged
+
+
+def print_adaptive_report(report: Optional[Dict]):
+    """Print the converged concurrency and an evenly spaced sample of the controller's decisions"""
+    if report is None:
+        return
+    print(f"\nAdaptive Concurrency ({report['description']}):")
+    workers = f" (sum over {report['workers']} workers)" if report["workers"] > 1 else ""
+    print(f"  Converged Concurrency: {report['converged']:.1f}{workers}, "
+          f"oscillating {report['range'][0]}-{report['range'][1]} over the second half of the run")
+    decisions = report["decisions"]
+    print(f"  Decisions: {decisions['increase']} increase, {decisions['decrease']} decrease, "
+          f"{decisions['hold']} hold; {report['backpressure']} requests met backpressure (429/503/timeout)")
+
+    trace = report["trace"]
+    # Every decrease is shown; increases and holds are thinned to an even sample
+    step = max(1, len(trace) // TRACE_ROWS)
+    rows = [entry for i, entry in enumerate(trace) if entry["action"] in ("start", "decrease") or i % step == 0]
+    label = " of the first worker" if report["workers"] > 1 else ""
+    print(f"\n  Decision Trace{label} ({len(rows)} of {len(trace)}):")
+    print(f"  {'t (s)':>8} {'Action':<9} {'Limit':>11}  Reason")
+    for entry in rows[-TRACE_ROWS * 2:]:
+        change = f"{entry.get('before', entry['limit'])} -> {entry['limit']}"
+        print(f"  {entry['t']:>8.1f} {entry['action']:<9} {change:>11}  {entry['reason']}")
+
+
+def add_adaptive_arguments(parser: argparse.ArgumentParser, default_metric: str = 'ttft'):
+    """Register the adaptive concurrency options shared by the stress testers"""
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Control the concurrency online (AIMD) instead of holding --concurrent-requests; '
+                            'requires --target-latency')
+    parser.add_argument('--target-latency', type=float, default=None,
+                       help='Latency target in seconds at --target-percentile for --adaptive')
+    parser.add_argument('--target-percentile', type=float, default=95,
+                       help='Percentile the latency target applies to (default: 95)')
+    parser.add_argument('--target-metric', choices=('ttft', 'duration'), default=default_metric,
+                       help=f'Latency the target applies to; ttft needs --stream (default: {default_metric})')
+    parser.add_argument('--min-concurrency', type=int, default=1,
+                       help='Lowest concurrency the controller may cut to (default: 1)')
+    parser.add_argument('--max-concurrency', type=int, default=256,
+                       help='Highest concurrency the controller may grow to (default: 256)')
+    parser.add_argument('--additive-increase', type=float, default=1.0,
+                       help='Requests added per decision while under target (default: 1)')
+    parser.add_argument('--multiplicative-decrease', type=float, default=0.5,
+                       help='Factor the concurrency is cut by on breach, 429/503 or timeout (default: 0.5)')
+    parser.add_argument('--adaptive-window', type=int, default=0,
+                       help='Completed requests per decision (default: 0, the current concurrency, at least '
+                            f'{MIN_WINDOW})')
+
+
+def controller_from_args(args: argparse.Namespace) -> Optional[AIMDController]:
+    """Build an AIMDController from parsed arguments, or None without --adaptive"""
+    if not args.adaptive:
+        return None
+    if args.target_latency is None:
+        raise ValueError("--adaptive needs --target-latency")
+    return AIMDController(
+        target_latency=args.target_latency,
+        percentile=args.target_percentile,
+        metric=args.target_metric,
+        # Start from --concurrent-requests, so a known-good level skips the slow climb
+        initial=min(max(args.concurrent_requests, args.min_concurrency), args.max_concurrency),
+        min_limit=args.min_concurrency,
+        max_limit=args.max_concurrency,
+        increase=args.additive_increase,
+        decrease=args.multiplicative_decrease,
+        window=args.adaptive_window
+    )
@@ -0,0 +1,167 @@
+"""
+Open-loop arrival scheduling for the stress testers
+Generates request send times from a Poisson, constant-rate or gamma arrival process
+(optionally with periodic bursts) and dispatches each request at its scheduled time,
+no matter how many requests are still in flight
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARRIVAL_PROCESSES = ('poisson', 'constant', 'gamma')
+
+
+class ArrivalSchedule:
+    def __init__(self, rate: float, arrival: str = 'poisson', gamma_shape: float = 1.0,
+                 burst_factor: float = 1.0, burst_period: float = 0.0,
+                 burst_duration: float = 0.0, seed: Optional[int] = None,
+                 start_offset: float = 0.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(f"arrival must be one of {', '.join(ARRIVAL_PROCESSES)}")
+        # Checked up front: a zero shape or factor would only fail mid-run, when its gap is drawn
+        if gamma_shape <= 0:
+            raise ValueError("gamma shape must be positive")
+        if burst_factor <= 0:
+            raise ValueError("burst factor must be positive")
+        if burst_period < 0 or burst_duration < 0:
+            raise ValueError("burst period and duration must not be negative")
+        self.rate = rate  # Mean requests per second outside bursts
+        self.arrival = arrival
+        self.gamma_shape = gamma_shape  # < 1 is burstier than Poisson, > 1 is smoother
+        self.burst_factor = burst_factor  # Rate multiplier while a burst is active
+        self.burst_period = burst_period  # Seconds between burst starts (0 disables bursts)
+        self.burst_duration = burst_duration  # Seconds each burst lasts
+        self.seed = seed
+        self.start_offset = start_offset  # Offset of the first arrival (used to interleave workers)
+        self.random = random.Random(seed)
+
+    def rate_at(self, t: float) -> float:
+        """Return the instantaneous arrival rate at t seconds into the run"""
+        if self.burst_period > 0 and (t % self.burst_period) < self.burst_duration:
+            return self.rate * self.burst_factor
+        return self.rate
+
+    def next_gap(self, t: float) -> float:
+        """Draw the gap to the next arrival for a request scheduled at t"""
+        rate = self.rate_at(t)
+        if self.arrival == 'constant':
+            return 1.0 / rate
+        if self.arrival == 'gamma':
+            # Keep the mean gap at 1/rate, shape only changes the variance
+            return self.random.gammavariate(self.gamma_shape, 1.0 / (self.gamma_shape * rate))
+        return self.random.expovariate(rate)
+
+    def offsets(self, count: Optional[int] = None) -> Iterator[float]:
+        """Yield send offsets in seconds from the start of the run (endless if count is None)"""
+        t = self.start_offset
+        emitted = 0
+        while count is None or emitted < count:
+            yield t
+            emitted += 1
+            t += self.next_gap(t)
+
+    def split(self, workers: int, index: int) -> "ArrivalSchedule":
+        """Return this worker's share of the schedule when the load is split across processes
+
+        Each worker runs the same process at rate/workers; superposed, the workers offer the
+        original rate. Constant-rate workers are phase-shifted so their arrivals interleave.
+        """
+        return ArrivalSchedule(
+            rate=self.rate / workers,
+            arrival=self.arrival,
+            gamma_shape=self.gamma_shape,
+            burst_factor=self.burst_factor,
+            burst_period=self.burst_period,
+            burst_duration=self.burst_duration,
+            seed=None if self.seed is None else self.seed * workers + index,
+            start_offset=self.start_offset + (index / self.rate if self.arrival == 'constant' else 0.0)
+        )
+
+    def describe(self) -> str:
+        """Short human-readable description for the configuration log"""
+        text = f"{self.arrival} @ {self.rate:g} req/s"
+        if self.arrival == 'gamma':
+            text += f" (shape {self.gamma_shape:g})"
+        if self.burst_period > 0 and self.burst_factor != 1.0:
+            text += (f", x{self.burst_factor:g} bursts of {self.burst_duration:g}s "
+                     f"every {self.burst_period:g}s")
+        return text
+
+
+async def dispatch_open_loop(schedule: Iterator[Tuple[float, Any]],
+                             send: Callable[[int, float, Any], Awaitable[None]]):
+    """Start send(request_id, intended_start, item) at each scheduled (offset, item) without waiting for earlier requests
+
+    Latency must be measured from intended_start, not from when the task actually started,
+    so that client-side dispatch delays and server queueing are never hidden (coordinated omission).
+    send is expected to record its own result; only in-flight tasks are kept in memory.
+    """
+    run_start = time.time()
+    in_flight = set()
+    max_lag = 0.0
+    for request_id, (offset, item) in enumerate(schedule, 1):
+        intended_start = run_start + offset
+        delay = intended_start - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        task = asyncio.create_task(send(request_id, intended_start, item))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if max_lag > 0.01:
+        logger.warning(f"Dispatcher fell behind schedule by up to {max_lag * 1000:.1f}ms "
+                       f"(latencies are still measured from the intended send time)")
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+def add_arrival_arguments(parser: argparse.ArgumentParser):
+    """Register the open-loop arrival options shared by the stress testers"""
+    parser.add_argument('--rate', type=float, default=None,
+                       help='Open-loop mode: mean arrival rate in requests/second (ignores --concurrent-requests)')
+    parser.add_argument('--arrival', choices=ARRIVAL_PROCESSES, default='poisson',
+                       help='Arrival process for --rate (default: poisson)')
+    parser.add_argument('--gamma-shape', type=float, default=0.5,
+                       help='Shape of the gamma arrival process, <1 is burstier than Poisson (default: 0.5)')
+    parser.add_argument('--burst-factor', type=float, default=1.0,
+                       help='Multiply the arrival rate by this factor during bursts (default: 1.0, no bursts)')
+    parser.add_argument('--burst-period', type=float, default=0.0,
+                       help='Seconds between the start of consecutive bursts (default: 0, disabled)')
+    parser.add_argument('--burst-duration', type=float, default=0.0,
+                       help='Length of each burst in seconds (default: 0)')
+    parser.add_argument('--arrival-seed', type=int, default=None,
+                       help='Random seed for the arrival process (default: random)')
+
+
+def schedule_from_args(args: argparse.Namespace,
+                       parser: Optional[argparse.ArgumentParser] = None) -> Optional[ArrivalSchedule]:
+    """Build an ArrivalSchedule from parsed arguments, or None for closed-loop mode
+
+    Invalid options are reported with parser.error when a parser is given.
+    """
+    if args.rate is None:
+        return None
+    try:
+        return ArrivalSchedule(
+            rate=args.rate,
+            arrival=args.arrival,
+            gamma_shape=args.gamma_shape,
+            burst_factor=args.burst_factor,
+            burst_period=args.burst_period,
+            burst_duration=args.burst_duration,
+            seed=args.arrival_seed
+        )
+    except ValueError as e:
+        if parser is None:
+            raise
+        parser.error(f"invalid arrival options: {e}")
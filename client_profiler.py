@@ -0,0 +1,124 @@
+"""
+Client self-profiling for the stress testers
+Measures what the load generator itself costs: event-loop lag (a periodic probe that
+records how late its sleeps wake up), request body build/encode time and response parse
+time. If that overhead is a large share of the measured latency the run is flagged as
+client-bound. Also provides the optional fast path: uvloop event loop and orjson codec.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from histogram import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+# Share of measured latency spent in the client above which a run is flagged as client-bound
+CLIENT_BOUND_THRESHOLD = 0.05
+
+
+def json_codec(fast_path: bool = False) -> Tuple[Callable[[object], bytes], Callable[[bytes], object]]:
+    """Return (dumps to bytes, loads) using orjson on the fast path when it is installed"""
+    if fast_path:
+        try:
+            import orjson
+            return orjson.dumps, orjson.loads
+        except ImportError:
+            logger.warning("orjson is not installed, using the standard json module (pip install orjson)")
+    return (lambda value: json.dumps(value).encode()), json.loads
+
+
+def install_fast_event_loop() -> bool:
+    """Switch asyncio to uvloop if it is installed; must run before the event loop is created"""
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop is not installed, using the default event loop (pip install uvloop)")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+class LoopLagProbe:
+    def __init__(self, histogram: LogHistogram, interval: float = 0.05):
+        self.histogram = histogram  # Receives how late every probe sleep woke up, in seconds
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+
+    async def probe(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.histogram.record(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        """Start probing on the running event loop"""
+        self.task = asyncio.get_running_loop().create_task(self.probe())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class ClientProfile:
+    def __init__(self):
+        self.loop_lag = LogHistogram()  # Event-loop scheduling delay
+        self.build = LogHistogram()  # Per-request body build / encode, outside the measured latency
+        self.parse = LogHistogram()  # Per-request response decode, inside the measured latency
+
+    def merge(self, other: "ClientProfile"):
+        """Merge another worker's profile into this one"""
+        self.loop_lag.merge(other.loop_lag)
+        self.build.merge(other.build)
+        self.parse.merge(other.parse)
+
+    def report(self, latency: Optional[LogHistogram], threshold: float = CLIENT_BOUND_THRESHOLD) -> Dict:
+        """Summarize client overhead and decide whether the run was client-bound"""
+        report = {"threshold": threshold, "client_share": None, "client_bound": False}
+        for name in ("loop_lag", "build", "parse"):
+            histogram = getattr(self, name)
+            report[name] = ({"mean": histogram.mean, "p99": histogram.percentile(99), "max": histogram.max}
+                            if histogram.count else None)
+        if latency is not None and latency.count and latency.total > 0:
+            # Every request pays its parse time plus at least one late wake-up of the loop
+            overhead = self.parse.total + (self.loop_lag.mean if self.loop_lag.count else 0.0) * latency.count
+            report["client_share"] = overhead / latency.total
+            report["client_bound"] = report["client_share"] >= threshold
+        return report
+
+
+def print_client_profile_report(report: Optional[Dict]):
+    """Print the client overhead section of a tester report"""
+    if report is None:
+        return
+    print("\nClient Overhead:")
+    for name, label in (("loop_lag", "Event-Loop Lag"), ("build", "Body Build/Encode (not in latency)"),
+                        ("parse", "Response Parse")):
+        stats = report[name]
+        if stats:
+            print(f"  {label}: mean {stats['mean'] * 1000:.3f}ms, p99 {stats['p99'] * 1000:.3f}ms, "
+                  f"max {stats['max'] * 1000:.3f}ms")
+    if report["client_share"] is not None:
+        print(f"  Client Share of Measured Latency: {report['client_share']:.2%}")
+        if report["client_bound"]:
+            print(f"  WARNING: CLIENT-BOUND run (client overhead >= {report['threshold']:.0%} of latency); "
+                  f"latencies include load generator delays. Try --fast-path or --workers.")
+
+
+def add_profiling_arguments(parser):
+    """Register the client profiling options shared by the stress testers"""
+    parser.add_argument('--fast-path', action='store_true',
+                       help='Use uvloop and orjson when installed and log requests at debug level only')
+    parser.add_argument('--client-bound-threshold', type=float, default=CLIENT_BOUND_THRESHOLD,
+                       help=f'Flag the run as client-bound when client overhead reaches this share of '
+                            f'measured latency (default: {CLIENT_BOUND_THRESHOLD})')
+    parser.add_argument('--lag-probe-interval', type=float, default=0.05,
+                       help='Seconds between event-loop lag probes (default: 0.05)')
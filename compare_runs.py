@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Run-to-run regression comparator for stored stress test results
+Loads two or more --results-dir runs (memory mapped), compares every candidate against the
+first (baseline) run and reports percentile deltas with bootstrap confidence intervals.
+Exits non-zero when a statistically significant regression is found, so it can gate config
+changes and vLLM / llama.cpp submodule bumps.
+"""
+
+import argparse
+import importlib.util
+import sys
+from typing import Dict, Optional
+
+from result_store import load_run
+
+# Metric -> True when higher values are better
+METRICS = {
+    "duration": False,
+    "ttft": False,
+    "tpot": False,
+    "tokens_per_sec": True,
+}
+BOOTSTRAP_CELLS = 4_000_000  # Resampled values drawn per vectorized step, bounds memory on large runs
+
+
+def metric_values(run: Dict, metric: str):
+    """Values of a metric over the successful requests of a run, NaNs dropped"""
+    import numpy as np
+    columns = run["columns"]
+    values = np.asarray(columns[metric][columns["success"] == 1], dtype=np.float64)
+    return values[~np.isnan(values)]
+
+
+def bootstrap_percentiles(values, percentile: float, resamples: int, rng):
+    """Percentile of `resamples` bootstrap resamples of values"""
+    import numpy as np
+    estimates = np.empty(resamples)
+    chunk = max(1, BOOTSTRAP_CELLS // len(values))
+    for start in range(0, resamples, chunk):
+        count = min(chunk, resamples - start)
+        indices = rng.integers(0, len(values), size=(count, len(values)))
+        estimates[start:start + count] = np.percentile(values[indices], percentile, axis=1)
+    return estimates
+
+
+def compare_metric(baseline, candidate, percentile: float, resamples: int,
+                   confidence: float, rng) -> Optional[Dict]:
+    """Relative percentile delta of candidate vs baseline with a bootstrap confidence interval"""
+    import numpy as np
+    if len(baseline) < 2 or len(candidate) < 2:
+        return None
+    base = float(np.percentile(baseline, percentile))
+    cand = float(np.percentile(candidate, percentile))
+    if base == 0:
+        return None
+    deltas = (bootstrap_percentiles(candidate, percentile, resamples, rng)
+              / bootstrap_percentiles(baseline, percentile, resamples, rng)) - 1
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(deltas, [tail, 100 - tail])
+    return {"baseline": base, "candidate": cand, "delta": cand / base - 1,
+            "ci_low": float(low), "ci_high": float(high)}
+
+
+def verdict(comparison: Dict, higher_is_better: bool, threshold: float) -> str:
+    """REGRESSION / IMPROVED when the whole interval is past the threshold on one side"""
+    low, high = comparison["ci_low"], comparison["ci_high"]
+    worse_low, worse_high = (-high, -low) if higher_is_better else (low, high)
+    if worse_low > 0 and comparison["delta"] * (-1 if higher_is_better else 1) >= threshold:
+        return "REGRESSION"
+    if worse_high < 0 and comparison["delta"] * (1 if higher_is_better else -1) >= threshold:
+        return "IMPROVED"
+    return ""
+
+
+def describe_run(path: str, run: Dict) -> str:
+    """One-line description of a stored run"""
+    meta = run["meta"]
+    columns = run["columns"]
+    success = int(columns["success"].sum()) if run["rows"] else 0
+    return (f"{path}: {meta.get('tester')} {meta.get('mode') or ''} on {meta.get('model') or meta.get('served_model')}, "
+            f"{success}/{run['rows']} successful requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Stored Stress Test Runs')
+    parser.add_argument('runs', nargs='+',
+                       help='Result directories (--results-dir); the first one is the baseline')
+    parser.add_argument('--metrics', type=lambda s: s.split(','), default=list(METRICS),
+                       help=f'Comma-separated metrics to compare (default: {",".join(METRICS)})')
+    parser.add_argument('--percentiles', type=lambda s: [float(p) for p in s.split(',')], default=[50, 90, 99],
+                       help='Comma-separated percentiles to compare (default: 50,90,99)')
+    parser.add_argument('--bootstrap', type=int, default=1000,
+                       help='Bootstrap resamples per comparison (default: 1000)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                       help='Confidence level of the intervals (default: 0.95)')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                       help='Smallest relative change worth flagging (default: 0.05)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Bootstrap random seed (default: 0)')
+
+    args = parser.parse_args()
+
+    if len(args.runs) < 2:
+        parser.error("need a baseline and at least one candidate run")
+    unknown = [metric for metric in args.metrics if metric not in METRICS]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)}")
+
+    import numpy as np
+    rng = np.random.default_rng(args.seed)
+
+    runs = [load_run(path) for path in args.runs]
+    baseline = runs[0]
+    print("=== STORED RUNS ===")
+    for i, (path, run) in enumerate(zip(args.runs, runs)):
+        print(f"{'Baseline' if i == 0 else 'Candidate'} {describe_run(path, run)}")
+    if baseline["meta"].get("args_file_contents") is not None:
+        for path, run in zip(args.runs[1:], runs[1:]):
+            if run["meta"].get("args_file_contents") != baseline["meta"]["args_file_contents"]:
+                print(f"  Note: {path} ran against different server arguments than the baseline")
+
+    regressions = 0
+    for path, run in zip(args.runs[1:], runs[1:]):
+        print(f"\n=== {path} vs {args.runs[0]} ({args.confidence:.0%} bootstrap CI) ===")
+        header = f"{'Metric':<16} {'Pct':>5} {'Baseline':>11} {'Candidate':>11} {'Delta':>8} {'CI':>19}  Verdict"
+        print(header)
+        print("-" * len(header))
+        for metric in args.metrics:
+            base_values = metric_values(baseline, metric)
+            cand_values = metric_values(run, metric)
+            for percentile in args.percentiles:
+                comparison = compare_metric(base_values, cand_values, percentile, args.bootstrap,
+                                            args.confidence, rng)
+                if comparison is None:
+                    continue
+                result = verdict(comparison, METRICS[metric], args.threshold)
+                regressions += result == "REGRESSION"
+                ci = f"[{comparison['ci_low']:+.1%}, {comparison['ci_high']:+.1%}]"
+                print(f"{metric:<16} {f'p{percentile:g}':>5} {comparison['baseline']:>11.4f} "
+                      f"{comparison['candidate']:>11.4f} {comparison['delta']:>+8.1%} {ci:>19}  {result}")
+
+    if regressions:
+        print(f"\n{regressions} significant regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\nNo significant regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    if importlib.util.find_spec("numpy") is None:
+        print("Error: numpy is required for this script.")
+        print("Please install it with: pip install numpy")
+        exit(1)
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Batched embedding benchmark for self-hosted embedding server
+Sweeps the number of inputs per /v1/embeddings request against the input length and reports
+inputs embedded per second and request latency for each point, next to the server's
+--max-num-seqs. With --micro-batcher, single-input callers go through MicroBatcher instead,
+so the per-input latency includes the time spent waiting for a batch to fill.
+"""
+
+import asyncio
+import argparse
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from histogram import PERCENTILES, LogHistogram
+from micro_batcher import MicroBatcher, embedding_batch_submitter
+from prompt_pool import generate_long_message
+from server_args import get_arg, read_args_file
+from stress_test_embedding import EmbeddingStressTester
+from tokenizer_utils import add_tokenizer_arguments, tokenizer_settings_from_args
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatchBenchmark:
+    def __init__(self, server_url: str, batch_sizes: List[int], input_lengths: List[int],
+                 items_per_point: int = 640, concurrent_requests: int = 4, request_timeout: int = 180,
+                 micro_batcher: bool = False, callers: int = 64, max_wait: float = 0.005,
+                 max_num_seqs: Optional[int] = None, tokenizer_settings: Optional[Dict] = None):
+        self.server_url = server_url
+        self.batch_sizes = batch_sizes
+        self.input_lengths = input_lengths  # Tokens per input
+        self.items_per_point = items_per_point  # Inputs embedded per point, whatever the batch size
+        self.concurrent_requests = concurrent_requests  # Requests (batches) in flight
+        self.request_timeout = request_timeout
+        self.micro_batcher = micro_batcher  # Coalesce single-input calls instead of sending fixed batches
+        self.callers = callers  # Concurrent single-input callers in micro-batcher mode
+        self.max_wait = max_wait
+        self.max_num_seqs = max_num_seqs  # Server batch limit, for the report
+        self.tokenizer_settings = tokenizer_settings
+
+        self.points: List[Dict] = []
+
+    async def run_batch_point(self, batch_size: int, input_tokens: int) -> Dict:
+        """Send fixed batches of batch_size inputs with the embedding tester"""
+        tester = EmbeddingStressTester(
+            server_url=self.server_url,
+            concurrent_requests=self.concurrent_requests,
+            total_requests=math.ceil(self.items_per_point / batch_size),
+            request_timeout=self.request_timeout,
+            context_size=input_tokens,
+            tokenizer_settings=self.tokenizer_settings,
+            batch_size=batch_size
+        )
+        await tester.run_concurrent_requests()
+        aggregator = tester.aggregator
+        duration = aggregator.histogram('duration')
+        return {
+            "items": aggregator.successful_requests * batch_size,
+            "failed_requests": aggregator.total_requests - aggregator.successful_requests,
+            "wall_duration": tester.wall_duration,
+            "prompt_tokens": tester.total_prompt_tokens,
+            "latency": duration.percentiles() if duration else None,
+            "average_batch_size": float(batch_size)
+        }
+
+    async def run_micro_point(self, batch_size: int, input_tokens: int) -> Dict:
+        """Embed single inputs from many callers through a MicroBatcher"""
+        inputs = [generate_long_message(input_tokens) for _ in range(min(self.items_per_point, 64))]
+        latency = LogHistogram()
+        items = iter(range(self.items_per_point))
+        failures = 0
+
+        connector = aiohttp.TCPConnector(limit=self.concurrent_requests)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            batcher = MicroBatcher(
+                embedding_batch_submitter(session, self.server_url, "kCodeEmbedding", self.request_timeout),
+                max_batch_size=batch_size, max_wait=self.max_wait,
+                max_concurrent_batches=self.concurrent_requests
+            )
+
+            async def caller():
+                nonlocal failures
+                for item in items:
+                    # A fresh nonce per input, so no server-side cache can answer it
+                    text = f"[{os.urandom(8).hex()}] {inputs[item % len(inputs)]}"
+                    started = time.perf_counter()
+                    try:
+                        await batcher.submit(text)
+                    except Exception as e:
+                        failures += 1
+                        logger.debug(f"Input {item} failed: {e}")
+                        continue
+                    latency.record(time.perf_counter() - started)
+
+            run_start = time.time()
+            await asyncio.gather(*(caller() for _ in range(self.callers)))
+            await batcher.close()
+            wall_duration = time.time() - run_start
+
+        batching = batcher.report()
+        return {
+            "items": latency.count,
+            "failed_requests": failures,
+            "wall_duration": wall_duration,
+            "prompt_tokens": None,
+            "latency": latency.percentiles() if latency.count else None,
+            "average_batch_size": batching["average_batch_size"],
+            "queue_wait": batching["queue_wait"]
+        }
+
+    async def run_point(self, batch_size: int, input_tokens: int) -> Dict:
+        """Measure one (batch size, input length) point"""
+        logger.info(f"=== batch size {batch_size}, {input_tokens} tokens per input ===")
+        if self.micro_batcher:
+            point = await self.run_micro_point(batch_size, input_tokens)
+        else:
+            point = await self.run_batch_point(batch_size, input_tokens)
+        point.update(batch_size=batch_size, input_tokens=input_tokens)
+        wall = point["wall_duration"]
+        point["items_per_sec"] = point["items"] / wall if wall > 0 else 0.0
+        point["tokens_per_sec"] = point["prompt_tokens"] / wall if wall > 0 and point["prompt_tokens"] else None
+        return point
+
+    async def run(self) -> List[Dict]:
+        """Run every (input length, batch size) point in order"""
+        for input_tokens in self.input_lengths:
+            for batch_size in self.batch_sizes:
+                self.points.append(await self.run_point(batch_size, input_tokens))
+        return self.points
+
+    def print_report(self):
+        """Print inputs/second and latency percentiles against batch size"""
+        print("\n=== EMBEDDING BATCH REPORT ===")
+        if self.micro_batcher:
+            print(f"Micro-batcher: {self.callers} single-input callers, max wait {self.max_wait * 1000:g}ms, "
+                  f"{self.concurrent_requests} batches in flight, {self.items_per_point} inputs per point")
+        else:
+            print(f"Fixed batches: {self.concurrent_requests} concurrent requests, {self.items_per_point} inputs per point")
+        latency_label = "Input Latency" if self.micro_batcher else "Request Latency"
+        print(f"Latency columns: {latency_label} (s)")
+        header = (f"{'Tokens':>7} {'Batch':>6} {'Avg Batch':>10} {'Inputs/s':>10} {'Speedup':>8} {'Tok/s':>10} "
+                  + "".join(f"{'p' + format(q, 'g'):>10}" for q in PERCENTILES)
+                  + f" {'p99 vs 1':>9}")
+        print(header)
+        print("-" * len(header))
+        baselines = {}
+        for point in self.points:
+            baseline = baselines.setdefault(point["input_tokens"], point)
+            speedup = point["items_per_sec"] / baseline["items_per_sec"] if baseline["items_per_sec"] else 0.0
+            tokens = f"{point['tokens_per_sec']:.0f}" if point["tokens_per_sec"] else "-"
+            # Batches that cannot fit the server's running batch together queue inside the engine
+            marker = "*" if self.max_num_seqs and point["batch_size"] * self.concurrent_requests > self.max_num_seqs else " "
+            line = (f"{point['input_tokens']:>7} {point['batch_size']:>5}{marker} {point['average_batch_size']:>10.1f} "
+                    f"{point['items_per_sec']:>10.1f} {speedup:>7.2f}x {tokens:>10} ")
+            if point["latency"]:
+                line += "".join(f"{point['latency'][q]:>10.3f}" for q in PERCENTILES)
+                if baseline["latency"]:
+                    line += f" {point['latency'][99] / baseline['latency'][99]:>8.2f}x"
+            else:
+                line += "".join(f"{'-':>10}" for _ in PERCENTILES)
+            if point["failed_requests"]:
+                line += f"  ({point['failed_requests']} failed)"
+            print(line)
+        if self.max_num_seqs:
+            print(f"\n* batch size x {self.concurrent_requests} in flight exceeds the server's --max-num-seqs "
+                  f"{self.max_num_seqs}; extra inputs wait for a later engine step")
+        print("Speedup and p99 vs 1 compare each point with the first batch size at the same input length.")
+
+        for input_tokens in self.input_lengths:
+            points = [p for p in self.points if p["input_tokens"] == input_tokens and p["items"]]
+            if points:
+                best = max(points, key=lambda p: p["items_per_sec"])
+                print(f"  {input_tokens} tokens: best throughput at batch size {best['batch_size']} "
+                      f"({best['items_per_sec']:.1f} inputs/s)")
+
+
+def parse_list(cast):
+    """argparse type for comma-separated lists"""
+    return lambda text: [cast(item) for item in text.split(',') if item.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Embedding Batch Benchmark Script')
+    parser.add_argument('--server-url', default='http://localhost:8001/v1/embeddings',
+                       help='Server URL (default: http://localhost:8001/v1/embeddings)')
+    parser.add_argument('--batch-sizes', type=parse_list(int), default=[1, 2, 4, 8, 16, 32, 64],
+                       help='Comma-separated inputs per request to sweep (default: 1,2,4,8,16,32,64)')
+    parser.add_argument('--input-lengths', type=parse_list(int), default=[128, 512, 2048],
+                       help='Comma-separated tokens per input to sweep (default: 128,512,2048)')
+    parser.add_argument('--items-per-point', type=int, default=640,
+                       help='Inputs embedded per point (default: 640)')
+    parser.add_argument('--concurrent-requests', type=int, default=4,
+                       help='Requests (batches) in flight (default: 4)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    parser.add_argument('--micro-batcher', action='store_true',
+                       help='Send single inputs through the client-side micro-batcher; batch sizes become '
+                            'its maximum batch size')
+    parser.add_argument('--callers', type=int, default=64,
+                       help='Concurrent single-input callers with --micro-batcher (default: 64)')
+    parser.add_argument('--max-wait', type=float, default=0.005,
+                       help='Seconds the micro-batcher waits for a batch to fill (default: 0.005)')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request of every point')
+    add_tokenizer_arguments(parser, 'vllm_args_embedding.sh')
+
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('stress_test_embedding').setLevel(logging.WARNING)
+
+    max_num_seqs = None
+    if os.path.exists(args.server_args):
+        max_num_seqs = get_arg(read_args_file(args.server_args), '--max-num-seqs')
+
+    benchmark = EmbeddingBatchBenchmark(
+        server_url=args.server_url,
+        batch_sizes=args.batch_sizes,
+        input_lengths=args.input_lengths,
+        items_per_point=args.items_per_point,
+        concurrent_requests=args.concurrent_requests,
+        request_timeout=args.request_timeout,
+        micro_batcher=args.micro_batcher,
+        callers=args.callers,
+        max_wait=args.max_wait,
+        max_num_seqs=int(max_num_seqs) if max_num_seqs else None,
+        tokenizer_settings=tokenizer_settings_from_args(args, use_chat_template=False)
+    )
+
+    logger.info("Starting embedding batch benchmark...")
+    await benchmark.run()
+    benchmark.print_report()
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    try:
+        import aiohttp
+        asyncio.run(main())
+    except ImportError:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Content-addressed caching proxy for the embedding server
+Serves the same /v1/embeddings API as the upstream server (kCodeEmbedding on port 8001).
+Every input is hashed together with the model name; hits come from an in-memory LRU of
+vectors backed by a memory-mapped on-disk vector store, and only the misses are forwarded,
+coalesced across concurrent requests by MicroBatcher and fetched as base64 float32.
+Hit rate, upstream bytes saved and latency are reported on GET /stats and at shutdown.
+"""
+
+import asyncio
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from client_profiler import json_codec
+from embedding_codec import decode_embeddings
+from histogram import PERCENTILES, LogHistogram
+from micro_batcher import MicroBatcher
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+KEY_BYTES = 16
+STORE_META = "store.json"
+
+
+def input_key(model: str, item) -> bytes:
+    """Content address of one input: model name and exact input text (or token ids)"""
+    text = item if isinstance(item, str) else json.dumps(item)
+    return hashlib.blake2b(f"{model}\0{text}".encode(), digest_size=KEY_BYTES).digest()
+
+
+class VectorStore:
+    def __init__(self, directory: str, capacity: int):
+        self.directory = directory
+        self.capacity = capacity  # Rows on disk; the least recently used row is overwritten when full
+        self.dimension: Optional[int] = None
+        self.vectors = None  # (capacity x dimension) float32 memmap
+        self.keys = None  # (capacity x KEY_BYTES) uint8 memmap, all zeros for a free row
+        self.tokens = None  # Prompt tokens of every stored input, reported back as usage
+        self.rows: "OrderedDict[bytes, int]" = OrderedDict()  # Key -> row, least recently used first
+        self.free_rows: List[int] = []
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, STORE_META)):
+            with open(os.path.join(directory, STORE_META)) as f:
+                meta = json.load(f)
+            if meta["capacity"] != capacity:
+                logger.warning(f"Vector store in {directory} holds {meta['capacity']} rows, keeping that capacity")
+                self.capacity = meta["capacity"]
+            self.open(meta["dimension"], "r+")
+
+    def open(self, dimension: int, mode: str):
+        """Map the store files, creating them for a new store"""
+        import numpy as np
+        self.dimension = dimension
+        path = lambda name: os.path.join(self.directory, name)
+        self.vectors = np.memmap(path("vectors.f32"), dtype="<f4", mode=mode, shape=(self.capacity, dimension))
+        self.keys = np.memmap(path("keys.bin"), dtype=np.uint8, mode=mode, shape=(self.capacity, KEY_BYTES))
+        self.tokens = np.memmap(path("tokens.i32"), dtype="<i4", mode=mode, shape=(self.capacity,))
+        if mode == "w+":
+            with open(path(STORE_META), "w") as f:
+                json.dump({"dimension": dimension, "capacity": self.capacity}, f)
+        used = np.flatnonzero(self.keys.any(axis=1))
+        self.rows = OrderedDict((self.keys[row].tobytes(), int(row)) for row in used)
+        self.free_rows = sorted(set(range(self.capacity)) - set(self.rows.values()), reverse=True)
+        if self.rows:
+            logger.info(f"Vector store: {len(self.rows)} cached vectors of dimension {dimension} loaded from {self.directory}")
+
+    def get(self, key: bytes) -> Optional[Tuple[object, int]]:
+        """(vector, prompt tokens) of a stored input, or None"""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        self.rows.move_to_end(key)
+        return self.vectors[row], int(self.tokens[row])
+
+    def put(self, key: bytes, vector, tokens: int):
+        """Store a vector, evicting the least recently used row when the store is full"""
+        if self.vectors is None:
+            self.open(len(vector), "w+")
+        if len(vector) != self.dimension:
+            raise ValueError(f"Vector of dimension {len(vector)} does not fit the store's {self.dimension}")
+        if key in self.rows:
+            self.rows.move_to_end(key)
+            return
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            _, row = self.rows.popitem(last=False)
+        self.vectors[row] = vector
+        self.tokens[row] = tokens
+        self.keys[row] = memoryview(key)
+        self.rows[key] = row
+
+    def flush(self):
+        """Write dirty pages back to the store files"""
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.keys.flush()
+            self.tokens.flush()
+
+
+class EmbeddingCacheProxy:
+    def __init__(self, upstream_url: str, store: VectorStore, memory_entries: int = 100000,
+                 max_batch_size: int = 32, max_wait: float = 0.005, max_upstream_batches: int = 8,
+                 request_timeout: int = 180, fast_path: bool = False):
+        self.upstream_url = upstream_url
+        self.store = store
+        self.memory_entries = memory_entries  # Hot vectors kept in process memory
+        self.memory: "OrderedDict[bytes, Tuple[object, int]]" = OrderedDict()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_upstream_batches = max_upstream_batches
+        self.request_timeout = request_timeout
+        self.json_dumps, self.json_loads = json_codec(fast_path)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.batchers: Dict[str, MicroBatcher] = {}  # One per model
+        self.pending: Dict[bytes, asyncio.Future] = {}  # Misses already on their way upstream
+
+        self.requests = 0
+        self.inputs = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Misses that joined an identical miss already in flight
+        self.upstream_requests = 0
+        self.upstream_bytes = 0
+        self.upstream_inputs = 0
+        self.latency = LogHistogram()  # Client request latency through the proxy
+        self.upstream_latency = LogHistogram()
+
+    def lookup(self, key: bytes) -> Optional[Tuple[object, int]]:
+        """Memory LRU first, then the on-disk store (promoting the hit into memory)"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+        entry = self.store.get(key)
+        if entry is not None:
+            self.disk_hits += 1
+            # Copy out of the memmap: an evicted row is overwritten while callers still hold the view
+            entry = (entry[0].copy(), entry[1])
+            self.remember(key, *entry)
+        return entry
+
+    def remember(self, key: bytes, vector, tokens: int):
+        self.memory[key] = (vector, tokens)
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    async def fetch_upstream(self, model: str, items: List) -> List[Tuple[object, int]]:
+        """Embed a batch of missed inputs upstream, as base64 float32"""
+        payload = {"model": model, "input": items, "encoding_format": "base64"}
+        started = time.perf_counter()
+        async with self.session.post(self.upstream_url, data=self.json_dumps(payload), headers=JSON_HEADERS,
+                                     timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+            raw = await response.read()
+            if response.status != 200:
+                raise web.HTTPBadGateway(text=raw[:200].decode(errors="replace"))
+        self.upstream_latency.record(time.perf_counter() - started)
+        self.upstream_requests += 1
+        self.upstream_bytes += len(raw)
+        self.upstream_inputs += len(items)
+        data = self.json_loads(raw)
+        vectors = decode_embeddings(data, "base64")
+        # Usage covers the whole batch; attribute it to the inputs by length
+        total_tokens = (data.get("usage") or {}).get("prompt_tokens", 0)
+        lengths = [len(item) for item in items]
+        scale = total_tokens / sum(lengths) if sum(lengths) else 0.0
+        return [(vectors[i], round(lengths[i] * scale)) for i in range(len(items))]
+
+    def batcher(self, model: str) -> MicroBatcher:
+        if model not in self.batchers:
+            self.batchers[model] = MicroBatcher(lambda items: self.fetch_upstream(model, items),
+                                                max_batch_size=self.max_batch_size, max_wait=self.max_wait,
+                                                max_concurrent_batches=self.max_upstream_batches)
+        return self.batchers[model]
+
+    async def resolve_miss(self, model: str, key: bytes, item) -> Tuple[object, int]:
+        """Fetch one missed input, sharing the upstream call with identical concurrent misses"""
+        if key in self.pending:
+            self.coalesced += 1
+            return await asyncio.shield(self.pending[key])
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            vector, tokens = await self.batcher(model).submit(item)
+            self.store.put(key, vector, tokens)
+            self.remember(key, vector, tokens)
+            future.set_result((vector, tokens))
+            return vector, tokens
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters retrieve the exception; mark it retrieved when nobody is waiting
+            future.exception()
+            raise
+        finally:
+            del self.pending[key]
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        """POST /v1/embeddings"""
+        started = time.perf_counter()
+        body = self.json_loads(await request.read())
+        model = body.get("model", "")
+        items = body.get("input", "")
+        single = not isinstance(items, list) or (items and isinstance(items[0], int))
+        items = [items] if single else items
+        self.requests += 1
+        self.inputs += len(items)
+
+        results: List[Optional[Tuple[object, int]]] = []
+        misses = []
+        for index, item in enumerate(items):
+            key = input_key(model, item)
+            entry = self.lookup(key)
+            results.append(entry)
+            if entry is None:
+                self.misses += 1
+                misses.append((index, key, item))
+        if misses:
+            try:
+                fetched = await asyncio.gather(*(self.resolve_miss(model, key, item) for _, key, item in misses))
+            except web.HTTPException:
+                raise
+            except Exception as e:
+                raise web.HTTPBadGateway(text=f"Upstream embedding request failed: {e}")
+            for (index, _, _), entry in zip(misses, fetched):
+                results[index] = entry
+
+        base64_output = body.get("encoding_format") == "base64"
+        data = []
+        prompt_tokens = 0
+        for index, (vector, tokens) in enumerate(results):
+            prompt_tokens += tokens
+            embedding = base64.b64encode(vector.tobytes()).decode() if base64_output else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        response = web.Response(body=self.json_dumps({
+            "object": "list", "data": data, "model": model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        }), content_type="application/json")
+        self.latency.record(time.perf_counter() - started)
+        return response
+
+    def stats(self) -> Dict:
+        """Hit rate, upstream traffic saved and latency so far"""
+        hits = self.memory_hits + self.disk_hits
+        # Upstream bytes a hit would have cost, at the observed bytes per fetched input
+        bytes_per_input = self.upstream_bytes / self.upstream_inputs if self.upstream_inputs else 0.0
+        return {
+            "requests": self.requests,
+            "inputs": self.inputs,
+            "hit_rate": hits / self.inputs if self.inputs else 0.0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced_misses": self.coalesced,
+            "upstream_requests": self.upstream_requests,
+            "upstream_inputs": self.upstream_inputs,
+            "upstream_bytes": self.upstream_bytes,
+            "bytes_saved": round((hits + self.coalesced) * bytes_per_input),
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.store.rows),
+            "latency": self.latency.percentiles() if self.latency.count else None,
+            "upstream_latency": self.upstream_latency.percentiles() if self.upstream_latency.count else None,
+            "average_upstream_batch": self.upstream_inputs / self.upstream_requests if self.upstream_requests else 0.0
+        }
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        """GET /stats"""
+        return web.json_response(self.stats())
+
+    async def health(self, request: web.Request) -> web.Response:
+        """GET /health, passed through to the upstream server"""
+        health_url = self.upstream_url.split("/v1/")[0] + "/health"
+        try:
+            async with self.session.get(health_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return web.Response(status=response.status, text=await response.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return web.Response(status=503, text=f"Upstream unavailable: {e}")
+
+    async def on_startup(self, application: web.Application):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_upstream_batches))
+
+    async def on_cleanup(self, application: web.Application):
+        for batcher in self.batchers.values():
+            await batcher.close()
+        await self.session.close()
+        self.store.flush()
+        print_proxy_report(self.stats())
+
+    def app(self) -> web.Application:
+        application = web.Application(client_max_size=256 * 1024 * 1024)
+        application.router.add_post("/v1/embeddings", self.embeddings)
+        application.router.add_get("/stats", self.stats_handler)
+        application.router.add_get("/health", self.health)
+        application.on_startup.append(self.on_startup)
+        application.on_cleanup.append(self.on_cleanup)
+        return application
+
+
+def print_proxy_report(stats: Dict):
+    """Print the cache effectiveness summary"""
+    print("\n=== EMBEDDING CACHE PROXY REPORT ===")
+    print(f"Requests: {stats['requests']}, inputs: {stats['inputs']}")
+    print(f"Hit Rate: {stats['hit_rate']:.1%} ({stats['memory_hits']} memory, {stats['disk_hits']} disk, "
+          f"{stats['misses']} misses of which {stats['coalesced_misses']} coalesced)")
+    print(f"Upstream: {stats['upstream_requests']} requests, {stats['upstream_inputs']} inputs "
+          f"(average batch {stats['average_upstream_batch']:.1f}), {stats['upstream_bytes'] / 1e6:.1f} MB received")
+    print(f"Upstream Bytes Saved: {stats['bytes_saved'] / 1e6:.1f} MB")
+    print(f"Cached Vectors: {stats['memory_entries']} in memory, {stats['disk_entries']} on disk")
+    for name, label in (("latency", "Proxy Latency (s)"), ("upstream_latency", "Upstream Latency (s)")):
+        if stats[name]:
+            print(f"  {label:<22}" + "".join(f"  p{q:g} {stats[name][q]:.4f}" for q in PERCENTILES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedding Cache Proxy')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8002,
+                       help='Port to listen on (default: 8002)')
+    parser.add_argument('--upstream', default='http://localhost:8001/v1/embeddings',
+                       help='Upstream embeddings endpoint (default: http://localhost:8001/v1/embeddings)')
+    parser.add_argument('--cache-dir', default='embedding_cache',
+                       help='Directory of the memory-mapped vector store (default: embedding_cache)')
+    parser.add_argument('--disk-entries', type=int, default=1_000_000,
+                       help='Vectors kept in the on-disk store (default: 1000000)')
+    parser.add_argument('--memory-entries', type=int, default=100_000,
+                       help='Vectors kept in the in-memory LRU (default: 100000)')
+    parser.add_argument('--max-batch-size', type=int, default=32,
+                       help='Largest upstream batch of missed inputs (default: 32)')
+    parser.add_argument('--max-wait', type=float, default=0.005,
+                       help='Seconds a miss waits for others to fill its upstream batch (default: 0.005)')
+    parser.add_argument('--max-upstream-batches', type=int, default=8,
+                       help='Upstream batches in flight at once (default: 8)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Upstream request timeout in seconds (default: 180)')
+    parser.add_argument('--fast-path', action='store_true',
+                       help='Use orjson when installed')
+
+    args = parser.parse_args()
+
+    proxy = EmbeddingCacheProxy(
+        upstream_url=args.upstream,
+        store=VectorStore(args.cache_dir, args.disk_entries),
+        memory_entries=args.memory_entries,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait,
+        max_upstream_batches=args.max_upstream_batches,
+        request_timeout=args.request_timeout,
+        fast_path=args.fast_path
+    )
+    logger.info(f"Embedding cache proxy on {args.host}:{args.port} -> {args.upstream}")
+    web.run_app(proxy.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    try:
+        import aiohttp
+        if importlib.util.find_spec("numpy") is None:
+            raise ImportError("numpy is not installed")
+        main()
+    except ImportError:
+        print("Error: aiohttp and numpy are required for this script.")
+        print("Please install them with: pip install aiohttp numpy")
+        exit(1)
@@ -0,0 +1,67 @@
+"""
+Decoding of /v1/embeddings responses into NumPy matrices
+With encoding_format "base64" every vector arrives as one base64 string of little-endian
+float32 values; it is decoded and viewed as float32 with np.frombuffer, then copied into a
+preallocated contiguous (inputs x dimension) matrix, so no Python float is ever created.
+The "float" path (JSON number lists) is kept for comparison, see embedding_decode_bench.py.
+"""
+
+import base64
+import json
+from typing import Callable, Dict, List
+
+ENCODING_FORMATS = ("float", "base64")
+
+
+def decode_embeddings(response: Dict, encoding_format: str = "float", out=None):
+    """Return the embeddings of a parsed response as a float32 (inputs x dimension) matrix
+
+    `out` may be a preallocated float32 matrix with at least as many rows as inputs; the
+    returned matrix is then a view of its first rows.
+    """
+    import numpy as np
+    data = response["data"]
+    if not data:
+        return np.empty((0, 0), dtype=np.float32) if out is None else out[:0]
+    first = data[0]["embedding"]
+    if encoding_format == "base64":
+        # The first vector's bytes give the dimension and are reused for its row below
+        first = base64.b64decode(first)
+        dimension = len(first) // 4
+    else:
+        dimension = len(first)
+    if out is None:
+        out = np.empty((len(data), dimension), dtype=np.float32)
+    elif out.shape[0] < len(data) or out.shape[1] != dimension or out.dtype != np.float32:
+        raise ValueError(f"Output matrix {out.shape} {out.dtype} cannot hold {len(data)} x {dimension} float32")
+    for position, entry in enumerate(data):
+        vector = entry["embedding"]
+        if encoding_format == "base64":
+            # A view over the decoded bytes; the row assignment is a single memcpy
+            raw = first if position == 0 else base64.b64decode(vector)
+            out[entry["index"]] = np.frombuffer(raw, dtype="<f4")
+        else:
+            out[entry["index"]] = vector
+    return out[:len(data)]
+
+
+def encode_embeddings(vectors: List, encoding_format: str = "float") -> List:
+    """Encode float32 vectors the way an OpenAI-compatible server returns them"""
+    if encoding_format == "base64":
+        import numpy as np
+        return [base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode() for vector in vectors]
+    return [[float(value) for value in vector] for vector in vectors]
+
+
+def parse_embedding_response(raw: bytes, encoding_format: str = "float",
+                             loads: Callable[[bytes], object] = json.loads, out=None):
+    """Parse raw response bytes and decode their embeddings, returning (response, matrix)"""
+    response = loads(raw)
+    return response, decode_embeddings(response, encoding_format, out)
+
+
+def add_encoding_arguments(parser):
+    """Register the embedding encoding options"""
+    parser.add_argument('--encoding-format', choices=ENCODING_FORMATS, default=None,
+                       help='Ask the server for JSON float lists or base64 float32 vectors and decode them '
+                            'into a NumPy matrix (default: server default, vectors are parsed and discarded)')
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Client-side embedding decode benchmark
+Fetches one /v1/embeddings response per encoding format (or synthesizes them with
+--synthetic) and measures what decoding them into a float32 NumPy matrix costs the client:
+CPU time and peak memory per 1k embeddings for JSON float lists vs base64, with the standard
+json module and with orjson when it is installed.
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import aiohttp
+
+from embedding_codec import ENCODING_FORMATS, decode_embeddings, encode_embeddings
+from prompt_pool import generate_long_message
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def available_parsers() -> List[Tuple[str, object]]:
+    """(name, loads) of the JSON parsers to compare"""
+    parsers = [("json", json.loads)]
+    try:
+        import orjson
+        parsers.append(("orjson", orjson.loads))
+    except ImportError:
+        logger.info("orjson is not installed, comparing the standard json module only")
+    return parsers
+
+
+async def fetch_responses(server_url: str, batch_size: int, context_size: int,
+                          request_timeout: int) -> Dict[str, bytes]:
+    """Embed the same inputs once per encoding format and return the raw response bodies"""
+    texts = [f"[{os.urandom(8).hex()}] {generate_long_message(context_size)}" for _ in range(batch_size)]
+    responses = {}
+    async with aiohttp.ClientSession() as session:
+        for encoding_format in ENCODING_FORMATS:
+            payload = {"model": "kCodeEmbedding", "input": texts, "encoding_format": encoding_format}
+            async with session.post(server_url, json=payload, headers=JSON_HEADERS,
+                                    timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+                raw = await response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status} for {encoding_format}: {raw[:200]!r}")
+            responses[encoding_format] = raw
+    return responses
+
+
+def synthetic_responses(batch_size: int, dimension: int, seed: int = 0) -> Dict[str, bytes]:
+    """Build OpenAI-style responses for the same random vectors in every encoding format"""
+    import numpy as np
+    vectors = np.random.default_rng(seed).uniform(-1, 1, size=(batch_size, dimension)).astype(np.float32)
+    responses = {}
+    for encoding_format in ENCODING_FORMATS:
+        data = [{"object": "embedding", "index": i, "embedding": embedding}
+                for i, embedding in enumerate(encode_embeddings(vectors, encoding_format))]
+        responses[encoding_format] = json.dumps({"object": "list", "data": data, "model": "kCodeEmbedding",
+                                                 "usage": {"prompt_tokens": 0, "total_tokens": 0}}).encode()
+    return responses
+
+
+def measure_decode(raw: bytes, encoding_format: str, loads, repeats: int) -> Dict:
+    """CPU and wall time of parsing + decoding a response `repeats` times, and the peak memory of one decode"""
+    matrix = decode_embeddings(loads(raw), encoding_format)
+    rows = matrix.shape[0]
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for _ in range(repeats):
+        # The preallocated matrix is reused, as a client would for a stream of batches
+        decode_embeddings(loads(raw), encoding_format, matrix)
+    cpu = time.process_time() - cpu_started
+    wall = time.perf_counter() - wall_started
+
+    # Peak of everything one decode keeps alive at once: parsed response plus vectors
+    tracemalloc.start()
+    response = loads(raw)
+    decode_embeddings(response, encoding_format, matrix)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del response
+
+    embeddings = rows * repeats
+    return {
+        "rows": rows,
+        "dimension": matrix.shape[1],
+        "response_bytes": len(raw),
+        "cpu_ms_per_1k": cpu / embeddings * 1000 * 1000,
+        "wall_ms_per_1k": wall / embeddings * 1000 * 1000,
+        "peak_mb_per_1k": peak / rows * 1000 / 1e6,
+        "matrix": matrix
+    }
+
+
+def print_report(results: Dict[Tuple[str, str], Dict], embeddings: int):
+    """Print decode cost per 1k embeddings for every format and parser"""
+    first = next(iter(results.values()))
+    print("\n=== EMBEDDING DECODE REPORT ===")
+    print(f"{first['rows']} vectors of dimension {first['dimension']} per response, "
+          f"~{embeddings} embeddings decoded per measurement")
+    header = (f"{'Format':<8} {'Parser':<8} {'Response KB':>12} {'CPU ms/1k':>10} {'Wall ms/1k':>11} "
+              f"{'Peak MB/1k':>11} {'CPU vs float/json':>18}")
+    print(header)
+    print("-" * len(header))
+    baseline = results.get(("float", "json"))
+    for (encoding_format, parser), result in results.items():
+        speedup = baseline["cpu_ms_per_1k"] / result["cpu_ms_per_1k"] if baseline and result["cpu_ms_per_1k"] else 0.0
+        print(f"{encoding_format:<8} {parser:<8} {result['response_bytes'] / 1024:>12.1f} "
+              f"{result['cpu_ms_per_1k']:>10.2f} {result['wall_ms_per_1k']:>11.2f} "
+              f"{result['peak_mb_per_1k']:>11.2f} {speedup:>17.1f}x")
+
+    import numpy as np
+    matrices = {encoding_format: result["matrix"] for (encoding_format, _), result in results.items()}
+    if "float" in matrices and "base64" in matrices and matrices["float"].shape == matrices["base64"].shape:
+        difference = float(np.max(np.abs(matrices["float"] - matrices["base64"]))) if matrices["float"].size else 0.0
+        print(f"\nMax |float - base64| over the decoded vectors: {difference:.3g}")
+    print("Peak MB/1k: memory held while one response is parsed and decoded (Python objects and arrays).")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Embedding Decode Benchmark Script')
+    parser.add_argument('--server-url', default='http://localhost:8001/v1/embeddings',
+                       help='Server URL to fetch the responses from (default: http://localhost:8001/v1/embeddings)')
+    parser.add_argument('--synthetic', action='store_true',
+                       help='Synthesize the responses locally instead of asking the server')
+    parser.add_argument('--dimension', type=int, default=896,
+                       help='Vector dimension of synthetic responses (default: 896, jina-code-embeddings-0.5b)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Inputs per response (default: 32)')
+    parser.add_argument('--context-size', type=int, default=128,
+                       help='Tokens per input when fetching from the server (default: 128)')
+    parser.add_argument('--embeddings', type=int, default=20000,
+                       help='Embeddings decoded per format and parser (default: 20000)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        responses = synthetic_responses(args.batch_size, args.dimension)
+    else:
+        logger.info(f"Fetching {args.batch_size} embeddings per encoding format from {args.server_url}...")
+        responses = await fetch_responses(args.server_url, args.batch_size, args.context_size, args.request_timeout)
+
+    repeats = max(1, math.ceil(args.embeddings / args.batch_size))
+    parsers = available_parsers()
+    results = {}
+    for encoding_format in ENCODING_FORMATS:
+        for name, loads in parsers:
+            logger.info(f"Decoding {encoding_format} responses with {name}...")
+            results[(encoding_format, name)] = measure_decode(responses[encoding_format], encoding_format,
+                                                              loads, repeats)
+    print_report(results, repeats * args.batch_size)
+
+if __name__ == "__main__":
+    try:
+        import aiohttp
+        if importlib.util.find_spec("numpy") is None:
+            raise ImportError("numpy is not installed")
+        asyncio.run(main())
+    except ImportError:
+        print("Error: aiohttp and numpy are required for this script.")
+        print("Please install them with: pip install aiohttp numpy")
+        exit(1)
@@ -0,0 +1,186 @@
+"""
+Bounded-memory streaming statistics for the stress testers
+LogHistogram records values into logarithmic buckets (HDR-style) so percentiles stay
+accurate to a fixed relative error no matter how many values are recorded, and
+ResultAggregator folds request result dicts into a set of histograms as they complete
+"""
+
+import math
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LogHistogram:
+    def __init__(self, relative_error: float = 0.01, lowest_value: float = 1e-6):
+        self.relative_error = relative_error  # Max relative error of reported percentiles
+        self.lowest_value = lowest_value  # Smallest distinguishable positive value
+        self.log_base = math.log1p(2 * relative_error)
+
+        # Sparse bucket counts: the number of buckets is bounded by log(max/lowest) / log_base
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def bucket_index(self, value: float) -> int:
+        """Map a positive value to its logarithmic bucket"""
+        if value <= self.lowest_value:
+            return 0
+        return int(math.log(value / self.lowest_value) / self.log_base)
+
+    def bucket_value(self, index: int) -> float:
+        """Representative (geometric midpoint) value of a bucket"""
+        return self.lowest_value * math.exp((index + 0.5) * self.log_base)
+
+    def record(self, value: float, count: int = 1):
+        """Record a value (or count copies of it)"""
+        if value <= 0:
+            self.zero_count += count
+            value = max(value, 0)
+        else:
+            index = self.bucket_index(value)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram"):
+        """Add another histogram's counts into this one (e.g. from another worker or run)"""
+        if other.relative_error != self.relative_error or other.lowest_value != self.lowest_value:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Return the q-th percentile (0-100), accurate to relative_error"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = self.zero_count
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Exact min/max are known, so never report beyond them
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def percentiles(self, qs=PERCENTILES) -> Dict[float, float]:
+        """Return several percentiles at once"""
+        return {q: self.percentile(q) for q in qs}
+
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dict"""
+        return {
+            "relative_error": self.relative_error,
+            "lowest_value": self.lowest_value,
+            "buckets": {str(index): count for index, count in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LogHistogram":
+        """Rebuild a histogram serialized with to_dict"""
+        histogram = cls(relative_error=data["relative_error"], lowest_value=data["lowest_value"])
+        histogram.buckets = {int(index): count for index, count in data["buckets"].items()}
+        histogram.zero_count = data["zero_count"]
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        if histogram.count:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+
+class ResultAggregator:
+    # Result fields summarized for every successful request
+    FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens', 'duration', 'tokens_per_sec')
+    # Fields that are only recorded when positive (TTFT / TPOT exist only when streaming)
+    OPTIONAL_FIELDS = ('ttft', 'tpot')
+    # Fields only some servers report (None when missing, zero is meaningful)
+    REPORTED_FIELDS = ('cached_tokens',)
+
+    def __init__(self, sample_size: int = 5):
+        self.sample_size = sample_size
+        self.total_requests = 0
+        self.successful_requests = 0
+        self.histograms: Dict[str, LogHistogram] = {
+            name: LogHistogram() for name in self.FIELDS + self.OPTIONAL_FIELDS + self.REPORTED_FIELDS
+        }
+        self.histograms['inter_token_latency'] = LogHistogram()
+        self.samples: List[Dict] = []  # First few successful results, for the report
+
+    def record(self, result: Dict):
+        """Fold one request result into the running statistics"""
+        self.total_requests += 1
+        if result.get('status') != 'SUCCESS':
+            return
+        self.successful_requests += 1
+        for name in self.FIELDS:
+            self.histograms[name].record(result.get(name, 0))
+        for name in self.OPTIONAL_FIELDS:
+            if result.get(name, 0) > 0:
+                self.histograms[name].record(result[name])
+        for name in self.REPORTED_FIELDS:
+            if result.get(name) is not None:
+                self.histograms[name].record(result[name])
+        itl = self.histograms['inter_token_latency']
+        for gap in result.get('inter_token_latencies', ()):
+            itl.record(gap)
+        if len(self.samples) < self.sample_size:
+            self.samples.append({k: v for k, v in result.items() if k != 'inter_token_latencies'})
+
+    def merge(self, other: "ResultAggregator"):
+        """Merge another aggregator (e.g. from another worker process) into this one"""
+        self.total_requests += other.total_requests
+        self.successful_requests += other.successful_requests
+        for name, histogram in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+            else:
+                self.histograms[name] = histogram
+        self.samples.extend(other.samples[:max(0, self.sample_size - len(self.samples))])
+
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dict (e.g. for a checkpoint)"""
+        return {
+            "sample_size": self.sample_size,
+            "total_requests": self.total_requests,
+            "successful_requests": self.successful_requests,
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            "samples": self.samples
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ResultAggregator":
+        """Rebuild an aggregator serialized with to_dict"""
+        aggregator = cls(sample_size=data.get("sample_size", 5))
+        aggregator.total_requests = data["total_requests"]
+        aggregator.successful_requests = data["successful_requests"]
+        aggregator.histograms.update((name, LogHistogram.from_dict(histogram))
+                                     for name, histogram in data["histograms"].items())
+        aggregator.samples = data["samples"]
+        return aggregator
+
+    def histogram(self, name: str) -> Optional[LogHistogram]:
+        """Return the histogram for a field, or None if nothing was recorded for it"""
+        histogram = self.histograms.get(name)
+        return histogram if histogram is not None and histogram.count else None
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Long-context scaling benchmark for self-hosted LLM server
+Sends one request at a time at prompt lengths on a geometric grid up to the server's context
+limit (--max-model-len / -c), with exact-length prompts and repeated trials per length. Fits
+prefill time and per-token decode cost as functions of context length and reports the lengths
+where throughput falls off a cliff (chunked prefill, KV cache exhaustion and offloading).
+Optionally repeats the scan for server argument variants, e.g. with and without
+--kv-offloading-size or --fit-ctx, and compares them.
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from metrics_scraper import MetricsScraper, add_metrics_arguments, scraper_from_args
+from prompt_pool import PromptPool
+from server_args import get_arg, read_args_file
+from server_launcher import LAUNCHERS, create_launcher, server_base_url, server_kind
+from stress_test_llm import LLMStressTester
+from sweep import parse_variant, solve_linear
+from tokenizer_utils import add_tokenizer_arguments, tokenizer_settings_from_args
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# A point whose per-token cost exceeds the trend of the shorter contexts by this much is a cliff
+CLIFF_THRESHOLD = 0.25
+TREND_POINTS = 3  # Shorter points the local trend is extrapolated from
+
+
+def context_limit(server_args: List[str], kind: str) -> Optional[int]:
+    """Longest context a single request may use according to the server arguments"""
+    if kind == "llama":
+        context = get_arg(server_args, '-c', '--ctx-size')
+        if context is None:
+            return None
+        slots = int(get_arg(server_args, '-np', '--parallel', default='1'))
+        # Without a unified KV cache, -c is split evenly between the slots
+        unified = '-kvu' in server_args or '--kv-unified' in server_args
+        return int(context) if unified or slots <= 1 else int(context) // slots
+    value = get_arg(server_args, '--max-model-len')
+    return int(value) if value else None
+
+
+def context_boundaries(server_args: List[str], kind: str) -> List[Tuple[int, str]]:
+    """Context lengths where the server changes how it processes a request, for explaining cliffs"""
+    if kind == "llama":
+        specs = ((('-ub', '--ubatch-size'), "-ub {}: longer prompts are prefilled in several micro-batches"),
+                 (('-b', '--batch-size'), "-b {}: longer prompts are split into several logical batches"))
+    else:
+        specs = ((('--max-num-batched-tokens',), "--max-num-batched-tokens {}: longer prompts are "
+                                                 "prefilled in chunks over several engine steps"),)
+    boundaries = []
+    for names, description in specs:
+        value = get_arg(server_args, *names)
+        if value and value.isdigit():
+            boundaries.append((int(value), description.format(value)))
+    return boundaries
+
+
+async def fetch_kv_capacity(server_url: str) -> Optional[int]:
+    """GPU KV cache capacity in tokens from vLLM's cache_config_info metric, if exposed"""
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            async with session.get(server_base_url(server_url) + "/metrics") as response:
+                if response.status != 200:
+                    return None
+                text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+    for line in text.splitlines():
+        if line.startswith("vllm:cache_config_info"):
+            labels = dict(re.findall(r'(\w+)="([^"]*)"', line))
+            if labels.get("num_gpu_blocks", "").isdigit() and labels.get("block_size", "").isdigit():
+                return int(labels["num_gpu_blocks"]) * int(labels["block_size"])
+    return None
+
+
+def geometric_grid(start: int, stop: int, growth: float) -> List[int]:
+    """Lengths start, start*growth, ... below stop, then stop itself"""
+    if growth <= 1:
+        raise ValueError("Grid growth factor must be above 1")
+    lengths = []
+    length = float(start)
+    while round(length) < stop:
+        lengths.append(round(length))
+        length *= growth
+    lengths.append(stop)
+    return sorted(set(lengths))
+
+
+def fit_polynomial(xs: List[float], ys: List[float], degree: int) -> Optional[Dict]:
+    """Least-squares fit of y = c0 + c1*x + ... + c_degree*x^degree, with its R^2"""
+    if len(xs) <= degree:
+        return None
+    rows = [[x ** k for k in range(degree + 1)] for x in xs]
+    normal = [[sum(row[i] * row[j] for row in rows) for j in range(degree + 1)] for i in range(degree + 1)]
+    rhs = [sum(row[i] * y for row, y in zip(rows, ys)) for i in range(degree + 1)]
+    coefficients = solve_linear(normal, rhs)
+    if coefficients is None:
+        return None
+    fit = {"coefficients": coefficients, "points": len(xs)}
+    mean = sum(ys) / len(ys)
+    total = sum((y - mean) ** 2 for y in ys)
+    residual = sum((y - evaluate(fit, x)) ** 2 for x, y in zip(xs, ys))
+    fit["r2"] = 1 - residual / total if total > 0 else 1.0
+    return fit
+
+
+def evaluate(fit: Dict, x: float) -> float:
+    return sum(c * x ** k for k, c in enumerate(fit["coefficients"]))
+
+
+def find_cliffs(xs: List[float], costs: List[float], threshold: float = CLIFF_THRESHOLD) -> List[Dict]:
+    """Points whose per-token cost jumps above the trend of the shorter contexts
+
+    The trend is a line through the last few points, but never below the previous point, so
+    fixed overheads fading out at short contexts do not count. It restarts at every cliff, so
+    a regime that stays slower is reported once.
+    """
+    cliffs = []
+    start = 0
+    for i in range(1, len(xs)):
+        window = slice(max(start, i - TREND_POINTS), i)
+        fit = fit_polynomial(xs[window], costs[window], 1)
+        if fit is None and start:
+            # A new regime needs two points of its own before it has a trend
+            continue
+        expected = max(evaluate(fit, xs[i]) if fit else 0.0, costs[i - 1])
+        if expected > 0 and costs[i] > expected * (1 + threshold):
+            cliffs.append({"index": i, "ratio": costs[i] / expected})
+            start = i
+    return cliffs
+
+
+class LongContextBenchmark:
+    def __init__(self, server_url: str, lengths: List[int], trials: int = 3, max_tokens: int = 128,
+                 request_timeout: int = 600, warmup_requests: int = 1,
+                 cliff_threshold: float = CLIFF_THRESHOLD, context_limit: Optional[int] = None,
+                 boundaries: Optional[List[Tuple[int, str]]] = None,
+                 scraper: Optional[MetricsScraper] = None, tokenizer_settings: Optional[Dict] = None):
+        self.server_url = server_url
+        self.lengths = lengths  # Prompt tokens per point
+        self.trials = trials  # Requests per length, sent one at a time
+        self.max_tokens = max_tokens
+        self.request_timeout = request_timeout
+        self.warmup_requests = warmup_requests  # Unmeasured requests at the shortest length first
+        self.cliff_threshold = cliff_threshold
+        self.context_limit = context_limit  # For the report
+        self.boundaries = list(boundaries or [])  # (tokens, description) of known processing changes
+        self.scraper = scraper
+        self.tokenizer_settings = tokenizer_settings
+
+        self.points: List[Dict] = []
+
+    def make_tester(self, length: int, total_requests: int) -> LLMStressTester:
+        """Create a single-stream tester with its own exact-length prompt pool"""
+        tester = LLMStressTester(
+            server_url=self.server_url,
+            concurrent_requests=1,
+            total_requests=total_requests,
+            request_timeout=self.request_timeout,
+            context_size=length,
+            max_tokens=self.max_tokens,
+            mode='mixed',
+            stream=True,
+            prompt_pool_size=total_requests,
+            tokenizer_settings=self.tokenizer_settings
+        )
+        # Every trial decodes the full max_tokens, so TPOT always covers the same span
+        tester.prompt_pool = PromptPool(
+            total_requests, length, lambda content: dict(tester.build_payload(content), ignore_eos=True),
+            unique=True, count_tokens=tester.token_counter(),
+            tokenizer_name=self.tokenizer_settings["tokenizer"] if self.tokenizer_settings else None
+        )
+        return tester
+
+    async def run_tester(self, tester: LLMStressTester):
+        # Exact-length pools of long prompts take a while to tokenize, keep the loop free meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, tester.prompt_pool.build)
+        await tester.run_concurrent_requests()
+
+    async def run_point(self, length: int) -> Dict:
+        """Send the trials of one prompt length and summarize them"""
+        logger.info(f"=== {length} prompt tokens, {self.trials} trial(s) ===")
+        tester = self.make_tester(length, self.trials)
+        started = time.time()
+        await self.run_tester(tester)
+        aggregator = tester.aggregator
+
+        point = {"length": length, "ok": aggregator.successful_requests, "trials": aggregator.total_requests}
+        prompt = aggregator.histogram('prompt_tokens')
+        # The server's own count is the x-axis, it includes the chat template
+        point["prompt_tokens"] = prompt.mean if prompt else float(length)
+        for name in ('ttft', 'tpot'):
+            histogram = aggregator.histogram(name)
+            point[name] = ({"mean": histogram.mean, "min": histogram.min, "max": histogram.max}
+                           if histogram else None)
+        cached = aggregator.histogram('cached_tokens')
+        point["cached_tokens"] = cached.mean if cached else None
+        point["prefill_tokens_per_sec"] = point["prompt_tokens"] / point["ttft"]["mean"] if point["ttft"] else None
+        point["decode_tokens_per_sec"] = 1 / point["tpot"]["mean"] if point["tpot"] else None
+
+        metrics = self.scraper.report(started, time.time()) if self.scraper else None
+        point["kv_usage"] = metrics["gauges"]["kv_usage"]["max"] if metrics and "kv_usage" in metrics["gauges"] else None
+        point["preemptions"] = metrics["counters"].get("preemptions") if metrics else None
+
+        if point["ttft"]:
+            logger.info(f"{length} tokens: TTFT {point['ttft']['mean']:.3f}s "
+                        f"({point['prefill_tokens_per_sec']:.0f} prompt tok/s), "
+                        f"decode {point['decode_tokens_per_sec'] or 0:.1f} tok/s, {point['ok']}/{point['trials']} OK")
+        else:
+            logger.warning(f"{length} tokens: no successful trial")
+        return point
+
+    async def run(self) -> List[Dict]:
+        """Warm up, then measure every length from the shortest to the longest"""
+        if self.warmup_requests:
+            logger.info(f"Sending {self.warmup_requests} warm-up request(s)...")
+            await self.run_tester(self.make_tester(min(self.lengths), self.warmup_requests))
+        self.points = []
+        for length in self.lengths:
+            self.points.append(await self.run_point(length))
+        return self.points
+
+    def measured(self, key: str) -> List[Dict]:
+        return [point for point in self.points if point[key]]
+
+    def fit_prefill(self, points: List[Dict]) -> Optional[Dict]:
+        """TTFT(n) = a + b*n + c*n^2 with n in thousands of prompt tokens"""
+        return fit_polynomial([p["prompt_tokens"] / 1000 for p in points], [p["ttft"]["mean"] for p in points],
+                              min(2, len(points) - 1))
+
+    def fit_decode(self, points: List[Dict]) -> Optional[Dict]:
+        """TPOT(n) = d + e*n with n in thousands of context tokens"""
+        return fit_polynomial([p["prompt_tokens"] / 1000 for p in points], [p["tpot"]["mean"] for p in points], 1)
+
+    def summarize(self) -> Dict:
+        """Fits below the first cliff, the cliffs of each phase and the longest working context"""
+        summary = {"prefill": None, "decode": None, "cliffs": [], "longest_ok": None}
+        ok = [point for point in self.points if point["ok"]]
+        if ok:
+            summary["longest_ok"] = max(ok, key=lambda point: point["length"])
+        for phase, key, fit in (("prefill", "ttft", self.fit_prefill), ("decode", "tpot", self.fit_decode)):
+            points = self.measured(key)
+            if not points:
+                continue
+            xs = [point["prompt_tokens"] / 1000 for point in points]
+            # Prefill is judged per prompt token, decode per generated token
+            costs = [point[key]["mean"] / (point["prompt_tokens"] if phase == "prefill" else 1) for point in points]
+            cliffs = find_cliffs(xs, costs, self.cliff_threshold)
+            for cliff in cliffs:
+                index = cliff["index"]
+                before, after = points[index - 1], points[index]
+                # A slowdown can start one point early while still within the threshold
+                lower = points[index - 2]["prompt_tokens"] if index >= 2 else 0
+                summary["cliffs"].append({
+                    "phase": phase, "ratio": cliff["ratio"], "before": before, "after": after,
+                    "causes": [description for tokens, description in self.boundaries
+                               if lower < tokens <= after["prompt_tokens"] + self.max_tokens]
+                })
+            # The cost model describes the regime below the first cliff
+            clean = points[:cliffs[0]["index"]] if cliffs else points
+            summary[phase] = fit(clean if len(clean) >= 2 else points)
+        return summary
+
+    def print_report(self, title: str = "LONG-CONTEXT SCALING"):
+        """Print the per-length table, the cost fits and the detected cliffs"""
+        print(f"\n=== {title} REPORT ===")
+        limit = f"context limit {self.context_limit} tokens, " if self.context_limit else ""
+        print(f"One request at a time, {limit}{self.trials} trial(s) per length, {self.max_tokens} output tokens")
+        show_kv = any(point["kv_usage"] is not None for point in self.points)
+        header = (f"{'Target':>8} {'Prompt':>8} {'OK':>5} {'TTFT mean':>10} {'min':>8} {'max':>8} "
+                  f"{'Prefill tok/s':>14} {'TPOT ms':>8} {'Decode tok/s':>13} {'Cached':>7}"
+                  + (f" {'KV max':>7}" if show_kv else ""))
+        print(header)
+        print("-" * len(header))
+        for point in self.points:
+            line = f"{point['length']:>8} {point['prompt_tokens']:>8.0f} {point['ok']:>2}/{point['trials']:<2} "
+            if point["ttft"]:
+                ttft = point["ttft"]
+                line += (f"{ttft['mean']:>10.3f} {ttft['min']:>8.3f} {ttft['max']:>8.3f} "
+                         f"{point['prefill_tokens_per_sec']:>14.0f} ")
+            else:
+                line += f"{'-':>10} {'-':>8} {'-':>8} {'-':>14} "
+            if point["tpot"]:
+                line += f"{point['tpot']['mean'] * 1000:>8.2f} {point['decode_tokens_per_sec']:>13.1f} "
+            else:
+                line += f"{'-':>8} {'-':>13} "
+            cached = point["cached_tokens"]
+            line += f"{format(cached / point['prompt_tokens'], '.0%') if cached is not None else '-':>7}"
+            if show_kv:
+                line += f" {format(point['kv_usage'], '.0%') if point['kv_usage'] is not None else '-':>7}"
+            print(line)
+        if any(point["cached_tokens"] and point["cached_tokens"] > 0.05 * point["prompt_tokens"] for point in self.points):
+            print("Warning: some prompts were partly served from the prefix cache, their prefill times are optimistic")
+
+        summary = self.summarize()
+        longest = self.points[-1]["prompt_tokens"] if self.points else 0
+        prefill = summary["prefill"]
+        if prefill:
+            a, b, c = (prefill["coefficients"] + [0.0])[:3]
+            marginal = b + 2 * c * longest / 1000  # Seconds per 1k tokens at the longest context
+            print(f"\nPrefill fit ({prefill['points']} points, R^2 {prefill['r2']:.3f}): "
+                  f"TTFT(n) = {a * 1000:.1f} ms + {b * 1000:.2f} ms per 1k tokens + {c * 1000:.3f} ms per (1k tokens)^2")
+            if marginal > 0:
+                print(f"  Marginal prefill cost at {longest:.0f} tokens: {marginal * 1000:.2f} ms per 1k tokens "
+                      f"({1000 / marginal:.0f} tok/s)")
+        decode = summary["decode"]
+        if decode:
+            d, e = decode["coefficients"]
+            print(f"Decode fit ({decode['points']} points, R^2 {decode['r2']:.3f}): "
+                  f"TPOT(n) = {d * 1000:.2f} ms + {e * 1000:.4f} ms per 1k context tokens")
+            at_longest = evaluate(decode, longest / 1000)
+            if d > 0 and at_longest > 0:
+                print(f"  At {longest:.0f} tokens: {at_longest * 1000:.2f} ms per token ({1 / at_longest:.1f} tok/s), "
+                      f"{at_longest / d - 1:+.0%} vs an empty context")
+
+        print("")
+        if not summary["cliffs"]:
+            print(f"No throughput cliffs (per-token cost more than {self.cliff_threshold:.0%} above the trend) "
+                  f"up to {longest:.0f} tokens")
+        for cliff in summary["cliffs"]:
+            before, after = cliff["before"], cliff["after"]
+            rate = "prefill_tokens_per_sec" if cliff["phase"] == "prefill" else "decode_tokens_per_sec"
+            print(f"{cliff['phase'].capitalize()} cliff between {before['prompt_tokens']:.0f} and "
+                  f"{after['prompt_tokens']:.0f} tokens: {cliff['ratio']:.2f}x the per-token cost expected from "
+                  f"shorter contexts ({before[rate]:.0f} -> {after[rate]:.0f} tok/s)")
+            for cause in cliff["causes"]:
+                print(f"  crosses {cause}")
+        print("Fits use the points below the first cliff of each phase; n is the server-reported prompt length.")
+
+
+def print_comparison(results: List[Tuple[str, Optional[LongContextBenchmark]]]):
+    """Print one row per server variant: throughput at the longest context and the first cliff"""
+    print("\n=== VARIANT COMPARISON ===")
+    header = (f"{'Variant':<32} {'Longest OK':>11} {'Prefill tok/s':>14} {'Decode tok/s':>13} "
+              f"{'First cliff':>24}")
+    print(header)
+    print("-" * len(header))
+    for label, benchmark in results:
+        if benchmark is None:
+            print(f"{label:<32} failed (see the log above)")
+            continue
+        summary = benchmark.summarize()
+        longest = summary["longest_ok"]
+        if longest is None:
+            print(f"{label:<32} no successful request")
+            continue
+        cliff = min(summary["cliffs"], key=lambda c: c["after"]["prompt_tokens"]) if summary["cliffs"] else None
+        cliff_text = f"{cliff['phase']} @ {cliff['after']['prompt_tokens']:.0f}" if cliff else "none"
+        print(f"{label:<32} {longest['length']:>11} {longest['prefill_tokens_per_sec'] or 0:>14.0f} "
+              f"{longest['decode_tokens_per_sec'] or 0:>13.1f} {cliff_text:>24}")
+    print("\nThroughput columns are measured at each variant's longest successful prompt length.")
+
+
+def parse_list(text: str) -> List[int]:
+    """argparse type for comma-separated token counts"""
+    return [int(item) for item in text.split(',') if item.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Long-Context Scaling Benchmark Script')
+    parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Server URL (default: http://localhost:8000/v1/chat/completions)')
+    parser.add_argument('--max-context', type=int, default=None,
+                       help='Context limit to scan up to (default: --max-model-len / -c from --server-args)')
+    parser.add_argument('--min-context', type=int, default=512,
+                       help='Shortest prompt length in tokens (default: 512)')
+    parser.add_argument('--growth', type=float, default=2.0,
+                       help='Factor between consecutive prompt lengths (default: 2, e.g. 1.414 for two '
+                            'points per doubling)')
+    parser.add_argument('--lengths', type=parse_list, default=None,
+                       help='Comma-separated prompt lengths to measure instead of the geometric grid')
+    parser.add_argument('--trials', type=int, default=3,
+                       help='Requests per prompt length (default: 3)')
+    parser.add_argument('--max-tokens', type=int, default=128,
+                       help='Tokens to generate per request, decoded in full with ignore_eos (default: 128)')
+    parser.add_argument('--headroom', type=float, default=0.02,
+                       help='Fraction of the context limit kept free for the chat template and token '
+                            'estimate errors (default: 0.02)')
+    parser.add_argument('--cliff-threshold', type=float, default=CLIFF_THRESHOLD,
+                       help=f'Per-token cost above the trend of shorter contexts that counts as a cliff '
+                            f'(default: {CLIFF_THRESHOLD})')
+    parser.add_argument('--warmup-requests', type=int, default=1,
+                       help='Unmeasured requests at the shortest length before the scan (default: 1)')
+    parser.add_argument('--request-timeout', type=int, default=600,
+                       help='Request timeout in seconds (default: 600)')
+    parser.add_argument('--variant', action='append', default=[],
+                       help='Server variant to launch and scan: an args file, or "label:--flag value ..." '
+                            'overrides of --server-args; repeatable (default: scan the running server)')
+    parser.add_argument('--launcher', choices=LAUNCHERS, default='command',
+                       help='How variants are started (default: command)')
+    parser.add_argument('--launch-command', type=str, default=None,
+                       help='Server command the variant arguments are appended to '
+                            '(default: as in run_vllm.sh / run_llama.sh)')
+    parser.add_argument('--startup-timeout', type=float, default=900,
+                       help='Seconds to wait for a launched server to become healthy (default: 900)')
+    parser.add_argument('--server-log', type=str, default=None,
+                       help='Append launched server output to this file (default: discard)')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request of every point')
+    parser.add_argument('--estimate-tokens', action='store_true',
+                       help='Size prompts with the 4-characters-per-token estimate instead of the local '
+                            'tokenizer; the longest points may then miss their length or exceed the limit')
+    add_metrics_arguments(parser)
+    add_tokenizer_arguments(parser, 'vllm_args.sh')
+
+    args = parser.parse_args()
+
+    # Exact-length prompts are the point of the scan, so the tokenizer is on unless opted out
+    args.exact_tokens = not args.estimate_tokens
+    try:
+        tokenizer_settings = tokenizer_settings_from_args(args)
+    except ValueError as e:
+        parser.error(f"{e}; pass --tokenizer, or --estimate-tokens for approximate prompt lengths")
+    if tokenizer_settings:
+        modules = ["transformers"] + (["jinja2"] if tokenizer_settings["chat_template"] else [])
+        missing = [module for module in modules if importlib.util.find_spec(module) is None]
+        if missing:
+            parser.error(f"Exact-length prompts need {' and '.join(missing)} (pip install {' '.join(missing)}); "
+                         f"pass --estimate-tokens for approximate prompt lengths")
+
+    if not args.verbose:
+        logging.getLogger('stress_test_llm').setLevel(logging.WARNING)
+
+    kind = server_kind(args.server_args)
+    base_args = read_args_file(args.server_args) if os.path.exists(args.server_args) else []
+
+    async def scan(server_args: List[str], title: str) -> LongContextBenchmark:
+        limit = args.max_context or context_limit(server_args, kind)
+        if not limit and not args.lengths:
+            raise ValueError(f"No context limit in {args.server_args}, pass --max-context or --lengths")
+        if args.lengths:
+            lengths = sorted(args.lengths)
+        else:
+            longest = int(limit * (1 - args.headroom)) - args.max_tokens
+            lengths = geometric_grid(min(args.min_context, longest), longest, args.growth)
+        boundaries = context_boundaries(server_args, kind)
+        kv_capacity = await fetch_kv_capacity(args.server_url)
+        if kv_capacity:
+            boundaries.append((kv_capacity, f"the GPU KV cache capacity of {kv_capacity} tokens: beyond it "
+                                            f"blocks are offloaded (--kv-offloading-size) or preempted"))
+        logger.info(f"Scanning {len(lengths)} prompt lengths: {', '.join(str(length) for length in lengths)}")
+
+        scraper = scraper_from_args(args)
+        if scraper:
+            scraper.start()
+        benchmark = LongContextBenchmark(
+            server_url=args.server_url,
+            lengths=lengths,
+            trials=args.trials,
+            max_tokens=args.max_tokens,
+            request_timeout=args.request_timeout,
+            warmup_requests=args.warmup_requests,
+            cliff_threshold=args.cliff_threshold,
+            context_limit=limit,
+            boundaries=boundaries,
+            scraper=scraper,
+            tokenizer_settings=tokenizer_settings
+        )
+        try:
+            await benchmark.run()
+        finally:
+            if scraper:
+                scraper.stop()
+        benchmark.print_report(title)
+        return benchmark
+
+    if not args.variant:
+        await scan(base_args, "LONG-CONTEXT SCALING")
+        return
+
+    launcher = create_launcher(args.launcher, args.server_args, args.server_url, command=args.launch_command,
+                               startup_timeout=args.startup_timeout, log_path=args.server_log)
+    results = []
+    for spec in args.variant:
+        label, server_args = parse_variant(spec, base_args)
+        logger.info(f"=== Variant {label} ===")
+        try:
+            launcher.start(server_args)
+            await launcher.wait_ready()
+            results.append((label, await scan(server_args, f"LONG-CONTEXT SCALING {label}")))
+        except (RuntimeError, ValueError, OSError) as e:
+            # One variant that does not start or has no context limit does not end the comparison
+            logger.error(f"Variant {label}: {e}")
+            results.append((label, None))
+        finally:
+            launcher.stop()
+    print_comparison(results)
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    try:
+        import aiohttp
+        asyncio.run(main())
+    except ImportError:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
@@ -0,0 +1,226 @@
+"""
+Server-side metrics scraper for the stress testers
+Polls vLLM's Prometheus /metrics and llama.cpp's /metrics and /slots on the --server-url host
+in a background thread during a run, keeps a handful of normalized series (queue depth,
+running sequences, KV cache usage, prefix-cache hits, preemptions, front-end process CPU)
+and aligns them to the client's run timeline for the report
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from server_launcher import server_base_url
+
+logger = logging.getLogger(__name__)
+
+# Prometheus series kept, mapped to normalized names (values are summed over label sets)
+PROMETHEUS_SERIES = {
+    # vLLM
+    "vllm:num_requests_running": "running",
+    "vllm:num_requests_waiting": "waiting",
+    "vllm:kv_cache_usage_perc": "kv_usage",  # A 0-1 fraction despite the name
+    "vllm:gpu_cache_usage_perc": "kv_usage",  # Name before the V1 engine
+    "vllm:num_preemptions_total": "preemptions",
+    "vllm:prefix_cache_queries_total": "prefix_queries",
+    "vllm:prefix_cache_hits_total": "prefix_hits",
+    "vllm:gpu_prefix_cache_hit_rate": "prefix_hit_rate",
+    # llama.cpp (needs --metrics)
+    "llamacpp:requests_processing": "running",
+    "llamacpp:requests_deferred": "waiting",
+    "llamacpp:kv_cache_usage_ratio": "kv_usage",
+    # Prometheus process collector: CPU of the process serving /metrics (vLLM's API front-end)
+    "process_cpu_seconds_total": "process_cpu",
+    "process_resident_memory_bytes": "process_rss",
+}
+GAUGES = ("running", "waiting", "kv_usage", "prefix_hit_rate", "slots_busy", "process_rss")
+COUNTERS = ("preemptions", "prefix_queries", "prefix_hits", "process_cpu")
+TIMELINE_ROWS = 20
+
+
+def parse_prometheus_line(line: str) -> Optional[Tuple[str, float]]:
+    """Return (normalized name, value) for a kept sample line, None for anything else"""
+    if not line or line.startswith('#'):
+        return None
+    end = len(line)
+    for separator in ('{', ' '):
+        index = line.find(separator)
+        if index != -1:
+            end = min(end, index)
+    name = PROMETHEUS_SERIES.get(line[:end])
+    if name is None:
+        return None
+    # The value follows the (optional) label set; an optional timestamp may follow it
+    fields = line[line.rfind('}') + 1:].split() if '{' in line else line.split()[1:]
+    try:
+        return name, float(fields[0])
+    except (IndexError, ValueError):
+        return None
+
+
+class MetricsScraper:
+    def __init__(self, server_url: str, interval: float = 1.0,
+                 client_probe: Optional[Callable[[], Tuple[int, int]]] = None):
+        self.base_url = server_base_url(server_url)
+        self.interval = interval  # Seconds between polls
+        self.client_probe = client_probe  # Returns (in-flight, completed) of the client at poll time
+        self.endpoints = {"metrics": True, "slots": True}  # Disabled once they answer 404 / 501
+        self.samples: List[Tuple[float, Dict[str, float]]] = []
+        self.errors = 0
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    async def scrape_metrics(self, session: aiohttp.ClientSession, sample: Dict[str, float]):
+        """Parse /metrics line by line, keeping only the normalized series"""
+        async with session.get(self.base_url + "/metrics") as response:
+            if response.status in (404, 501):
+                self.endpoints["metrics"] = False
+                return
+            response.raise_for_status()
+            async for raw_line in response.content:
+                parsed = parse_prometheus_line(raw_line.decode(errors='replace').strip())
+                if parsed:
+                    name, value = parsed
+                    sample[name] = sample.get(name, 0.0) + value
+
+    async def scrape_slots(self, session: aiohttp.ClientSession, sample: Dict[str, float]):
+        """Count busy llama.cpp slots from /slots"""
+        async with session.get(self.base_url + "/slots") as response:
+            if response.status in (404, 501):
+                self.endpoints["slots"] = False
+                return
+            response.raise_for_status()
+            slots = json.loads(await response.read())
+            sample["slots_total"] = len(slots)
+            sample["slots_busy"] = sum(1 for slot in slots if slot.get("is_processing"))
+
+    async def poll(self):
+        """Poll the server until stopped, taking one last sample after the stop request"""
+        timeout = aiohttp.ClientTimeout(total=max(self.interval * 2, 5))
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                stopping = self.stop_event.is_set()
+                started = time.time()
+                sample: Dict[str, float] = {}
+                for endpoint, scrape in (("metrics", self.scrape_metrics), ("slots", self.scrape_slots)):
+                    if not self.endpoints[endpoint]:
+                        continue
+                    try:
+                        await scrape(session, sample)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        self.errors += 1
+                        logger.debug(f"Scraping /{endpoint} failed: {e}")
+                if self.client_probe:
+                    sample["client_in_flight"], sample["client_completed"] = self.client_probe()
+                if sample:
+                    self.samples.append((started, sample))
+                elif not any(self.endpoints.values()):
+                    logger.warning(f"{self.base_url} exposes neither /metrics nor /slots, stopping the scraper")
+                    return
+                if stopping:
+                    return
+                await asyncio.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def start(self):
+        """Start polling in a background thread with its own event loop"""
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.poll()), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the last scrape to finish"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def prune(self, before: float):
+        """Drop the samples taken before a timestamp, keeping memory flat on endless runs"""
+        stale = 0
+        for started, _ in self.samples:
+            if started >= before:
+                break
+            stale += 1
+        # In place, so samples the polling thread appends meanwhile are kept
+        del self.samples[:stale]
+
+    def report(self, run_start: Optional[float] = None, run_end: Optional[float] = None,
+               timeline: bool = False) -> Optional[Dict]:
+        """Summarize the samples taken between run_start and run_end"""
+        # One poll of slack on each side so counter deltas span the whole run
+        samples = [(t, s) for t, s in self.samples
+                   if (run_start is None or t >= run_start - self.interval)
+                   and (run_end is None or t <= run_end + self.interval)]
+        if not samples:
+            return None
+        origin = run_start if run_start is not None else samples[0][0]
+        report = {"samples": len(samples), "errors": self.errors, "gauges": {}, "counters": {}}
+        for name in GAUGES:
+            values = [s[name] for _, s in samples if name in s]
+            if values:
+                report["gauges"][name] = {"mean": sum(values) / len(values), "max": max(values)}
+        for name in COUNTERS:
+            values = [s[name] for _, s in samples if name in s]
+            if values:
+                report["counters"][name] = values[-1] - values[0]
+        queries = report["counters"].get("prefix_queries")
+        if queries:
+            report["prefix_hit_rate"] = report["counters"].get("prefix_hits", 0) / queries
+        elif "prefix_hit_rate" in report["gauges"]:
+            report["prefix_hit_rate"] = report["gauges"]["prefix_hit_rate"]["mean"]
+
+        # Evenly spaced rows of the aligned timeline
+        step = max(1, len(samples) // TIMELINE_ROWS)
+        report["timeline"] = [dict(s, t=t - origin) for t, s in samples[::step]] if timeline else []
+        return report
+
+
+def print_server_metrics_report(report: Optional[Dict]):
+    """Print the server-side metrics section of a tester report"""
+    if report is None:
+        return
+    gauges = report["gauges"]
+    print(f"\nServer Metrics ({report['samples']} samples, {report['errors']} scrape errors):")
+    labels = (("waiting", "Queue Depth (waiting)", "{:.1f}"), ("running", "Running Sequences", "{:.1f}"),
+              ("slots_busy", "Busy Slots", "{:.1f}"), ("kv_usage", "KV Cache Usage", "{:.1%}"))
+    for name, label, fmt in labels:
+        if name in gauges:
+            print(f"  {label}: mean {fmt.format(gauges[name]['mean'])}, max {fmt.format(gauges[name]['max'])}")
+    if "prefix_hit_rate" in report:
+        print(f"  Prefix Cache Hit Rate: {report['prefix_hit_rate']:.1%}")
+    if "preemptions" in report["counters"]:
+        print(f"  Preemptions: {report['counters']['preemptions']:.0f}")
+    if "process_rss" in gauges:
+        print(f"  Server Process RSS: mean {gauges['process_rss']['mean'] / 2**20:.0f} MB, "
+              f"max {gauges['process_rss']['max'] / 2**20:.0f} MB")
+    if "process_cpu" in report["counters"]:
+        print(f"  Server Process CPU: {report['counters']['process_cpu']:.2f}s")
+
+    if report["timeline"]:
+        print("\n  Timeline (seconds from run start):")
+        print(f"  {'t':>7} {'Client in-flight':>16} {'Completed':>10} {'Running':>8} {'Waiting':>8} {'KV':>7}")
+        for row in report["timeline"]:
+            print(f"  {row['t']:>7.1f} {row.get('client_in_flight', '-'):>16} {row.get('client_completed', '-'):>10} "
+                  f"{row.get('running', row.get('slots_busy', '-')):>8} {row.get('waiting', '-'):>8} "
+                  f"{format(row['kv_usage'], '.1%') if 'kv_usage' in row else '-':>7}")
+
+
+def add_metrics_arguments(parser):
+    """Register the server metrics scraping options shared by the stress testers"""
+    parser.add_argument('--scrape-metrics', action='store_true',
+                       help='Poll /metrics (vLLM, llama.cpp --metrics) and /slots (llama.cpp) on the server '
+                            'host during the run and report queue depth, KV usage and prefix-cache hits')
+    parser.add_argument('--metrics-interval', type=float, default=1.0,
+                       help='Seconds between metrics polls (default: 1.0)')
+    parser.add_argument('--metrics-timeline', action='store_true',
+                       help='Also print the scraped metrics as a timeline aligned to the run')
+
+
+def scraper_from_args(args) -> Optional[MetricsScraper]:
+    """Build a MetricsScraper from parsed arguments, or None when scraping is disabled"""
+    if not args.scrape_metrics:
+        return None
+    return MetricsScraper(args.server_url, interval=args.metrics_interval)
@@ -0,0 +1,123 @@
+"""
+Async micro-batcher for embedding clients
+Individual embed calls are queued and coalesced into server batches, flushed when a batch
+reaches max_batch_size or its oldest item has waited max_wait seconds. Each caller gets its
+own result back (or the batch's exception). Used by embedding_batch_bench.py and reusable by
+any indexing client that embeds one chunk at a time.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from histogram import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class MicroBatcher:
+    def __init__(self, submit_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 32, max_wait: float = 0.005,
+                 max_concurrent_batches: Optional[int] = None):
+        self.submit_batch = submit_batch  # Sends a list of items, returns their results in order
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait  # Seconds the oldest queued item may wait for the batch to fill
+        self.batch_slots = asyncio.Semaphore(max_concurrent_batches) if max_concurrent_batches else None
+        self.pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+        self.batch_sizes = LogHistogram()
+        self.queue_waits = LogHistogram()  # Time from submit until the item's batch was flushed
+        self.batch_latencies = LogHistogram()  # Server round trip of each batch
+        self.items = 0
+        self.failed_batches = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Send everything queued so far as one batch"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+        if self.pending:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        task = asyncio.get_running_loop().create_task(self.run_batch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_batch(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        if self.batch_slots:
+            await self.batch_slots.acquire()
+        flushed = time.perf_counter()
+        for _, _, queued in batch:
+            self.queue_waits.record(flushed - queued)
+        self.batch_sizes.record(len(batch))
+        self.items += len(batch)
+        try:
+            results = await self.submit_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch of {len(batch)} items returned {len(results)} results")
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.batch_latencies.record(time.perf_counter() - flushed)
+            if self.batch_slots:
+                self.batch_slots.release()
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Flush the queue and wait for every batch in flight"""
+        while self.pending:
+            self.flush()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def report(self) -> Dict:
+        """Batch sizes formed and time items spent waiting for them"""
+        return {
+            "items": self.items,
+            "batches": self.batch_sizes.count,
+            "failed_batches": self.failed_batches,
+            "average_batch_size": self.batch_sizes.mean if self.batch_sizes.count else 0.0,
+            "queue_wait": self.queue_waits.percentiles() if self.queue_waits.count else None,
+            "batch_latency": self.batch_latencies.percentiles() if self.batch_latencies.count else None
+        }
+
+
+def embedding_batch_submitter(session: aiohttp.ClientSession, server_url: str, model: str,
+                              request_timeout: float = 180,
+                              extra: Optional[Dict] = None) -> Callable[[List[str]], Awaitable[List[Any]]]:
+    """submit_batch for a MicroBatcher that embeds a list of texts via /v1/embeddings"""
+    async def submit(texts: List[str]) -> List[Any]:
+        payload = {"model": model, "input": texts, **(extra or {})}
+        async with session.post(server_url, json=payload, headers=JSON_HEADERS,
+                                timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {(await response.text())[:200]}")
+            data = (await response.json())["data"]
+        # Results may come back in any order, "index" ties them to the inputs
+        return [entry["embedding"] for entry in sorted(data, key=lambda entry: entry["index"])]
+    return submit
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Mixed co-located workload benchmark for the chat and embedding servers
+vllm_args.sh and vllm_args_embedding.sh put both servers on the same GPUs. This driver
+measures each workload alone as a baseline, then runs a chat workload (LLMStressTester)
+and an embedding workload (EmbeddingStressTester) at the same time, each with its own
+concurrency or arrival rate, on one event loop and one shared clock. It reports each
+workload's latency and throughput degradation against its solo baseline.
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+from arrival import ARRIVAL_PROCESSES, ArrivalSchedule
+from histogram import PERCENTILES
+from server_args import get_arg, read_args_file
+from stress_test_embedding import EmbeddingStressTester
+from stress_test_llm import LLMStressTester
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+WORKLOADS = ('chat', 'embedding')
+# Workloads that ran alone for more than this share of the mixed phase measured little interference
+MIN_OVERLAP_SHARE = 0.8
+
+
+class MixedWorkloadBenchmark:
+    def __init__(self, chat_kwargs: Dict, embedding_kwargs: Dict, chat_rate: Optional[float] = None,
+                 embedding_rate: Optional[float] = None, arrival: str = 'poisson', gamma_shape: float = 0.5,
+                 arrival_seed: Optional[int] = None, settle_seconds: float = 5.0, percentile: float = 99):
+        self.tester_kwargs = {"chat": chat_kwargs, "embedding": embedding_kwargs}
+        self.rates = {"chat": chat_rate, "embedding": embedding_rate}  # None runs the workload closed loop
+        self.arrival = arrival
+        self.gamma_shape = gamma_shape
+        self.arrival_seed = arrival_seed
+        self.settle_seconds = settle_seconds  # Idle time between phases so server queues drain
+        self.percentile = percentile  # Tail percentile reported next to p50
+
+        self.prompt_pools: Dict[str, object] = {}  # Built once per workload and shared by every phase
+        self.baseline: Dict[str, Dict] = {}
+        self.mixed: Dict[str, Dict] = {}
+        self.overlap = 0.0  # Seconds both workloads were running in the mixed phase
+
+    def make_tester(self, workload: str):
+        """Create a tester for one phase of a workload"""
+        kwargs = dict(self.tester_kwargs[workload])
+        rate = self.rates[workload]
+        if rate is not None:
+            # A fresh schedule per phase; with --arrival-seed the solo and mixed phases offer identical arrivals
+            seed = None if self.arrival_seed is None else self.arrival_seed + WORKLOADS.index(workload)
+            kwargs["arrival_schedule"] = ArrivalSchedule(rate, self.arrival, self.gamma_shape, seed=seed)
+        tester_class = LLMStressTester if workload == 'chat' else EmbeddingStressTester
+        return tester_class(**kwargs)
+
+    async def prepare(self, workload: str):
+        """Create a tester whose prompt pool is already built, so its run starts without delay"""
+        tester = self.make_tester(workload)
+        if workload not in self.prompt_pools:
+            self.prompt_pools[workload] = await asyncio.get_running_loop().run_in_executor(None, tester.build_prompt_pool)
+        tester.prompt_pool = self.prompt_pools[workload]
+        return tester
+
+    def describe(self, workload: str) -> str:
+        """Offered load of a workload for the logs and the report"""
+        rate = self.rates[workload]
+        if rate is not None:
+            return f"{self.arrival} @ {rate:g} req/s"
+        return f"{self.tester_kwargs[workload]['concurrent_requests']} concurrent"
+
+    def measure(self, tester, workload: str) -> Dict:
+        """Summarize one workload's run"""
+        aggregator = tester.aggregator
+        wall = tester.wall_duration or 1e-9
+        # Chat is judged on generated tokens, embeddings on the input tokens they consume
+        token_field = 'completion_tokens' if workload == 'chat' else 'prompt_tokens'
+        summary = {
+            "requests": aggregator.total_requests,
+            "success_rate": aggregator.successful_requests / aggregator.total_requests if aggregator.total_requests else 0,
+            "request_rate": aggregator.successful_requests / wall,
+            "throughput": aggregator.histograms[token_field].total / wall,
+            "start": tester.run_start,
+            "end": tester.run_start + tester.wall_duration,
+            "latency": {}
+        }
+        for name in ('ttft', 'tpot', 'duration'):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                summary["latency"][name] = histogram.percentiles()
+        return summary
+
+    async def run_solo(self, workload: str):
+        """Measure a workload alone on the GPUs"""
+        logger.info(f"=== Solo {workload} baseline ({self.describe(workload)}) ===")
+        tester = await self.prepare(workload)
+        await tester.run_concurrent_requests()
+        self.baseline[workload] = self.measure(tester, workload)
+
+    async def run_mixed(self):
+        """Run both workloads at once on the shared event loop"""
+        logger.info("=== Mixed: " + ", ".join(f"{workload} {self.describe(workload)}" for workload in WORKLOADS) + " ===")
+        testers = {workload: await self.prepare(workload) for workload in WORKLOADS}
+        await asyncio.gather(*(tester.run_concurrent_requests() for tester in testers.values()))
+        self.mixed = {workload: self.measure(tester, workload) for workload, tester in testers.items()}
+        self.overlap = max(0.0, min(summary["end"] for summary in self.mixed.values()) -
+                           max(summary["start"] for summary in self.mixed.values()))
+
+    async def run(self):
+        """Both solo baselines, then the mixed phase"""
+        for workload in WORKLOADS:
+            await self.run_solo(workload)
+            await asyncio.sleep(self.settle_seconds)
+        await self.run_mixed()
+
+    def rows(self, workload: str) -> List[tuple]:
+        """(label, solo, mixed, higher_is_better) rows of the comparison table"""
+        q = self.percentile
+        solo, mixed = self.baseline[workload], self.mixed[workload]
+        unit = "Output tok/s" if workload == 'chat' else "Input tok/s"
+        rows = [(unit, solo["throughput"], mixed["throughput"], True),
+                ("Requests/s", solo["request_rate"], mixed["request_rate"], True),
+                ("Success rate (%)", solo["success_rate"] * 100, mixed["success_rate"] * 100, True)]
+        labels = (("ttft", "TTFT", 1, "s"), ("tpot", "TPOT", 1000, "ms"), ("duration", "Latency", 1, "s"))
+        for name, label, scale, suffix in labels:
+            if name not in solo["latency"] or name not in mixed["latency"]:
+                continue
+            for percentile in (50, q):
+                rows.append((f"{label} p{percentile:g} ({suffix})", solo["latency"][name][percentile] * scale,
+                             mixed["latency"][name][percentile] * scale, False))
+        return rows
+
+    def print_report(self, gpu_memory: Optional[Dict[str, str]] = None):
+        """Print solo vs mixed metrics of every workload and the shared-clock timeline"""
+        print("\n=== MIXED WORKLOAD REPORT ===")
+        for workload in WORKLOADS:
+            memory = f", --gpu-memory-utilization {gpu_memory[workload]}" if gpu_memory and gpu_memory.get(workload) else ""
+            print(f"{workload.capitalize()}: {self.describe(workload)}{memory}")
+
+        origin = min(summary["start"] for summary in self.mixed.values())
+        spans = ", ".join(f"{workload} {self.mixed[workload]['start'] - origin:.1f}-{self.mixed[workload]['end'] - origin:.1f}s"
+                          for workload in WORKLOADS)
+        print(f"Shared clock of the mixed phase: {spans}; both running for {self.overlap:.1f}s")
+
+        header = f"\n{'Workload':<10} {'Metric':<20} {'Solo':>12} {'Mixed':>12} {'Change':>9}"
+        print(header)
+        print("-" * (len(header) - 1))
+        for workload in WORKLOADS:
+            for label, solo, mixed, higher_is_better in self.rows(workload):
+                change = (mixed / solo - 1) * 100 if solo else math.nan
+                # Flag the direction that hurts this workload
+                worse = change < 0 if higher_is_better else change > 0
+                marker = " !" if worse and abs(change) >= 10 else ""
+                print(f"{workload:<10} {label:<20} {solo:>12.3f} {mixed:>12.3f} {change:>+8.1f}%{marker}")
+
+        print("\n! marks a degradation of 10% or more against the solo baseline.")
+        for workload in WORKLOADS:
+            summary = self.mixed[workload]
+            wall = summary["end"] - summary["start"]
+            share = self.overlap / wall if wall > 0 else 0.0
+            if share < MIN_OVERLAP_SHARE:
+                print(f"Warning: {workload} overlapped the other workload for only {share:.0%} of its mixed run; "
+                      f"size --chat-requests / --embedding-requests so both workloads end together.")
+
+
+def gpu_memory_utilization(path: str) -> Optional[str]:
+    """--gpu-memory-utilization of a server args file, if the file exists"""
+    if not os.path.exists(path):
+        return None
+    return get_arg(read_args_file(path), '--gpu-memory-utilization')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Mixed Chat + Embedding Workload Benchmark')
+    parser.add_argument('--chat-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Chat server URL (default: http://localhost:8000/v1/chat/completions)')
+    parser.add_argument('--embedding-url', default='http://localhost:8001/v1/embeddings',
+                       help='Embedding server URL (default: http://localhost:8001/v1/embeddings)')
+    parser.add_argument('--chat-concurrency', type=int, default=4,
+                       help='Concurrent chat requests (default: 4)')
+    parser.add_argument('--chat-rate', type=float, default=None,
+                       help='Open-loop chat arrival rate in requests/second instead of --chat-concurrency')
+    parser.add_argument('--chat-requests', type=int, default=40,
+                       help='Chat requests per phase (default: 40)')
+    parser.add_argument('--context-size', type=int, default=6000,
+                       help='Chat context size in tokens (default: 6000)')
+    parser.add_argument('--max-tokens', type=int, default=350,
+                       help='Maximum tokens generated per chat request (default: 350)')
+    parser.add_argument('--embedding-concurrency', type=int, default=8,
+                       help='Concurrent embedding requests (default: 8)')
+    parser.add_argument('--embedding-rate', type=float, default=None,
+                       help='Open-loop embedding arrival rate in requests/second instead of --embedding-concurrency')
+    parser.add_argument('--embedding-requests', type=int, default=400,
+                       help='Embedding requests per phase (default: 400)')
+    parser.add_argument('--embedding-context-size', type=int, default=512,
+                       help='Tokens per embedding input (default: 512)')
+    parser.add_argument('--embedding-batch-size', type=int, default=1,
+                       help='Inputs per embedding request (default: 1)')
+    parser.add_argument('--arrival', choices=ARRIVAL_PROCESSES, default='poisson',
+                       help='Arrival process for --chat-rate / --embedding-rate (default: poisson)')
+    parser.add_argument('--gamma-shape', type=float, default=0.5,
+                       help='Shape of the gamma arrival process, <1 is burstier than Poisson (default: 0.5)')
+    parser.add_argument('--arrival-seed', type=int, default=None,
+                       help='Random seed of the arrival processes, makes solo and mixed arrivals identical (default: random)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    parser.add_argument('--settle', type=float, default=5.0,
+                       help='Idle seconds between phases (default: 5)')
+    parser.add_argument('--percentile', type=float, default=99, choices=PERCENTILES,
+                       help='Tail percentile reported next to p50 (default: 99)')
+    parser.add_argument('--server-args', type=str, default='vllm_args.sh',
+                       help='Chat server args file, for the report header (default: vllm_args.sh)')
+    parser.add_argument('--embedding-server-args', type=str, default='vllm_args_embedding.sh',
+                       help='Embedding server args file, for the report header (default: vllm_args_embedding.sh)')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request of every phase')
+
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('stress_test_llm').setLevel(logging.WARNING)
+        logging.getLogger('stress_test_embedding').setLevel(logging.WARNING)
+
+    # Chat always streams so the interference shows up separately in TTFT and TPOT
+    chat_kwargs = dict(
+        server_url=args.chat_url,
+        concurrent_requests=args.chat_concurrency,
+        total_requests=args.chat_requests,
+        request_timeout=args.request_timeout,
+        context_size=args.context_size,
+        max_tokens=args.max_tokens,
+        mode='mixed',
+        stream=True
+    )
+    embedding_kwargs = dict(
+        server_url=args.embedding_url,
+        concurrent_requests=args.embedding_concurrency,
+        total_requests=args.embedding_requests,
+        request_timeout=args.request_timeout,
+        context_size=args.embedding_context_size,
+        batch_size=args.embedding_batch_size
+    )
+    benchmark = MixedWorkloadBenchmark(chat_kwargs, embedding_kwargs, chat_rate=args.chat_rate,
+                                       embedding_rate=args.embedding_rate, arrival=args.arrival,
+                                       gamma_shape=args.gamma_shape, arrival_seed=args.arrival_seed,
+                                       settle_seconds=args.settle, percentile=args.percentile)
+    await benchmark.run()
+    benchmark.print_report({"chat": gpu_memory_utilization(args.server_args),
+                            "embedding": gpu_memory_utilization(args.embedding_server_args)})
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    if importlib.util.find_spec("aiohttp") is None:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
+    asyncio.run(main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI-compatible inference server with a calibrated latency model
+Serves /v1/chat/completions (streaming and non-streaming), raw-prompt /v1/completions and
+llama.cpp-style /completion, /v1/embeddings, /health and a vLLM-style /metrics without a GPU. Latency follows configurable prefill and decode rates,
+a batch-slot limit like --max-num-seqs / -np and a block-level LRU prefix cache, so the
+stress testers, sweep and scrapers can be exercised locally. Prefill and decode can slow down
+with context length and with uptime (--aging), and contexts beyond the cache capacity can pay
+an offloading penalty.
+With --instant every response is immediate, which measures how fast the client itself can go.
+Unknown arguments are ignored, so vllm_args.sh / llama_args.sh variants can be passed as-is.
+"""
+
+import asyncio
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Same estimate the prompt generators use
+
+
+class PrefixCache:
+    def __init__(self, block_size: int = 32, capacity_blocks: int = 4096):
+        self.block_size = block_size  # Tokens per KV block; only whole blocks are reused
+        self.capacity_blocks = capacity_blocks
+        self.blocks: "OrderedDict[bytes, None]" = OrderedDict()  # Chained block hashes in LRU order
+        self.queries = 0  # Prompt tokens looked up
+        self.hits = 0  # Prompt tokens served from the cache
+
+    def block_hashes(self, text: str) -> List[bytes]:
+        """Chained hashes of the prompt's full blocks, so a block only matches after an identical prefix"""
+        chars = self.block_size * CHARS_PER_TOKEN
+        hashes = []
+        digest = b""
+        for start in range(0, len(text) - chars + 1, chars):
+            digest = hashlib.blake2b(digest + text[start:start + chars].encode(), digest_size=16).digest()
+            hashes.append(digest)
+        return hashes
+
+    def lookup(self, text: str, prompt_tokens: int) -> Tuple[int, List[bytes]]:
+        """Return (cached prompt tokens, block hashes) for a prompt"""
+        hashes = self.block_hashes(text)
+        cached_blocks = 0
+        for digest in hashes:
+            if digest not in self.blocks:
+                break
+            self.blocks.move_to_end(digest)
+            cached_blocks += 1
+        cached = min(cached_blocks * self.block_size, prompt_tokens)
+        self.queries += prompt_tokens
+        self.hits += cached
+        return cached, hashes
+
+    def insert(self, hashes: List[bytes]):
+        """Add a prefilled prompt's blocks, evicting the least recently used ones"""
+        for digest in hashes:
+            self.blocks[digest] = None
+            self.blocks.move_to_end(digest)
+        while len(self.blocks) > self.capacity_blocks:
+            self.blocks.popitem(last=False)
+
+    @property
+    def usage(self) -> float:
+        return len(self.blocks) / self.capacity_blocks if self.capacity_blocks else 0.0
+
+
+def resident_memory_bytes() -> int:
+    """Current RSS of this process (Linux), 0 where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MockServer:
+    def __init__(self, prefill_rate: float = 8000.0, decode_rate: float = 60.0,
+                 decode_slowdown: float = 0.05, max_num_seqs: int = 4,
+                 block_size: int = 32, cache_blocks: int = 4096, embedding_dim: int = 1024,
+                 tool_call_rate: float = 0.5, instant: bool = False, seed: Optional[int] = None,
+                 request_overhead: float = 0.0, context_slowdown: float = 0.0, offload_penalty: float = 1.0,
+                 max_waiting: Optional[int] = None, template_cost: float = 0.0, aging: float = 0.0):
+        self.prefill_rate = prefill_rate  # Prompt tokens/second of the whole engine, shared by concurrent prefills
+        self.decode_rate = decode_rate  # Output tokens/second of a single sequence
+        self.decode_slowdown = decode_slowdown  # Extra decode step time per additional running sequence
+        self.max_num_seqs = max_num_seqs  # Batch slots; further requests wait in the queue
+        self.embedding_dim = embedding_dim
+        self.tool_call_rate = tool_call_rate  # Chance a request with tools answers with a tool call
+        self.instant = instant  # No simulated latency at all
+        self.request_overhead = request_overhead  # Fixed per-request embedding cost that batching amortizes
+        self.max_waiting = max_waiting  # Queue length beyond which requests are rejected with 429
+        self.context_slowdown = context_slowdown  # Relative per-token cost increase per 1k tokens of context
+        self.offload_penalty = offload_penalty  # Cost multiplier for context beyond the cache capacity
+        self.template_cost = template_cost  # Front-end CPU seconds per 1k prompt tokens of a chat request
+        self.aging = aging  # Relative per-token cost increase per hour of uptime, like cache fragmentation
+        self.started = time.time()
+        self.random = random.Random(seed)
+        self.prefix_cache = PrefixCache(block_size, cache_blocks)
+        self.slots = asyncio.Semaphore(max_num_seqs)
+        self.running = 0
+        self.waiting = 0
+        self.prefilling = 0
+        self.requests_total = 0
+
+    async def acquire_slot(self):
+        """Wait in the queue for a batch slot"""
+        if self.instant:
+            # Calibration mode: never queue, so only the client limits the request rate
+            self.running += 1
+            return
+        if self.max_waiting is not None and self.waiting >= self.max_waiting:
+            # Backpressure like a gateway or a server with a bounded queue
+            raise web.HTTPTooManyRequests(text="Server busy")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release_slot(self):
+        self.running -= 1
+        if not self.instant:
+            self.slots.release()
+
+    @property
+    def kv_capacity(self) -> int:
+        """Context tokens that fit the (simulated) GPU KV cache"""
+        return self.prefix_cache.capacity_blocks * self.prefix_cache.block_size
+
+    def context_cost(self, start: int, end: int) -> float:
+        """Relative cost of processing context positions start..end, 1.0 per token without slowdown"""
+        def span(a: int, b: int) -> float:
+            # Per-token cost grows linearly with the position, so a span costs its midpoint rate
+            return (b - a) * (1 + self.context_slowdown * (a + b) / 2000)
+        cost = span(start, end)
+        if end > self.kv_capacity:
+            cost += (self.offload_penalty - 1) * span(max(start, self.kv_capacity), end)
+        return cost * (1 + self.aging * (time.time() - self.started) / 3600)
+
+    async def prefill(self, text: str, prompt_tokens: int) -> int:
+        """Simulate the prefill of the uncached part of a prompt, returning the cached token count"""
+        cached, hashes = self.prefix_cache.lookup(text, prompt_tokens)
+        if not self.instant:
+            # Concurrent prefills share the engine's prefill throughput
+            self.prefilling += 1
+            try:
+                await asyncio.sleep(self.context_cost(cached, prompt_tokens) * self.prefilling / self.prefill_rate)
+            finally:
+                self.prefilling -= 1
+        self.prefix_cache.insert(hashes)
+        return cached
+
+    def decode_interval(self, context: int = 0) -> float:
+        """Time of one decode step at the current batch size and context length"""
+        if self.instant:
+            return 0.0
+        step = (1 + self.decode_slowdown * max(0, self.running - 1)) / self.decode_rate
+        return step * self.context_cost(context, context + 1)
+
+    @staticmethod
+    def prompt_text(body: Dict) -> str:
+        """Flatten a chat request into the text the prefix cache and token estimate see"""
+        parts = [json.dumps(body["tools"])] if body.get("tools") else []
+        for message in body.get("messages", []):
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            parts.append(f"{message.get('role', 'user')}: {content}")
+            if message.get("tool_calls"):
+                parts.append(json.dumps(message["tool_calls"]))
+        return "\n".join(parts)
+
+    @staticmethod
+    def raw_prompt_text(prompt) -> Tuple[str, int]:
+        """(cache text, prompt tokens) of a raw completion prompt given as text or token ids"""
+        if isinstance(prompt, list) and prompt and isinstance(prompt[0], list):
+            prompt = prompt[0]  # A batch of one prompt
+        if isinstance(prompt, list):
+            # Four bytes per token id keep the prefix cache's characters-per-token block math
+            return struct.pack(f"<{len(prompt)}I", *prompt).decode("latin-1"), max(1, len(prompt))
+        text = str(prompt or "")
+        return text, max(1, len(text) // CHARS_PER_TOKEN)
+
+    def render_on_server(self, prompt_tokens: int):
+        """Burn the front-end CPU a server spends rendering and tokenizing a chat request"""
+        if self.instant or self.template_cost <= 0:
+            return
+        # Blocks the event loop on purpose: a busy front-end delays every other request too
+        deadline = time.process_time() + self.template_cost * prompt_tokens / 1000
+        while time.process_time() < deadline:
+            pass
+
+    def tool_call(self, body: Dict) -> Optional[Dict]:
+        """Pick a tool call for requests that offer tools"""
+        tools = body.get("tools")
+        if not tools or body.get("tool_choice") == "none" or self.random.random() >= self.tool_call_rate:
+            return None
+        function = self.random.choice(tools).get("function", {})
+        return {"index": 0, "id": f"call_{self.requests_total}", "type": "function",
+                "function": {"name": function.get("name", "tool"), "arguments": json.dumps({"path": "src/main.py"})}}
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        """POST /v1/chat/completions"""
+        body = await request.json()
+        self.requests_total += 1
+        text = self.prompt_text(body)
+        prompt_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        self.render_on_server(prompt_tokens)
+        completion_tokens = max(1, int(body.get("max_tokens") or body.get("max_completion_tokens") or 256))
+        call = self.tool_call(body)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        created = int(time.time())
+        completion_id = f"chatcmpl-mock-{self.requests_total}"
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None) -> bytes:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return b"data: " + json.dumps(data).encode() + b"\n\n"
+
+        await self.acquire_slot()
+        try:
+            usage["prompt_tokens_details"] = {"cached_tokens": await self.prefill(text, prompt_tokens)}
+            finish_reason = "tool_calls" if call else "length"
+            if not body.get("stream"):
+                await asyncio.sleep(self.decode_interval(prompt_tokens + completion_tokens // 2) * completion_tokens)
+                message = {"role": "assistant", "content": "" if call else "tok " * completion_tokens}
+                if call:
+                    message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"}]
+                return web.json_response({
+                    "id": completion_id, "object": "chat.completion", "created": created,
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                    "usage": usage
+                })
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+            await response.write(chunk({"role": "assistant", "content": ""}))
+            for i in range(completion_tokens):
+                if i:
+                    await asyncio.sleep(self.decode_interval(prompt_tokens + i))
+                if call and i == 0:
+                    await response.write(chunk({"tool_calls": [call]}))
+                elif not call:
+                    await response.write(chunk({"content": "tok "}))
+            await response.write(chunk({}, finish_reason))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model", "mock"), "choices": [], "usage": usage}
+                await response.write(b"data: " + json.dumps(data).encode() + b"\n\n")
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        finally:
+            self.release_slot()
+
+    async def completion(self, request: web.Request) -> web.StreamResponse:
+        """POST /v1/completions (OpenAI) and /completion (llama.cpp native) with a prerendered prompt"""
+        body = await request.json()
+        self.requests_total += 1
+        native = request.path == "/completion"
+        text, prompt_tokens = self.raw_prompt_text(body.get("prompt"))
+        completion_tokens = max(1, int(body.get("n_predict" if native else "max_tokens") or 256))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        created = int(time.time())
+        completion_id = f"cmpl-mock-{self.requests_total}"
+
+        def chunk(data: Dict) -> bytes:
+            return b"data: " + json.dumps(data).encode() + b"\n\n"
+
+        def text_chunk(piece: str, finish_reason: Optional[str] = None) -> bytes:
+            if native:
+                return chunk({"content": piece, "stop": False})
+            return chunk({"id": completion_id, "object": "text_completion", "created": created,
+                          "model": body.get("model", "mock"),
+                          "choices": [{"index": 0, "text": piece, "finish_reason": finish_reason}]})
+
+        await self.acquire_slot()
+        try:
+            cached = await self.prefill(text, prompt_tokens)
+            usage["prompt_tokens_details"] = {"cached_tokens": cached}
+            # llama.cpp reports the prompt split into reused (cache_n) and processed (prompt_n) tokens
+            final = {"content": "", "stop": True, "tokens_evaluated": prompt_tokens,
+                     "tokens_predicted": completion_tokens,
+                     "timings": {"cache_n": cached, "prompt_n": prompt_tokens - cached, "predicted_n": completion_tokens}}
+            if not body.get("stream"):
+                await asyncio.sleep(self.decode_interval(prompt_tokens + completion_tokens // 2) * completion_tokens)
+                if native:
+                    return web.json_response(dict(final, content="tok " * completion_tokens))
+                return web.json_response({
+                    "id": completion_id, "object": "text_completion", "created": created,
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "text": "tok " * completion_tokens, "finish_reason": "length"}],
+                    "usage": usage
+                })
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+            for i in range(completion_tokens):
+                if i:
+                    await asyncio.sleep(self.decode_interval(prompt_tokens + i))
+                await response.write(text_chunk("tok "))
+            if native:
+                # llama.cpp ends its native stream with the stop chunk, without [DONE]
+                await response.write(chunk(final))
+                return response
+            await response.write(text_chunk("", "length"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                await response.write(chunk({"id": completion_id, "object": "text_completion", "created": created,
+                                            "model": body.get("model", "mock"), "choices": [], "usage": usage}))
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        finally:
+            self.release_slot()
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        """POST /v1/embeddings"""
+        body = await request.json()
+        self.requests_total += 1
+        inputs = body.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        prompt_tokens = sum(max(1, len(text) // CHARS_PER_TOKEN) if isinstance(text, str) else len(text)
+                            for text in inputs)
+        await self.acquire_slot()
+        try:
+            if not self.instant:
+                await asyncio.sleep(self.request_overhead + prompt_tokens / self.prefill_rate)
+        finally:
+            self.release_slot()
+        data = []
+        for index, text in enumerate(inputs):
+            # Deterministic per input so repeated inputs embed identically
+            rng = random.Random(hashlib.blake2b(str(text).encode(), digest_size=8).digest())
+            vector = [rng.uniform(-1, 1) for _ in range(self.embedding_dim)]
+            if body.get("encoding_format") == "base64":
+                # Little-endian float32, as vLLM and the OpenAI API encode it
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        return web.json_response({"object": "list", "data": data, "model": body.get("model", "mock"),
+                                  "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}})
+
+    async def health(self, request: web.Request) -> web.Response:
+        """GET /health"""
+        return web.Response(text="OK")
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics in vLLM's Prometheus naming"""
+        labels = '{model_name="mock"}'
+        lines = [
+            f"vllm:num_requests_running{labels} {self.running}",
+            f"vllm:num_requests_waiting{labels} {self.waiting}",
+            f"vllm:kv_cache_usage_perc{labels} {self.prefix_cache.usage}",
+            f"vllm:num_preemptions_total{labels} 0",
+            f"vllm:prefix_cache_queries_total{labels} {self.prefix_cache.queries}",
+            f"vllm:prefix_cache_hits_total{labels} {self.prefix_cache.hits}",
+            f'vllm:cache_config_info{{block_size="{self.prefix_cache.block_size}",'
+            f'num_gpu_blocks="{self.prefix_cache.capacity_blocks}"}} 1.0',
+            # Standard Prometheus process collector series of the API server process
+            f"process_cpu_seconds_total {time.process_time()}",
+            f"process_resident_memory_bytes {resident_memory_bytes()}",
+        ]
+        return web.Response(text="\n".join(lines) + "\n")
+
+    def app(self) -> web.Application:
+        application = web.Application(client_max_size=256 * 1024 * 1024)
+        application.router.add_post("/v1/chat/completions", self.chat)
+        application.router.add_post("/v1/completions", self.completion)
+        application.router.add_post("/completion", self.completion)
+        application.router.add_post("/v1/embeddings", self.embeddings)
+        application.router.add_get("/health", self.health)
+        application.router.add_get("/metrics", self.metrics)
+        return application
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command line of the mock server"""
+    # No abbreviations: args files are passed through unchanged, and a real server flag such as
+    # llama.cpp's --temp must never be taken as a prefix of a mock option (--template-cost)
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible Inference Server', allow_abbrev=False)
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000,
+                       help='Port to listen on (default: 8000)')
+    parser.add_argument('--prefill-rate', type=float, default=8000.0,
+                       help='Engine prompt processing rate in tokens/second (default: 8000)')
+    parser.add_argument('--decode-rate', type=float, default=60.0,
+                       help='Single-sequence generation rate in tokens/second (default: 60)')
+    parser.add_argument('--decode-slowdown', type=float, default=0.05,
+                       help='Relative decode step slowdown per extra running sequence (default: 0.05)')
+    parser.add_argument('--max-num-seqs', '-np', '--parallel', dest='max_num_seqs', type=int, default=4,
+                       help='Batch slots, like vLLM --max-num-seqs / llama.cpp -np (default: 4)')
+    parser.add_argument('--block-size', type=int, default=32,
+                       help='Prefix cache block size in tokens (default: 32)')
+    parser.add_argument('--cache-blocks', type=int, default=4096,
+                       help='Prefix cache capacity in blocks (default: 4096)')
+    parser.add_argument('--embedding-dim', type=int, default=1024,
+                       help='Embedding vector size (default: 1024)')
+    parser.add_argument('--tool-call-rate', type=float, default=0.5,
+                       help='Chance a request offering tools is answered with a tool call (default: 0.5)')
+    parser.add_argument('--request-overhead', type=float, default=0.0,
+                       help='Fixed seconds added to every embeddings request, however many inputs it '
+                            'carries (default: 0)')
+    parser.add_argument('--context-slowdown', type=float, default=0.0,
+                       help='Relative prefill / decode cost increase per token per 1k tokens of context (default: 0)')
+    parser.add_argument('--offload-penalty', type=float, default=1.0,
+                       help='Cost multiplier for context beyond --cache-blocks x --block-size tokens, '
+                            'like KV offloading (default: 1, no penalty)')
+    parser.add_argument('--max-waiting', type=int, default=None,
+                       help='Reject requests with 429 once this many are queued (default: unbounded queue)')
+    parser.add_argument('--template-cost', type=float, default=0.0,
+                       help='Front-end CPU seconds per 1k prompt tokens spent rendering and tokenizing chat '
+                            'requests; raw /v1/completions prompts skip it (default: 0)')
+    parser.add_argument('--aging', type=float, default=0.0,
+                       help='Relative prefill / decode cost increase per hour of uptime, to exercise soak drift '
+                            'detection (default: 0)')
+    parser.add_argument('--instant', action='store_true',
+                       help='Respond without any simulated latency (client calibration)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for tool call decisions (default: random)')
+    return parser
+
+
+def main():
+    # Server args files carry many options the mock does not model
+    args, ignored = build_parser().parse_known_args()
+    if ignored:
+        logger.info(f"Ignoring unsupported arguments: {' '.join(ignored)}")
+
+    server = MockServer(
+        prefill_rate=args.prefill_rate,
+        decode_rate=args.decode_rate,
+        decode_slowdown=args.decode_slowdown,
+        max_num_seqs=args.max_num_seqs,
+        block_size=args.block_size,
+        cache_blocks=args.cache_blocks,
+        embedding_dim=args.embedding_dim,
+        tool_call_rate=args.tool_call_rate,
+        instant=args.instant,
+        seed=args.seed,
+        request_overhead=args.request_overhead,
+        context_slowdown=args.context_slowdown,
+        offload_penalty=args.offload_penalty,
+        max_waiting=args.max_waiting,
+        template_cost=args.template_cost,
+        aging=args.aging
+    )
+    if args.instant:
+        logger.info(f"Mock server on {args.host}:{args.port} in instant mode")
+    else:
+        logger.info(f"Mock server on {args.host}:{args.port}: prefill {args.prefill_rate:g} tok/s, "
+                    f"decode {args.decode_rate:g} tok/s, {args.max_num_seqs} slots")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Multi-process load generation for the stress testers
+Shards the request budget across worker processes, each running its own event loop and
+aiohttp connector, starts them together on a shared barrier and merges their results
+back into a single tester for reporting
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Dict
+
+from client_profiler import install_fast_event_loop
+
+logger = logging.getLogger(__name__)
+
+# Workers that are not ready by then are assumed dead and the barrier is broken
+BARRIER_TIMEOUT = 600
+# How often to check for workers that died without sending a result
+RESULT_POLL_INTERVAL = 1.0
+
+
+def split_count(total: int, workers: int, index: int) -> int:
+    """Deterministically split an integer budget, giving the remainder to the first workers"""
+    return total // workers + (1 if index < total % workers else 0)
+
+
+def shard_kwargs(tester_kwargs: Dict, workers: int, index: int) -> Dict:
+    """Return the tester constructor arguments for one worker's share of the load"""
+    kwargs = dict(tester_kwargs)
+    kwargs["total_requests"] = split_count(tester_kwargs["total_requests"], workers, index)
+    kwargs["concurrent_requests"] = max(1, split_count(tester_kwargs["concurrent_requests"], workers, index))
+    if tester_kwargs.get("arrival_schedule") is not None:
+        kwargs["arrival_schedule"] = tester_kwargs["arrival_schedule"].split(workers, index)
+    if tester_kwargs.get("replay") is not None:
+        kwargs["replay"] = tester_kwargs["replay"].split(workers, index)
+    if tester_kwargs.get("adaptive") is not None:
+        kwargs["adaptive"] = tester_kwargs["adaptive"].split(workers, index)
+    if tester_kwargs.get("results_dir") is not None:
+        kwargs["results_shard"] = index
+    # A single live status line; the first worker shows its own share of the load
+    if index > 0:
+        kwargs["live_view"] = False
+    return kwargs
+
+
+def effective_workers(tester_kwargs: Dict, workers: int) -> int:
+    """Cap the worker count so a fixed closed-loop concurrency is never rounded up"""
+    open_loop = any(tester_kwargs.get(name) is not None for name in ("arrival_schedule", "replay", "adaptive"))
+    # Every worker runs at least one request at a time, so more workers than concurrent
+    # requests would raise the total load above what was asked for
+    if not open_loop and workers > tester_kwargs["concurrent_requests"]:
+        logger.warning(f"Only {tester_kwargs['concurrent_requests']} concurrent requests, "
+                       f"using that many workers instead of {workers}")
+        return max(1, tester_kwargs["concurrent_requests"])
+    return workers
+
+
+def worker_main(tester_class, tester_kwargs: Dict, workers: int, index: int,
+                barrier, results_queue):
+    """Entry point of a worker process"""
+    try:
+        tester = tester_class(**shard_kwargs(tester_kwargs, workers, index))
+        # Block on the shared barrier once setup (prompt pool, session) is done
+        tester.start_barrier = lambda: barrier.wait(BARRIER_TIMEOUT)
+        if tester_kwargs.get("fast_path"):
+            install_fast_event_loop()
+        asyncio.run(tester.run_concurrent_requests())
+        results_queue.put((index, tester.export_state(), None))
+    except Exception as e:
+        barrier.abort()
+        results_queue.put((index, None, f"{type(e).__name__}: {e}"))
+
+
+def run_workers(tester_class, tester_kwargs: Dict, workers: int):
+    """Run the tester in `workers` processes and return a tester holding the merged results"""
+    workers = effective_workers(tester_kwargs, workers)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results_queue = context.Queue()
+
+    logger.info(f"Starting {workers} worker processes...")
+    processes = [
+        context.Process(target=worker_main,
+                        args=(tester_class, tester_kwargs, workers, index, barrier, results_queue),
+                        daemon=True)
+        for index in range(workers)
+    ]
+    start_time = time.time()
+    for process in processes:
+        process.start()
+
+    # Results must be drained before join, otherwise large payloads can deadlock the queue
+    merged = tester_class(**tester_kwargs)
+    pending = set(range(workers))
+    failures = 0
+    while pending:
+        try:
+            index, state, error = results_queue.get(timeout=RESULT_POLL_INTERVAL)
+        except queue.Empty:
+            # A worker flushes its result before exiting, so a dead worker that still sends
+            # nothing on the next poll crashed or was killed (e.g. by the OOM killer)
+            dead = [index for index in pending if not processes[index].is_alive()]
+            if not dead:
+                continue
+            try:
+                index, state, error = results_queue.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                # Release workers still waiting on the barrier for the dead one
+                barrier.abort()
+                for index in dead:
+                    pending.discard(index)
+                    failures += 1
+                    logger.error(f"Worker {index} died without a result (exit code {processes[index].exitcode})")
+                continue
+        pending.discard(index)
+        if error:
+            failures += 1
+            logger.error(f"Worker {index} failed: {error}")
+            continue
+        merged.merge_state(state)
+    for process in processes:
+        process.join()
+
+    logger.info(f"{workers - failures}/{workers} workers finished in {time.time() - start_time:.2f}s")
+    return merged
+
+
+def add_worker_arguments(parser):
+    """Register the multi-process options shared by the stress testers"""
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of load generator processes; requests, concurrency and rate are split '
+                            'evenly between them, with at most one process per concurrent request (default: 1)')
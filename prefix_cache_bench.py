@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Prefix-cache effectiveness benchmark for self-hosted LLM server
+Sends prompts made of a shared prefix (one of N prefix groups) followed by a unique suffix,
+sweeping the shared-prefix fraction, and reports TTFT and prefill throughput against the
+expected cache-hit ratio. Quantifies what --enable-prefix-caching / KV offloading (vLLM) and
+--cache-reuse / --slot-prompt-similarity (llama.cpp) actually buy under load.
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import logging
+from typing import Dict, List, Optional
+
+from histogram import PERCENTILES
+from prompt_pool import NONCE_PLACEHOLDER, SAMPLE_NONCE, PromptPool, generate_long_message
+from stress_test_llm import LLMStressTester
+from tokenizer_utils import add_tokenizer_arguments, fit_to_tokens, tokenizer_settings_from_args
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class SharedPrefixPool(PromptPool):
+    def __init__(self, groups: int, prefix_tokens: int, suffix_tokens: int, body_builder,
+                 suffixes_per_group: int = 4, count_tokens=None, tokenizer_name: Optional[str] = None,
+                 seed: Optional[int] = None):
+        super().__init__(groups * suffixes_per_group, prefix_tokens + suffix_tokens, body_builder,
+                         unique=True, seed=seed, count_tokens=count_tokens, tokenizer_name=tokenizer_name)
+        self.groups = groups  # Number of distinct shared prefixes
+        self.prefix_tokens = prefix_tokens
+        self.suffix_tokens = suffix_tokens
+
+    def generate_prefix(self) -> str:
+        """Generate one shared prefix of prefix_tokens tokens"""
+        if self.prefix_tokens <= 0:
+            return ""
+        if self.count_tokens is None:
+            return generate_long_message(self.prefix_tokens, self.random)
+        text = generate_long_message(self.prefix_tokens * 2, self.random)
+        return fit_to_tokens(text, self.prefix_tokens, self.count_tokens)
+
+    def generate_suffix(self, prefix: str) -> str:
+        """Generate a unique suffix so the whole request lands on context_tokens"""
+        if self.count_tokens is None:
+            return generate_long_message(self.suffix_tokens, self.random)
+        text = generate_long_message(self.suffix_tokens * 2, self.random)
+        return fit_to_tokens(text, self.context_tokens,
+                             lambda t: self.count_tokens(f"{prefix}\n\n[{SAMPLE_NONCE}] {t}"))
+
+    def build_contents(self) -> List[str]:
+        """Bodies cycle through the prefix groups; the nonce sits right after the shared prefix"""
+        prefixes = [self.generate_prefix() for _ in range(self.groups)]
+        contents = []
+        for i in range(self.size):
+            prefix = prefixes[i % self.groups]
+            contents.append(f"{prefix}\n\n[{NONCE_PLACEHOLDER}] {self.generate_suffix(prefix)}")
+        return contents
+
+
+class PrefixCacheBenchmark:
+    def __init__(self, server_url: str, context_size: int, prefix_ratios: List[float],
+                 prefix_groups: List[int], suffix_tokens: Optional[int] = None,
+                 requests_per_point: int = 20, concurrent_requests: int = 4,
+                 max_tokens: int = 1, request_timeout: int = 180, block_size: int = 32,
+                 warmup: bool = True, tokenizer_settings: Optional[Dict] = None):
+        self.server_url = server_url
+        self.context_size = context_size
+        self.prefix_ratios = prefix_ratios  # Shared fraction of each prompt
+        self.prefix_groups = prefix_groups  # Number of distinct prefixes competing for the cache
+        self.suffix_tokens = suffix_tokens  # Fixed unique part (context then grows with the ratio)
+        self.requests_per_point = requests_per_point
+        self.concurrent_requests = concurrent_requests
+        self.max_tokens = max_tokens
+        self.request_timeout = request_timeout
+        self.block_size = block_size  # Server KV block size: only whole blocks can be reused
+        self.warmup = warmup  # Send one request per group first so prefixes are cached
+        self.tokenizer_settings = tokenizer_settings
+
+        self.points: List[Dict] = []
+
+    def point_lengths(self, ratio: float) -> tuple:
+        """Return (prefix_tokens, suffix_tokens) for a shared-prefix ratio"""
+        if self.suffix_tokens is not None:
+            if ratio >= 1:
+                raise ValueError("Shared-prefix ratio must be below 1 with --suffix-tokens")
+            return round(self.suffix_tokens * ratio / (1 - ratio)), self.suffix_tokens
+        prefix_tokens = round(self.context_size * ratio)
+        return prefix_tokens, max(1, self.context_size - prefix_tokens)
+
+    def make_tester(self, total_requests: int, concurrent_requests: int, context_size: int) -> LLMStressTester:
+        """Create a streaming LLM tester for one benchmark point"""
+        return LLMStressTester(
+            server_url=self.server_url,
+            concurrent_requests=concurrent_requests,
+            total_requests=total_requests,
+            request_timeout=self.request_timeout,
+            context_size=context_size,
+            max_tokens=self.max_tokens,
+            mode='pp' if self.max_tokens <= 1 else 'mixed',
+            stream=True,
+            tokenizer_settings=self.tokenizer_settings
+        )
+
+    async def run_point(self, groups: int, ratio: float) -> Dict:
+        """Warm the prefix groups, then measure one (groups, ratio) point"""
+        prefix_tokens, suffix_tokens = self.point_lengths(ratio)
+        tester = self.make_tester(self.requests_per_point, self.concurrent_requests, prefix_tokens + suffix_tokens)
+        pool = SharedPrefixPool(groups, prefix_tokens, suffix_tokens, tester.build_payload,
+                                count_tokens=tester.token_counter(),
+                                tokenizer_name=self.tokenizer_settings["tokenizer"] if self.tokenizer_settings else None)
+        pool = await asyncio.get_running_loop().run_in_executor(None, pool.build)
+
+        logger.info(f"=== {groups} prefix group(s), shared ratio {ratio:.2f} "
+                    f"({prefix_tokens} shared + {suffix_tokens} unique tokens) ===")
+        if self.warmup:
+            # The first `groups` bodies handed out cover every prefix group once
+            warmer = self.make_tester(groups, 1, prefix_tokens + suffix_tokens)
+            warmer.prompt_pool = pool
+            await warmer.run_concurrent_requests()
+
+        tester.prompt_pool = pool
+        await tester.run_concurrent_requests()
+        aggregator = tester.aggregator
+
+        # Only whole KV blocks of the shared prefix can be served from the cache
+        total_tokens = prefix_tokens + suffix_tokens
+        reusable_tokens = (prefix_tokens // self.block_size) * self.block_size
+        point = {
+            "groups": groups,
+            "ratio": ratio,
+            "prefix_tokens": prefix_tokens,
+            "suffix_tokens": suffix_tokens,
+            "expected_hit_ratio": reusable_tokens / total_tokens if total_tokens else 0.0,
+            "observed_hit_ratio": None,
+            "successful_requests": aggregator.successful_requests,
+            "total_requests": aggregator.total_requests
+        }
+        ttft = aggregator.histogram('ttft')
+        prompt = aggregator.histogram('prompt_tokens')
+        cached = aggregator.histogram('cached_tokens')
+        if ttft and prompt:
+            point["ttft"] = ttft.percentiles()
+            point["average_ttft"] = ttft.mean
+            point["prefill_tokens_per_sec"] = prompt.mean / ttft.mean
+            point["uncached_tokens_per_sec"] = prompt.mean * (1 - point["expected_hit_ratio"]) / ttft.mean
+            if cached and prompt.mean:
+                point["observed_hit_ratio"] = cached.mean / prompt.mean
+        return point
+
+    async def run(self) -> List[Dict]:
+        """Run every (groups, ratio) point in order"""
+        for groups in self.prefix_groups:
+            for ratio in self.prefix_ratios:
+                self.points.append(await self.run_point(groups, ratio))
+        return self.points
+
+    def print_report(self):
+        """Print TTFT and prefill throughput against the expected cache-hit ratio"""
+        print("\n=== PREFIX CACHE REPORT ===")
+        print(f"Block size: {self.block_size} tokens, {self.requests_per_point} requests per point, "
+              f"{self.concurrent_requests} concurrent")
+        header = (f"{'Groups':>6} {'Shared':>7} {'Prefix':>7} {'Suffix':>7} {'Exp Hit':>8} {'Obs Hit':>8} "
+                  + "".join(f"{'TTFT p' + format(q, 'g'):>12}" for q in PERCENTILES)
+                  + f" {'Prefill tok/s':>14} {'Uncached tok/s':>15} {'OK':>7}")
+        print(header)
+        print("-" * len(header))
+        for point in self.points:
+            observed = f"{point['observed_hit_ratio']:.1%}" if point["observed_hit_ratio"] is not None else "n/a"
+            line = (f"{point['groups']:>6} {point['ratio']:>7.2f} {point['prefix_tokens']:>7} "
+                    f"{point['suffix_tokens']:>7} {point['expected_hit_ratio']:>8.1%} {observed:>8} ")
+            if "ttft" in point:
+                line += "".join(f"{point['ttft'][q]:>12.3f}" for q in PERCENTILES)
+                line += f" {point['prefill_tokens_per_sec']:>14.1f} {point['uncached_tokens_per_sec']:>15.1f}"
+            else:
+                line += "".join(f"{'-':>12}" for _ in PERCENTILES) + f" {'-':>14} {'-':>15}"
+            line += f" {point['successful_requests']:>3}/{point['total_requests']:<3}"
+            print(line)
+        print("\nExp Hit: block-aligned shared fraction of each prompt, assuming the prefix stays cached.")
+        print("Obs Hit: cached prompt tokens reported by the server (n/a if the server does not report them).")
+        print("A falling Obs Hit as Groups grows means prefixes are evicted before reuse.")
+
+
+def parse_list(cast):
+    """argparse type for comma-separated lists"""
+    return lambda text: [cast(item) for item in text.split(',') if item.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Prefix Cache Benchmark Script')
+    parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Server URL (default: http://localhost:8000/v1/chat/completions)')
+    parser.add_argument('--context-size', type=int, default=6000,
+                       help='Total prompt size in tokens (default: 6000)')
+    parser.add_argument('--prefix-ratios', type=parse_list(float), default=[0.0, 0.25, 0.5, 0.75, 0.9],
+                       help='Comma-separated shared-prefix fractions to sweep (default: 0,0.25,0.5,0.75,0.9)')
+    parser.add_argument('--prefix-groups', type=parse_list(int), default=[1],
+                       help='Comma-separated numbers of distinct prefix groups to sweep (default: 1)')
+    parser.add_argument('--suffix-tokens', type=int, default=None,
+                       help='Fixed unique suffix length; the prefix then grows with the ratio instead of '
+                            'splitting --context-size (default: unset)')
+    parser.add_argument('--requests-per-point', type=int, default=20,
+                       help='Measured requests per point (default: 20)')
+    parser.add_argument('--concurrent-requests', type=int, default=4,
+                       help='Number of concurrent requests (default: 4)')
+    parser.add_argument('--max-tokens', type=int, default=1,
+                       help='Tokens to generate per request (default: 1, prefill only)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    parser.add_argument('--block-size', type=int, default=32,
+                       help='Server KV cache block size in tokens (default: 32, as in vllm_args.sh)')
+    parser.add_argument('--no-warmup', action='store_true',
+                       help='Do not send one warm-up request per prefix group before measuring')
+    add_tokenizer_arguments(parser, 'vllm_args.sh')
+
+    args = parser.parse_args()
+
+    benchmark = PrefixCacheBenchmark(
+        server_url=args.server_url,
+        context_size=args.context_size,
+        prefix_ratios=args.prefix_ratios,
+        prefix_groups=args.prefix_groups,
+        suffix_tokens=args.suffix_tokens,
+        requests_per_point=args.requests_per_point,
+        concurrent_requests=args.concurrent_requests,
+        max_tokens=args.max_tokens,
+        request_timeout=args.request_timeout,
+        block_size=args.block_size,
+        warmup=not args.no_warmup,
+        tokenizer_settings=tokenizer_settings_from_args(args)
+    )
+
+    logger.info("Starting prefix cache benchmark...")
+    await benchmark.run()
+    benchmark.print_report()
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    if importlib.util.find_spec("aiohttp") is None:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
+    asyncio.run(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Prefix-affinity router across several OpenAI-compatible inference backends
+Requests are routed by hashing their leading prompt blocks (rendezvous hashing over the
+healthy backends), so requests sharing a system prompt, tool list or conversation prefix
+keep landing where that prefix is already in the KV / prompt cache. When the preferred
+backend is loaded well above the least-loaded one, the request falls back to least-loaded.
+Upstream connections are pooled keep-alive connections, streamed responses are passed
+through chunk by chunk, and per-backend metrics are served on /stats and /metrics.
+"""
+
+import asyncio
+import argparse
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from client_profiler import json_codec
+from histogram import PERCENTILES, LogHistogram
+from server_launcher import server_base_url
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Same estimate the prompt generators use
+POLICIES = ("affinity", "least-loaded", "round-robin")
+# Hop-by-hop and length headers are not copied between the client and upstream connections;
+# responses keep content-encoding because upstream bytes are passed through undecoded
+SKIPPED_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+                   "transfer-encoding", "upgrade", "content-length"}
+# The client's request body arrives already decoded, and the upstream is addressed by its own host
+SKIPPED_REQUEST_HEADERS = SKIPPED_HEADERS | {"content-encoding", "host"}
+
+
+def request_text(body: Dict) -> str:
+    """Flatten a request into the text its prompt starts with, in the order the server sees it"""
+    parts = [json.dumps(body["tools"])] if body.get("tools") else []
+    for message in body.get("messages", []):
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(f"{message.get('role', 'user')}: {content}")
+        if message.get("tool_calls"):
+            parts.append(json.dumps(message["tool_calls"]))
+    for field in ("prompt", "input"):
+        if isinstance(body.get(field), str):
+            parts.append(body[field])
+    return "\n".join(parts)
+
+
+def affinity_key(body: Dict, block_chars: int, blocks: int) -> Optional[bytes]:
+    """Hash of the leading whole prompt blocks, or None for prompts shorter than one block"""
+    text = request_text(body)
+    length = min(len(text) // block_chars, blocks) * block_chars
+    if not length:
+        return None
+    return hashlib.blake2b(f"{body.get('model', '')}\0{text[:length]}".encode(), digest_size=8).digest()
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")  # scheme://host:port
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.affinity_routes = 0  # Requests sent here because their prefix hashes here
+        self.fallback_routes = 0  # Requests sent here because the preferred backend was too busy
+        self.bytes_out = 0
+        self.first_byte = LogHistogram()  # Time until the upstream response headers arrived
+        self.duration = LogHistogram()
+
+    def weight(self, key: bytes) -> int:
+        """Rendezvous hashing weight of this backend for an affinity key"""
+        return int.from_bytes(hashlib.blake2b(key + self.url.encode(), digest_size=8).digest(), "big")
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "affinity_routes": self.affinity_routes,
+            "fallback_routes": self.fallback_routes,
+            "bytes_out": self.bytes_out,
+            "first_byte": self.first_byte.percentiles() if self.first_byte.count else None,
+            "duration": self.duration.percentiles() if self.duration.count else None
+        }
+
+
+class PrefixRouter:
+    def __init__(self, backends: List[str], policy: str = "affinity", block_size: int = 32,
+                 affinity_blocks: int = 16, max_imbalance: int = 4, health_interval: float = 5.0,
+                 connections_per_backend: int = 256, request_timeout: int = 600, fast_path: bool = False):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.backends = [Backend(url) for url in backends]
+        self.policy = policy
+        self.block_chars = block_size * CHARS_PER_TOKEN  # Server KV block, in characters
+        self.affinity_blocks = affinity_blocks  # Leading blocks hashed; later blocks do not move a request
+        self.max_imbalance = max_imbalance  # In-flight requests above the least-loaded backend before falling back
+        self.health_interval = health_interval
+        self.connections_per_backend = connections_per_backend
+        self.request_timeout = request_timeout
+        self.json_dumps, self.json_loads = json_codec(fast_path)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.health_task: Optional[asyncio.Task] = None
+        self.next_backend = 0
+
+    def candidates(self) -> List[Backend]:
+        healthy = [backend for backend in self.backends if backend.healthy]
+        # With every backend down, keep trying them rather than failing outright
+        return healthy or self.backends
+
+    def choose(self, body: Dict) -> Backend:
+        """Pick the backend for a request according to the routing policy"""
+        candidates = self.candidates()
+        least_loaded = min(candidates, key=lambda backend: backend.in_flight)
+        if self.policy == "round-robin":
+            self.next_backend = (self.next_backend + 1) % len(candidates)
+            return candidates[self.next_backend]
+        key = affinity_key(body, self.block_chars, self.affinity_blocks) if self.policy == "affinity" else None
+        if key is None:
+            least_loaded.fallback_routes += 1
+            return least_loaded
+        preferred = max(candidates, key=lambda backend: backend.weight(key))
+        if preferred.in_flight - least_loaded.in_flight > self.max_imbalance:
+            least_loaded.fallback_routes += 1
+            return least_loaded
+        preferred.affinity_routes += 1
+        return preferred
+
+    async def proxy(self, request: web.Request) -> web.StreamResponse:
+        """Forward a POST to the chosen backend and pass its response through unbuffered"""
+        raw = await request.read()
+        try:
+            body = self.json_loads(raw)
+        except ValueError:
+            raise web.HTTPBadRequest(text="Request body is not JSON")
+        backend = self.choose(body)
+        headers = {name: value for name, value in request.headers.items()
+                   if name.lower() not in SKIPPED_REQUEST_HEADERS}
+
+        started = time.perf_counter()
+        backend.in_flight += 1
+        backend.requests += 1
+        response: Optional[web.StreamResponse] = None
+        try:
+            async with self.session.post(backend.url + request.path_qs, data=raw, headers=headers,
+                                         timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as upstream:
+                backend.first_byte.record(time.perf_counter() - started)
+                response = web.StreamResponse(status=upstream.status, headers={
+                    name: value for name, value in upstream.headers.items() if name.lower() not in SKIPPED_HEADERS})
+                await response.prepare(request)
+                # Every chunk is written as soon as it arrives, so SSE tokens are not held back
+                async for chunk in upstream.content.iter_any():
+                    backend.bytes_out += len(chunk)
+                    try:
+                        await response.write(chunk)
+                    except ConnectionResetError:
+                        # The client went away; leaving the block drops the upstream request too
+                        logger.debug(f"Client disconnected from a {backend.url} response")
+                        return response
+                if upstream.status >= 500:
+                    backend.errors += 1
+            await response.write_eof()
+            return response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            backend.errors += 1
+            if isinstance(e, aiohttp.ClientConnectionError):
+                backend.healthy = False
+                logger.warning(f"Backend {backend.url} unreachable, marked unhealthy: {e}")
+            if response is None:
+                raise web.HTTPBadGateway(text=f"Backend {backend.url} failed: {e}")
+            # Headers are already sent; all that is left is cutting the stream short
+            return response
+        finally:
+            backend.in_flight -= 1
+            backend.duration.record(time.perf_counter() - started)
+
+    async def check_health(self):
+        """Poll every backend's /health so failed backends leave and recovered ones rejoin"""
+        while True:
+            for backend in self.backends:
+                try:
+                    async with self.session.get(backend.url + "/health", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                        healthy = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    healthy = False
+                if healthy != backend.healthy:
+                    logger.info(f"Backend {backend.url} is now {'healthy' if healthy else 'unhealthy'}")
+                backend.healthy = healthy
+            await asyncio.sleep(self.health_interval)
+
+    def stats(self) -> Dict:
+        return {"policy": self.policy, "backends": [backend.stats() for backend in self.backends]}
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        """GET /stats"""
+        return web.json_response(self.stats())
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics, per-backend counters in Prometheus text format"""
+        lines = []
+        for name, kind, value in (("router_backend_healthy", "gauge", lambda b: int(b.healthy)),
+                                  ("router_backend_in_flight", "gauge", lambda b: b.in_flight),
+                                  ("router_backend_requests_total", "counter", lambda b: b.requests),
+                                  ("router_backend_errors_total", "counter", lambda b: b.errors),
+                                  ("router_backend_affinity_routes_total", "counter", lambda b: b.affinity_routes),
+                                  ("router_backend_fallback_routes_total", "counter", lambda b: b.fallback_routes),
+                                  ("router_backend_bytes_out_total", "counter", lambda b: b.bytes_out)):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{backend="{backend.url}"}} {value(backend)}' for backend in self.backends)
+        return web.Response(text="\n".join(lines) + "\n")
+
+    async def health(self, request: web.Request) -> web.Response:
+        """GET /health, healthy while any backend is"""
+        if any(backend.healthy for backend in self.backends):
+            return web.Response(text="OK")
+        return web.Response(status=503, text="No healthy backend")
+
+    async def on_startup(self, application: web.Application):
+        # Keep-alive connections are pooled per backend and reused across requests
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.connections_per_backend,
+                                         keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, auto_decompress=False)
+        self.health_task = asyncio.get_running_loop().create_task(self.check_health())
+
+    async def on_cleanup(self, application: web.Application):
+        self.health_task.cancel()
+        try:
+            await self.health_task
+        except asyncio.CancelledError:
+            pass
+        await self.session.close()
+        print_router_report(self.stats())
+
+    def app(self) -> web.Application:
+        application = web.Application(client_max_size=256 * 1024 * 1024)
+        for path in ("/v1/chat/completions", "/v1/completions", "/v1/embeddings", "/completion"):
+            application.router.add_post(path, self.proxy)
+        application.router.add_get("/health", self.health)
+        application.router.add_get("/stats", self.stats_handler)
+        application.router.add_get("/metrics", self.metrics)
+        application.on_startup.append(self.on_startup)
+        application.on_cleanup.append(self.on_cleanup)
+        return application
+
+
+def print_router_report(stats: Dict):
+    """Print per-backend routing and latency counters"""
+    print(f"\n=== ROUTER REPORT ({stats['policy']}) ===")
+    header = (f"{'Backend':<28} {'Requests':>9} {'Affinity':>9} {'Fallback':>9} {'Errors':>7} "
+              + "".join(f"{'p' + format(q, 'g') + ' (s)':>11}" for q in PERCENTILES))
+    print(header)
+    print("-" * len(header))
+    for backend in stats["backends"]:
+        line = (f"{backend['url']:<28} {backend['requests']:>9} {backend['affinity_routes']:>9} "
+                f"{backend['fallback_routes']:>9} {backend['errors']:>7} ")
+        if backend["duration"]:
+            line += "".join(f"{backend['duration'][q]:>11.3f}" for q in PERCENTILES)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prefix-Affinity Inference Router')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                       help='Port to listen on (default: 8080)')
+    parser.add_argument('--backend', action='append', required=True,
+                       help='Backend base URL or endpoint URL, e.g. http://localhost:8000; repeatable')
+    parser.add_argument('--policy', choices=POLICIES, default='affinity',
+                       help='Routing policy; the others are baselines for comparison (default: affinity)')
+    parser.add_argument('--block-size', type=int, default=32,
+                       help='Server KV block size in tokens (default: 32, as in vllm_args.sh)')
+    parser.add_argument('--affinity-blocks', type=int, default=16,
+                       help='Leading prompt blocks hashed for affinity (default: 16)')
+    parser.add_argument('--max-imbalance', type=int, default=4,
+                       help='In-flight requests the preferred backend may run above the least-loaded one '
+                            'before requests fall back to least-loaded (default: 4)')
+    parser.add_argument('--health-interval', type=float, default=5.0,
+                       help='Seconds between backend /health checks (default: 5)')
+    parser.add_argument('--connections-per-backend', type=int, default=256,
+                       help='Pooled keep-alive connections per backend (default: 256)')
+    parser.add_argument('--request-timeout', type=int, default=600,
+                       help='Upstream request timeout in seconds (default: 600)')
+    parser.add_argument('--fast-path', action='store_true',
+                       help='Use orjson when installed')
+
+    args = parser.parse_args()
+
+    router = PrefixRouter(
+        backends=[server_base_url(url) for url in args.backend],
+        policy=args.policy,
+        block_size=args.block_size,
+        affinity_blocks=args.affinity_blocks,
+        max_imbalance=args.max_imbalance,
+        health_interval=args.health_interval,
+        connections_per_backend=args.connections_per_backend,
+        request_timeout=args.request_timeout,
+        fast_path=args.fast_path
+    )
+    logger.info(f"Router on {args.host}:{args.port} ({args.policy}) -> {', '.join(b.url for b in router.backends)}")
+    web.run_app(router.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    try:
+        import aiohttp
+        main()
+    except ImportError:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
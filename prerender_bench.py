@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Client-side chat template prerendering benchmark
+Replays the same scripted multi-turn agent conversations (system prompt, tools, growing tool
+results) through three request paths and compares them:
+  chat    /v1/chat/completions, the server renders the template and tokenizes every turn
+  text    the client renders the template (prompt_renderer) and sends the text as a raw prompt
+  tokens  the client also tokenizes, reusing each conversation's cached prefix ids
+Raw prompts go to /v1/completions or llama.cpp's native /completion. The report shows
+end-to-end latency, client preparation time and the CPU the server's front-end spent.
+"""
+
+import asyncio
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from histogram import PERCENTILES, LogHistogram, ResultAggregator
+from metrics_scraper import parse_prometheus_line
+from prompt_pool import generate_long_message
+from prompt_renderer import API_ENDPOINTS, ConversationRenderer, completion_payload, parse_stream_chunk, print_render_report
+from server_launcher import server_base_url
+from session_simulator import AGENT_TOOLS, SYSTEM_PROMPT
+from tokenizer_utils import default_tokenizer_settings
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PATHS = ('chat', 'text', 'tokens')
+# Renders of the tokens path that are checked against tokenizing the whole prompt at once
+VERIFY_RENDERS = 50
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU seconds of a local process from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        # Fields after the parenthesized command name; utime and stime are the 14th and 15th
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class PrerenderBenchmark:
+    def __init__(self, server_url: str, api: str = 'completions', paths: Tuple[str, ...] = PATHS,
+                 sessions: int = 4, turns: int = 10, max_tokens: int = 32, system_tokens: int = 2000,
+                 task_tokens: int = 500, tool_result_tokens: int = 2000, request_timeout: int = 300,
+                 chat_template: Optional[str] = None, tokenizer_name: Optional[str] = None,
+                 server_pid: Optional[int] = None, verify_tokens: bool = False, seed: Optional[int] = None):
+        self.base_url = server_base_url(server_url)
+        self.api = api  # Raw prompt API: 'completions' or 'llama'
+        self.paths = paths
+        self.sessions = sessions  # Concurrent conversations per path
+        self.turns = turns
+        self.max_tokens = max_tokens
+        self.request_timeout = request_timeout
+        self.chat_template = chat_template
+        self.tokenizer_name = tokenizer_name
+        self.server_pid = server_pid  # Read the front-end CPU from /proc instead of /metrics
+        self.verify_tokens = verify_tokens
+        self.random = random.Random(seed)
+
+        # Every path replays the same conversations; only a per-path nonce keeps prefix caches apart
+        self.system_prompt = SYSTEM_PROMPT + "\n\n" + generate_long_message(system_tokens, self.random)
+        self.tasks = [generate_long_message(task_tokens, self.random) for _ in range(sessions)]
+        self.tool_results = [[generate_long_message(max(1, round(tool_result_tokens * self.random.uniform(0.5, 1.5))),
+                                                    self.random) for _ in range(turns)] for _ in range(sessions)]
+
+        self.results: Dict[str, Dict] = {}
+
+    def conversation(self, path: str, session_id: int) -> List[Dict]:
+        """Opening messages of a scripted conversation"""
+        return [
+            {"role": "system", "content": f"[{path} {self.random.getrandbits(64):016x}] {self.system_prompt}"},
+            {"role": "user", "content": f"Task {session_id}: {self.tasks[session_id]}"}
+        ]
+
+    def extend(self, messages: List[Dict], session_id: int, turn: int):
+        """Append the scripted assistant tool call and its result after a turn"""
+        call_id = f"call_{session_id}_{turn}"
+        messages.append({"role": "assistant", "content": "", "tool_calls": [{
+            "id": call_id, "type": "function",
+            "function": {"name": "read_file", "arguments": json.dumps({"path": f"src/module_{turn}.py"})}
+        }]})
+        messages.append({"role": "tool", "tool_call_id": call_id, "content": self.tool_results[session_id][turn]})
+
+    def build_body(self, path: str, renderer: Optional[ConversationRenderer], conversation_id,
+                   messages: List[Dict]) -> Tuple[str, bytes]:
+        """(endpoint, serialized body) of one turn on a path"""
+        if path == 'chat':
+            payload = {"model": "kCode", "messages": messages, "tools": AGENT_TOOLS, "tool_choice": "auto",
+                       "max_tokens": self.max_tokens, "temperature": 0.7, "stream": True,
+                       "stream_options": {"include_usage": True}}
+            return API_ENDPOINTS['chat'], json.dumps(payload).encode()
+        text, ids = renderer.render(conversation_id, messages, AGENT_TOOLS)
+        prompt = ids if path == 'tokens' else text
+        return API_ENDPOINTS[self.api], json.dumps(completion_payload(self.api, prompt, self.max_tokens)).encode()
+
+    async def send_turn(self, session: aiohttp.ClientSession, path: str, endpoint: str, body: bytes,
+                        prepare_time: float) -> Dict:
+        """Send one turn and return timing and token information"""
+        api = 'chat' if path == 'chat' else self.api
+        start_time = time.time()
+        try:
+            async with session.post(self.base_url + endpoint, data=body, headers=JSON_HEADERS,
+                                    timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    raise RuntimeError(f"HTTP {response.status}: {text[:200]}")
+                usage = {}
+                timings = {}
+                first_token = None
+                async for raw_line in response.content:
+                    line = raw_line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    produced, chunk_usage, chunk_timings = parse_stream_chunk(api, json.loads(data))
+                    if produced and first_token is None:
+                        first_token = time.time()
+                    usage = chunk_usage or usage
+                    timings = chunk_timings or timings
+            duration = time.time() - start_time
+            cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+            if cached_tokens is None and timings:
+                cached_tokens = timings.get('cache_n')
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+            return {
+                "status": "SUCCESS",
+                "duration": duration,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "tokens_per_sec": completion_tokens / duration if duration > 0 else 0,
+                "ttft": (first_token - start_time) if first_token else 0,
+                "cached_tokens": cached_tokens,
+                "prepare_time": prepare_time
+            }
+        except Exception as e:
+            logger.error(f"{path}: request FAILED after {time.time() - start_time:.3f}s: {e}")
+            return {"status": "FAILED", "duration": time.time() - start_time, "error": str(e)}
+
+    async def server_cpu(self, session: aiohttp.ClientSession) -> Optional[float]:
+        """Current CPU seconds of the server front-end, None when it cannot be read"""
+        if self.server_pid:
+            return process_cpu_seconds(self.server_pid)
+        try:
+            async with session.get(self.base_url + "/metrics", timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status != 200:
+                    return None
+                total = None
+                async for raw_line in response.content:
+                    parsed = parse_prometheus_line(raw_line.decode(errors='replace').strip())
+                    if parsed and parsed[0] == "process_cpu":
+                        total = (total or 0.0) + parsed[1]
+                return total
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def run_path(self, path: str) -> Dict:
+        """Replay every conversation through one request path"""
+        renderer = None
+        if path != 'chat':
+            renderer = ConversationRenderer(self.chat_template, self.tokenizer_name if path == 'tokens' else None,
+                                            max_conversations=max(1024, self.sessions))
+        aggregator = ResultAggregator()
+        prepare = LogHistogram()
+        mismatches = 0
+
+        async def run_session(session: aiohttp.ClientSession, session_id: int):
+            nonlocal mismatches
+            messages = self.conversation(path, session_id)
+            for turn in range(self.turns):
+                started = time.perf_counter()
+                endpoint, body = self.build_body(path, renderer, session_id, messages)
+                prepare_time = time.perf_counter() - started
+                if path == 'tokens' and self.verify_tokens and renderer.renders <= VERIFY_RENDERS:
+                    text = renderer.render_text(messages, AGENT_TOOLS)
+                    if json.loads(body)["prompt"] != renderer.encode(text):
+                        mismatches += 1
+                result = await self.send_turn(session, path, endpoint, body, prepare_time)
+                aggregator.record(result)
+                if result["status"] != "SUCCESS":
+                    return
+                prepare.record(prepare_time)
+                self.extend(messages, session_id, turn)
+            if renderer:
+                renderer.forget(session_id)
+
+        connector = aiohttp.TCPConnector(limit=self.sessions + 1)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            cpu_before = await self.server_cpu(session)
+            run_start = time.time()
+            await asyncio.gather(*(run_session(session, session_id) for session_id in range(self.sessions)))
+            wall = time.time() - run_start
+            cpu_after = await self.server_cpu(session)
+
+        result = {
+            "aggregator": aggregator,
+            "prepare": prepare,
+            "wall": wall,
+            "server_cpu": cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+            "render": renderer.report() if renderer else None,
+            "mismatches": mismatches if path == 'tokens' and self.verify_tokens else None
+        }
+        logger.info(f"{path}: {aggregator.successful_requests}/{aggregator.total_requests} turns in {wall:.1f}s")
+        return result
+
+    async def run(self):
+        """Run every path in turn"""
+        for path in self.paths:
+            logger.info(f"=== Path {path} ({API_ENDPOINTS['chat' if path == 'chat' else self.api]}) ===")
+            self.results[path] = await self.run_path(path)
+
+    def print_report(self):
+        """Compare latency, client preparation time and server front-end CPU across paths"""
+        print("\n=== CHAT TEMPLATE PRERENDERING REPORT ===")
+        print(f"{self.sessions} conversations x {self.turns} turns per path, raw prompts via "
+              f"{API_ENDPOINTS[self.api]}, template {self.chat_template}")
+        q = PERCENTILES[2]
+        header = (f"{'Path':<7} {'OK':>9} {'Context':>8} {'Prep ms':>8} {'TTFT p50':>9} {f'TTFT p{q:g}':>9} "
+                  f"{'Lat p50':>8} {f'Lat p{q:g}':>8} {'Server CPU s':>13} {'CPU ms/turn':>12}")
+        print(header)
+        print("-" * len(header))
+        baseline = None
+        for path, result in self.results.items():
+            aggregator = result["aggregator"]
+            line = f"{path:<7} {aggregator.successful_requests:>4}/{aggregator.total_requests:<4}"
+            if not aggregator.successful_requests:
+                print(line)
+                continue
+            ttft = aggregator.histogram('ttft')
+            duration = aggregator.histograms['duration']
+            line += (f" {aggregator.histograms['prompt_tokens'].mean:>8.0f} {result['prepare'].mean * 1000:>8.2f}"
+                     f" {ttft.percentile(50) if ttft else 0:>9.3f} {ttft.percentile(q) if ttft else 0:>9.3f}"
+                     f" {duration.percentile(50):>8.3f} {duration.percentile(q):>8.3f}")
+            cpu = result["server_cpu"]
+            if cpu is None:
+                line += f" {'n/a':>13} {'n/a':>12}"
+            else:
+                line += f" {cpu:>13.2f} {cpu / aggregator.total_requests * 1000:>12.2f}"
+                if path == 'chat':
+                    baseline = cpu
+                elif baseline:
+                    line += f"  ({cpu / baseline - 1:+.0%} vs chat)"
+            print(line)
+
+        print("\nContext: mean prompt tokens per turn. Prep: client time to render, tokenize and serialize a turn.")
+        if any(result["server_cpu"] is None for result in self.results.values()):
+            print("Server CPU needs process_cpu_seconds_total on /metrics (vLLM front-end) or --server-pid.")
+        elif self.server_pid:
+            print(f"Server CPU: process {self.server_pid} from /proc (for llama.cpp this is the whole server).")
+        for path, result in self.results.items():
+            print_render_report(result["render"], f" [{path} path]")
+            if result["mismatches"] is None:
+                continue
+            checked = min(VERIFY_RENDERS, result["render"]["renders"])
+            if result["mismatches"]:
+                print(f"  Warning: {result['mismatches']} of {checked} incremental tokenizations differed from "
+                      f"tokenizing the whole prompt")
+            else:
+                print(f"  Incremental token ids matched whole-prompt tokenization on all {checked} checked turns")
+
+
+def parse_paths(text: str) -> Tuple[str, ...]:
+    paths = tuple(path.strip() for path in text.split(',') if path.strip())
+    unknown = [path for path in paths if path not in PATHS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown path(s) {', '.join(unknown)}, choose from {', '.join(PATHS)}")
+    return paths
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Chat Template Prerendering Benchmark')
+    parser.add_argument('--server-url', default='http://localhost:8000',
+                       help='Server base URL; the path is chosen per request path (default: http://localhost:8000)')
+    parser.add_argument('--api', choices=('completions', 'llama'), default='completions',
+                       help='Raw prompt endpoint: /v1/completions or llama.cpp /completion (default: completions)')
+    parser.add_argument('--paths', type=parse_paths, default=PATHS,
+                       help='Comma-separated request paths to compare (default: chat,text,tokens)')
+    parser.add_argument('--sessions', type=int, default=4,
+                       help='Concurrent conversations per path (default: 4)')
+    parser.add_argument('--turns', type=int, default=10,
+                       help='Turns per conversation (default: 10)')
+    parser.add_argument('--max-tokens', type=int, default=32,
+                       help='Tokens generated per turn (default: 32)')
+    parser.add_argument('--system-tokens', type=int, default=2000,
+                       help='Size of the shared system prompt (default: 2000)')
+    parser.add_argument('--task-tokens', type=int, default=500,
+                       help='Size of the first user message (default: 500)')
+    parser.add_argument('--tool-result-tokens', type=int, default=2000,
+                       help='Average size of the tool result appended every turn (default: 2000)')
+    parser.add_argument('--request-timeout', type=int, default=300,
+                       help='Request timeout in seconds (default: 300)')
+    parser.add_argument('--server-args', type=str, default='vllm_args.sh',
+                       help='Server args file to take the chat template and tokenizer from (default: vllm_args.sh)')
+    parser.add_argument('--chat-template', type=str, default=None,
+                       help='Chat template file (default: --chat-template from --server-args)')
+    parser.add_argument('--tokenizer', type=str, default=None,
+                       help='Tokenizer for the tokens path (default: --tokenizer/--model from --server-args)')
+    parser.add_argument('--server-pid', type=int, default=None,
+                       help='Measure server CPU of this local process from /proc instead of /metrics')
+    parser.add_argument('--verify-tokens', action='store_true',
+                       help=f'Check the first {VERIFY_RENDERS} incremental tokenizations against tokenizing the whole prompt')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for the scripted conversations (default: random)')
+
+    args = parser.parse_args()
+
+    defaults = default_tokenizer_settings(args.server_args)
+    chat_template = args.chat_template or defaults["chat_template"]
+    tokenizer_name = args.tokenizer or defaults["tokenizer"]
+    if any(path != 'chat' for path in args.paths) and not chat_template:
+        parser.error(f"No chat template given and none found in {args.server_args}")
+    if 'tokens' in args.paths and not tokenizer_name:
+        parser.error(f"The tokens path needs --tokenizer (none found in {args.server_args})")
+
+    benchmark = PrerenderBenchmark(
+        server_url=args.server_url,
+        api=args.api,
+        paths=args.paths,
+        sessions=args.sessions,
+        turns=args.turns,
+        max_tokens=args.max_tokens,
+        system_tokens=args.system_tokens,
+        task_tokens=args.task_tokens,
+        tool_result_tokens=args.tool_result_tokens,
+        request_timeout=args.request_timeout,
+        chat_template=chat_template,
+        tokenizer_name=tokenizer_name,
+        server_pid=args.server_pid,
+        verify_tokens=args.verify_tokens,
+        seed=args.seed
+    )
+    await benchmark.run()
+    benchmark.print_report()
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    try:
+        import aiohttp
+        asyncio.run(main())
+    except ImportError as e:
+        print(f"Error: {e}")
+        print("Please install the requirements with: pip install aiohttp jinja2 transformers")
+        exit(1)
@@ -0,0 +1,271 @@
+"""
+Precomputed prompt pool for the stress testers
+Generates (or loads from a cache file) a set of random prompts before the run starts and
+pre-serializes the request bodies, so the hot path only hands out ready-made bytes.
+Every body handed out in unique mode starts with a fresh random nonce, which changes the
+very first KV blocks and therefore defeats server-side prefix caching.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# List of random words to use for generating varied content
+RANDOM_WORDS = [
+    "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "computer", "science",
+    "artificial", "intelligence", "machine", "learning", "deep", "neural", "network", "algorithm",
+    "data", "analysis", "statistical", "model", "prediction", "accuracy", "performance", "optimization",
+    "development", "programming", "software", "hardware", "architecture", "design", "implementation",
+    "testing", "deployment", "monitoring", "maintenance", "security", "privacy", "encryption", "decryption",
+    "database", "storage", "retrieval", "processing", "computation", "simulation", "experiment", "research",
+    "discovery", "innovation", "technology", "application", "interface", "user", "experience", "design",
+    "framework", "library", "module", "component", "integration", "compatibility", "scalability", "reliability"
+]
+
+NONCE_PLACEHOLDER = "@@NONCE@@"
+NONCE_BYTES = 8  # 16 hex characters
+SAMPLE_NONCE = "0" * (NONCE_BYTES * 2)  # Stand-in nonce used when counting tokens
+
+
+def generate_long_message(context_tokens: int, rng: Optional[random.Random] = None) -> str:
+    """Generate a long human message with random but meaningful words to prevent caching
+
+    Words are drawn in batches and the length is tracked incrementally, so the cost is
+    linear in the target size.
+    """
+    rng = rng or random
+    # Approximate 1 token = 4 characters for English text
+    target_chars = context_tokens * 4
+
+    # Draw words in batches until the joined text would reach the target length
+    words: List[str] = []
+    length = 0
+    while length < target_chars:
+        batch = rng.choices(RANDOM_WORDS, k=max(16, (target_chars - length) // 7))
+        words.extend(batch)
+        length += sum(map(len, batch)) + len(batch)
+
+    # Join words into sentences of 10-20 words with proper punctuation
+    sentence_parts = []
+    i = 0
+    while i < len(words):
+        size = rng.randint(10, 20)
+        sentence_parts.append(' '.join(words[i:i + size]) + '.')
+        i += size
+
+    # Combine sentences with some structure
+    half = len(sentence_parts) // 2
+    structured_text = "User query: " + ' '.join(sentence_parts[:half]) + \
+                     "\n\nAssistant response: " + ' '.join(sentence_parts[half:])
+
+    # Trim to exact target character count
+    return structured_text[:target_chars]
+
+
+class PromptPool:
+    def __init__(self, size: int, context_tokens: int, body_builder: Callable[[str], Dict],
+                 unique: bool = True, fixed_prompt: Optional[str] = None,
+                 cache_path: Optional[str] = None, seed: Optional[int] = None,
+                 count_tokens: Optional[Callable[[str], int]] = None, tokenizer_name: Optional[str] = None,
+                 batch_size: int = 1):
+        self.size = size  # Number of distinct prompts to generate
+        self.context_tokens = context_tokens
+        self.body_builder = body_builder  # Turns prompt text into a JSON request payload
+        self.unique = unique  # Prepend a fresh random nonce to every body handed out
+        self.fixed_prompt = fixed_prompt  # Use this prompt instead of generating any
+        self.cache_path = cache_path  # JSONL file to load prompts from / save them to
+        self.random = random.Random(seed)
+        self.count_tokens = count_tokens  # Exact prompt token count for a content string, if available
+        self.tokenizer_name = tokenizer_name
+        self.batch_size = batch_size  # Contents per body; above 1 the body builder gets a list of contents
+
+        # Each body is stored as the parts around its nonce slots, or (body,)
+        self.bodies: List[tuple] = []
+        self.token_counts: List[Optional[int]] = []  # Exact prompt tokens per body, if counted
+        self.estimated_tokens: List[int] = []  # Prompt tokens per body estimated from the content text
+        self.next_index = 0
+        self.repeated_indexes = set()  # Entries already handed out once with their fixed repeat nonce
+        self.build_seconds = 0.0
+        self.loaded_from_cache = False
+        self.handed_out = 0
+        self.handout_seconds = 0.0
+
+    def load_prompts(self) -> Optional[List[str]]:
+        """Load prompts from the cache file if it matches the requested size"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        with open(self.cache_path) as f:
+            header = json.loads(f.readline())
+            if header.get("context_tokens") != self.context_tokens or header.get("tokenizer") != self.tokenizer_name:
+                logger.info(f"Prompt cache {self.cache_path} was built for {header.get('context_tokens')} "
+                            f"tokens with tokenizer {header.get('tokenizer')}, regenerating")
+                return None
+            prompts = [json.loads(line) for _, line in zip(range(self.size), f)]
+        if len(prompts) < self.size:
+            logger.info(f"Prompt cache {self.cache_path} holds only {len(prompts)} prompts, regenerating")
+            return None
+        return prompts
+
+    def save_prompts(self, prompts: List[str]):
+        """Write prompts to the cache file, one JSON string per line"""
+        # Write to a private file and rename, so concurrent workers never see a partial cache
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({"context_tokens": self.context_tokens, "tokenizer": self.tokenizer_name}) + "\n")
+            for prompt in prompts:
+                f.write(json.dumps(prompt) + "\n")
+        os.replace(tmp_path, self.cache_path)
+
+    def content(self, prompt: str) -> str:
+        """Message content for a prompt, with the nonce slot in unique mode"""
+        return f"[{NONCE_PLACEHOLDER}] {prompt}" if self.unique else prompt
+
+    def generate_prompt(self) -> str:
+        """Generate one prompt, fitted to the exact target token count when a tokenizer is set"""
+        if self.count_tokens is None:
+            return generate_long_message(self.context_tokens, self.random)
+        from tokenizer_utils import fit_to_tokens
+        # Over-generate, then truncate to the exact token budget of the final request
+        text = generate_long_message(self.context_tokens * 2, self.random)
+        return fit_to_tokens(text, self.context_tokens,
+                             lambda t: self.count_tokens(self.content(t).replace(NONCE_PLACEHOLDER, SAMPLE_NONCE)))
+
+    def build_contents(self) -> List[str]:
+        """Generate or load all prompts and return their message contents (with nonce slots)"""
+        if self.fixed_prompt is not None:
+            prompts = [self.fixed_prompt]
+        else:
+            prompts = self.load_prompts()
+            self.loaded_from_cache = prompts is not None
+            if prompts is None:
+                prompts = [self.generate_prompt() for _ in range(self.size)]
+                if self.cache_path:
+                    self.save_prompts(prompts)
+        return [self.content(prompt) for prompt in prompts]
+
+    def build(self) -> "PromptPool":
+        """Generate or load all prompts and pre-serialize their request bodies"""
+        start_time = time.perf_counter()
+
+        placeholder = NONCE_PLACEHOLDER.encode()
+        self.bodies = []
+        self.token_counts = []
+        self.estimated_tokens = []
+        contents = self.build_contents()
+        for i, content in enumerate(contents):
+            # Batched bodies take the next batch_size contents, wrapping around the pool
+            group = [contents[(i + k) % len(contents)] for k in range(self.batch_size)]
+            body = json.dumps(self.body_builder(content if self.batch_size == 1 else group)).encode()
+            # Every nonce slot of a body gets the same nonce when it is handed out
+            self.bodies.append(tuple(body.split(placeholder)) if self.unique else (body,))
+            if self.count_tokens is not None:
+                self.token_counts.append(sum(self.count_tokens(item.replace(NONCE_PLACEHOLDER, SAMPLE_NONCE))
+                                             for item in group))
+            else:
+                self.token_counts.append(None)
+            # Approximate 1 token = 4 characters of each input text, not of the serialized JSON
+            self.estimated_tokens.append(sum(len(item.replace(NONCE_PLACEHOLDER, SAMPLE_NONCE)) // 4
+                                             for item in group))
+
+        self.build_seconds = time.perf_counter() - start_time
+        source = "loaded from " + self.cache_path if self.loaded_from_cache else "generated"
+        logger.info(f"Prompt pool: {len(self.bodies)} prompts of ~{self.context_tokens} tokens {source} "
+                    f"in {self.build_seconds:.3f}s ({self.total_bytes() / 1e6:.1f} MB serialized)")
+        return self
+
+    def next_request(self, repeat: bool = False) -> tuple:
+        """Hand out the next pre-serialized request body and its prompt tokens
+
+        The token count is exact when a tokenizer is set, otherwise estimated from the input text.
+        With repeat, the body gets a nonce fixed per pool entry, so it is byte-identical to every
+        other repeated handout of that entry (for caches in front of the server). Only the second
+        and later repeats of an entry can hit such a cache; see repeat_is_warm().
+        """
+        start_time = time.perf_counter()
+        index = self.next_index
+        parts = self.bodies[index]
+        self.next_index = (index + 1) % len(self.bodies)
+        if repeat:
+            self.repeated_indexes.add(index)
+        if self.unique:
+            nonce = f"{index:0{NONCE_BYTES * 2}x}".encode() if repeat else os.urandom(NONCE_BYTES).hex().encode()
+            body = nonce.join(parts)
+        else:
+            body = parts[0]
+        self.handed_out += 1
+        self.handout_seconds += time.perf_counter() - start_time
+        exact = self.token_counts[index]
+        return body, exact if exact is not None else self.estimated_tokens[index]
+
+    def repeat_is_warm(self) -> bool:
+        """Whether the next repeated handout resends a body that was already handed out"""
+        if not self.unique:
+            # Every handout of an entry is identical; entries are handed out in order
+            return self.handed_out > self.next_index
+        return self.next_index in self.repeated_indexes
+
+    def next_body(self) -> bytes:
+        """Hand out the next pre-serialized request body"""
+        return self.next_request()[0]
+
+    def total_bytes(self) -> int:
+        return sum(len(part) for parts in self.bodies for part in parts)
+
+    def report(self) -> Dict:
+        """Client-side generation cost, to show the load generator is not the bottleneck"""
+        return {
+            "prompts": len(self.bodies),
+            "build_seconds": self.build_seconds,
+            "loaded_from_cache": self.loaded_from_cache,
+            "serialized_bytes": self.total_bytes(),
+            "bodies_handed_out": self.handed_out,
+            "average_handout_us": self.handout_seconds / self.handed_out * 1e6 if self.handed_out else 0.0,
+            "tokenizer": self.tokenizer_name,
+            "average_expected_tokens": sum(self.token_counts) / len(self.token_counts)
+                                       if self.token_counts and None not in self.token_counts else None
+        }
+
+
+def add_prompt_pool_arguments(parser):
+    """Register the prompt pool options shared by the stress testers"""
+    parser.add_argument('--prompt-pool-size', type=int, default=16,
+                       help='Number of distinct prompts generated before the run (default: 16)')
+    parser.add_argument('--prompt-cache', type=str, default=None,
+                       help='JSONL file to load the prompt pool from, or to save it to if missing')
+
+
+def merge_prompt_pool_reports(reports: List[Dict]) -> Dict:
+    """Combine the prompt pool reports of several worker processes"""
+    handed_out = sum(r["bodies_handed_out"] for r in reports)
+    return {
+        "prompts": sum(r["prompts"] for r in reports),
+        "build_seconds": max(r["build_seconds"] for r in reports),
+        "loaded_from_cache": all(r["loaded_from_cache"] for r in reports),
+        "serialized_bytes": sum(r["serialized_bytes"] for r in reports),
+        "bodies_handed_out": handed_out,
+        "average_handout_us": sum(r["average_handout_us"] * r["bodies_handed_out"] for r in reports) / handed_out
+                              if handed_out else 0.0,
+        "tokenizer": reports[0]["tokenizer"],
+        "average_expected_tokens": sum(r["average_expected_tokens"] * r["prompts"] for r in reports) /
+                                   sum(r["prompts"] for r in reports)
+                                   if all(r["average_expected_tokens"] is not None for r in reports) else None
+    }
+
+
+def print_prompt_pool_report(report: Optional[Dict]):
+    """Print the client-side generation cost section of a report"""
+    if report is None:
+        return
+    source = "loaded from cache" if report["loaded_from_cache"] else "generated"
+    print("\nClient-side Prompt Generation:")
+    print(f"  Prompt Pool: {report['prompts']} prompts {source} in {report['build_seconds']:.3f}s "
+          f"({report['serialized_bytes'] / 1e6:.1f} MB)")
+    print(f"  Per-request Body Handout: {report['average_handout_us']:.1f}us average "
+          f"over {report['bodies_handed_out']} requests")
+    if report.get("average_expected_tokens") is not None:
+        print(f"  Expected Prompt Tokens ({report['tokenizer']}): {report['average_expected_tokens']:.0f}")
@@ -0,0 +1,192 @@
+"""
+Client-side chat template prerendering
+Compiles the server's chat template (e.g. templates/qwen3coder.jinja2) once and renders
+conversations on the client, so requests can go to the raw /v1/completions endpoint or to
+llama.cpp's native /completion instead of having the server's front-end render and tokenize
+the whole conversation on every turn. The rendered prefix of every conversation, and its
+token ids when a tokenizer is loaded, is cached, so each turn of an append-only conversation
+only tokenizes the text that is new since the previous turn.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from histogram import LogHistogram
+from tokenizer_utils import load_chat_template, load_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Endpoint paths of the request APIs, relative to the server base URL
+API_ENDPOINTS = {
+    "chat": "/v1/chat/completions",  # Server renders the template and tokenizes
+    "completions": "/v1/completions",  # OpenAI-compatible raw prompt (vLLM, llama.cpp)
+    "llama": "/completion"  # llama.cpp native raw prompt
+}
+
+# Used to find the generation prompt the template appends (e.g. "<|im_start|>assistant\n")
+PROBE_MESSAGES = [{"role": "user", "content": "probe"}]
+
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    """Decode JSON tool call arguments into dicts, as vLLM does before rendering a template"""
+    normalized = []
+    for message in messages:
+        calls = message.get("tool_calls")
+        if calls and any(isinstance((call.get("function") or {}).get("arguments"), str) for call in calls):
+            message = dict(message, tool_calls=[
+                dict(call, function=dict(call["function"], arguments=json.loads(call["function"]["arguments"] or "{}")))
+                if isinstance((call.get("function") or {}).get("arguments"), str) else call
+                for call in calls
+            ])
+        normalized.append(message)
+    return normalized
+
+
+class ConversationRenderer:
+    def __init__(self, chat_template: str, tokenizer_name: Optional[str] = None,
+                 max_conversations: int = 1024):
+        self.chat_template = chat_template  # Path to the jinja2 template the server uses
+        self.template = load_chat_template(chat_template)  # Compiled once per process
+        self.tokenizer = load_tokenizer(tokenizer_name) if tokenizer_name else None  # None renders text only
+        self.max_conversations = max_conversations  # Cached prefixes kept, least recently used evicted
+        # conversation id -> (rendered text up to the last message, its token ids)
+        self.prefixes: "OrderedDict[object, Tuple[str, Optional[List[int]]]]" = OrderedDict()
+
+        base = self.render_text(PROBE_MESSAGES, add_generation_prompt=False)
+        full = self.render_text(PROBE_MESSAGES)
+        self.generation_prompt = full[len(base):] if full.startswith(base) else ""
+        self.generation_ids = self.encode(self.generation_prompt) if self.tokenizer and self.generation_prompt else []
+
+        self.render_time = LogHistogram()  # Seconds per template render
+        self.tokenize_time = LogHistogram()  # Seconds per (incremental) tokenization
+        self.renders = 0
+        self.prefix_hits = 0  # Renders that extended a cached prefix
+        self.reused_chars = 0
+        self.rendered_chars = 0
+        self.reused_tokens = 0
+        self.encoded_tokens = 0  # Tokens actually run through the tokenizer
+
+    def render_text(self, messages: List[Dict], tools: Optional[List[Dict]] = None,
+                    add_generation_prompt: bool = True) -> str:
+        """Render a conversation to the exact prompt text the server would build from it"""
+        return self.template.render(
+            messages=normalize_messages(messages),
+            tools=tools or [],
+            add_generation_prompt=add_generation_prompt,
+            bos_token=(self.tokenizer.bos_token or "") if self.tokenizer else "",
+            eos_token=(self.tokenizer.eos_token or "") if self.tokenizer else ""
+        )
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize rendered text; the template already placed every special token"""
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def render(self, conversation_id, messages: List[Dict],
+               tools: Optional[List[Dict]] = None) -> Tuple[str, Optional[List[int]]]:
+        """Render (and tokenize) a conversation ready for generation, reusing its cached prefix
+
+        The cached prefix ends right after a complete message, where chat templates put
+        special tokens, so tokenizing the cached and the new part separately gives the same
+        ids as tokenizing the whole prompt. A conversation that was edited rather than
+        extended no longer starts with its cached text and is tokenized from scratch.
+        """
+        started = time.perf_counter()
+        text = self.render_text(messages, tools)
+        self.render_time.record(time.perf_counter() - started)
+        self.renders += 1
+        self.rendered_chars += len(text)
+
+        cached_text, cached_ids = self.prefixes.pop(conversation_id, ("", []))
+        if cached_text and text.startswith(cached_text):
+            self.prefix_hits += 1
+            self.reused_chars += len(cached_text)
+        else:
+            cached_text, cached_ids = "", []
+        # The next turn appends to the conversation, not to the generation prompt
+        base_end = len(text) - len(self.generation_prompt) if text.endswith(self.generation_prompt) else len(text)
+
+        ids = None
+        base_ids = None
+        if self.tokenizer:
+            started = time.perf_counter()
+            new_ids = self.encode(text[len(cached_text):base_end])
+            base_ids = cached_ids + new_ids
+            ids = base_ids + (self.generation_ids if base_end < len(text) else [])
+            self.tokenize_time.record(time.perf_counter() - started)
+            self.reused_tokens += len(cached_ids)
+            self.encoded_tokens += len(new_ids)
+
+        self.prefixes[conversation_id] = (text[:base_end], base_ids)
+        while len(self.prefixes) > self.max_conversations:
+            self.prefixes.popitem(last=False)
+        return text, ids
+
+    def forget(self, conversation_id):
+        """Drop a finished conversation's cached prefix"""
+        self.prefixes.pop(conversation_id, None)
+
+    def report(self) -> Dict:
+        """Client-side rendering and tokenization cost"""
+        report = {
+            "renders": self.renders,
+            "prefix_hits": self.prefix_hits,
+            "reused_char_share": self.reused_chars / self.rendered_chars if self.rendered_chars else 0.0,
+            "render_ms": self.render_time.mean * 1000 if self.render_time.count else 0.0,
+            "tokenizer": self.tokenizer is not None
+        }
+        if self.tokenizer:
+            total = self.reused_tokens + self.encoded_tokens
+            report["reused_token_share"] = self.reused_tokens / total if total else 0.0
+            report["tokenize_ms"] = self.tokenize_time.mean * 1000 if self.tokenize_time.count else 0.0
+        return report
+
+
+def completion_payload(api: str, prompt: Union[str, List[int]], max_tokens: int, stream: bool = True,
+                       model: str = "kCode", temperature: float = 0.7) -> Dict:
+    """Request body for a prerendered prompt on the raw completion endpoints"""
+    if api == "llama":
+        # cache_prompt keeps llama.cpp's slot KV reuse, which the chat endpoint enables as well
+        return {"prompt": prompt, "n_predict": max_tokens, "temperature": temperature,
+                "stream": stream, "cache_prompt": True}
+    payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature,
+               "stream": stream}
+    if isinstance(prompt, str):
+        # The rendered text already carries the template's special tokens
+        payload["add_special_tokens"] = False
+    if stream:
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def parse_stream_chunk(api: str, chunk: Dict) -> Tuple[bool, Dict, Dict]:
+    """(produced output, usage, timings) of one streamed chunk of any of the APIs"""
+    if api == "llama":
+        usage = {}
+        if chunk.get("stop"):
+            usage = {"prompt_tokens": chunk.get("tokens_evaluated", 0),
+                     "completion_tokens": chunk.get("tokens_predicted", 0)}
+        return bool(chunk.get("content")), usage, chunk.get("timings") or {}
+    produced = False
+    for choice in chunk.get("choices") or []:
+        if api == "chat":
+            delta = choice.get("delta") or {}
+            produced = produced or bool(delta.get("content") or delta.get("reasoning_content") or delta.get("tool_calls"))
+        else:
+            produced = produced or bool(choice.get("text"))
+    return produced, chunk.get("usage") or {}, chunk.get("timings") or {}
+
+
+def print_render_report(report: Optional[Dict], label: str = ""):
+    """Print the client-side prerendering section of a report"""
+    if report is None or not report["renders"]:
+        return
+    print(f"\nClient-side Prerendering{label} ({report['renders']} renders):")
+    print(f"  Template Render: {report['render_ms']:.2f}ms average")
+    print(f"  Prefix Cache: {report['prefix_hits']} hits, {report['reused_char_share']:.1%} of the rendered "
+          f"text came from a cached conversation prefix")
+    if report["tokenizer"]:
+        print(f"  Tokenization: {report['tokenize_ms']:.2f}ms average, "
+              f"{report['reused_token_share']:.1%} of prompt token ids reused from the cache")
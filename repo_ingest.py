@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Streaming embedding ingest of a whole code repository
+Walks a directory tree lazily, splits every text file into overlapping token-bounded chunks
+that fit the embedding server's --max-model-len, and embeds them with kCodeEmbedding through
+MicroBatcher (base64 float32, a bounded number of batches in flight). Vectors are appended to
+a memory-mapped float32 file with a row-aligned chunk index (file id, line and character
+span), and every embedded file is recorded in an append-only manifest with its content hash.
+Memory stays bounded by the number of files in flight, not by the size of the repository.
+Re-running resumes incrementally: files whose size and mtime, or else content hash, are
+unchanged are skipped, changed files are re-embedded into new rows and deleted files are
+marked as such. Superseded rows stay in the vector file until the index is rebuilt.
+"""
+
+import asyncio
+import argparse
+import bisect
+import fnmatch
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import resource
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import aiohttp
+
+from embedding_codec import decode_embeddings
+from histogram import PERCENTILES
+from micro_batcher import MicroBatcher, embedding_batch_submitter
+from server_args import get_arg, read_args_file
+from tokenizer_utils import add_tokenizer_arguments, load_tokenizer, tokenizer_settings_from_args
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Same estimate the prompt generators use
+SPECIAL_TOKEN_RESERVE = 2  # Room for the special tokens the server adds around every input
+BINARY_SNIFF_BYTES = 8192  # A NUL byte in this many leading bytes marks a binary file
+GROWTH_ROWS = 16384  # Rows the vector file grows by when it is full
+DEFAULT_EXCLUDE_DIRS = ('.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+                        '.mypy_cache', '.pytest_cache', '.tox', 'build', 'dist')
+
+INDEX_META = "ingest.json"
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.idx"
+MANIFEST_FILE = "files.jsonl"
+# One row per vector: file id from the manifest, 1-based line span and character span in the file
+CHUNK_FIELDS = [("file", "<i4"), ("start_line", "<i4"), ("end_line", "<i4"),
+                ("start_char", "<i8"), ("end_char", "<i8")]
+
+
+def walk_files(root: str, include: List[str], exclude_dirs: Set[str],
+               max_file_bytes: int) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (relative path, stat) of candidate files, one directory listing at a time"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as scan:
+                entries = sorted(scan, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Cannot list {directory}: {e}")
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in exclude_dirs:
+                    subdirectories.append(entry.path)
+                continue
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            path = os.path.relpath(entry.path, root)
+            if include and not any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(entry.name, pattern)
+                                   for pattern in include):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if 0 < stat.st_size <= max_file_bytes:
+                yield path, stat
+        # Depth-first in name order, so runs walk the tree identically
+        stack.extend(reversed(subdirectories))
+
+
+class Chunker:
+    def __init__(self, chunk_tokens: int = 1024, overlap_tokens: int = 128, tokenizer_name: Optional[str] = None):
+        if not 0 <= overlap_tokens < chunk_tokens - SPECIAL_TOKEN_RESERVE:
+            raise ValueError("overlap must be smaller than the chunk size")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = load_tokenizer(tokenizer_name) if tokenizer_name else None  # None estimates from characters
+
+    def spans(self, text: str) -> Tuple[List[Tuple[int, int]], int]:
+        """Character spans of the overlapping chunks of a file, and their total tokens"""
+        windows = self.token_spans(text) if self.tokenizer else self.line_spans(text)
+        windows = [window for window in windows if text[window[0]:window[1]].strip()]
+        return [(start, end) for start, end, _ in windows], sum(tokens for _, _, tokens in windows)
+
+    def token_spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """Exact windows of the tokenized file, with their token counts"""
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        budget = self.chunk_tokens - SPECIAL_TOKEN_RESERVE
+        spans = []
+        for first in range(0, len(offsets), budget - self.overlap_tokens):
+            last = min(len(offsets), first + budget)
+            spans.append((offsets[first][0], offsets[last - 1][1], last - first))
+            if last == len(offsets):
+                break
+        return spans
+
+    def line_spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """Character-estimated windows, cut at line breaks where possible, with estimated token counts"""
+        max_chars = (self.chunk_tokens - SPECIAL_TOKEN_RESERVE) * CHARS_PER_TOKEN
+        overlap_chars = self.overlap_tokens * CHARS_PER_TOKEN
+        spans = []
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + max_chars)
+            if end < len(text):
+                # Prefer the last line break in the second half of the window
+                cut = text.rfind('\n', start + max_chars // 2, end)
+                if cut != -1:
+                    end = cut + 1
+            spans.append((start, end, max(1, (end - start) // CHARS_PER_TOKEN)))
+            if end == len(text):
+                break
+            next_start = max(end - overlap_chars, start + 1)
+            # The overlap starts at a line start when there is one inside it
+            line_break = text.find('\n', next_start, end)
+            start = line_break + 1 if line_break != -1 and line_break + 1 < end else next_start
+        return spans
+
+
+class IngestIndex:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.dimension: Optional[int] = None
+        self.capacity = 0
+        self.vectors = None  # (capacity x dimension) float32 memmap
+        self.chunks = None  # (capacity,) CHUNK_FIELDS memmap
+        self.files: Dict[str, Dict] = {}  # Latest manifest record of every path
+        self.rows = 0  # Rows referenced by the manifest; anything past them is overwritten
+        self.next_file_id = 0
+        os.makedirs(directory, exist_ok=True)
+
+        meta_path = self.path(INDEX_META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.map(meta["dimension"], meta["capacity"])
+        if os.path.exists(self.path(MANIFEST_FILE)):
+            with open(self.path(MANIFEST_FILE)) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves at most one torn last line
+                        continue
+                    self.files[record["path"]] = record
+                    self.rows = max(self.rows, record.get("first_row", 0) + record.get("rows", 0))
+                    self.next_file_id = max(self.next_file_id, record.get("id", -1) + 1)
+        live = sum(1 for record in self.files.values() if not record.get("deleted"))
+        if self.files:
+            logger.info(f"Index {directory}: {live} files, {self.rows} rows from previous runs")
+        self.manifest = open(self.path(MANIFEST_FILE), "a")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def map(self, dimension: int, capacity: int):
+        """(Re)map the vector and chunk files at a given capacity, growing them if needed"""
+        import numpy as np
+        self.flush()
+        self.dimension = dimension
+        self.capacity = capacity
+        chunk_dtype = np.dtype(CHUNK_FIELDS)
+        for name, row_bytes in ((VECTORS_FILE, dimension * 4), (CHUNKS_FILE, chunk_dtype.itemsize)):
+            with open(self.path(name), "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(self.path(VECTORS_FILE), dtype="<f4", mode="r+", shape=(capacity, dimension))
+        self.chunks = np.memmap(self.path(CHUNKS_FILE), dtype=chunk_dtype, mode="r+", shape=(capacity,))
+        with open(self.path(INDEX_META), "w") as f:
+            json.dump({"dimension": dimension, "capacity": capacity, "chunk_fields": CHUNK_FIELDS}, f)
+
+    def write(self, record: Dict):
+        """Append a manifest record; it is the commit point of a file"""
+        self.manifest.write(json.dumps(record) + "\n")
+        self.manifest.flush()
+        self.files[record["path"]] = record
+
+    def append_file(self, path: str, stat: os.stat_result, digest: str, matrix,
+                    spans: List[Tuple[int, int]], lines: List[Tuple[int, int]]) -> Dict:
+        """Store a file's vectors in contiguous rows, then commit it to the manifest
+
+        A file without chunks (matrix None) gets a record with no rows, so later runs skip it as unchanged.
+        """
+        first = self.rows
+        file_id = self.next_file_id
+        self.next_file_id += 1
+        if spans:
+            if self.dimension is None:
+                self.map(matrix.shape[1], GROWTH_ROWS)
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(f"Vectors of dimension {matrix.shape[1]} do not fit the index's {self.dimension}")
+            if first + len(matrix) > self.capacity:
+                self.map(self.dimension, max(first + len(matrix), self.capacity + GROWTH_ROWS))
+            self.vectors[first:first + len(matrix)] = matrix
+            rows = self.chunks[first:first + len(matrix)]
+            rows["file"] = file_id
+            rows["start_line"], rows["end_line"] = zip(*lines)
+            rows["start_char"], rows["end_char"] = zip(*spans)
+            self.rows += len(matrix)
+        record = {"id": file_id, "path": path, "hash": digest, "size": stat.st_size,
+                  "mtime_ns": stat.st_mtime_ns, "first_row": first, "rows": len(spans)}
+        self.write(record)
+        return record
+
+    def touch(self, path: str, stat: os.stat_result):
+        """Record the new mtime of a file whose content did not change"""
+        self.write(dict(self.files[path], size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+
+    def mark_deleted(self, path: str):
+        self.write({"path": path, "deleted": True})
+
+    def flush(self):
+        """Write dirty pages back to the vector and chunk files"""
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.chunks.flush()
+
+    def close(self):
+        self.flush()
+        self.manifest.close()
+
+
+def line_ranges(text: str, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """1-based first and last line of every character span"""
+    line_starts = [0] + [match.end() for match in re.finditer('\n', text)]
+    return [(bisect.bisect_right(line_starts, start), bisect.bisect_right(line_starts, max(start, end - 1)))
+            for start, end in spans]
+
+
+def read_file(path: str) -> Optional[bytes]:
+    """File contents, or None for a binary file"""
+    with open(path, "rb") as f:
+        content = f.read()
+    return None if b"\0" in content[:BINARY_SNIFF_BYTES] else content
+
+
+class RepoIngest:
+    def __init__(self, root: str, index: IngestIndex, chunker: Chunker,
+                 server_url: str = 'http://localhost:8001/v1/embeddings', model: str = 'kCodeEmbedding',
+                 batch_size: int = 32, concurrency: int = 8, file_workers: int = 16, max_wait: float = 0.01,
+                 request_timeout: int = 180, include: Optional[List[str]] = None,
+                 exclude_dirs: Tuple[str, ...] = DEFAULT_EXCLUDE_DIRS, max_file_bytes: int = 2_000_000):
+        self.root = root
+        self.index = index
+        self.chunker = chunker
+        self.server_url = server_url
+        self.model = model
+        self.batch_size = batch_size  # Chunks per embeddings request
+        self.concurrency = concurrency  # Embeddings requests in flight
+        self.file_workers = file_workers  # Files read, chunked and waiting for vectors at once
+        self.max_wait = max_wait
+        self.request_timeout = request_timeout
+        self.include = include or []
+        self.exclude_dirs = set(exclude_dirs)
+        self.max_file_bytes = max_file_bytes
+
+        self.batcher_report: Optional[Dict] = None
+        self.scanned = 0
+        self.embedded = 0
+        self.unchanged = 0
+        self.binary = 0
+        self.failed = 0
+        self.deleted = 0
+        self.chunk_count = 0
+        self.tokens = 0
+        self.wall_duration = 0.0
+
+    async def process_file(self, batcher: MicroBatcher, path: str, stat: os.stat_result):
+        """Embed one file unless it is unchanged since the last run"""
+        previous = self.index.files.get(path)
+        if previous and previous.get("deleted"):
+            previous = None
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            self.unchanged += 1
+            return
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, read_file, os.path.join(self.root, path))
+        if content is None:
+            self.binary += 1
+            return
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        if previous and previous["hash"] == digest:
+            self.index.touch(path, stat)
+            self.unchanged += 1
+            return
+
+        text = content.decode('utf-8', errors='replace')
+        # Tokenizing whole files is CPU work, keep it off the event loop
+        spans, tokens = await loop.run_in_executor(None, self.chunker.spans, text)
+        if not spans:
+            # Whitespace only: record it without rows so the next run does not read it again
+            self.index.append_file(path, stat, digest, None, spans, [])
+            return
+        chunks = [text[start:end] for start, end in spans]
+        vectors = await asyncio.gather(*(batcher.submit(chunk) for chunk in chunks))
+        matrix = decode_embeddings({"data": [{"index": i, "embedding": vector} for i, vector in enumerate(vectors)]},
+                                   "base64")
+        self.index.append_file(path, stat, digest, matrix, spans, line_ranges(text, spans))
+        self.embedded += 1
+        self.chunk_count += len(chunks)
+        self.tokens += tokens
+
+    async def run(self):
+        """Walk, chunk, embed and store the whole repository"""
+        seen: Set[str] = set()
+        files = walk_files(self.root, self.include, self.exclude_dirs, self.max_file_bytes)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        started = time.time()
+        async with aiohttp.ClientSession(connector=connector) as session:
+            submit = embedding_batch_submitter(session, self.server_url, self.model, self.request_timeout,
+                                               extra={"encoding_format": "base64"})
+            # Vectors arrive as base64 float32 strings, decoded per file into one matrix
+            batcher = MicroBatcher(submit, max_batch_size=self.batch_size,
+                                   max_wait=self.max_wait, max_concurrent_batches=self.concurrency)
+
+            async def worker():
+                # Workers share the lazy walk, so only file_workers files are in memory at once
+                for path, stat in files:
+                    seen.add(path)
+                    self.scanned += 1
+                    try:
+                        await self.process_file(batcher, path, stat)
+                    except Exception as e:
+                        # The file is not committed and is retried by the next run
+                        self.failed += 1
+                        logger.error(f"{path}: {type(e).__name__}: {e}")
+                    if self.scanned % 1000 == 0:
+                        logger.info(f"{self.scanned} files scanned, {self.embedded} embedded "
+                                    f"({self.chunk_count} chunks), {self.unchanged} unchanged")
+
+            await asyncio.gather(*(worker() for _ in range(self.file_workers)))
+            await batcher.close()
+            self.batcher_report = batcher.report()
+
+        for path, record in list(self.index.files.items()):
+            if path not in seen and not record.get("deleted"):
+                self.index.mark_deleted(path)
+                self.deleted += 1
+        self.index.flush()
+        self.wall_duration = time.time() - started
+
+    def print_report(self):
+        """Print throughput and index size"""
+        wall = self.wall_duration or 1e-9
+        index = self.index
+        print("\n=== REPOSITORY INGEST REPORT ===")
+        print(f"Root: {self.root}")
+        size = index.rows * (index.dimension or 0) * 4 / 1e6
+        print(f"Index: {index.directory} ({index.rows} rows of dimension {index.dimension or '-'}, {size:.1f} MB of vectors)")
+        print(f"Files: {self.scanned} scanned, {self.embedded} embedded, {self.unchanged} unchanged (skipped), "
+              f"{self.binary} binary, {self.failed} failed, {self.deleted} deleted")
+        token_label = "tokens" if self.chunker.tokenizer else "tokens (estimated)"
+        print(f"Chunks: {self.chunk_count} ({self.tokens} {token_label}, "
+              f"{self.chunk_count / self.embedded if self.embedded else 0:.1f} per embedded file)")
+        print(f"Wall Time: {self.wall_duration:.2f}s")
+        print(f"Throughput: {self.scanned / wall:.1f} files/s scanned, {self.embedded / wall:.1f} files/s embedded, "
+              f"{self.chunk_count / wall:.1f} chunks/s, {self.tokens / wall:.0f} {token_label}/s")
+        batches = self.batcher_report
+        if batches and batches["batches"]:
+            latency = batches["batch_latency"]
+            print(f"Batches: {batches['batches']} of {batches['average_batch_size']:.1f} chunks on average, "
+                  f"{batches['failed_batches']} failed, latency p50 {latency[50]:.3f}s p{PERCENTILES[2]:g} "
+                  f"{latency[PERCENTILES[2]]:.3f}s")
+        # ru_maxrss is in kilobytes on Linux
+        print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+def default_max_model_len(args_file: str) -> Optional[int]:
+    """Input limit the embedding server is started with"""
+    if not os.path.exists(args_file):
+        return None
+    value = get_arg(read_args_file(args_file), '--max-model-len')
+    return int(value) if value else None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Repository Embedding Ingest')
+    parser.add_argument('root',
+                       help='Repository directory to embed')
+    parser.add_argument('--index-dir', default='repo_index',
+                       help='Directory of the vector file, chunk index and manifest (default: repo_index)')
+    parser.add_argument('--server-url', default='http://localhost:8001/v1/embeddings',
+                       help='Embeddings endpoint (default: http://localhost:8001/v1/embeddings)')
+    parser.add_argument('--model', default='kCodeEmbedding',
+                       help='Served model name (default: kCodeEmbedding)')
+    parser.add_argument('--chunk-tokens', type=int, default=1024,
+                       help='Tokens per chunk, at most the server --max-model-len (default: 1024)')
+    parser.add_argument('--overlap-tokens', type=int, default=128,
+                       help='Tokens shared by consecutive chunks of a file (default: 128)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Chunks per embeddings request (default: 32)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                       help='Embeddings requests in flight (default: 8)')
+    parser.add_argument('--file-workers', type=int, default=16,
+                       help='Files being read, chunked and embedded at once; bounds memory (default: 16)')
+    parser.add_argument('--max-wait', type=float, default=0.01,
+                       help='Seconds a chunk waits for others to fill its batch (default: 0.01)')
+    parser.add_argument('--include', action='append', default=[],
+                       help='Only embed files matching this glob, e.g. "*.py"; repeatable (default: every text file)')
+    parser.add_argument('--exclude-dir', action='append', default=[],
+                       help=f'Also skip directories with this name; repeatable (always skipped: {", ".join(DEFAULT_EXCLUDE_DIRS)})')
+    parser.add_argument('--max-file-bytes', type=int, default=2_000_000,
+                       help='Skip files larger than this, typically generated or data files (default: 2000000)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    add_tokenizer_arguments(parser, 'vllm_args_embedding.sh')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a directory")
+    max_model_len = default_max_model_len(args.server_args)
+    if max_model_len and args.chunk_tokens > max_model_len:
+        parser.error(f"--chunk-tokens {args.chunk_tokens} exceeds --max-model-len {max_model_len} of {args.server_args}")
+    if not 0 <= args.overlap_tokens < args.chunk_tokens - SPECIAL_TOKEN_RESERVE:
+        parser.error("--overlap-tokens must be smaller than --chunk-tokens")
+
+    exclude_dirs = DEFAULT_EXCLUDE_DIRS + tuple(args.exclude_dir)
+    index_parent = os.path.relpath(os.path.abspath(args.index_dir), os.path.abspath(args.root))
+    if not index_parent.startswith(os.pardir):
+        # Never embed the index itself
+        exclude_dirs += (os.path.basename(os.path.normpath(args.index_dir)),)
+
+    settings = tokenizer_settings_from_args(args, use_chat_template=False)
+    chunker = Chunker(args.chunk_tokens, args.overlap_tokens, settings["tokenizer"] if settings else None)
+    index = IngestIndex(args.index_dir)
+    ingest = RepoIngest(
+        root=args.root,
+        index=index,
+        chunker=chunker,
+        server_url=args.server_url,
+        model=args.model,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        file_workers=args.file_workers,
+        max_wait=args.max_wait,
+        request_timeout=args.request_timeout,
+        include=args.include,
+        exclude_dirs=exclude_dirs,
+        max_file_bytes=args.max_file_bytes
+    )
+    logger.info(f"Embedding {args.root} into {args.index_dir}: {args.chunk_tokens}-token chunks, "
+                f"{args.overlap_tokens} overlap, batches of {args.batch_size}, {args.concurrency} in flight")
+    try:
+        await ingest.run()
+    finally:
+        index.close()
+    ingest.print_report()
+
+if __name__ == "__main__":
+    try:
+        import aiohttp
+        if importlib.util.find_spec("numpy") is None:
+            raise ImportError("numpy is not installed")
+        asyncio.run(main())
+    except ImportError:
+        print("Error: aiohttp and numpy are required for this script.")
+        print("Please install them with: pip install aiohttp numpy")
+        exit(1)
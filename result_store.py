@@ -0,0 +1,144 @@
+"""
+Columnar per-request result store for the stress testers
+Every finished request is appended to fixed-width little-endian column files
+(<column>-<shard>.bin, one shard per worker process) in batches during the run, next to a
+meta.json carrying the run metadata: server args file contents, mode, model and command line.
+Runs are loaded back with numpy memory mapping (see compare_runs.py).
+"""
+
+import json
+import logging
+import math
+import os
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from server_args import get_arg, read_args_file
+
+logger = logging.getLogger(__name__)
+
+# (column, array typecode, numpy dtype); missing values are NaN for floats and -1 for integers
+COLUMNS = (
+    ("request_id", "i", "<i4"),
+    ("start_time", "d", "<f8"),
+    ("success", "b", "i1"),
+    ("duration", "f", "<f4"),
+    ("ttft", "f", "<f4"),
+    ("tpot", "f", "<f4"),
+    ("tokens_per_sec", "f", "<f4"),
+    ("prompt_tokens", "i", "<i4"),
+    ("completion_tokens", "i", "<i4"),
+    ("cached_tokens", "i", "<i4"),
+)
+BATCH_SIZE = 1024  # Rows buffered in memory before they are appended to the column files
+META_FILE = "meta.json"
+
+
+class ResultWriter:
+    def __init__(self, directory: str, shard: int = 0, batch_size: int = BATCH_SIZE):
+        self.directory = directory
+        self.shard = shard  # Worker index; every process appends to its own column files
+        self.batch_size = batch_size
+        self.buffers = {name: array(typecode) for name, typecode, _ in COLUMNS}
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, result: Dict):
+        """Buffer one request result, flushing a full batch to disk"""
+        success = result.get("status") == "SUCCESS"
+        for name, typecode, _ in COLUMNS:
+            if name == "success":
+                value = int(success)
+            else:
+                value = result.get(name)
+                # TTFT / TPOT of zero mean "not measured" (non-streaming or failed requests)
+                if value is None or (name in ("ttft", "tpot") and not value):
+                    value = math.nan if typecode in "fd" else -1
+            self.buffers[name].append(value)
+        self.rows += 1
+        if len(self.buffers["request_id"]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the column files"""
+        if not len(self.buffers["request_id"]):
+            return
+        for name, _, _ in COLUMNS:
+            buffer = self.buffers[name]
+            if sys.byteorder != "little":
+                buffer.byteswap()
+            with open(os.path.join(self.directory, f"{name}-{self.shard}.bin"), "ab") as f:
+                buffer.tofile(f)
+            del buffer[:]
+
+    def close(self):
+        """Flush whatever is still buffered"""
+        self.flush()
+
+
+def run_metadata(tester: str, mode: Optional[str], args_file: Optional[str], served_model: str) -> Dict:
+    """Describe a run: tester, mode, model and the exact server arguments it ran against"""
+    metadata = {
+        "tester": tester,
+        "mode": mode,
+        "served_model": served_model,
+        "model": None,
+        "args_file": args_file,
+        "args_file_contents": None,
+        "command_line": sys.argv,
+        "created": time.time()
+    }
+    if args_file and os.path.exists(args_file):
+        with open(args_file) as f:
+            metadata["args_file_contents"] = f.read()
+        metadata["model"] = get_arg(read_args_file(args_file), '--model', '-m')
+    return metadata
+
+
+def write_run_metadata(directory: str, metadata: Dict):
+    """Write meta.json with the run metadata and column layout"""
+    if os.path.exists(os.path.join(directory, META_FILE)):
+        raise ValueError(f"{directory} already holds a stored run, pick a new --results-dir")
+    os.makedirs(directory, exist_ok=True)
+    metadata = dict(metadata, columns={name: dtype for name, _, dtype in COLUMNS})
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def load_run(directory: str) -> Dict:
+    """Load a run as {"meta": ..., "columns": {name: numpy array}} using memory mapping"""
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("Loading result stores requires numpy: pip install numpy")
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    shards = sorted({entry.rsplit("-", 1)[1][:-len(".bin")] for entry in os.listdir(directory)
+                     if entry.endswith(".bin") and "-" in entry})
+    parts: Dict[str, List] = {name: [] for name in meta["columns"]}
+    for shard in shards:
+        paths = {name: os.path.join(directory, f"{name}-{shard}.bin") for name in meta["columns"]}
+        # A worker killed mid-flush can leave columns of unequal length, keep the complete rows
+        rows = min(os.path.getsize(path) // np.dtype(meta["columns"][name]).itemsize
+                   if os.path.exists(path) else 0 for name, path in paths.items())
+        if not rows:
+            continue
+        for name, path in paths.items():
+            parts[name].append(np.memmap(path, dtype=meta["columns"][name], mode="r", shape=(rows,)))
+    # A single shard stays memory mapped, several are concatenated
+    columns = {}
+    for name, dtype in meta["columns"].items():
+        if not parts[name]:
+            columns[name] = np.empty(0, dtype=dtype)
+        else:
+            columns[name] = parts[name][0] if len(parts[name]) == 1 else np.concatenate(parts[name])
+    return {"meta": meta, "columns": columns, "rows": len(columns["request_id"])}
+
+
+def add_results_arguments(parser):
+    """Register the result store options shared by the stress testers"""
+    parser.add_argument('--results-dir', type=str, default=None,
+                       help='Append every request to columnar files in this directory for compare_runs.py '
+                            '(default: do not store per-request results)')
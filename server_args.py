@@ -0,0 +1,64 @@
+"""
+Helpers for the server argument files (vllm_args.sh, llama_args.sh, vllm_args_embedding.sh)
+Parses them exactly like run_vllm.sh / run_llama.sh do: comment and empty lines are skipped
+and every other line is split on whitespace into arguments
+"""
+
+import re
+from typing import List, Optional
+
+# A token that starts a new flag; anything else (including negative numbers) is a value
+FLAG_PATTERN = re.compile(r"^--?[A-Za-z]")
+
+
+def parse_args_text(text: str) -> List[str]:
+    """Split the contents of an args file into a flat argument list"""
+    args = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        # Skip comment lines (starting with #) and empty lines
+        if not stripped or stripped.startswith('#'):
+            continue
+        args.extend(stripped.split())
+    return args
+
+
+def read_args_file(path: str) -> List[str]:
+    """Read an args file into a flat argument list"""
+    with open(path) as f:
+        return parse_args_text(f.read())
+
+
+def get_arg(args: List[str], *names: str, default: Optional[str] = None) -> Optional[str]:
+    """Return the value following the last occurrence of any of the given flags"""
+    value = default
+    for i, arg in enumerate(args[:-1]):
+        if arg in names:
+            value = args[i + 1]
+    return value
+
+
+def set_arg(args: List[str], name: str, value: str) -> List[str]:
+    """Return a copy of args with a flag's value replaced (or appended if missing)"""
+    args = list(args)
+    for i, arg in enumerate(args[:-1]):
+        if arg == name:
+            args[i + 1] = value
+            return args
+    return args + [name, value]
+
+
+def apply_overrides(args: List[str], overrides: List[str]) -> List[str]:
+    """Return a copy of args with '--flag value' pairs and bare '--flag' switches applied"""
+    args = list(args)
+    i = 0
+    while i < len(overrides):
+        name = overrides[i]
+        if i + 1 < len(overrides) and not FLAG_PATTERN.match(overrides[i + 1]):
+            args = set_arg(args, name, overrides[i + 1])
+            i += 2
+            continue
+        if name not in args:
+            args.append(name)
+        i += 1
+    return args
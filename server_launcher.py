@@ -0,0 +1,111 @@
+"""
+Pluggable server launchers for the sweep driver
+A launcher starts an inference server with a given argument list, waits until it answers
+its /health endpoint and stops it again, so server-side argument variants can be
+benchmarked back to back. The "mock" launcher runs mock_server.py instead of a real server.
+"""
+
+import asyncio
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Same invocations as run_vllm.sh / run_llama.sh
+DEFAULT_COMMANDS = {
+    "vllm": ["uv", "run", "vllm", "serve",
+             "--compilation-config", '{"cache_dir": "/mnt/llm-data/.cache/vllm"}',
+             "--kv-transfer-config", '{"numa_mode":"auto", "kv_role":"kv_both"}'],
+    "llama": ["./llama.cpp/build/bin/llama-server"]
+}
+
+
+def server_base_url(server_url: str) -> str:
+    """Return scheme://host:port of an endpoint URL such as .../v1/chat/completions"""
+    parts = urlsplit(server_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def server_kind(args_file: str) -> str:
+    """Guess which server an args file is for from its name (llama_args.sh vs vllm_args.sh)"""
+    return "llama" if "llama" in os.path.basename(args_file) else "vllm"
+
+
+class CommandLauncher:
+    def __init__(self, command: List[str], server_url: str, startup_timeout: float = 900,
+                 log_path: Optional[str] = None, env: Optional[Dict[str, str]] = None):
+        self.command = command  # Server executable and fixed arguments; variant arguments are appended
+        self.health_url = server_base_url(server_url) + "/health"
+        self.startup_timeout = startup_timeout  # Model loading and graph capture can take minutes
+        self.log_path = log_path  # Server output goes here (discarded when None)
+        self.env = env or {}
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self, server_args: List[str]):
+        """Start the server process in its own process group"""
+        output = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+        logger.info(f"Launching: {shlex.join(self.command + server_args)}")
+        self.process = subprocess.Popen(
+            self.command + server_args,
+            stdout=output, stderr=subprocess.STDOUT,
+            env={**os.environ, "CUDA_DISABLE_PERF_BOOST": "1", **self.env},
+            start_new_session=True
+        )
+        if output is not subprocess.DEVNULL:
+            output.close()
+
+    async def wait_ready(self):
+        """Poll /health until the server answers 200, failing early if the process exits"""
+        deadline = time.time() + self.startup_timeout
+        async with aiohttp.ClientSession() as session:
+            while time.time() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {self.process.returncode} during startup")
+                try:
+                    async with session.get(self.health_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                        if response.status == 200:
+                            logger.info("Server is ready")
+                            return
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                await asyncio.sleep(2)
+        raise RuntimeError(f"Server not ready after {self.startup_timeout:.0f}s")
+
+    def stop(self):
+        """Terminate the whole process group, killing it if it does not exit in time"""
+        if self.process is None or self.process.poll() is not None:
+            return
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            logger.warning("Server did not stop after SIGTERM, killing it")
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        self.process = None
+
+
+def create_launcher(name: str, args_file: str, server_url: str, command: Optional[str] = None,
+                    startup_timeout: float = 900, log_path: Optional[str] = None):
+    """Build a launcher by name for the server an args file belongs to"""
+    if name == "command":
+        return CommandLauncher(shlex.split(command) if command else DEFAULT_COMMANDS[server_kind(args_file)],
+                               server_url, startup_timeout=startup_timeout, log_path=log_path)
+    if name == "mock":
+        # The mock server accepts (and mostly ignores) the real server arguments
+        mock_server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+        return CommandLauncher([sys.executable, mock_server], server_url,
+                               startup_timeout=startup_timeout, log_path=log_path)
+    raise ValueError(f"Unknown launcher: {name}")
+
+
+LAUNCHERS = ("command", "mock")
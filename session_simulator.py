@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Multi-turn agentic session simulator for self-hosted LLM server
+Runs concurrent coding-agent style sessions: every turn sends the whole conversation with
+tool definitions, feeds the real assistant reply (and synthetic tool results) back into the
+next request and waits a think time in between, so context grows turn by turn.
+Reports per-turn latency as the context grows and how well per-session KV reuse holds up.
+"""
+
+import asyncio
+import argparse
+import json
+import os
+import random
+import time
+import aiohttp
+import logging
+from typing import Dict, List, Optional
+
+from histogram import PERCENTILES, LogHistogram, ResultAggregator
+from prompt_pool import generate_long_message
+from server_args import get_arg, read_args_file
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Tool definitions of a typical coding agent (OpenAI function calling format)
+AGENT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Read the contents of a file in the repository",
+            "parameters": {
+                "type": "object",
+                "properties": {"path": {"type": "string", "description": "Path relative to the repository root"}},
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_code",
+            "description": "Search the repository for a regular expression",
+            "parameters": {
+                "type": "object",
+                "properties": {"pattern": {"type": "string", "description": "Regular expression to search for"}},
+                "required": ["pattern"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "run_shell",
+            "description": "Run a shell command in the repository and return its output",
+            "parameters": {
+                "type": "object",
+                "properties": {"command": {"type": "string", "description": "Command line to execute"}},
+                "required": ["command"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "edit_file",
+            "description": "Replace a snippet of a file with new text",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Path relative to the repository root"},
+                    "old_text": {"type": "string", "description": "Exact text to replace"},
+                    "new_text": {"type": "string", "description": "Replacement text"}
+                },
+                "required": ["path", "old_text", "new_text"]
+            }
+        }
+    }
+]
+
+SYSTEM_PROMPT = ("You are a coding agent working in a software repository. Use the tools to inspect "
+                 "and change the code, call one tool at a time, and explain your changes briefly.")
+
+
+def default_max_model_len(args_file: str = 'vllm_args.sh') -> int:
+    """Context limit the server is started with (--max-model-len or llama.cpp -c)"""
+    if os.path.exists(args_file):
+        value = get_arg(read_args_file(args_file), '--max-model-len', '-c', '--ctx-size')
+        if value:
+            return int(value)
+    return 90000
+
+
+class SessionSimulator:
+    def __init__(self, server_url: str, sessions: int = 4, turns: int = 20,
+                 request_timeout: int = 300, max_tokens: int = 256,
+                 system_tokens: int = 2000, task_tokens: int = 500,
+                 tool_result_tokens: int = 1500, user_tokens: int = 200,
+                 think_time: float = 2.0, max_model_len: int = 90000,
+                 tools: bool = True, seed: Optional[int] = None):
+        self.server_url = server_url
+        self.sessions = sessions  # Concurrent sessions
+        self.turns = turns  # Turns per session
+        self.request_timeout = request_timeout
+        self.max_tokens = max_tokens
+        self.system_tokens = system_tokens  # Shared system prompt / repository overview
+        self.task_tokens = task_tokens  # Unique first user message of each session
+        self.tool_result_tokens = tool_result_tokens  # Size of every synthetic tool result
+        self.user_tokens = user_tokens  # Follow-up user message when the model stops calling tools
+        self.think_time = think_time  # Mean (exponential) pause between turns
+        self.max_model_len = max_model_len  # Sessions end before their context would overflow
+        self.tools = tools
+        self.random = random.Random(seed)
+
+        # Shared by every session, like the system prompt of a real agent
+        self.system_prompt = SYSTEM_PROMPT + "\n\n" + generate_long_message(system_tokens, self.random)
+
+        # One aggregator per turn index so latency can be followed as context grows
+        self.turn_stats: List[ResultAggregator] = [ResultAggregator() for _ in range(turns)]
+        # Cached prompt tokens as a fraction of the previous turn's context (server-reported)
+        self.turn_reuse: List[LogHistogram] = [LogHistogram() for _ in range(turns)]
+        self.sessions_completed = 0
+        self.sessions_context_limited = 0
+        self.sessions_failed = 0
+        self.tool_calls = 0
+        self.wall_duration = 0
+
+    def build_payload(self, messages: List[Dict]) -> Dict:
+        """Build the streaming chat completion payload for a conversation"""
+        payload = {
+            "model": "kCode",
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": 0.7,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        if self.tools:
+            payload["tools"] = AGENT_TOOLS
+            payload["tool_choice"] = "auto"
+        return payload
+
+    async def read_message_stream(self, response: aiohttp.ClientResponse) -> Dict:
+        """Consume an SSE chat completion stream, assembling the assistant message and token times"""
+        if response.status != 200:
+            body = await response.text()
+            raise RuntimeError(f"HTTP {response.status}: {body[:200]}")
+
+        usage = {}
+        timings = {}
+        token_times = []
+        content = []
+        tool_calls: Dict[int, Dict] = {}
+        async for raw_line in response.content:
+            line = raw_line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            chunk = json.loads(data)
+
+            if chunk.get('usage'):
+                usage = chunk['usage']
+            if chunk.get('timings'):
+                timings = chunk['timings']
+            for choice in chunk.get('choices') or []:
+                delta = choice.get('delta') or {}
+                if delta.get('content') or delta.get('reasoning_content') or delta.get('tool_calls'):
+                    token_times.append(time.time())
+                if delta.get('content'):
+                    content.append(delta['content'])
+                # Tool calls arrive as fragments keyed by index: id and name first, then argument pieces
+                for fragment in delta.get('tool_calls') or []:
+                    call = tool_calls.setdefault(fragment.get('index', len(tool_calls)), {
+                        "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                    })
+                    if fragment.get('id'):
+                        call["id"] = fragment['id']
+                    function = fragment.get('function') or {}
+                    call["function"]["name"] += function.get('name') or ""
+                    call["function"]["arguments"] += function.get('arguments') or ""
+
+        message = {"role": "assistant", "content": "".join(content)}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+        return {"usage": usage, "timings": timings, "token_times": token_times, "message": message}
+
+    def tool_result(self, call: Dict) -> str:
+        """Synthetic output of a tool call, sized like a file read or command output"""
+        name = call["function"]["name"] or "tool"
+        size = max(1, round(self.rng_size(self.tool_result_tokens)))
+        return f"[{name} output]\n" + generate_long_message(size, self.random)
+
+    def rng_size(self, mean: int) -> float:
+        """Vary a message size by +/- 50% around its mean"""
+        return mean * self.random.uniform(0.5, 1.5)
+
+    async def send_turn(self, session: aiohttp.ClientSession, session_id: int, turn: int,
+                        messages: List[Dict]) -> Dict:
+        """Send one turn of a conversation and return timing, token and reply information"""
+        start_time = time.time()
+        body = json.dumps(self.build_payload(messages)).encode()
+        try:
+            async with session.post(self.server_url, data=body, headers=JSON_HEADERS,
+                                    timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+                response_data = await self.read_message_stream(response)
+
+            end_time = time.time()
+            duration = end_time - start_time
+            usage = response_data["usage"]
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+            cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+            if cached_tokens is None and response_data["timings"]:
+                cached_tokens = response_data["timings"].get('cache_n')
+
+            token_times = response_data["token_times"]
+            ttft = token_times[0] - start_time if token_times else duration
+            tpot = (end_time - token_times[0]) / (completion_tokens - 1) if token_times and completion_tokens > 1 else 0
+            result = {
+                "session_id": session_id,
+                "turn": turn,
+                "status": "SUCCESS",
+                "duration": duration,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": usage.get('total_tokens', prompt_tokens + completion_tokens),
+                "tokens_per_sec": 1 / tpot if tpot > 0 else 0,
+                "ttft": ttft,
+                "tpot": tpot,
+                "inter_token_latencies": [b - a for a, b in zip(token_times, token_times[1:])],
+                "cached_tokens": cached_tokens,
+                "message": response_data["message"]
+            }
+            logger.info(f"Session {session_id} turn {turn + 1}: context {prompt_tokens} tokens, "
+                        f"TTFT {ttft:.3f}s, {completion_tokens} completion tokens, "
+                        f"{len(result['message'].get('tool_calls', []))} tool call(s)")
+            return result
+
+        except Exception as e:
+            duration = time.time() - start_time
+            logger.error(f"Session {session_id} turn {turn + 1}: FAILED (Time: {duration:.3f}s, Error: {str(e)})")
+            return {
+                "session_id": session_id,
+                "turn": turn,
+                "status": "FAILED",
+                "duration": duration,
+                "error": str(e),
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "tokens_per_sec": 0,
+                "ttft": 0,
+                "tpot": 0,
+                "inter_token_latencies": [],
+                "cached_tokens": None
+            }
+
+    async def run_session(self, session: aiohttp.ClientSession, session_id: int):
+        """Run one agent session until it has done all its turns or runs out of context"""
+        # Stagger session starts so they do not all prefill in lockstep
+        await asyncio.sleep(self.random.uniform(0, self.think_time))
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"Task {session_id}: " + generate_long_message(self.task_tokens, self.random)}
+        ]
+        previous_context = 0
+        for turn in range(self.turns):
+            result = await self.send_turn(session, session_id, turn, messages)
+            message = result.pop("message", None)
+            self.turn_stats[turn].record(result)
+            if message is None:
+                # Without a reply the conversation cannot continue
+                self.sessions_failed += 1
+                return
+            if turn > 0 and result["cached_tokens"] is not None and previous_context:
+                self.turn_reuse[turn].record(min(1.0, result["cached_tokens"] / previous_context))
+            previous_context = result["total_tokens"]
+
+            # Servers may stream a tool call without an id; the assistant message and its tool
+            # replies must agree, so every such call gets its own id before either is sent back
+            for index, call in enumerate(message.get("tool_calls", [])):
+                if not call["id"]:
+                    call["id"] = f"call_{session_id}_{turn}_{index}"
+
+            # Feed the real reply back, answering every tool call it made
+            messages.append(message)
+            growth = 0
+            for call in message.get("tool_calls", []):
+                output = self.tool_result(call)
+                messages.append({"role": "tool", "tool_call_id": call["id"], "content": output})
+                growth += len(output) // 4
+                self.tool_calls += 1
+            if not message.get("tool_calls"):
+                follow_up = generate_long_message(max(1, round(self.rng_size(self.user_tokens))), self.random)
+                messages.append({"role": "user", "content": "Continue with the next step. " + follow_up})
+                growth += len(follow_up) // 4
+
+            if previous_context + growth + self.max_tokens > self.max_model_len:
+                logger.info(f"Session {session_id}: context limit reached after {turn + 1} turns")
+                self.sessions_context_limited += 1
+                return
+            if turn + 1 < self.turns:
+                await asyncio.sleep(self.random.expovariate(1 / self.think_time) if self.think_time > 0 else 0)
+        self.sessions_completed += 1
+
+    async def run(self):
+        """Run all sessions concurrently"""
+        # One connection per session: requests of a session are strictly sequential
+        connector = aiohttp.TCPConnector(limit=self.sessions)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            logger.info("Configuration:")
+            logger.info(f"  Server URL: {self.server_url}")
+            logger.info(f"  Sessions: {self.sessions} concurrent, {self.turns} turns each")
+            logger.info(f"  Tools: {'Enabled (' + str(len(AGENT_TOOLS)) + ' definitions)' if self.tools else 'Disabled'}")
+            logger.info(f"  System Prompt: ~{self.system_tokens} tokens (shared), Task: ~{self.task_tokens} tokens")
+            logger.info(f"  Tool Result: ~{self.tool_result_tokens} tokens, Follow-up: ~{self.user_tokens} tokens")
+            logger.info(f"  Max Tokens per Turn: {self.max_tokens}")
+            logger.info(f"  Think Time: {self.think_time}s mean")
+            logger.info(f"  Max Model Length: {self.max_model_len} tokens")
+            logger.info("")
+
+            run_start = time.time()
+            await asyncio.gather(*(self.run_session(session, session_id) for session_id in range(1, self.sessions + 1)),
+                                 return_exceptions=True)
+            self.wall_duration = time.time() - run_start
+
+    def print_report(self):
+        """Print per-turn latency against the growing context"""
+        print("\n=== SESSION SIMULATION REPORT ===")
+        print(f"Sessions: {self.sessions} ({self.sessions_completed} completed, "
+              f"{self.sessions_context_limited} hit the context limit, {self.sessions_failed} failed)")
+        print(f"Tool Calls Answered: {self.tool_calls}")
+        print(f"Wall Time: {self.wall_duration:.2f}s")
+
+        header = (f"{'Turn':>4} {'OK':>7} {'Context':>8} {'Cached':>7} {'Reuse':>6} "
+                  + "".join(f"{'TTFT p' + format(q, 'g'):>12}" for q in PERCENTILES)
+                  + f" {'TPOT p50':>9} {'Duration p50':>13}")
+        print("\nPer-Turn Latency (seconds):")
+        print(header)
+        print("-" * len(header))
+        for turn, aggregator in enumerate(self.turn_stats):
+            if not aggregator.total_requests:
+                break
+            line = f"{turn + 1:>4} {aggregator.successful_requests:>3}/{aggregator.total_requests:<3}"
+            prompt = aggregator.histogram('prompt_tokens')
+            if not prompt:
+                print(line)
+                continue
+            cached = aggregator.histogram('cached_tokens')
+            reuse = self.turn_reuse[turn]
+            line += f" {prompt.mean:>8.0f}"
+            line += f" {cached.mean:>7.0f}" if cached else f" {'n/a':>7}"
+            line += f" {reuse.mean:>6.0%}" if reuse.count else f" {'-':>6}"
+            ttft = aggregator.histogram('ttft')
+            line += "".join(f"{ttft.percentile(q):>12.3f}" for q in PERCENTILES) if ttft else "".join(f"{'-':>12}" for _ in PERCENTILES)
+            tpot = aggregator.histogram('tpot')
+            line += f" {tpot.percentile(50):>9.4f}" if tpot else f" {'-':>9}"
+            line += f" {aggregator.histograms['duration'].percentile(50):>13.3f}"
+            print(line)
+
+        print("\nContext: average prompt tokens of the turn. Cached: server-reported prefix-cache hits.")
+        print("Reuse: cached tokens as a share of the previous turn's context; a drop under load means")
+        print("sessions are evicting each other's KV cache between turns.")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Multi-turn Agentic Session Simulator')
+    parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Server URL (default: http://localhost:8000/v1/chat/completions)')
+    parser.add_argument('--sessions', type=int, default=4,
+                       help='Number of concurrent sessions (default: 4)')
+    parser.add_argument('--turns', type=int, default=20,
+                       help='Turns per session (default: 20)')
+    parser.add_argument('--request-timeout', type=int, default=300,
+                       help='Request timeout in seconds (default: 300)')
+    parser.add_argument('--max-tokens', type=int, default=256,
+                       help='Maximum tokens generated per turn (default: 256)')
+    parser.add_argument('--system-tokens', type=int, default=2000,
+                       help='Size of the shared system prompt (default: 2000)')
+    parser.add_argument('--task-tokens', type=int, default=500,
+                       help='Size of the first user message of each session (default: 500)')
+    parser.add_argument('--tool-result-tokens', type=int, default=1500,
+                       help='Average size of a tool result fed back to the model (default: 1500)')
+    parser.add_argument('--user-tokens', type=int, default=200,
+                       help='Average size of a follow-up user message when no tool is called (default: 200)')
+    parser.add_argument('--think-time', type=float, default=2.0,
+                       help='Mean pause between turns in seconds, exponentially distributed (default: 2.0)')
+    parser.add_argument('--max-model-len', type=int, default=None,
+                       help='Context limit of the server (default: --max-model-len from vllm_args.sh)')
+    parser.add_argument('--no-tools', action='store_true',
+                       help='Do not send tool definitions')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for generated messages and think times (default: random)')
+
+    args = parser.parse_args()
+
+    simulator = SessionSimulator(
+        server_url=args.server_url,
+        sessions=args.sessions,
+        turns=args.turns,
+        request_timeout=args.request_timeout,
+        max_tokens=args.max_tokens,
+        system_tokens=args.system_tokens,
+        task_tokens=args.task_tokens,
+        tool_result_tokens=args.tool_result_tokens,
+        user_tokens=args.user_tokens,
+        think_time=args.think_time,
+        max_model_len=args.max_model_len or default_max_model_len(),
+        tools=not args.no_tools,
+        seed=args.seed
+    )
+
+    logger.info("Starting session simulation...")
+    await simulator.run()
+    simulator.print_report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Long-duration soak test for self-hosted LLM server
+Runs the LLM stress tester for a wall-clock duration (e.g. --duration 8h) instead of a request
+count, with flat client memory: every --window the request statistics are rotated out into a
+small window summary (throughput, latency percentiles, error rate and kinds, server KV usage,
+queue depth and RSS, client RSS) that is appended to a checkpoint directory. Each metric is
+then tested for drift over the soak with a Mann-Kendall trend test and a Theil-Sen slope, so
+slow degradation such as KV-offload (LMCache) fragmentation, slot-cache growth from
+--ctx-checkpoints / -cram or memory creep is reported only when it is statistically significant
+and large enough to matter. An interrupted soak loses at most one window and can be resumed
+(--resume) or analyzed without sending anything (--analyze).
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from arrival import add_arrival_arguments, schedule_from_args
+from histogram import PERCENTILES, ResultAggregator
+from metrics_scraper import MetricsScraper
+from prompt_pool import add_prompt_pool_arguments
+from stress_test_llm import LLMStressTester
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TAIL = PERCENTILES[2]  # Tail percentile tracked per window (99)
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+TABLE_ROWS = 24  # Evenly spaced windows shown in the report
+STATE_FILE = "soak.json"
+WINDOWS_FILE = "windows.jsonl"
+# Arguments that define the workload; a resumed soak takes them from its checkpoint
+WORKLOAD_ARGS = ('server_url', 'duration', 'window', 'concurrent_requests', 'rate', 'arrival', 'gamma_shape',
+                 'burst_factor', 'burst_period', 'burst_duration', 'arrival_seed', 'context_size', 'max_tokens',
+                 'request_timeout', 'prompt_pool_size', 'prompt_cache', 'no_server_metrics', 'metrics_interval')
+# Window metric -> (label, True when an increase is a degradation, value format)
+DRIFT_METRICS = {
+    "request_rate": ("Requests/s", False, "{:.2f}"),
+    "output_tokens_per_sec": ("Output Tok/s", False, "{:.1f}"),
+    "error_rate": ("Error Rate", True, "{:.2%}"),
+    "ttft_p50": ("TTFT p50 (s)", True, "{:.3f}"),
+    f"ttft_p{TAIL:g}": (f"TTFT p{TAIL:g} (s)", True, "{:.3f}"),
+    "tpot_p50": ("TPOT p50 (s)", True, "{:.4f}"),
+    f"tpot_p{TAIL:g}": (f"TPOT p{TAIL:g} (s)", True, "{:.4f}"),
+    f"latency_p{TAIL:g}": (f"Latency p{TAIL:g} (s)", True, "{:.2f}"),
+    "kv_usage": ("Server KV Usage", True, "{:.1%}"),
+    "server_rss_mb": ("Server RSS (MB)", True, "{:.0f}"),
+    "client_rss_mb": ("Client RSS (MB)", True, "{:.0f}"),
+}
+ABSOLUTE_METRICS = ("error_rate",)  # Judged on the change in percentage points, not relative change
+
+
+def parse_duration(text: str) -> float:
+    """Seconds of a duration like 8h, 90m, 1h30m or 3600"""
+    parts = re.findall(r"(\d+(?:\.\d+)?)([smhd]?)", text.strip().lower())
+    if not parts or "".join(number + unit for number, unit in parts) != text.strip().lower():
+        raise argparse.ArgumentTypeError(f"invalid duration: {text!r} (e.g. 8h, 90m, 1h30m, 3600)")
+    seconds = sum(float(number) * DURATION_UNITS[unit or "s"] for number, unit in parts)
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("duration must be positive")
+    return seconds
+
+
+def format_duration(seconds: float) -> str:
+    """Compact h/m/s rendering of a duration"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def resident_memory_bytes() -> int:
+    """Current RSS of this process (Linux), 0 where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def mann_kendall(values: List[float]) -> Tuple[float, float]:
+    """(z, two-sided p-value) of the Mann-Kendall test for a monotonic trend
+
+    Non-parametric, so a few latency spikes cannot fake a trend the way they can bend a
+    least-squares fit. Uses the normal approximation with the tie correction.
+    """
+    n = len(values)
+    s = sum((values[j] > values[i]) - (values[j] < values[i]) for i in range(n) for j in range(i + 1, n))
+    ties = Counter(values).values()
+    variance = (n * (n - 1) * (2 * n + 5) - sum(t * (t - 1) * (2 * t + 5) for t in ties)) / 18
+    if variance <= 0:
+        return 0.0, 1.0
+    z = (s - math.copysign(1, s)) / math.sqrt(variance) if s else 0.0
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def theil_sen(xs: List[float], ys: List[float]) -> Tuple[float, float]:
+    """(slope, intercept) of the Theil-Sen estimator: the median of all pairwise slopes"""
+    slopes = [(ys[j] - ys[i]) / (xs[j] - xs[i])
+              for i in range(len(xs)) for j in range(i + 1, len(xs)) if xs[j] != xs[i]]
+    slope = statistics.median(slopes) if slopes else 0.0
+    return slope, statistics.median(y - slope * x for x, y in zip(xs, ys))
+
+
+class SoakTester(LLMStressTester):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.window_errors: Dict[str, int] = {}  # Failure kind -> count since the last window rotation
+
+    def record_result(self, result: Dict):
+        """Record a finished request, counting failures by kind"""
+        super().record_result(result)
+        if result.get("status") != "SUCCESS":
+            kind = result.get("backpressure") or "error"
+            self.window_errors[kind] = self.window_errors.get(kind, 0) + 1
+
+
+class SoakCheckpoint:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path(STATE_FILE))
+
+    def load(self) -> Tuple[Dict, List[Dict]]:
+        """Saved state and its windows; windows written after the last state save are dropped"""
+        with open(self.path(STATE_FILE)) as f:
+            state = json.load(f)
+        windows = []
+        if os.path.exists(self.path(WINDOWS_FILE)):
+            with open(self.path(WINDOWS_FILE)) as f:
+                for line in f:
+                    if len(windows) == state["windows"]:
+                        break
+                    windows.append(json.loads(line))
+        # Rewrite so windows appended from here on line up with the state again
+        with open(self.path(WINDOWS_FILE), "w") as f:
+            f.writelines(json.dumps(window) + "\n" for window in windows)
+        return state, windows
+
+    def append_window(self, window: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(WINDOWS_FILE), "a") as f:
+            f.write(json.dumps(window) + "\n")
+
+    def save(self, state: Dict):
+        """Replace the state atomically, so a kill mid-write keeps the previous checkpoint"""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path(STATE_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, self.path(STATE_FILE))
+
+
+class SoakRunner:
+    def __init__(self, tester_kwargs: Dict, duration: float, window: float, checkpoint: SoakCheckpoint,
+                 args: Dict, scraper: Optional[MetricsScraper] = None, alpha: float = 0.01,
+                 min_drift: float = 0.05, min_error_creep: float = 0.005, min_windows: int = 6):
+        self.tester_kwargs = tester_kwargs
+        self.duration = duration  # Soak seconds in total, over every segment
+        self.window = window  # Seconds per window summary
+        self.checkpoint = checkpoint
+        self.args = args  # Workload arguments, saved for --resume
+        self.scraper = scraper
+        self.alpha = alpha  # Significance level of the trend test
+        self.min_drift = min_drift  # Smallest relative change over the soak that counts as drift
+        self.min_error_creep = min_error_creep  # Smallest error rate increase (absolute) that counts
+        self.min_windows = min_windows  # Full windows needed before a trend is tested
+
+        self.started = time.time()
+        self.elapsed = 0.0  # Soak seconds covered by saved windows
+        self.segments = 0  # Runs of the soak; more than one after a resume
+        self.windows: List[Dict] = []
+        self.totals = ResultAggregator()  # Every request of the soak, in fixed-size histograms
+        self.error_kinds: Dict[str, int] = {}
+
+    def restore(self, state: Dict, windows: List[Dict]):
+        """Continue from a checkpoint"""
+        self.started = state["started"]
+        self.elapsed = state["elapsed"]
+        self.segments = state["segments"]
+        self.windows = windows
+        self.totals = ResultAggregator.from_dict(state["totals"])
+        self.error_kinds = state["error_kinds"]
+
+    def state(self) -> Dict:
+        return {
+            "args": self.args,
+            "started": self.started,
+            "updated": time.time(),
+            "duration": self.duration,
+            "window": self.window,
+            "elapsed": self.elapsed,
+            "segments": self.segments,
+            "windows": len(self.windows),
+            "totals": self.totals.to_dict(),
+            "error_kinds": self.error_kinds
+        }
+
+    def close_window(self, tester: SoakTester, start: float, end: float, offset: float) -> Dict:
+        """Rotate the tester's statistics into a window summary and checkpoint it"""
+        aggregator, tester.aggregator = tester.aggregator, ResultAggregator()
+        errors, tester.window_errors = tester.window_errors, {}
+        # Only the live view's rolling window of the timeline is still needed
+        tester.timeline.prune(end - tester.rolling_window - tester.timeline.bucket_seconds)
+
+        seconds = max(end - start, 1e-9)
+        failed = aggregator.total_requests - aggregator.successful_requests
+        window = {
+            "index": len(self.windows),
+            "segment": self.segments,
+            "start": offset,
+            "end": offset + seconds,
+            "seconds": seconds,
+            "partial": seconds < self.window / 2,  # The drain at the end of a segment; left out of the trends
+            "time": end,
+            "requests": aggregator.total_requests,
+            "errors": failed,
+            "error_kinds": errors,
+            "error_rate": failed / aggregator.total_requests if aggregator.total_requests else 0.0,
+            "request_rate": aggregator.successful_requests / seconds,
+            "output_tokens_per_sec": aggregator.histograms['completion_tokens'].total / seconds,
+            "prompt_tokens_per_sec": aggregator.histograms['prompt_tokens'].total / seconds,
+            "in_flight": tester.in_flight,
+            "client_rss_mb": resident_memory_bytes() / 2**20
+        }
+        for name, key in (('ttft', 'ttft'), ('tpot', 'tpot'), ('duration', 'latency')):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                window[f"{key}_p50"] = histogram.percentile(50)
+                window[f"{key}_p{TAIL:g}"] = histogram.percentile(TAIL)
+        if self.scraper:
+            server = self.scraper.report(start, end)
+            self.scraper.prune(end - self.scraper.interval)
+            if server:
+                gauges = server["gauges"]
+                for name, key in (("kv_usage", "kv_usage"), ("waiting", "waiting"), ("running", "running")):
+                    if name in gauges:
+                        window[key] = gauges[name]["mean"]
+                if "process_rss" in gauges:
+                    window["server_rss_mb"] = gauges["process_rss"]["max"] / 2**20
+                if "preemptions" in server["counters"]:
+                    window["preemptions"] = server["counters"]["preemptions"]
+
+        self.totals.merge(aggregator)
+        for kind, count in errors.items():
+            self.error_kinds[kind] = self.error_kinds.get(kind, 0) + count
+        self.windows.append(window)
+        self.elapsed = window["end"]
+        self.checkpoint.append_window(window)
+        self.checkpoint.save(self.state())
+
+        ttft = window.get(f"ttft_p{TAIL:g}")
+        logger.info(f"Window {window['index'] + 1} [{format_duration(window['start'])} - "
+                    f"{format_duration(window['end'])}]: {window['request_rate']:.2f} req/s, "
+                    f"{window['output_tokens_per_sec']:.1f} output tok/s, "
+                    f"TTFT p{TAIL:g} {format(ttft, '.3f') + 's' if ttft is not None else '-'}, "
+                    f"errors {window['error_rate']:.1%}, client RSS {window['client_rss_mb']:.0f} MB")
+        return window
+
+    async def run(self):
+        """Run the rest of the soak, closing a window every `window` seconds"""
+        remaining = self.duration - self.elapsed
+        if remaining <= 0:
+            logger.info("Soak already complete")
+            return
+        self.segments += 1
+        if self.segments > 1:
+            logger.info(f"Resuming soak at {format_duration(self.elapsed)} of {format_duration(self.duration)} "
+                        f"({len(self.windows)} windows saved)")
+        tester = SoakTester(**self.tester_kwargs, duration=remaining)
+        if self.scraper:
+            self.scraper.client_probe = lambda: (tester.in_flight, tester.aggregator.total_requests)
+            self.scraper.start()
+        offset = self.elapsed
+        try:
+            run = asyncio.ensure_future(tester.run_concurrent_requests())
+            # run_start is set once the prompt pool is built and the workers start
+            while not tester.run_start and not run.done():
+                await asyncio.sleep(0.05)
+            window_start = tester.run_start
+            while not run.done():
+                await asyncio.wait({run}, timeout=max(0.0, window_start + self.window - time.time()))
+                if run.done():
+                    break
+                now = time.time()
+                self.close_window(tester, window_start, now, offset)
+                offset += now - window_start
+                window_start = now
+            await run
+            # The last window is shorter and includes the drain of in-flight requests
+            self.close_window(tester, window_start, tester.run_start + tester.wall_duration, offset)
+            # Open-loop arrivals can end a little before the deadline; the soak is complete either way
+            self.elapsed = max(self.elapsed, self.duration)
+            self.checkpoint.save(self.state())
+        finally:
+            if self.scraper:
+                self.scraper.stop()
+
+    def drift(self) -> List[Dict]:
+        """Trend test of every window metric over the soak"""
+        full = [window for window in self.windows if not window["partial"]]
+        results = []
+        for key, (label, higher_is_worse, fmt) in DRIFT_METRICS.items():
+            points = [((window["start"] + window["end"]) / 7200, window[key]) for window in full if key in window]
+            result = {"metric": key, "label": label, "windows": len(points), "verdict": "n/a"}
+            results.append(result)
+            if len(points) < self.min_windows:
+                continue
+            hours, values = [x for x, _ in points], [y for _, y in points]
+            slope, intercept = theil_sen(hours, values)
+            _, p_value = mann_kendall(values)
+            first, last = intercept + slope * hours[0], intercept + slope * hours[-1]
+            if key in ABSOLUTE_METRICS:
+                change = last - first
+                large = abs(change) >= self.min_error_creep
+            else:
+                change = last / first - 1 if first > 0 else None
+                large = change is not None and abs(change) >= self.min_drift
+            result.update(first=first, last=last, change=change, slope=slope, p_value=p_value)
+            if p_value < self.alpha and large:
+                result["verdict"] = "DEGRADING" if (slope > 0) == higher_is_worse else "improving"
+            else:
+                result["verdict"] = "stable"
+        return results
+
+    def print_report(self) -> List[str]:
+        """Print the soak summary, the window table and the drift analysis; returns the degrading metrics"""
+        windows = self.windows
+        print("\n=== SOAK TEST REPORT ===")
+        print(f"Soaked: {format_duration(self.elapsed)} of {format_duration(self.duration)} in {len(windows)} windows "
+              f"of {format_duration(self.window)} ({self.segments} segment{'s' if self.segments != 1 else ''})")
+        if self.segments > 1:
+            print("  Resumed soak: drift is fitted on soak time; a server restart between segments resets its state")
+        totals = self.totals
+        if not totals.total_requests:
+            print("No requests recorded")
+            return []
+        failed = totals.total_requests - totals.successful_requests
+        print(f"Requests: {totals.total_requests} ({failed} failed, {failed / totals.total_requests:.2%})")
+        if self.error_kinds:
+            print("  Failures by kind: " + ", ".join(f"{kind} {count}" for kind, count in
+                                                    sorted(self.error_kinds.items(), key=lambda item: -item[1])))
+        if self.elapsed:
+            print(f"Average: {totals.successful_requests / self.elapsed:.2f} req/s, "
+                  f"{totals.histograms['completion_tokens'].total / self.elapsed:.1f} output tok/s")
+        for name, label in (('ttft', 'TTFT'), ('tpot', 'TPOT'), ('duration', 'Latency')):
+            histogram = totals.histogram(name)
+            if histogram:
+                print(f"  {label}: " + ", ".join(f"p{q:g} {value:.3f}s" for q, value in histogram.percentiles().items()))
+
+        print("\nWindows (soak time):")
+        header = (f"  {'Start':>7} {'Req/s':>7} {'Tok/s':>8} {'Err':>6} {'TTFT p50':>9} {f'TTFT p{TAIL:g}':>9} "
+                  f"{'TPOT p50':>9} {'KV':>6} {'Srv MB':>7} {'Cli MB':>7}")
+        print(header)
+        def cell(window, key, fmt, width):
+            return format(format(window[key], fmt) if key in window else "-", f">{width}")
+
+        step = max(1, math.ceil(len(windows) / TABLE_ROWS))
+        for window in windows[::step]:
+            start = format_duration(window['start']) + ("*" if window["partial"] else "")
+            print(f"  {start:>7} {window['request_rate']:>7.2f} "
+                  f"{window['output_tokens_per_sec']:>8.1f} {window['error_rate']:>6.1%} "
+                  f"{cell(window, 'ttft_p50', '.3f', 9)} {cell(window, f'ttft_p{TAIL:g}', '.3f', 9)} "
+                  f"{cell(window, 'tpot_p50', '.4f', 9)} {cell(window, 'kv_usage', '.1%', 6)} "
+                  f"{cell(window, 'server_rss_mb', '.0f', 7)} {cell(window, 'client_rss_mb', '.0f', 7)}")
+
+        if any(window["partial"] for window in windows):
+            print("  * shorter than half a window (end of a segment), left out of the drift analysis")
+
+        print(f"\nDrift (Mann-Kendall trend test at alpha {self.alpha:g}, Theil-Sen fit from first to last window):")
+        print(f"  {'Metric':<18} {'Start':>10} {'End':>10} {'Change':>9} {'p-value':>9}  Verdict")
+        degrading = []
+        for result in self.drift():
+            fmt = DRIFT_METRICS[result["metric"]][2]
+            if "p_value" not in result:
+                print(f"  {result['label']:<18} {'-':>10} {'-':>10} {'-':>9} {'-':>9}  "
+                      f"n/a ({result['windows']} of {self.min_windows} full windows)")
+                continue
+            change = result["change"]
+            if change is None:
+                change_text = "-"
+            elif result["metric"] in ABSOLUTE_METRICS:
+                change_text = f"{change * 100:+.2f}pp"
+            else:
+                change_text = f"{change:+.1%}"
+            print(f"  {result['label']:<18} {fmt.format(result['first']):>10} {fmt.format(result['last']):>10} "
+                  f"{change_text:>9} {result['p_value']:>9.4f}  {result['verdict']}")
+            if result["verdict"] == "DEGRADING":
+                degrading.append(result["label"])
+        if degrading:
+            print(f"\nSignificant degradation over the soak: {', '.join(degrading)}")
+        else:
+            print(f"\nNo significant degradation (changes under {self.min_drift:.0%}, or error rate creep under "
+                  f"{self.min_error_creep * 100:g}pp, are ignored)")
+        return degrading
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='LLM Soak Test')
+    parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Server URL (default: http://localhost:8000/v1/chat/completions)')
+    parser.add_argument('--duration', type=parse_duration, default=None,
+                       help='Soak length, e.g. 8h, 90m or 1h30m; with --resume it replaces the saved length')
+    parser.add_argument('--window', type=parse_duration, default=300.0,
+                       help='Length of each statistics window, e.g. 5m (default: 5m)')
+    parser.add_argument('--concurrent-requests', type=int, default=4,
+                       help='Number of concurrent requests (default: 4)')
+    parser.add_argument('--context-size', type=int, default=6000,
+                       help='Desired context window in tokens (default: 6000)')
+    parser.add_argument('--max-tokens', type=int, default=350,
+                       help='Maximum tokens to generate per request (default: 350)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    parser.add_argument('--no-server-metrics', action='store_true',
+                       help='Do not poll /metrics and /slots for KV usage, queue depth and server RSS')
+    parser.add_argument('--metrics-interval', type=float, default=5.0,
+                       help='Seconds between server metrics polls (default: 5.0)')
+    parser.add_argument('--checkpoint-dir', type=str, default='soak_checkpoint',
+                       help='Directory the window summaries and resumable state are written to '
+                            '(default: soak_checkpoint)')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--resume', action='store_true',
+                       help='Continue the interrupted soak in --checkpoint-dir with its saved workload')
+    action.add_argument('--analyze', action='store_true',
+                       help='Only print the report of the soak in --checkpoint-dir, sending nothing')
+    parser.add_argument('--alpha', type=float, default=0.01,
+                       help='Significance level of the drift test (default: 0.01)')
+    parser.add_argument('--min-drift', type=float, default=0.05,
+                       help='Smallest relative change over the soak reported as drift (default: 0.05)')
+    parser.add_argument('--min-error-creep', type=float, default=0.005,
+                       help='Smallest absolute error rate increase reported as drift (default: 0.005)')
+    parser.add_argument('--min-windows', type=int, default=6,
+                       help='Full windows needed before drift is tested (default: 6)')
+    parser.add_argument('--live', action='store_true',
+                       help='Show a live rolling throughput / in-flight line during the soak')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request')
+    add_arrival_arguments(parser)
+    add_prompt_pool_arguments(parser)
+
+    args = parser.parse_args()
+
+    checkpoint = SoakCheckpoint(args.checkpoint_dir)
+    state, windows = None, []
+    if args.resume or args.analyze:
+        if not checkpoint.exists():
+            parser.error(f"No soak checkpoint in {args.checkpoint_dir}")
+        state, windows = checkpoint.load()
+        duration = args.duration
+        for name in WORKLOAD_ARGS:
+            setattr(args, name, state["args"][name])
+        if duration:
+            args.duration = duration
+    elif checkpoint.exists():
+        parser.error(f"{args.checkpoint_dir} already holds a soak; use --resume, --analyze or another --checkpoint-dir")
+    elif args.duration is None:
+        parser.error("--duration is required")
+    if args.window > args.duration:
+        parser.error("--window must not be longer than --duration")
+
+    if not args.verbose:
+        logging.getLogger('stress_test_llm').setLevel(logging.WARNING)
+
+    tester_kwargs = dict(
+        server_url=args.server_url,
+        concurrent_requests=args.concurrent_requests,
+        request_timeout=args.request_timeout,
+        context_size=args.context_size,
+        max_tokens=args.max_tokens,
+        mode='mixed',
+        stream=True,
+        arrival_schedule=schedule_from_args(args, parser),
+        prompt_pool_size=args.prompt_pool_size,
+        prompt_cache=args.prompt_cache,
+        live_view=args.live
+    )
+    scraper = None if args.no_server_metrics else MetricsScraper(args.server_url, interval=args.metrics_interval)
+    runner = SoakRunner(
+        tester_kwargs=tester_kwargs,
+        duration=args.duration,
+        window=args.window,
+        checkpoint=checkpoint,
+        args={name: getattr(args, name) for name in WORKLOAD_ARGS},
+        scraper=scraper,
+        alpha=args.alpha,
+        min_drift=args.min_drift,
+        min_error_creep=args.min_error_creep,
+        min_windows=args.min_windows
+    )
+    if state:
+        runner.restore(state, windows)
+
+    if not args.analyze:
+        load = f"{args.rate:g} req/s" if args.rate is not None else f"concurrency {args.concurrent_requests}"
+        logger.info(f"Soaking {args.server_url} for {format_duration(args.duration)} at {load}, "
+                    f"{format_duration(args.window)} windows, checkpoints in {args.checkpoint_dir}")
+        try:
+            await runner.run()
+        except asyncio.CancelledError:
+            logger.warning(f"Soak interrupted; continue it with --resume --checkpoint-dir {args.checkpoint_dir}")
+            raise
+    if runner.print_report():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    if importlib.util.find_spec("aiohttp") is None:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Every closed window is already checkpointed
+        exit(130)
@@ -6,12 +6,31 @@ Uses Python's built-in asyncio for asynchronous operations
 """
 
 import asyncio
-import json
+import importlib.util
 import time
 import aiohttp
 import argparse
 import logging
-from typing import Dict, List, Optional
+import random
+from typing import Callable, Dict, Optional
+
+from adaptive_concurrency import (AIMDController, add_adaptive_arguments, backpressure_reason, controller_from_args,
+                                  http_error, merge_adaptive_reports, print_adaptive_report)
+from arrival import ArrivalSchedule, add_arrival_arguments, dispatch_open_loop, schedule_from_args
+from client_profiler import (CLIENT_BOUND_THRESHOLD, ClientProfile, LoopLagProbe, add_profiling_arguments,
+                             install_fast_event_loop, json_codec, print_client_profile_report)
+from embedding_codec import add_encoding_arguments, decode_embeddings
+from histogram import PERCENTILES, LogHistogram, ResultAggregator
+from metrics_scraper import add_metrics_arguments, print_server_metrics_report, scraper_from_args
+from multiprocess_runner import add_worker_arguments, run_workers
+from prompt_pool import (PromptPool, add_prompt_pool_arguments, generate_long_message,
+                         merge_prompt_pool_reports, print_prompt_pool_report)
+from result_store import ResultWriter, add_results_arguments, run_metadata, write_run_metadata
+from throughput_timeline import (ROLLING_WINDOW, ThroughputTimeline, TimelineMonitor, add_timeline_arguments,
+                                 print_throughput_report)
+from tokenizer_utils import TokenCounter, add_tokenizer_arguments, tokenizer_settings_from_args
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,98 +39,137 @@ logger = logging.getLogger(__name__)
 class EmbeddingStressTester:
     def __init__(self, server_url: str, concurrent_requests: int = 4, 
                  total_requests: int = 100, request_timeout: int = 30,
-                 context_size: int = 40000):
+                 context_size: int = 40000, arrival_schedule: Optional[ArrivalSchedule] = None,
+                 prompt_pool_size: int = 16, prompt_cache: Optional[str] = None,
+                 tokenizer_settings: Optional[Dict] = None,
+                 results_dir: Optional[str] = None, results_shard: int = 0,
+                 fast_path: bool = False, client_bound_threshold: float = CLIENT_BOUND_THRESHOLD,
+                 lag_probe_interval: float = 0.05, live_view: bool = False,
+                 rolling_window: float = ROLLING_WINDOW, warmup_seconds: Optional[float] = None,
+                 cooldown_seconds: Optional[float] = None, batch_size: int = 1,
+                 encoding_format: Optional[str] = None, repeat_ratio: float = 0.0,
+                 adaptive: Optional[AIMDController] = None):
         self.server_url = server_url
         self.concurrent_requests = concurrent_requests
         self.total_requests = total_requests
         self.request_timeout = request_timeout
         self.context_size = context_size
+        self.batch_size = batch_size  # Inputs per request; above 1 "input" is a list
+        self.encoding_format = encoding_format  # 'float' / 'base64': request it and decode vectors into NumPy
+        self.embedding_matrix = None  # Reused float32 matrix the vectors are decoded into
+        self.repeat_ratio = repeat_ratio  # Share of requests that resend an earlier input byte for byte
+        self.repeat_random = random.Random()
+        self.repeated_latency = LogHistogram()  # Split latency to show what a cache in front of the server does
+        self.fresh_latency = LogHistogram()
+        self.arrival_schedule = arrival_schedule  # Open-loop arrivals instead of a fixed concurrency
+        self.adaptive = adaptive  # AIMD controller that sets the concurrency instead of concurrent_requests
+        self.adaptive_report: Optional[Dict] = None
+        self.prompt_pool_size = prompt_pool_size
+        self.prompt_cache = prompt_cache  # Optional JSONL file backing the prompt pool
+        self.tokenizer_settings = tokenizer_settings  # Local tokenizer / chat template for exact token counts
+        self.results_dir = results_dir  # Store every request in columnar files here
+        self.results_shard = results_shard  # Worker index, selects this process's column files
+        self.result_writer: Optional[ResultWriter] = None
+        self.fast_path = fast_path  # orjson codec and debug-level per-request logging
+        self.json_dumps, self.json_loads = json_codec(fast_path)
+        self.live_view = live_view  # Rolling throughput status line during the run
+        self.rolling_window = rolling_window
+        self.warmup_seconds = warmup_seconds  # Fixed trimming instead of steady-state detection
+        self.cooldown_seconds = cooldown_seconds
+        self.request_log_level = logging.DEBUG if fast_path or live_view else logging.INFO
+        self.client_bound_threshold = client_bound_threshold
+        self.lag_probe_interval = lag_probe_interval
+        self.client_profile = ClientProfile()  # What the load generator itself costs
+        self.prompt_pool: Optional[PromptPool] = None
+        self.prompt_pool_stats: Optional[Dict] = None
+        self.start_barrier: Optional[Callable[[], None]] = None  # Set by multi-process workers
         
-        # Store results
-        self.results = []
-        # Track total tokens and time for system-wide metrics
+        # Results are folded into fixed-size histograms as they complete
+        self.aggregator = ResultAggregator()
+        self.timeline = ThroughputTimeline()  # Wall-clock throughput per second of the run
+        self.wall_duration = 0
+        self.run_start = 0.0
+        self.in_flight = 0  # Requests sent but not yet recorded
+        self.server_metrics: Optional[Dict] = None  # Server-side metrics scraped during the run
+        # Track total tokens for system-wide metrics
         self.total_prompt_tokens = 0
-        self.total_duration = 0
         
     def generate_long_message(self, context_tokens: int) -> str:
         """Generate a long human message with random but meaningful words to prevent caching"""
-        import random
-        
-        # List of random words to use for generating varied content
-        random_words = [
-            "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "computer", "science",
-            "artificial", "intelligence", "machine", "learning", "deep", "neural", "network", "algorithm",
-            "data", "analysis", "statistical", "model", "prediction", "accuracy", "performance", "optimization",
-            "development", "programming", "software", "hardware", "architecture", "design", "implementation",
-            "testing", "deployment", "monitoring", "maintenance", "security", "privacy", "encryption", "decryption",
-            "database", "storage", "retrieval", "processing", "computation", "simulation", "experiment", "research",
-            "discovery", "innovation", "technology", "application", "interface", "user", "experience", "design",
-            "framework", "library", "module", "component", "integration", "compatibility", "scalability", "reliability"
-        ]
-        
-        # Create random sentences with varied content
-        # Approximate 1 token = 4 characters for English text
-        target_chars = context_tokens * 4
-        
-        # Generate random sentences using the word list
-        words = []
-        while len(' '.join(words)) < target_chars:
-            # Add a random number of words (between 1 and 10) to make it more varied
-            num_words = random.randint(1, 10)
-            for _ in range(num_words):
-                words.append(random.choice(random_words))
-        
-        # Join words into sentences with proper punctuation
-        sentence_parts = []
-        current_sentence = []
-        for i, word in enumerate(words):
-            current_sentence.append(word)
-            # Add period every 10-20 words to create natural sentences
-            if (i + 1) % random.randint(10, 20) == 0:
-                sentence_parts.append(' '.join(current_sentence) + '.')
-                current_sentence = []
-        
-        # Add any remaining words to a final sentence
-        if current_sentence:
-            sentence_parts.append(' '.join(current_sentence) + '.')
-        
-        # Combine sentences with some structure
-        structured_text = "User query: " + ' '.join(sentence_parts[:len(sentence_parts)//2]) + \
-                         "\n\nAssistant response: " + ' '.join(sentence_parts[len(sentence_parts)//2:])
-        
-        # Trim to exact target character count
-        if len(structured_text) > target_chars:
-            structured_text = structured_text[:target_chars]
-            
-        return structured_text
+        return generate_long_message(context_tokens)
     
-    async def send_request(self, session: aiohttp.ClientSession, request_id: int) -> Dict:
-        """Send a single request and return timing and token information"""
-        start_time = time.time()
-        
-        # Generate message with desired context size
-        long_message = self.generate_long_message(self.context_size)
-        
-        # Prepare request payload for embedding endpoint
+    def build_payload(self, content) -> Dict:
+        """Build the embedding payload for an input (or a list of inputs in batch mode)"""
         payload = {
             "model": "kCodeEmbedding",
-            "input": long_message
+            "input": content
         }
+        if self.encoding_format:
+            payload["encoding_format"] = self.encoding_format
+        return payload
+    
+    def decode_vectors(self, response_data: Dict):
+        """Decode the returned vectors into the reused float32 matrix"""
+        # Decoding never yields to the event loop, so one matrix serves every request
+        if self.embedding_matrix is None or self.embedding_matrix.shape[0] < len(response_data["data"]):
+            self.embedding_matrix = decode_embeddings(response_data, self.encoding_format)
+        else:
+            decode_embeddings(response_data, self.encoding_format, self.embedding_matrix)
+    
+    def build_prompt_pool(self) -> PromptPool:
+        """Generate and pre-serialize all inputs before the run starts"""
+        count_tokens = None
+        tokenizer_name = None
+        if self.tokenizer_settings:
+            # Embedding inputs are tokenized raw, without a chat template
+            count_tokens = TokenCounter(self.tokenizer_settings["tokenizer"]).count_text
+            tokenizer_name = self.tokenizer_settings["tokenizer"]
+        # Enough distinct inputs that no batch repeats one
+        pool = PromptPool(max(self.prompt_pool_size, self.batch_size), self.context_size, self.build_payload,
+                          unique=True, cache_path=self.prompt_cache, count_tokens=count_tokens,
+                          tokenizer_name=tokenizer_name, batch_size=self.batch_size)
+        return pool.build()
+    
+    async def send_request(self, session: aiohttp.ClientSession, request_id: int,
+                           intended_start: Optional[float] = None, body: Optional[bytes] = None) -> Dict:
+        """Send a single request and return timing and token information"""
+        # Request bodies are pre-serialized by the prompt pool unless one is given;
+        # getting one is client work and stays out of the measured latency
+        build_started = time.perf_counter()
+        expected_tokens = None
+        repeated = False
+        if body is None:
+            repeat = self.repeat_ratio > 0 and self.repeat_random.random() < self.repeat_ratio
+            # The first repeat of a pool entry only warms a cache, so it counts as fresh
+            repeated = repeat and self.prompt_pool.repeat_is_warm()
+            body, expected_tokens = self.prompt_pool.next_request(repeat)
+        self.client_profile.build.record(time.perf_counter() - build_started)
+        
+        # In open-loop mode latency is measured from the scheduled send time
+        start_time = intended_start if intended_start is not None else time.time()
         
         try:
             # Send request
-            async with session.post(self.server_url, json=payload, timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
-                response_data = await response.json()
+            async with session.post(self.server_url, data=body, headers=JSON_HEADERS, timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+                raw = await response.read()
+                if response.status != 200:
+                    raise http_error(response.status, raw[:200].decode(errors='replace'))
+                # Embedding responses are large float arrays, decoding them is real client work
+                parse_started = time.perf_counter()
+                response_data = self.json_loads(raw)
+                if self.encoding_format:
+                    self.decode_vectors(response_data)
+                self.client_profile.parse.record(time.perf_counter() - parse_started)
                 
                 # Parse token information from response (embedding responses include usage info)
                 prompt_tokens = response_data.get('usage', {}).get('prompt_tokens', 0)
                 total_tokens = response_data.get('usage', {}).get('total_tokens', 0)
                 completion_tokens = 0  # No completion tokens in embedding responses
                 
-                # If no usage info, we'll set to 0 or calculate from input length
+                # If no usage info, use the local tokenizer count or estimate from input length
                 if prompt_tokens == 0 and total_tokens == 0:
-                    # Estimate tokens from input length (approximate)
-                    prompt_tokens = len(long_message.split())  # rough estimate
+                    # Exact when --exact-tokens is set, otherwise approximated from the input text
+                    prompt_tokens = expected_tokens
                     total_tokens = prompt_tokens
                     completion_tokens = 0
                 
@@ -123,21 +181,24 @@ class EmbeddingStressTester:
                 
                 # Update system-wide metrics
                 self.total_prompt_tokens += prompt_tokens
-                self.total_duration += duration
                 
                 result = {
                     "request_id": request_id,
+                    "start_time": start_time,
                     "status": "SUCCESS",
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
                     "total_tokens": total_tokens,
                     "duration": duration,
-                    "tokens_per_sec": tokens_per_sec
+                    "tokens_per_sec": tokens_per_sec,
+                    "repeated": repeated
                 }
                 
-                logger.info(f"Request {request_id}: SUCCESS "
-                           f"(Prompt: {prompt_tokens}, Completion: {completion_tokens}, "
-                           f"Total: {total_tokens}, Time: {duration:.3f}s, Tok/sec: {tokens_per_sec:.2f})")
+                if logger.isEnabledFor(self.request_log_level):
+                    logger.log(self.request_log_level,
+                               f"Request {request_id}: SUCCESS "
+                               f"(Prompt: {prompt_tokens}, Completion: {completion_tokens}, "
+                               f"Total: {total_tokens}, Time: {duration:.3f}s, Tok/sec: {tokens_per_sec:.2f})")
                 
                 return result
                 
@@ -147,94 +208,192 @@ class EmbeddingStressTester:
             
             result = {
                 "request_id": request_id,
+                "start_time": start_time,
                 "status": "FAILED",
                 "prompt_tokens": 0,
                 "completion_tokens": 0,
                 "total_tokens": 0,
                 "duration": duration,
-                "tokens_per_sec": 0
+                "tokens_per_sec": 0,
+                "backpressure": backpressure_reason(e)  # 429 / 503 / timeout, for the adaptive controller
             }
             
             logger.error(f"Request {request_id}: FAILED (Time: {duration:.3f}s, Error: {str(e)})")
             return result
     
-    async def run_concurrent_requests(self) -> List[Dict]:
-        """Run concurrent requests with semaphore for limiting concurrency"""
+    def record_result(self, result: Dict):
+        """Record a finished request"""
+        self.aggregator.record(result)
+        self.timeline.record(result)
+        if self.repeat_ratio > 0 and result["status"] == "SUCCESS":
+            (self.repeated_latency if result["repeated"] else self.fresh_latency).record(result["duration"])
+        if self.result_writer:
+            self.result_writer.append(result)
+    
+    async def run_concurrent_requests(self) -> ResultAggregator:
+        """Run requests with a fixed pool of concurrent workers (or open-loop arrivals)"""
+        # Build every request body up front so nothing is generated on the hot path
+        # (in a thread, so tokenizer work never runs on the event loop)
+        if self.prompt_pool is None:
+            self.prompt_pool = await asyncio.get_running_loop().run_in_executor(None, self.build_prompt_pool)
+        if self.results_dir:
+            self.result_writer = ResultWriter(self.results_dir, self.results_shard)
+        
         # Create session with connection pooling
-        connector = aiohttp.TCPConnector(limit=self.concurrent_requests)
+        # Open-loop mode must never queue requests behind the connection pool
+        connector = aiohttp.TCPConnector(limit=0 if self.arrival_schedule else
+                                         (self.adaptive.max_limit if self.adaptive else self.concurrent_requests))
         timeout = aiohttp.ClientTimeout(total=self.request_timeout)
         
         async with aiohttp.ClientSession(
             connector=connector, 
             timeout=timeout
         ) as session:
-            # Create a semaphore to limit concurrent requests
-            semaphore = asyncio.Semaphore(self.concurrent_requests)
+            # Each worker pulls the next request id when its previous request finishes,
+            # so memory stays flat no matter how many requests are sent
+            request_ids = iter(range(1, self.total_requests + 1))
+            
+            async def worker():
+                for request_id in request_ids:
+                    self.in_flight += 1
+                    result = await self.send_request(session, request_id)
+                    self.in_flight -= 1
+                    self.record_result(result)
+            
+            async def adaptive_worker():
+                for request_id in request_ids:
+                    slot = await self.adaptive.acquire()
+                    self.in_flight += 1
+                    result = await self.send_request(session, request_id)
+                    self.in_flight -= 1
+                    self.adaptive.release_result(slot, result)
+                    self.record_result(result)
             
-            async def limited_send_request(request_id):
-                async with semaphore:
-                    return await self.send_request(session, request_id)
+            async def send_and_record(request_id, intended_start, body):
+                self.in_flight += 1
+                result = await self.send_request(session, request_id, intended_start, body)
+                self.in_flight -= 1
+                self.record_result(result)
             
             logger.info("Configuration:")
             logger.info(f"  Server URL: {self.server_url}")
-            logger.info(f"  Concurrent Requests: {self.concurrent_requests}")
+            if self.arrival_schedule:
+                logger.info(f"  Arrival Process: {self.arrival_schedule.describe()} (open loop)")
+            elif self.adaptive:
+                logger.info(f"  Concurrent Requests: adaptive, {self.adaptive.describe()}")
+            else:
+                logger.info(f"  Concurrent Requests: {self.concurrent_requests}")
             logger.info(f"  Total Requests: {self.total_requests}")
             logger.info(f"  Context Size: ~{self.context_size} tokens")
+            if self.batch_size > 1:
+                logger.info(f"  Batch Size: {self.batch_size} inputs per request")
             logger.info(f"  Request Timeout: {self.request_timeout} seconds")
             logger.info("")
             
-            logger.info(f"Sending {self.concurrent_requests} concurrent requests, {self.total_requests} total...")
+            # Multi-process workers wait here until every worker is ready
+            if self.start_barrier:
+                self.start_barrier()
             
-            # Create tasks for all requests
-            tasks = [limited_send_request(i) for i in range(1, self.total_requests + 1)]
-            
-            # Execute all tasks concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Filter out exceptions and collect results
-            for result in results:
-                if not isinstance(result, Exception):
-                    self.results.append(result)
+            # Event-loop lag shows when the client itself delays sends and receives
+            lag_probe = LoopLagProbe(self.client_profile.loop_lag, self.lag_probe_interval)
+            lag_probe.start()
+            monitor = TimelineMonitor(self.timeline, lambda: (self.in_flight, self.aggregator.total_requests),
+                                      self.total_requests, live=self.live_view, window=self.rolling_window)
+            self.run_start = run_start = time.time()
+            monitor.start(run_start)
+            if self.arrival_schedule:
+                logger.info(f"Sending {self.total_requests} requests at {self.arrival_schedule.describe()}...")
+                schedule = ((offset, None) for offset in self.arrival_schedule.offsets(self.total_requests))
+                await dispatch_open_loop(schedule, send_and_record)
+            elif self.adaptive:
+                logger.info(f"Sending {self.total_requests} requests with adaptive concurrency...")
+                # One worker per possible slot; the controller decides how many may send at once
+                await asyncio.gather(*(adaptive_worker() for _ in range(self.adaptive.max_limit)), return_exceptions=True)
+                self.adaptive_report = self.adaptive.report()
+            else:
+                logger.info(f"Sending {self.concurrent_requests} concurrent requests, {self.total_requests} total...")
+                
+                # Execute all workers concurrently
+                await asyncio.gather(*(worker() for _ in range(self.concurrent_requests)), return_exceptions=True)
+            self.wall_duration = time.time() - run_start
+            await lag_probe.stop()
+            await monitor.stop()
+            self.prompt_pool_stats = self.prompt_pool.report() if self.prompt_pool else None
+            if self.result_writer:
+                self.result_writer.close()
             
-            return self.results
+            return self.aggregator
+    
+    def export_state(self) -> Dict:
+        """Picklable summary of this run, merged by the parent in multi-process mode"""
+        return {
+            "aggregator": self.aggregator,
+            "wall_duration": self.wall_duration,
+            "run_start": self.run_start,
+            "prompt_pool_stats": self.prompt_pool_stats,
+            "total_prompt_tokens": self.total_prompt_tokens,
+            "client_profile": self.client_profile,
+            "repeated_latency": self.repeated_latency,
+            "fresh_latency": self.fresh_latency,
+            "timeline": self.timeline,
+            "adaptive_report": self.adaptive_report
+        }
+    
+    def merge_state(self, state: Dict):
+        """Merge a worker's exported state into this tester"""
+        self.aggregator.merge(state["aggregator"])
+        # Workers start together on a barrier, so the run lasts as long as the slowest one
+        self.wall_duration = max(self.wall_duration, state["wall_duration"])
+        self.run_start = min(self.run_start or state["run_start"], state["run_start"])
+        self.client_profile.merge(state["client_profile"])
+        self.repeated_latency.merge(state["repeated_latency"])
+        self.fresh_latency.merge(state["fresh_latency"])
+        self.timeline.merge(state["timeline"])
+        reports = [r for r in (self.prompt_pool_stats, state["prompt_pool_stats"]) if r]
+        self.prompt_pool_stats = merge_prompt_pool_reports(reports) if reports else None
+        reports = [r for r in (self.adaptive_report, state["adaptive_report"]) if r]
+        self.adaptive_report = merge_adaptive_reports(reports) if reports else None
+        self.total_prompt_tokens += state["total_prompt_tokens"]
     
     def calculate_statistics(self) -> Dict:
-        """Calculate statistics from results"""
-        successful_results = [r for r in self.results if r.get('status') == 'SUCCESS']
+        """Calculate statistics from the aggregated results"""
+        aggregator = self.aggregator
         
-        if not successful_results:
+        if not aggregator.successful_requests:
             return {}
         
-        # Extract token values
-        prompt_tokens_list = [r['prompt_tokens'] for r in successful_results]
-        completion_tokens_list = [r['completion_tokens'] for r in successful_results]
-        total_tokens_list = [r['total_tokens'] for r in successful_results]
-        tokens_per_sec_list = [r['tokens_per_sec'] for r in successful_results]
+        # Averages and exact min/max come straight from the histograms
+        stats = {}
+        for name in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'tokens_per_sec'):
+            histogram = aggregator.histograms[name]
+            stats[f"average_{name}"] = histogram.mean
+            stats[f"min_{name}"] = histogram.min
+            stats[f"max_{name}"] = histogram.max
+        stats["total_requests"] = aggregator.total_requests
+        stats["successful_requests"] = aggregator.successful_requests
+        stats["success_rate"] = (aggregator.successful_requests / aggregator.total_requests) * 100
         
-        # Calculate statistics
-        stats = {
-            "average_prompt_tokens": sum(prompt_tokens_list) / len(prompt_tokens_list),
-            "average_completion_tokens": sum(completion_tokens_list) / len(completion_tokens_list),
-            "average_total_tokens": sum(total_tokens_list) / len(total_tokens_list),
-            "average_tokens_per_sec": sum(tokens_per_sec_list) / len(tokens_per_sec_list),
-            "min_prompt_tokens": min(prompt_tokens_list),
-            "max_prompt_tokens": max(prompt_tokens_list),
-            "min_completion_tokens": min(completion_tokens_list),
-            "max_completion_tokens": max(completion_tokens_list),
-            "min_total_tokens": min(total_tokens_list),
-            "max_total_tokens": max(total_tokens_list),
-            "min_tokens_per_sec": min(tokens_per_sec_list),
-            "max_tokens_per_sec": max(tokens_per_sec_list),
-            "total_requests": len(self.results),
-            "successful_requests": len(successful_results),
-            "success_rate": (len(successful_results) / len(self.results)) * 100
-        }
+        # Tail latency percentiles
+        stats["percentiles"] = {}
+        for name in ('duration', 'tokens_per_sec'):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                stats["percentiles"][name] = histogram.percentiles()
+        
+        # Offered vs achieved load over wall-clock time
+        if self.wall_duration > 0:
+            stats["wall_duration"] = self.wall_duration
+            stats["achieved_rate"] = aggregator.successful_requests / self.wall_duration
+            stats["items_per_sec"] = aggregator.successful_requests * self.batch_size / self.wall_duration
+            stats["throughput"] = self.timeline.report(self.run_start, self.run_start + self.wall_duration,
+                                                       self.warmup_seconds, self.cooldown_seconds,
+                                                       self.rolling_window)
         
-        # Add system-wide metrics
-        if self.total_duration > 0:
+        # Add system-wide metrics; concurrent requests overlap, so divide by wall-clock time
+        if self.wall_duration > 0:
             stats["system_total_prompt_tokens"] = self.total_prompt_tokens
-            stats["system_total_duration"] = self.total_duration
-            stats["system_tokens_per_sec"] = self.total_prompt_tokens / self.total_duration
+            stats["system_total_duration"] = self.wall_duration
+            stats["system_tokens_per_sec"] = self.total_prompt_tokens / self.wall_duration
         
         return stats
     
@@ -268,19 +427,53 @@ class EmbeddingStressTester:
         if "system_total_prompt_tokens" in stats:
             print(f"\nSystem-wide Metrics:")
             print(f"  Total Prompt Tokens Processed: {stats['system_total_prompt_tokens']:.0f}")
-            print(f"  Total Duration: {stats['system_total_duration']:.2f} seconds")
+            print(f"  Wall-Clock Duration: {stats['system_total_duration']:.2f} seconds")
             print(f"  System Tokens/Second: {stats['system_tokens_per_sec']:.2f}")
+        if self.batch_size > 1 and "items_per_sec" in stats:
+            print(f"  Batch Size: {self.batch_size} inputs per request")
+            print(f"  Inputs Embedded/Second: {stats['items_per_sec']:.2f}")
+        
+        if self.arrival_schedule and "achieved_rate" in stats:
+            print("\nOpen-Loop Load:")
+            print(f"  Arrival Process: {self.arrival_schedule.describe()}")
+            print(f"  Achieved Rate: {stats['achieved_rate']:.2f} req/s over {stats['wall_duration']:.2f}s")
+            print("  Latencies are measured from the scheduled send time (coordinated-omission corrected)")
+        
+        print_throughput_report(stats.get("throughput"))
+        print_adaptive_report(self.adaptive_report)
+        
+        if self.repeat_ratio > 0:
+            print(f"\nRepeated Inputs ({self.repeat_ratio:.0%} of requests resend an earlier input):")
+            for label, histogram in (("Repeated", self.repeated_latency), ("Fresh", self.fresh_latency)):
+                if histogram.count:
+                    percentiles = histogram.percentiles()
+                    print(f"  {label:<9} {histogram.count:>7} requests, latency "
+                          + ", ".join(f"p{q:g} {percentiles[q]:.4f}s" for q in PERCENTILES))
+        
+        print("\nLatency Percentiles:")
+        print(f"  {'Metric':<24}" + "".join(f"{'p' + format(q, 'g'):>12}" for q in PERCENTILES))
+        labels = {
+            "duration": ("Request Latency (s)", 1),
+            "tokens_per_sec": ("Tokens/Second", 1)
+        }
+        for name, values in stats["percentiles"].items():
+            label, scale = labels[name]
+            print(f"  {label:<24}" + "".join(f"{values[q] * scale:>12.3f}" for q in PERCENTILES))
+        
+        print_prompt_pool_report(self.prompt_pool_stats)
+        print_server_metrics_report(self.server_metrics)
+        print_client_profile_report(self.client_profile.report(self.aggregator.histogram('duration'),
+                                                               self.client_bound_threshold))
         
         print(f"\nSuccess Rate: {stats['success_rate']:.2f}% ({stats['successful_requests']}/{stats['total_requests']} requests)")
         
         # Show first few results to verify context setup
         print("\nSample results (first 5 requests):")
-        successful_results = [r for r in self.results if r.get('status') == 'SUCCESS']
-        for result in successful_results[:5]:
+        for result in self.aggregator.samples:
             print(f"  Prompt: {result['prompt_tokens']}, Completion: {result['completion_tokens']}, "
                   f"Total: {result['total_tokens']}, Tok/sec: {result['tokens_per_sec']:.2f}")
 
-async def main():
+def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='Embedding Stress Test Script')
     parser.add_argument('--server-url', default='http://localhost:8001/v1/embeddings',
                        help='Server URL (default: http://localhost:8001/v1/embeddings)')
@@ -292,23 +485,90 @@ async def main():
                        help='Request timeout in seconds (default: 180)')
     parser.add_argument('--context-size', type=int, default=6000,
                        help='Desired context window in tokens (default: 6000)')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                       help='Share of requests that resend an earlier input unchanged, to measure a cache '
+                            'such as embedding_cache_proxy.py (default: 0, every input is unique)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Inputs per request, sent as an "input" list (default: 1)')
+    add_arrival_arguments(parser)
+    add_prompt_pool_arguments(parser)
+    add_worker_arguments(parser)
+    add_metrics_arguments(parser)
+    add_results_arguments(parser)
+    add_profiling_arguments(parser)
+    add_timeline_arguments(parser)
+    add_encoding_arguments(parser)
+    add_tokenizer_arguments(parser, 'vllm_args_embedding.sh')
+    add_adaptive_arguments(parser, default_metric='duration')
     
     args = parser.parse_args()
     
+    if args.adaptive and args.target_latency is None:
+        parser.error("--adaptive needs --target-latency")
+    if args.adaptive and args.rate is not None:
+        parser.error("--adaptive controls a closed loop and cannot be combined with --rate")
+    # Invalid arrival options end here with a usage error instead of failing mid-run
+    schedule_from_args(args, parser)
+    return args
+
+
+async def main(args: argparse.Namespace):
+    if args.encoding_format and importlib.util.find_spec("numpy") is None:
+        logger.error("--encoding-format decodes vectors with numpy: pip install numpy")
+        return
+    
     # Create tester instance
-    tester = EmbeddingStressTester(
+    tester_kwargs = dict(
         server_url=args.server_url,
         concurrent_requests=args.concurrent_requests,
         total_requests=args.total_requests,
         request_timeout=args.request_timeout,
-        context_size=args.context_size
+        context_size=args.context_size,
+        arrival_schedule=schedule_from_args(args),
+        prompt_pool_size=args.prompt_pool_size,
+        prompt_cache=args.prompt_cache,
+        tokenizer_settings=tokenizer_settings_from_args(args, use_chat_template=False),
+        results_dir=args.results_dir,
+        fast_path=args.fast_path,
+        client_bound_threshold=args.client_bound_threshold,
+        lag_probe_interval=args.lag_probe_interval,
+        live_view=args.live,
+        rolling_window=args.rolling_window,
+        warmup_seconds=args.warmup_seconds,
+        cooldown_seconds=args.cooldown_seconds,
+        batch_size=args.batch_size,
+        encoding_format=args.encoding_format,
+        repeat_ratio=args.repeat_ratio,
+        adaptive=controller_from_args(args)
     )
     
     # Run the stress test
     logger.info("Starting stress test for embedding server...")
     
-    # Run asynchronously
-    await tester.run_concurrent_requests()
+    # Run metadata goes next to the per-request columns so stored runs can be compared later
+    if args.results_dir:
+        write_run_metadata(args.results_dir, run_metadata('embedding', 'embedding', args.server_args, "kCodeEmbedding"))
+    
+    # Server-side metrics are polled from a background thread for the whole run
+    scraper = scraper_from_args(args)
+    if scraper:
+        scraper.start()
+    
+    if args.workers > 1:
+        # Shard the load across processes and merge their results
+        tester = run_workers(EmbeddingStressTester, tester_kwargs, args.workers)
+    else:
+        tester = EmbeddingStressTester(**tester_kwargs)
+        if scraper:
+            scraper.client_probe = lambda: (tester.in_flight, tester.aggregator.total_requests)
+        
+        # Run asynchronously
+        await tester.run_concurrent_requests()
+    
+    if scraper:
+        scraper.stop()
+        tester.server_metrics = scraper.report(tester.run_start, tester.run_start + tester.wall_duration,
+                                               timeline=args.metrics_timeline)
     
     # Print final report
     tester.print_report()
@@ -317,7 +577,11 @@ if __name__ == "__main__":
     # Check if aiohttp is available
     try:
         import aiohttp
-        asyncio.run(main())
+        args = parse_args()
+        # The event loop policy must be set before asyncio.run creates the loop
+        if args.fast_path:
+            install_fast_event_loop()
+        asyncio.run(main(args))
     except ImportError:
         print("Error: aiohttp library is required for this script.")
         print("Please install it with: pip install aiohttp")
@@ -7,12 +7,30 @@ Uses Python's built-in asyncio for asynchronous operations
 """
 
 import asyncio
-import json
+import itertools
 import time
 import aiohttp
 import argparse
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, Optional
+
+from adaptive_concurrency import (AIMDController, add_adaptive_arguments, backpressure_reason, controller_from_args,
+                                  http_error, merge_adaptive_reports, print_adaptive_report)
+from arrival import ArrivalSchedule, add_arrival_arguments, dispatch_open_loop, schedule_from_args
+from client_profiler import (CLIENT_BOUND_THRESHOLD, ClientProfile, LoopLagProbe, add_profiling_arguments,
+                             install_fast_event_loop, json_codec, print_client_profile_report)
+from histogram import PERCENTILES, ResultAggregator
+from metrics_scraper import add_metrics_arguments, print_server_metrics_report, scraper_from_args
+from multiprocess_runner import add_worker_arguments, run_workers
+from prompt_pool import (PromptPool, add_prompt_pool_arguments, generate_long_message,
+                         merge_prompt_pool_reports, print_prompt_pool_report)
+from result_store import ResultWriter, add_results_arguments, run_metadata, write_run_metadata
+from throughput_timeline import (ROLLING_WINDOW, ThroughputTimeline, TimelineMonitor, add_timeline_arguments,
+                                 print_throughput_report)
+from tokenizer_utils import TokenCounter, add_tokenizer_arguments, tokenizer_settings_from_args
+from trace_replay import TraceReplay, add_replay_arguments, replay_from_args
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,71 +40,67 @@ class LLMStressTester:
     def __init__(self, server_url: str, concurrent_requests: int = 4, 
                  total_requests: int = 100, request_timeout: int = 30,
                  context_size: int = 40000, max_tokens: int = 150,
-                 mode: Optional[str] = None, fixed_prefix: Optional[str] = None):
+                 mode: Optional[str] = None, fixed_prefix: Optional[str] = None,
+                 stream: bool = False, arrival_schedule: Optional[ArrivalSchedule] = None,
+                 prompt_pool_size: int = 16, prompt_cache: Optional[str] = None,
+                 tokenizer_settings: Optional[Dict] = None, replay: Optional[TraceReplay] = None,
+                 results_dir: Optional[str] = None, results_shard: int = 0,
+                 fast_path: bool = False, client_bound_threshold: float = CLIENT_BOUND_THRESHOLD,
+                 lag_probe_interval: float = 0.05, live_view: bool = False,
+                 rolling_window: float = ROLLING_WINDOW, warmup_seconds: Optional[float] = None,
+                 cooldown_seconds: Optional[float] = None, adaptive: Optional[AIMDController] = None,
+                 duration: Optional[float] = None):
         self.server_url = server_url
         self.concurrent_requests = concurrent_requests
         self.total_requests = total_requests
+        self.duration = duration  # Seconds to keep sending for, instead of total_requests
         self.request_timeout = request_timeout
         self.context_size = context_size
         self.max_tokens = max_tokens
         self.mode = mode  # 'pp' for prompt processing, 'tg' for token generation
         self.fixed_prefix = fixed_prefix  # Fixed prefix for token generation mode
+        self.stream = stream  # Use SSE streaming to measure TTFT / inter-token latency
+        self.adaptive = adaptive  # AIMD controller that sets the concurrency instead of concurrent_requests
+        self.adaptive_report: Optional[Dict] = None
+        self.arrival_schedule = arrival_schedule  # Open-loop arrivals instead of a fixed concurrency
+        self.prompt_pool_size = prompt_pool_size
+        self.prompt_cache = prompt_cache  # Optional JSONL file backing the prompt pool
+        self.tokenizer_settings = tokenizer_settings  # Local tokenizer / chat template for exact token counts
+        self.replay = replay  # Replay a recorded trace instead of generating prompts
+        self.results_dir = results_dir  # Store every request in columnar files here
+        self.results_shard = results_shard  # Worker index, selects this process's column files
+        self.result_writer: Optional[ResultWriter] = None
+        self.fast_path = fast_path  # orjson codec and debug-level per-request logging
+        self.json_dumps, self.json_loads = json_codec(fast_path)
+        self.live_view = live_view  # Rolling throughput status line during the run
+        self.rolling_window = rolling_window
+        self.warmup_seconds = warmup_seconds  # Fixed trimming instead of steady-state detection
+        self.cooldown_seconds = cooldown_seconds
+        self.request_log_level = logging.DEBUG if fast_path or live_view else logging.INFO
+        self.client_bound_threshold = client_bound_threshold
+        self.lag_probe_interval = lag_probe_interval
+        self.client_profile = ClientProfile()  # What the load generator itself costs
+        self.prompt_pool: Optional[PromptPool] = None
+        self.prompt_pool_stats: Optional[Dict] = None
+        self.start_barrier: Optional[Callable[[], None]] = None  # Set by multi-process workers
         
-        # Store results
-        self.results = []
+        # Results are folded into fixed-size histograms as they complete
+        self.aggregator = ResultAggregator()
+        self.timeline = ThroughputTimeline()  # Wall-clock throughput per second of the run
+        self.wall_duration = 0
+        self.run_start = 0.0
+        self.in_flight = 0  # Requests sent but not yet recorded
+        self.server_metrics: Optional[Dict] = None  # Server-side metrics scraped during the run
         self.cache_warmed = False  # Track if cache has been warmed for -tg mode
         
     def generate_long_message(self, context_tokens: int) -> str:
         """Generate a long human message with random but meaningful words to prevent caching"""
-        import random
-        
-        # List of random words to use for generating varied content
-        random_words = [
-            "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "computer", "science",
-            "artificial", "intelligence", "machine", "learning", "deep", "neural", "network", "algorithm",
-            "data", "analysis", "statistical", "model", "prediction", "accuracy", "performance", "optimization",
-            "development", "programming", "software", "hardware", "architecture", "design", "implementation",
-            "testing", "deployment", "monitoring", "maintenance", "security", "privacy", "encryption", "decryption",
-            "database", "storage", "retrieval", "processing", "computation", "simulation", "experiment", "research",
-            "discovery", "innovation", "technology", "application", "interface", "user", "experience", "design",
-            "framework", "library", "module", "component", "integration", "compatibility", "scalability", "reliability"
-        ]
-        
-        # Create random sentences with varied content
-        # Approximate 1 token = 4 characters for English text
-        target_chars = context_tokens * 4
-        
-        # Generate random sentences using the word list
-        words = []
-        while len(' '.join(words)) < target_chars:
-            # Add a random number of words (between 1 and 10) to make it more varied
-            num_words = random.randint(1, 10)
-            for _ in range(num_words):
-                words.append(random.choice(random_words))
-        
-        # Join words into sentences with proper punctuation
-        sentence_parts = []
-        current_sentence = []
-        for i, word in enumerate(words):
-            current_sentence.append(word)
-            # Add period every 10-20 words to create natural sentences
-            if (i + 1) % random.randint(10, 20) == 0:
-                sentence_parts.append(' '.join(current_sentence) + '.')
-                current_sentence = []
-        
-        # Add any remaining words to a final sentence
-        if current_sentence:
-            sentence_parts.append(' '.join(current_sentence) + '.')
-        
-        # Combine sentences with some structure
-        structured_text = "User query: " + ' '.join(sentence_parts[:len(sentence_parts)//2]) + \
-                         "\n\nAssistant response: " + ' '.join(sentence_parts[len(sentence_parts)//2:])
-        
-        # Trim to exact target character count
-        if len(structured_text) > target_chars:
-            structured_text = structured_text[:target_chars]
-            
-        return structured_text
+        return generate_long_message(context_tokens)
+    
+    def generate_fixed_prefix(self) -> str:
+        """Generate the -tg prefix, fitted to exactly context_size tokens when a local tokenizer is set"""
+        pool = PromptPool(1, self.context_size, self.build_payload, unique=False, count_tokens=self.token_counter())
+        return pool.generate_prompt()
     
     async def send_preflight_request(self, session: aiohttp.ClientSession) -> bool:
         """Send pre-flight request to warm up cache for token generation mode"""
@@ -114,55 +128,161 @@ class LLMStressTester:
         except Exception as e:
             logger.warning(f"Pre-flight request failed: {str(e)}, continuing anyway...")
             return False
-    
-    async def send_request(self, session: aiohttp.ClientSession, request_id: int) -> Dict:
-        """Send a single request and return timing and token information"""
-        start_time = time.time()
-        
-        # Handle different modes
-        if self.mode == 'pp':
-            # Prompt processing mode: randomize every request, max_tokens=1
-            long_message = self.generate_long_message(self.context_size)
-            max_tokens = 1
-        elif self.mode == 'tg':
-            # Token generation mode: use fixed prefix (cache should already be warmed)
-            if self.fixed_prefix is None:
-                raise ValueError("fixed_prefix must be provided for token generation mode (-tg)")
-            long_message = self.fixed_prefix
-            max_tokens = self.max_tokens
-        else:
-            # Mixed mode (default): randomize prefix like pp, use full max_tokens like tg
-            long_message = self.generate_long_message(self.context_size)
-            max_tokens = self.max_tokens
-        
-        # Prepare request payload
+
+    async def read_stream(self, response: aiohttp.ClientResponse) -> Dict:
+        """Consume an SSE chat completion stream, recording the arrival time of every token chunk"""
+        if response.status != 200:
+            body = await response.text()
+            raise http_error(response.status, body[:200])
+
+        usage = {}
+        timings = {}
+        token_times = []
+        parse_seconds = 0.0
+        # Each SSE event is a single "data: {...}" line, events are separated by blank lines
+        async for raw_line in response.content:
+            line = raw_line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            parse_started = time.perf_counter()
+            chunk = self.json_loads(data)
+            parse_seconds += time.perf_counter() - parse_started
+
+            # The final chunk carries usage (stream_options.include_usage) and no choices
+            if chunk.get('usage'):
+                usage = chunk['usage']
+            # llama.cpp reports prompt cache reuse in its timings block
+            if chunk.get('timings'):
+                timings = chunk['timings']
+            for choice in chunk.get('choices') or []:
+                delta = choice.get('delta') or {}
+                if delta.get('content') or delta.get('reasoning_content') or delta.get('tool_calls'):
+                    token_times.append(time.time())
+                    break
+
+        self.client_profile.parse.record(parse_seconds)
+        return {"usage": usage, "timings": timings, "token_times": token_times}
+
+    def build_payload(self, content: str) -> Dict:
+        """Build the chat completion payload for a prompt"""
         payload = {
             "model": "kCode",
             "messages": [
                 {
                     "role": "user",
-                    "content": long_message
+                    "content": content
                 }
             ],
-            "max_tokens": max_tokens,
+            # Prompt processing mode only needs the prefill, so generate a single token
+            "max_tokens": 1 if self.mode == 'pp' else self.max_tokens,
             "temperature": 0.7
         }
+        if self.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    def build_trace_body(self, record: Dict) -> bytes:
+        """Serialize a replayed trace record into a chat completion request body"""
+        payload = {
+            "model": "kCode",
+            "messages": record["messages"],
+            "max_tokens": record.get("max_tokens", self.max_tokens),
+            "temperature": record.get("temperature", 0.7)
+        }
+        if record.get("tools"):
+            payload["tools"] = record["tools"]
+        if self.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return self.json_dumps(payload)
+    
+    def token_counter(self) -> Optional[Callable[[str], int]]:
+        """Exact prompt token count of a user message, or None without a local tokenizer"""
+        if not self.tokenizer_settings:
+            return None
+        counter = TokenCounter(self.tokenizer_settings["tokenizer"], self.tokenizer_settings["chat_template"])
+        return counter.count_user_message if counter.template else counter.count_text
+    
+    def build_prompt_pool(self) -> PromptPool:
+        """Generate and pre-serialize all prompts before the run starts"""
+        count_tokens = self.token_counter()
+        tokenizer_name = self.tokenizer_settings["tokenizer"] if self.tokenizer_settings else None
+        if self.mode == 'tg':
+            # Token generation mode: use fixed prefix (cache should already be warmed)
+            if self.fixed_prefix is None:
+                raise ValueError("fixed_prefix must be provided for token generation mode (-tg)")
+            pool = PromptPool(1, self.context_size, self.build_payload, unique=False,
+                              fixed_prompt=self.fixed_prefix, count_tokens=count_tokens,
+                              tokenizer_name=tokenizer_name)
+        else:
+            # Prompt processing and mixed mode: every request gets a unique random nonce up front
+            pool = PromptPool(self.prompt_pool_size, self.context_size, self.build_payload,
+                              unique=True, cache_path=self.prompt_cache, count_tokens=count_tokens,
+                              tokenizer_name=tokenizer_name)
+        return pool.build()
+    
+    async def send_request(self, session: aiohttp.ClientSession, request_id: int,
+                           intended_start: Optional[float] = None, body: Optional[bytes] = None) -> Dict:
+        """Send a single request and return timing and token information"""
+        # Request bodies are pre-serialized by the prompt pool unless one is given;
+        # getting one is client work and stays out of the measured latency
+        build_started = time.perf_counter()
+        if body is None:
+            body = self.prompt_pool.next_body()
+        self.client_profile.build.record(time.perf_counter() - build_started)
+        
+        # In open-loop mode latency is measured from the scheduled send time
+        start_time = intended_start if intended_start is not None else time.time()
         
         try:
             # Send request
-            async with session.post(self.server_url, json=payload, timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
-                response_data = await response.json()
+            async with session.post(self.server_url, data=body, headers=JSON_HEADERS, timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as response:
+                if self.stream:
+                    response_data = await self.read_stream(response)
+                else:
+                    raw = await response.read()
+                    if response.status != 200:
+                        raise http_error(response.status, raw[:200].decode(errors='replace'))
+                    parse_started = time.perf_counter()
+                    response_data = self.json_loads(raw)
+                    self.client_profile.parse.record(time.perf_counter() - parse_started)
                 
                 # Parse token information from response
                 prompt_tokens = response_data.get('usage', {}).get('prompt_tokens', 0)
                 completion_tokens = response_data.get('usage', {}).get('completion_tokens', 0)
                 total_tokens = response_data.get('usage', {}).get('total_tokens', 0)
                 
+                # Prefix-cache hits, when the server reports them (vLLM prompt_tokens_details / llama.cpp timings)
+                cached_tokens = (response_data.get('usage', {}).get('prompt_tokens_details') or {}).get('cached_tokens')
+                if cached_tokens is None and response_data.get('timings'):
+                    cached_tokens = response_data['timings'].get('cache_n')
+                
                 end_time = time.time()
                 duration = end_time - start_time
                 
+                # Streaming splits the request into prefill (TTFT) and decode (inter-token gaps)
+                ttft = 0
+                tpot = 0
+                inter_token_latencies = []
+                token_times = response_data.get('token_times', [])
+                if token_times:
+                    ttft = token_times[0] - start_time
+                    inter_token_latencies = [b - a for a, b in zip(token_times, token_times[1:])]
+                    if completion_tokens > 1:
+                        tpot = (end_time - token_times[0]) / (completion_tokens - 1)
+                
                 # Calculate tokens per second based on mode
-                if self.mode == 'pp':
+                if self.stream and token_times:
+                    # Streaming: prefill speed for pp, pure decode speed otherwise
+                    if self.mode == 'pp':
+                        tokens_per_sec = prompt_tokens / ttft if ttft > 0 else 0
+                    else:
+                        tokens_per_sec = 1 / tpot if tpot > 0 else 0
+                elif self.mode == 'pp':
                     # Prompt processing: calculate based on prompt tokens
                     tokens_per_sec = prompt_tokens / duration if duration > 0 else 0
                 elif self.mode == 'tg':
@@ -174,18 +294,26 @@ class LLMStressTester:
                 
                 result = {
                     "request_id": request_id,
+                    "start_time": start_time,
                     "status": "SUCCESS",
                     "prompt_tokens": prompt_tokens,
                     "completion_tokens": completion_tokens,
                     "total_tokens": total_tokens,
                     "duration": duration,
-                    "tokens_per_sec": tokens_per_sec
+                    "tokens_per_sec": tokens_per_sec,
+                    "ttft": ttft,
+                    "tpot": tpot,
+                    "inter_token_latencies": inter_token_latencies,
+                    "cached_tokens": cached_tokens
                 }
                 
-                mode_label = "Prompt Processing" if self.mode == 'pp' else ("Token Generation" if self.mode == 'tg' else "Mixed")
-                logger.info(f"Request {request_id}: SUCCESS [{mode_label}] "
-                           f"(Prompt: {prompt_tokens}, Completion: {completion_tokens}, "
-                           f"Total: {total_tokens}, Time: {duration:.3f}s, Tok/sec: {tokens_per_sec:.2f})")
+                if logger.isEnabledFor(self.request_log_level):
+                    mode_label = "Prompt Processing" if self.mode == 'pp' else ("Token Generation" if self.mode == 'tg' else "Mixed")
+                    stream_info = f", TTFT: {ttft:.3f}s, TPOT: {tpot * 1000:.1f}ms" if self.stream else ""
+                    logger.log(self.request_log_level,
+                               f"Request {request_id}: SUCCESS [{mode_label}] "
+                               f"(Prompt: {prompt_tokens}, Completion: {completion_tokens}, "
+                               f"Total: {total_tokens}, Time: {duration:.3f}s, Tok/sec: {tokens_per_sec:.2f}{stream_info})")
                 
                 return result
                 
@@ -195,39 +323,98 @@ class LLMStressTester:
             
             result = {
                 "request_id": request_id,
+                "start_time": start_time,
                 "status": "FAILED",
                 "prompt_tokens": 0,
                 "completion_tokens": 0,
                 "total_tokens": 0,
                 "duration": duration,
-                "tokens_per_sec": 0
+                "tokens_per_sec": 0,
+                "ttft": 0,
+                "tpot": 0,
+                "inter_token_latencies": [],
+                "cached_tokens": None,
+                "backpressure": backpressure_reason(e)  # 429 / 503 / timeout, for the adaptive controller
             }
             
             logger.error(f"Request {request_id}: FAILED (Time: {duration:.3f}s, Error: {str(e)})")
             return result
     
-    async def run_concurrent_requests(self) -> List[Dict]:
-        """Run concurrent requests with semaphore for limiting concurrency"""
+    def record_result(self, result: Dict):
+        """Record a finished request"""
+        self.aggregator.record(result)
+        self.timeline.record(result)
+        if self.result_writer:
+            self.result_writer.append(result)
+    
+    def request_ids(self) -> Iterator[int]:
+        """Endless request ids that stop once the run has lasted `duration` seconds"""
+        for request_id in itertools.count(1):
+            if time.time() - self.run_start >= self.duration:
+                return
+            yield request_id
+    
+    async def run_concurrent_requests(self) -> ResultAggregator:
+        """Run requests with a fixed pool of concurrent workers (or open-loop arrivals)"""
+        # Build every request body up front so nothing is generated on the hot path
+        # (in a thread, so tokenizer work never runs on the event loop)
+        if self.prompt_pool is None and self.replay is None:
+            self.prompt_pool = await asyncio.get_running_loop().run_in_executor(None, self.build_prompt_pool)
+        if self.results_dir:
+            self.result_writer = ResultWriter(self.results_dir, self.results_shard)
+        
         # Create session with connection pooling
-        connector = aiohttp.TCPConnector(limit=self.concurrent_requests)
+        # Open-loop mode must never queue requests behind the connection pool
+        open_loop = self.arrival_schedule is not None or self.replay is not None
+        connector = aiohttp.TCPConnector(limit=0 if open_loop else
+                                         (self.adaptive.max_limit if self.adaptive else self.concurrent_requests))
         timeout = aiohttp.ClientTimeout(total=self.request_timeout)
         
         async with aiohttp.ClientSession(
             connector=connector, 
             timeout=timeout
         ) as session:
-            # Create a semaphore to limit concurrent requests
-            semaphore = asyncio.Semaphore(self.concurrent_requests)
+            # Each worker pulls the next request id when its previous request finishes,
+            # so memory stays flat no matter how many requests are sent
+            request_ids = self.request_ids() if self.duration else iter(range(1, self.total_requests + 1))
             
-            async def limited_send_request(request_id):
-                async with semaphore:
-                    return await self.send_request(session, request_id)
+            async def worker():
+                for request_id in request_ids:
+                    self.in_flight += 1
+                    result = await self.send_request(session, request_id)
+                    self.in_flight -= 1
+                    self.record_result(result)
+            
+            async def adaptive_worker():
+                for request_id in request_ids:
+                    slot = await self.adaptive.acquire()
+                    self.in_flight += 1
+                    result = await self.send_request(session, request_id)
+                    self.in_flight -= 1
+                    self.adaptive.release_result(slot, result)
+                    self.record_result(result)
+            
+            async def send_and_record(request_id, intended_start, body):
+                self.in_flight += 1
+                result = await self.send_request(session, request_id, intended_start, body)
+                self.in_flight -= 1
+                self.record_result(result)
             
             logger.info("Configuration:")
             logger.info(f"  Server URL: {self.server_url}")
             logger.info(f"  Mode: {self.mode.upper() if self.mode else 'MIXED'}")
-            logger.info(f"  Concurrent Requests: {self.concurrent_requests}")
-            logger.info(f"  Total Requests: {self.total_requests}")
+            if self.replay:
+                logger.info(f"  Trace Replay: {self.replay.describe()} (open loop)")
+            elif self.arrival_schedule:
+                logger.info(f"  Arrival Process: {self.arrival_schedule.describe()} (open loop)")
+            elif self.adaptive:
+                logger.info(f"  Concurrent Requests: adaptive, {self.adaptive.describe()}")
+            else:
+                logger.info(f"  Concurrent Requests: {self.concurrent_requests}")
+            if self.duration:
+                logger.info(f"  Duration: {self.duration:.0f} seconds")
+            else:
+                logger.info(f"  Total Requests: {self.total_requests}")
             logger.info(f"  Context Size: ~{self.context_size} tokens")
             if self.mode == 'pp':
                 logger.info(f"  Max Tokens per Request: 1 (Prompt Processing Mode)")
@@ -238,6 +425,7 @@ class LLMStressTester:
             elif self.mode != 'tg' and self.mode != 'pp':
                 logger.info(f"  Prefix: Randomized (Mixed Mode)")
             logger.info(f"  Request Timeout: {self.request_timeout} seconds")
+            logger.info(f"  Streaming: {'Enabled (TTFT / inter-token latency)' if self.stream else 'Disabled'}")
             logger.info("")
             
             # For token generation mode, send pre-flight request first to warm cache
@@ -245,52 +433,118 @@ class LLMStressTester:
                 logger.info("Sending pre-flight request to warm cache...")
                 await self.send_preflight_request(session)
             
-            logger.info(f"Sending {self.concurrent_requests} concurrent requests, {self.total_requests} total...")
-            
-            # Create tasks for all requests
-            tasks = [limited_send_request(i) for i in range(1, self.total_requests + 1)]
+            # Multi-process workers wait here until every worker is ready
+            if self.start_barrier:
+                self.start_barrier()
             
-            # Execute all tasks concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Filter out exceptions and collect results
-            for result in results:
-                if not isinstance(result, Exception):
-                    self.results.append(result)
+            # Event-loop lag shows when the client itself delays sends and receives
+            lag_probe = LoopLagProbe(self.client_profile.loop_lag, self.lag_probe_interval)
+            lag_probe.start()
+            monitor = TimelineMonitor(self.timeline, lambda: (self.in_flight, self.aggregator.total_requests),
+                                      None if self.duration else self.total_requests,
+                                      live=self.live_view, window=self.rolling_window)
+            self.run_start = run_start = time.time()
+            monitor.start(run_start)
+            if self.replay:
+                logger.info(f"Replaying {self.replay.describe()}...")
+                await dispatch_open_loop(self.replay.schedule(self.build_trace_body), send_and_record)
+            elif self.arrival_schedule and self.duration:
+                logger.info(f"Sending requests at {self.arrival_schedule.describe()} for {self.duration:.0f}s...")
+                offsets = itertools.takewhile(lambda offset: offset < self.duration, self.arrival_schedule.offsets())
+                await dispatch_open_loop(((offset, None) for offset in offsets), send_and_record)
+            elif self.arrival_schedule:
+                logger.info(f"Sending {self.total_requests} requests at {self.arrival_schedule.describe()}...")
+                schedule = ((offset, None) for offset in self.arrival_schedule.offsets(self.total_requests))
+                await dispatch_open_loop(schedule, send_and_record)
+            elif self.adaptive:
+                logger.info(f"Sending {self.total_requests} requests with adaptive concurrency..." if not self.duration
+                            else f"Sending for {self.duration:.0f}s with adaptive concurrency...")
+                # One worker per possible slot; the controller decides how many may send at once
+                await asyncio.gather(*(adaptive_worker() for _ in range(self.adaptive.max_limit)), return_exceptions=True)
+                self.adaptive_report = self.adaptive.report()
+            else:
+                total = f"for {self.duration:.0f}s" if self.duration else f"{self.total_requests} total"
+                logger.info(f"Sending {self.concurrent_requests} concurrent requests, {total}...")
+                
+                # Execute all workers concurrently
+                await asyncio.gather(*(worker() for _ in range(self.concurrent_requests)), return_exceptions=True)
+            self.wall_duration = time.time() - run_start
+            await lag_probe.stop()
+            await monitor.stop()
+            self.prompt_pool_stats = self.prompt_pool.report() if self.prompt_pool else None
+            if self.result_writer:
+                self.result_writer.close()
             
-            return self.results
+            return self.aggregator
+    
+    def export_state(self) -> Dict:
+        """Picklable summary of this run, merged by the parent in multi-process mode"""
+        return {
+            "aggregator": self.aggregator,
+            "wall_duration": self.wall_duration,
+            "run_start": self.run_start,
+            "prompt_pool_stats": self.prompt_pool_stats,
+            "client_profile": self.client_profile,
+            "timeline": self.timeline,
+            "adaptive_report": self.adaptive_report
+        }
+    
+    def merge_state(self, state: Dict):
+        """Merge a worker's exported state into this tester"""
+        self.aggregator.merge(state["aggregator"])
+        # Workers start together on a barrier, so the run lasts as long as the slowest one
+        self.wall_duration = max(self.wall_duration, state["wall_duration"])
+        self.run_start = min(self.run_start or state["run_start"], state["run_start"])
+        self.client_profile.merge(state["client_profile"])
+        self.timeline.merge(state["timeline"])
+        reports = [r for r in (self.prompt_pool_stats, state["prompt_pool_stats"]) if r]
+        self.prompt_pool_stats = merge_prompt_pool_reports(reports) if reports else None
+        reports = [r for r in (self.adaptive_report, state["adaptive_report"]) if r]
+        self.adaptive_report = merge_adaptive_reports(reports) if reports else None
     
     def calculate_statistics(self) -> Dict:
-        """Calculate statistics from results"""
-        successful_results = [r for r in self.results if r.get('status') == 'SUCCESS']
+        """Calculate statistics from the aggregated results"""
+        aggregator = self.aggregator
         
-        if not successful_results:
+        if not aggregator.successful_requests:
             return {}
         
-        # Extract token values
-        prompt_tokens_list = [r['prompt_tokens'] for r in successful_results]
-        completion_tokens_list = [r['completion_tokens'] for r in successful_results]
-        total_tokens_list = [r['total_tokens'] for r in successful_results]
-        tokens_per_sec_list = [r['tokens_per_sec'] for r in successful_results]
+        # Averages and exact min/max come straight from the histograms
+        stats = {}
+        for name in ('prompt_tokens', 'completion_tokens', 'total_tokens', 'tokens_per_sec'):
+            histogram = aggregator.histograms[name]
+            stats[f"average_{name}"] = histogram.mean
+            stats[f"min_{name}"] = histogram.min
+            stats[f"max_{name}"] = histogram.max
+        cached = aggregator.histogram('cached_tokens')
+        if cached:
+            stats["average_cached_tokens"] = cached.mean
+        stats["total_requests"] = aggregator.total_requests
+        stats["successful_requests"] = aggregator.successful_requests
+        stats["success_rate"] = (aggregator.successful_requests / aggregator.total_requests) * 100
         
-        # Calculate statistics
-        stats = {
-            "average_prompt_tokens": sum(prompt_tokens_list) / len(prompt_tokens_list),
-            "average_completion_tokens": sum(completion_tokens_list) / len(completion_tokens_list),
-            "average_total_tokens": sum(total_tokens_list) / len(total_tokens_list),
-            "average_tokens_per_sec": sum(tokens_per_sec_list) / len(tokens_per_sec_list),
-            "min_prompt_tokens": min(prompt_tokens_list),
-            "max_prompt_tokens": max(prompt_tokens_list),
-            "min_completion_tokens": min(completion_tokens_list),
-            "max_completion_tokens": max(completion_tokens_list),
-            "min_total_tokens": min(total_tokens_list),
-            "max_total_tokens": max(total_tokens_list),
-            "min_tokens_per_sec": min(tokens_per_sec_list),
-            "max_tokens_per_sec": max(tokens_per_sec_list),
-            "total_requests": len(self.results),
-            "successful_requests": len(successful_results),
-            "success_rate": (len(successful_results) / len(self.results)) * 100
-        }
+        # Tail latency percentiles
+        stats["percentiles"] = {}
+        for name in ('duration', 'ttft', 'tpot', 'inter_token_latency', 'tokens_per_sec'):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                stats["percentiles"][name] = histogram.percentiles()
+        
+        # Offered vs achieved load over wall-clock time
+        if self.wall_duration > 0:
+            stats["wall_duration"] = self.wall_duration
+            stats["achieved_rate"] = aggregator.successful_requests / self.wall_duration
+            stats["throughput"] = self.timeline.report(self.run_start, self.run_start + self.wall_duration,
+                                                       self.warmup_seconds, self.cooldown_seconds,
+                                                       self.rolling_window)
+        
+        # Streaming latency breakdown
+        for name, key in (('ttft', 'ttft'), ('tpot', 'tpot'), ('inter_token_latency', 'itl')):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                stats[f"average_{key}"] = histogram.mean
+                stats[f"min_{key}"] = histogram.min
+                stats[f"max_{key}"] = histogram.max
         
         return stats
     
@@ -312,6 +566,9 @@ class LLMStressTester:
         print(f"Average Prompt Tokens: {stats['average_prompt_tokens']:.0f}")
         print(f"Average Completion Tokens: {stats['average_completion_tokens']:.0f}")
         print(f"Average Total Tokens: {stats['average_total_tokens']:.0f}")
+        if "average_cached_tokens" in stats:
+            hit_rate = stats['average_cached_tokens'] / stats['average_prompt_tokens'] * 100 if stats['average_prompt_tokens'] else 0
+            print(f"Average Cached Prompt Tokens: {stats['average_cached_tokens']:.0f} ({hit_rate:.1f}% prefix-cache hits)")
         if self.mode == 'pp':
             print(f"Average Prompt Processing Tokens/Second: {stats['average_tokens_per_sec']:.2f}")
         elif self.mode == 'tg':
@@ -327,6 +584,51 @@ class LLMStressTester:
         print(f"Min Tokens/Second: {stats['min_tokens_per_sec']:.2f}")
         print(f"Max Tokens/Second: {stats['max_tokens_per_sec']:.2f}")
         
+        if "average_ttft" in stats:
+            print("\nStreaming Latency Breakdown:")
+            print(f"  Average Time To First Token: {stats['average_ttft']:.3f}s")
+            print(f"  Min Time To First Token: {stats['min_ttft']:.3f}s")
+            print(f"  Max Time To First Token: {stats['max_ttft']:.3f}s")
+        if "average_tpot" in stats:
+            print(f"  Average Time Per Output Token: {stats['average_tpot'] * 1000:.2f}ms")
+            print(f"  Min Time Per Output Token: {stats['min_tpot'] * 1000:.2f}ms")
+            print(f"  Max Time Per Output Token: {stats['max_tpot'] * 1000:.2f}ms")
+        if "average_itl" in stats:
+            print(f"  Average Inter-Token Latency: {stats['average_itl'] * 1000:.2f}ms")
+            print(f"  Max Inter-Token Latency: {stats['max_itl'] * 1000:.2f}ms")
+        
+        if self.replay and "achieved_rate" in stats:
+            print("\nTrace Replay:")
+            print(f"  Trace: {self.replay.describe()}")
+            print(f"  Achieved Rate: {stats['achieved_rate']:.2f} req/s over {stats['wall_duration']:.2f}s")
+            print("  Latencies are measured from the recorded arrival time (coordinated-omission corrected)")
+        elif self.arrival_schedule and "achieved_rate" in stats:
+            print("\nOpen-Loop Load:")
+            print(f"  Arrival Process: {self.arrival_schedule.describe()}")
+            print(f"  Achieved Rate: {stats['achieved_rate']:.2f} req/s over {stats['wall_duration']:.2f}s")
+            print("  Latencies are measured from the scheduled send time (coordinated-omission corrected)")
+        
+        print_throughput_report(stats.get("throughput"))
+        print_adaptive_report(self.adaptive_report)
+        
+        print("\nLatency Percentiles:")
+        print(f"  {'Metric':<24}" + "".join(f"{'p' + format(q, 'g'):>12}" for q in PERCENTILES))
+        labels = {
+            "duration": ("Request Latency (s)", 1),
+            "ttft": ("Time To First Token (s)", 1),
+            "tpot": ("Time Per Output Tok (ms)", 1000),
+            "inter_token_latency": ("Inter-Token Latency (ms)", 1000),
+            "tokens_per_sec": ("Tokens/Second", 1)
+        }
+        for name, values in stats["percentiles"].items():
+            label, scale = labels[name]
+            print(f"  {label:<24}" + "".join(f"{values[q] * scale:>12.3f}" for q in PERCENTILES))
+        
+        print_prompt_pool_report(self.prompt_pool_stats)
+        print_server_metrics_report(self.server_metrics)
+        print_client_profile_report(self.client_profile.report(self.aggregator.histogram('duration'),
+                                                               self.client_bound_threshold))
+        
         print(f"\nSuccess Rate: {stats['success_rate']:.2f}% ({stats['successful_requests']}/{stats['total_requests']} requests)")
         
         # Log summary for verification of context setup
@@ -339,12 +641,11 @@ class LLMStressTester:
         
         # Show first few results to verify context setup
         print("Sample results (first 5 requests):")
-        successful_results = [r for r in self.results if r.get('status') == 'SUCCESS']
-        for result in successful_results[:5]:
+        for result in self.aggregator.samples:
             print(f"  Prompt: {result['prompt_tokens']}, Completion: {result['completion_tokens']}, "
                   f"Total: {result['total_tokens']}, Tok/sec: {result['tokens_per_sec']:.2f}")
 
-async def main():
+def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='LLM Stress Test Script')
     parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
                        help='Server URL (default: http://localhost:8000/v1/chat/completions)')
@@ -364,12 +665,35 @@ async def main():
                        help='Maximum tokens to generate per request (default: 350, ignored in -pp mode)')
     parser.add_argument('--fixed-prefix', type=str, default=None,
                        help='Fixed prefix for token generation mode (-tg). If not provided, generates one based on context-size')
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream responses (SSE) and report time-to-first-token, inter-token latency and time-per-output-token')
+    add_arrival_arguments(parser)
+    add_prompt_pool_arguments(parser)
+    add_worker_arguments(parser)
+    add_metrics_arguments(parser)
+    add_results_arguments(parser)
+    add_profiling_arguments(parser)
+    add_timeline_arguments(parser)
+    add_tokenizer_arguments(parser, 'vllm_args.sh')
+    add_replay_arguments(parser)
+    add_adaptive_arguments(parser)
     
     args = parser.parse_args()
     
+    if args.adaptive and args.target_latency is None:
+        parser.error("--adaptive needs --target-latency")
+    if args.adaptive and (args.rate is not None or args.replay):
+        parser.error("--adaptive controls a closed loop and cannot be combined with --rate or --replay")
+    # Invalid arrival options end here with a usage error instead of failing mid-run
+    schedule_from_args(args, parser)
+    return args
+
+
+async def main(args: argparse.Namespace):
     # Determine mode
     mode = None
     fixed_prefix = args.fixed_prefix
+    tokenizer_settings = tokenizer_settings_from_args(args)
     
     if args.prompt_processing and args.token_generation:
         logger.error("Cannot use both -pp and -tg modes simultaneously")
@@ -383,16 +707,18 @@ async def main():
         if fixed_prefix is None:
             tester_temp = LLMStressTester(
                 server_url=args.server_url,
-                context_size=args.context_size
+                context_size=args.context_size,
+                tokenizer_settings=tokenizer_settings
             )
-            fixed_prefix = tester_temp.generate_long_message(args.context_size)
-            logger.info(f"Generated fixed prefix of ~{args.context_size} tokens for token generation mode")
+            fixed_prefix = tester_temp.generate_fixed_prefix()
+            logger.info(f"Generated fixed prefix of {'' if tokenizer_settings else '~'}{args.context_size} tokens "
+                        f"for token generation mode")
     else:
         # Default to mixed mode: randomized prefix with full max_tokens
         mode = 'mixed'
     
     # Create tester instance
-    tester = LLMStressTester(
+    tester_kwargs = dict(
         server_url=args.server_url,
         concurrent_requests=args.concurrent_requests,
         total_requests=args.total_requests,
@@ -400,14 +726,51 @@ async def main():
         context_size=args.context_size,
         max_tokens=args.max_tokens,
         mode=mode,
-        fixed_prefix=fixed_prefix
+        fixed_prefix=fixed_prefix,
+        stream=args.stream,
+        arrival_schedule=schedule_from_args(args),
+        prompt_pool_size=args.prompt_pool_size,
+        prompt_cache=args.prompt_cache,
+        tokenizer_settings=tokenizer_settings,
+        replay=replay_from_args(args),
+        results_dir=args.results_dir,
+        fast_path=args.fast_path,
+        client_bound_threshold=args.client_bound_threshold,
+        lag_probe_interval=args.lag_probe_interval,
+        live_view=args.live,
+        rolling_window=args.rolling_window,
+        warmup_seconds=args.warmup_seconds,
+        cooldown_seconds=args.cooldown_seconds,
+        adaptive=controller_from_args(args)
     )
     
     # Run the stress test
     logger.info("Starting enhanced stress test for LLM server...")
     
-    # Run asynchronously
-    await tester.run_concurrent_requests()
+    # Run metadata goes next to the per-request columns so stored runs can be compared later
+    if args.results_dir:
+        write_run_metadata(args.results_dir, run_metadata('llm', mode, args.server_args, "kCode"))
+    
+    # Server-side metrics are polled from a background thread for the whole run
+    scraper = scraper_from_args(args)
+    if scraper:
+        scraper.start()
+    
+    if args.workers > 1:
+        # Shard the load across processes and merge their results
+        tester = run_workers(LLMStressTester, tester_kwargs, args.workers)
+    else:
+        tester = LLMStressTester(**tester_kwargs)
+        if scraper:
+            scraper.client_probe = lambda: (tester.in_flight, tester.aggregator.total_requests)
+        
+        # Run asynchronously
+        await tester.run_concurrent_requests()
+    
+    if scraper:
+        scraper.stop()
+        tester.server_metrics = scraper.report(tester.run_start, tester.run_start + tester.wall_duration,
+                                               timeline=args.metrics_timeline)
     
     # Print final report
     tester.print_report()
@@ -416,7 +779,11 @@ if __name__ == "__main__":
     # Check if aiohttp is available
     try:
         import aiohttp
-        asyncio.run(main())
+        args = parse_args()
+        # The event loop policy must be set before asyncio.run creates the loop
+        if args.fast_path:
+            install_fast_event_loop()
+        asyncio.run(main(args))
     except ImportError:
         print("Error: aiohttp library is required for this script.")
         print("Please install it with: pip install aiohttp")
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Concurrency / arrival-rate sweep for self-hosted LLM server
+Steps the load across a range with the LLM stress tester, repeats every point until its
+throughput is steady, then finds the saturation knee, fits the Universal Scalability Law
+and reports the highest throughput that still meets the TTFT / TPOT SLOs.
+Optionally repeats the sweep for server argument variants (e.g. --max-num-seqs, -np),
+starting each through a launcher, and prints a comparison table.
+"""
+
+import asyncio
+import argparse
+import importlib.util
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+from arrival import ArrivalSchedule
+from histogram import PERCENTILES
+from server_args import apply_overrides, parse_args_text, read_args_file
+from server_launcher import LAUNCHERS, create_launcher
+from stress_test_llm import LLMStressTester
+from throughput_timeline import ROLLING_WINDOW
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Curves that stay this close to linear scaling (in normalized units) have no knee
+KNEE_MIN_DISTANCE = 0.05
+
+
+def find_knee(loads: List[float], throughputs: List[float]) -> Optional[int]:
+    """Index of the saturation knee of a throughput curve (Kneedle)
+
+    Both axes are normalized to [0, 1]; the knee is the point furthest above the diagonal,
+    i.e. where adding load stops buying proportional throughput.
+    """
+    if len(loads) < 3:
+        return None
+    low_x, high_x = min(loads), max(loads)
+    low_y, high_y = min(throughputs), max(throughputs)
+    if high_x == low_x or high_y == low_y:
+        return None
+    distances = [(y - low_y) / (high_y - low_y) - (x - low_x) / (high_x - low_x)
+                 for x, y in zip(loads, throughputs)]
+    knee = max(range(len(distances)), key=distances.__getitem__)
+    return knee if distances[knee] >= KNEE_MIN_DISTANCE else None
+
+
+def solve_linear(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """Solve a small dense linear system by Gaussian elimination, None if singular"""
+    n = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def fit_usl(concurrency: List[float], throughput: List[float]) -> Optional[Dict]:
+    """Least-squares fit of the Universal Scalability Law X(N) = lambda*N / (1 + sigma*(N-1) + kappa*N*(N-1))
+
+    Linearized as N/X = a + b*(N-1) + c*N*(N-1) with lambda = 1/a, sigma = b/a, kappa = c/a.
+    """
+    points = [(n, x) for n, x in zip(concurrency, throughput) if x > 0]
+    if len(points) < 3:
+        return None
+    rows = [[1.0, n - 1.0, n * (n - 1.0)] for n, _ in points]
+    ys = [n / x for n, x in points]
+    normal = [[sum(row[i] * row[j] for row in rows) for j in range(3)] for i in range(3)]
+    rhs = [sum(row[i] * y for row, y in zip(rows, ys)) for i in range(3)]
+    solution = solve_linear(normal, rhs)
+    if solution is None or solution[0] <= 0:
+        return None
+    a, b, c = solution
+    fit = {"lambda": 1 / a, "sigma": b / a, "kappa": c / a, "peak_concurrency": None}
+    if fit["kappa"] > 0 and fit["sigma"] < 1:
+        fit["peak_concurrency"] = math.sqrt((1 - fit["sigma"]) / fit["kappa"])
+    return fit
+
+
+class SweepRunner:
+    def __init__(self, server_url: str, loads: List[float], load_type: str = 'concurrency',
+                 requests_per_point: int = 32, max_runs: int = 3, steady_tolerance: float = 0.1,
+                 context_size: int = 6000, max_tokens: int = 350, mode: str = 'mixed',
+                 request_timeout: int = 180, slo_ttft: Optional[float] = None,
+                 slo_tpot: Optional[float] = None, slo_percentile: float = 99):
+        self.server_url = server_url
+        self.loads = loads  # Concurrency levels or arrival rates (requests/second)
+        self.load_type = load_type  # 'concurrency' (closed loop) or 'rate' (open loop)
+        self.requests_per_point = requests_per_point
+        self.max_runs = max_runs  # Repeats per point while throughput is still moving
+        self.steady_tolerance = steady_tolerance  # Max relative throughput change between repeats
+        self.context_size = context_size
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.request_timeout = request_timeout
+        self.slo_ttft = slo_ttft  # Seconds, at slo_percentile
+        self.slo_tpot = slo_tpot
+        self.slo_percentile = slo_percentile
+
+        self.prompt_pool = None  # Built once and shared by every point
+        self.points: List[Dict] = []
+
+    def make_tester(self, load: float) -> LLMStressTester:
+        """Create a streaming tester for one load level"""
+        concurrent = int(load) if self.load_type == 'concurrency' else 1
+        return LLMStressTester(
+            server_url=self.server_url,
+            concurrent_requests=concurrent,
+            # Closed-loop points need enough requests for every worker to cycle a few times
+            total_requests=max(self.requests_per_point, concurrent * 4),
+            request_timeout=self.request_timeout,
+            context_size=self.context_size,
+            max_tokens=self.max_tokens,
+            mode=self.mode,
+            stream=True,
+            arrival_schedule=ArrivalSchedule(load) if self.load_type == 'rate' else None
+        )
+
+    def measure(self, tester: LLMStressTester, load: float, runs: int) -> Dict:
+        """Summarize one run of a point over its steady-state window"""
+        aggregator = tester.aggregator
+        wall = tester.wall_duration or 1e-9
+        # Ramp-up and the closed-loop drain tail are trimmed off the rates; the rolling window
+        # shrinks with the run so short points can still show a plateau
+        window = min(ROLLING_WINDOW, max(tester.timeline.bucket_seconds, wall / 4))
+        timeline = tester.timeline.report(tester.run_start, tester.run_start + wall, window=window)
+        steady = timeline["steady"] if timeline else None
+        measured = steady or (timeline["full"] if timeline else None)
+        # Prefill-only runs are judged on prompt tokens, everything else on generated tokens
+        token_field = 'prompt_tokens' if self.mode == 'pp' else 'completion_tokens'
+        point = {
+            "load": load,
+            "runs": runs,
+            "requests": aggregator.total_requests,
+            "success_rate": aggregator.successful_requests / aggregator.total_requests if aggregator.total_requests else 0,
+            "request_rate": measured["request_rate"] if measured else aggregator.successful_requests / wall,
+            "throughput": (measured[f"{token_field}_per_sec"] if measured
+                           else aggregator.histograms[token_field].total / wall),
+            "steady_seconds": steady["seconds"] if steady else None,  # None: no plateau, whole run used
+            "latency": {}
+        }
+        for name in ('ttft', 'tpot', 'duration'):
+            histogram = aggregator.histogram(name)
+            if histogram:
+                point["latency"][name] = histogram.percentiles()
+        point["meets_slo"] = self.meets_slo(point)
+        return point
+
+    def meets_slo(self, point: Dict) -> bool:
+        """Whether a point meets the TTFT / TPOT SLOs at the SLO percentile"""
+        if point["success_rate"] < 0.99:
+            return False
+        for name, limit in (('ttft', self.slo_ttft), ('tpot', self.slo_tpot)):
+            if limit is None:
+                continue
+            percentiles = point["latency"].get(name)
+            if percentiles is None or percentiles[self.slo_percentile] > limit:
+                return False
+        return True
+
+    async def run_point(self, load: float) -> Dict:
+        """Repeat a load level until two consecutive runs agree on throughput"""
+        previous = None
+        for run in range(1, self.max_runs + 1):
+            tester = self.make_tester(load)
+            if self.prompt_pool is None:
+                self.prompt_pool = await asyncio.get_running_loop().run_in_executor(None, tester.build_prompt_pool)
+            tester.prompt_pool = self.prompt_pool
+            await tester.run_concurrent_requests()
+            point = self.measure(tester, load, run)
+            if previous is not None and previous["throughput"] > 0:
+                change = abs(point["throughput"] - previous["throughput"]) / previous["throughput"]
+                if change <= self.steady_tolerance:
+                    break
+            previous = point
+        else:
+            logger.warning(f"{self.load_type} {load:g}: throughput not steady after {self.max_runs} runs")
+        logger.info(f"{self.load_type} {load:g}: {point['throughput']:.1f} tok/s, "
+                    f"{point['request_rate']:.2f} req/s after {point['runs']} run(s)")
+        return point
+
+    async def run(self) -> List[Dict]:
+        """Sweep every load level in ascending order"""
+        self.points = []
+        for load in sorted(self.loads):
+            self.points.append(await self.run_point(load))
+        return self.points
+
+    def summarize(self) -> Dict:
+        """Knee, best SLO-compliant point and USL fit of the sweep"""
+        loads = [point["load"] for point in self.points]
+        throughputs = [point["throughput"] for point in self.points]
+        knee = find_knee(loads, throughputs)
+        within_slo = [point for point in self.points if point["meets_slo"]]
+        summary = {
+            "knee": self.points[knee] if knee is not None else None,
+            "peak": max(self.points, key=lambda point: point["throughput"]) if self.points else None,
+            "best_within_slo": max(within_slo, key=lambda point: point["throughput"]) if within_slo else None,
+            "usl": None
+        }
+        if self.load_type == 'concurrency':
+            summary["usl"] = fit_usl(loads, [point["request_rate"] for point in self.points])
+        return summary
+
+    def print_report(self, title: str = "SWEEP"):
+        """Print the per-point table and the sweep summary"""
+        unit = "prompt tok/s" if self.mode == 'pp' else "output tok/s"
+        q = self.slo_percentile
+        print(f"\n=== {title} REPORT ===")
+        header = (f"{self.load_type.capitalize():>11} {'Runs':>4} {'OK':>6} {'Req/s':>7} {unit:>13} "
+                  f"{'TTFT p50':>9} {f'TTFT p{q:g}':>10} {'TPOT p50':>9} {f'TPOT p{q:g}':>10} {'SLO':>4} {'Steady s':>8}")
+        print(header)
+        print("-" * len(header))
+        for point in self.points:
+            ttft = point["latency"].get('ttft', {})
+            tpot = point["latency"].get('tpot', {})
+            print(f"{point['load']:>11g} {point['runs']:>4} {point['success_rate']:>6.0%} "
+                  f"{point['request_rate']:>7.2f} {point['throughput']:>13.1f} "
+                  f"{ttft.get(50, math.nan):>9.3f} {ttft.get(q, math.nan):>10.3f} "
+                  f"{tpot.get(50, math.nan):>9.4f} {tpot.get(q, math.nan):>10.4f} "
+                  f"{'yes' if point['meets_slo'] else 'no':>4} "
+                  f"{format(point['steady_seconds'], '.1f') if point['steady_seconds'] else '-':>8}")
+        if any(point["steady_seconds"] is None for point in self.points):
+            print("Steady s '-': no throughput plateau found, rates cover the whole run including ramp-up and drain")
+
+        summary = self.summarize()
+        print("")
+        if summary["knee"]:
+            print(f"Saturation knee: {self.load_type} {summary['knee']['load']:g} "
+                  f"({summary['knee']['throughput']:.1f} {unit})")
+        else:
+            print("Saturation knee: none within the swept range (throughput still scales)")
+        if summary["peak"]:
+            print(f"Peak throughput: {summary['peak']['throughput']:.1f} {unit} at {self.load_type} {summary['peak']['load']:g}")
+        slo_text = ", ".join(f"{name} p{q:g} <= {limit}s" for name, limit in
+                             (('TTFT', self.slo_ttft), ('TPOT', self.slo_tpot)) if limit is not None)
+        if summary["best_within_slo"]:
+            best = summary["best_within_slo"]
+            print(f"Max throughput within SLO ({slo_text or 'success rate >= 99%'}): "
+                  f"{best['throughput']:.1f} {unit} at {self.load_type} {best['load']:g}")
+        else:
+            print(f"No point met the SLO ({slo_text or 'success rate >= 99%'})")
+        usl = summary["usl"]
+        if usl:
+            peak = f", predicted peak at concurrency {usl['peak_concurrency']:.1f}" if usl["peak_concurrency"] else ""
+            print(f"USL fit: lambda {usl['lambda']:.3f} req/s, contention sigma {usl['sigma']:.4f}, "
+                  f"coherency kappa {usl['kappa']:.5f}{peak}")
+
+
+def parse_list(text: str) -> List[float]:
+    """argparse type for comma-separated numbers"""
+    return [float(item) for item in text.split(',') if item.strip()]
+
+
+def parse_variant(spec: str, base_args: List[str]) -> tuple:
+    """Turn 'label:--flag value ...' or an args file path into (label, server args)"""
+    if os.path.exists(spec):
+        return os.path.basename(spec), read_args_file(spec)
+    label, _, overrides = spec.partition(':')
+    if not overrides:
+        label, overrides = spec, spec
+    return label, apply_overrides(base_args, parse_args_text(overrides))
+
+
+def print_comparison(results: List[tuple], load_type: str):
+    """Print one summary row per server variant"""
+    print("\n=== VARIANT COMPARISON ===")
+    header = f"{'Variant':<32} {'Knee':>8} {'Knee tput':>10} {'Peak tput':>10} {'SLO load':>9} {'SLO tput':>10}"
+    print(header)
+    print("-" * len(header))
+    for label, summary in results:
+        if summary is None:
+            print(f"{label:<32} failed to start")
+            continue
+        knee, peak, best = summary["knee"], summary["peak"], summary["best_within_slo"]
+        print(f"{label:<32} "
+              f"{format(knee['load'], 'g') if knee else '-':>8} {format(knee['throughput'], '.1f') if knee else '-':>10} "
+              f"{format(peak['throughput'], '.1f') if peak else '-':>10} "
+              f"{format(best['load'], 'g') if best else '-':>9} {format(best['throughput'], '.1f') if best else '-':>10}")
+    print(f"\nKnee / SLO load are {load_type} levels; throughput is tokens/second.")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='LLM Concurrency / Rate Sweep')
+    parser.add_argument('--server-url', default='http://localhost:8000/v1/chat/completions',
+                       help='Server URL (default: http://localhost:8000/v1/chat/completions)')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=parse_list, default=None,
+                       help='Comma-separated concurrency levels to sweep (default: 1,2,4,8,16)')
+    load.add_argument('--rates', type=parse_list, default=None,
+                       help='Comma-separated Poisson arrival rates (requests/second) to sweep instead')
+    parser.add_argument('-pp', '--prompt-processing', action='store_true',
+                       help='Prompt processing mode: max_tokens=1, throughput in prompt tokens/second')
+    parser.add_argument('--requests-per-point', type=int, default=32,
+                       help='Requests per run of each point (default: 32)')
+    parser.add_argument('--max-runs', type=int, default=3,
+                       help='Maximum runs per point while waiting for steady throughput (default: 3)')
+    parser.add_argument('--steady-tolerance', type=float, default=0.1,
+                       help='Relative throughput change between runs that counts as steady (default: 0.1)')
+    parser.add_argument('--context-size', type=int, default=6000,
+                       help='Desired context window in tokens (default: 6000)')
+    parser.add_argument('--max-tokens', type=int, default=350,
+                       help='Maximum tokens to generate per request (default: 350)')
+    parser.add_argument('--request-timeout', type=int, default=180,
+                       help='Request timeout in seconds (default: 180)')
+    parser.add_argument('--slo-ttft', type=float, default=None,
+                       help='TTFT SLO in seconds (default: none)')
+    parser.add_argument('--slo-tpot', type=float, default=None,
+                       help='TPOT SLO in seconds (default: none)')
+    parser.add_argument('--slo-percentile', type=float, default=99, choices=PERCENTILES,
+                       help='Percentile the SLOs apply to (default: 99)')
+    parser.add_argument('--server-args', type=str, default='vllm_args.sh',
+                       help='Base server args file the variants modify (default: vllm_args.sh)')
+    parser.add_argument('--variant', action='append', default=[],
+                       help='Server variant to launch and sweep: an args file, or "label:--flag value ..." '
+                            'overrides of --server-args; repeatable (default: sweep the running server)')
+    parser.add_argument('--launcher', choices=LAUNCHERS, default='command',
+                       help='How variants are started (default: command)')
+    parser.add_argument('--launch-command', type=str, default=None,
+                       help='Server command the variant arguments are appended to '
+                            '(default: as in run_vllm.sh / run_llama.sh)')
+    parser.add_argument('--startup-timeout', type=float, default=900,
+                       help='Seconds to wait for a launched server to become healthy (default: 900)')
+    parser.add_argument('--server-log', type=str, default=None,
+                       help='Append launched server output to this file (default: discard)')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request of every point')
+
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('stress_test_llm').setLevel(logging.WARNING)
+
+    load_type = 'rate' if args.rates else 'concurrency'
+    runner_kwargs = dict(
+        server_url=args.server_url,
+        loads=args.rates or args.concurrency or [1, 2, 4, 8, 16],
+        load_type=load_type,
+        requests_per_point=args.requests_per_point,
+        max_runs=args.max_runs,
+        steady_tolerance=args.steady_tolerance,
+        context_size=args.context_size,
+        max_tokens=args.max_tokens,
+        mode='pp' if args.prompt_processing else 'mixed',
+        request_timeout=args.request_timeout,
+        slo_ttft=args.slo_ttft,
+        slo_tpot=args.slo_tpot,
+        slo_percentile=args.slo_percentile
+    )
+
+    if not args.variant:
+        runner = SweepRunner(**runner_kwargs)
+        await runner.run()
+        runner.print_report()
+        return
+
+    base_args = read_args_file(args.server_args)
+    launcher = create_launcher(args.launcher, args.server_args, args.server_url, command=args.launch_command,
+                               startup_timeout=args.startup_timeout, log_path=args.server_log)
+    results = []
+    for spec in args.variant:
+        label, server_args = parse_variant(spec, base_args)
+        logger.info(f"=== Variant {label} ===")
+        try:
+            launcher.start(server_args)
+            await launcher.wait_ready()
+            runner = SweepRunner(**runner_kwargs)
+            await runner.run()
+            runner.print_report(f"SWEEP {label}")
+            results.append((label, runner.summarize()))
+        except (RuntimeError, OSError) as e:
+            logger.error(f"Variant {label}: {e}")
+            results.append((label, None))
+        finally:
+            launcher.stop()
+    print_comparison(results, load_type)
+
+if __name__ == "__main__":
+    # Check if aiohttp is available
+    if importlib.util.find_spec("aiohttp") is None:
+        print("Error: aiohttp library is required for this script.")
+        print("Please install it with: pip install aiohttp")
+        exit(1)
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from adaptive_concurrency import AIMDController, ServerOverloaded
+
+
+def controller(**kwargs) -> AIMDController:
+    kwargs.setdefault("target_latency", 1.0)
+    kwargs.setdefault("window", 4)
+    return AIMDController(**kwargs)
+
+
+async def round_trip(control: AIMDController, latency: float, overloaded=None):
+    """Fill every allowed slot at once, then release them all with the same outcome"""
+    slots = [await control.acquire() for _ in range(control.allowed)]
+    for slot in slots:
+        slot.latency = latency
+        slot.overloaded = overloaded
+        control.release(slot)
+
+
+def test_additive_increase_while_under_target():
+    async def run():
+        control = controller(initial=4, increase=1.0)
+        limits = []
+        for _ in range(3):
+            await round_trip(control, latency=0.1)
+            limits.append(control.allowed)
+        return control, limits
+
+    control, limits = asyncio.run(run())
+    assert limits == [5, 6, 7]
+    assert [entry["action"] for entry in control.trace] == ["start", "increase", "increase", "increase"]
+
+
+def test_holds_when_the_limit_was_not_the_constraint():
+    async def run():
+        control = controller(initial=8)
+        # One request at a time never saturates a limit of 8
+        for _ in range(4):
+            slot = await control.acquire()
+            slot.latency = 0.1
+            control.release(slot)
+        return control
+
+    control = asyncio.run(run())
+    assert control.allowed == 8 and control.trace[-1]["action"] == "hold"
+
+
+def test_multiplicative_decrease_on_latency_breach():
+    async def run():
+        control = controller(initial=8, decrease=0.5)
+        await round_trip(control, latency=2.0)
+        return control
+
+    control = asyncio.run(run())
+    # The first 4 samples breach the target; the other 4 were admitted before that decision
+    assert control.allowed == 4
+    assert [entry["action"] for entry in control.trace] == ["start", "decrease"]
+    assert control.trace[-1]["observed"] == pytest.approx(2.0, rel=0.01)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_multiplicative_decrease_on_backpressure(status):
+    async def run():
+        control = controller(initial=8, decrease=0.5)
+        await round_trip(control, latency=0.1, overloaded=f"HTTP {status}")
+        return control
+
+    control = asyncio.run(run())
+    # One overload episode cuts the limit once, not once per request already in flight
+    assert control.allowed == 4
+    assert control.backpressure == 8
+    assert control.trace[-1]["reason"] == f"HTTP {status}"
+
+
+def test_slot_counts_server_overloaded_as_backpressure():
+    async def run():
+        control = controller(initial=4)
+        with pytest.raises(ServerOverloaded):
+            async with control.slot():
+                raise ServerOverloaded(503, "HTTP 503: busy")
+        return control
+
+    control = asyncio.run(run())
+    assert control.allowed == 2 and control.in_flight == 0
+    assert control.trace[-1]["reason"] == "HTTP 503"
+
+
+def test_release_result_reads_backpressure_and_metric():
+    async def run():
+        control = controller(initial=2, metric="ttft")
+        slot = await control.acquire()
+        control.release_result(slot, {"status": "FAILED", "backpressure": "HTTP 429", "duration": 0.1})
+        return control
+
+    control = asyncio.run(run())
+    assert control.allowed == 1 and control.backpressure == 1
+
+
+def test_stale_epoch_samples_are_ignored():
+    async def run():
+        control = controller(initial=4)
+        stale = [await control.acquire() for _ in range(2)]
+        # A decision made while these were in flight opens a new epoch
+        fresh = await control.acquire()
+        fresh.overloaded = "HTTP 429"
+        control.release(fresh)
+        assert control.allowed == 2
+        for slot in stale:
+            slot.latency = 5.0
+            control.release(slot)
+        return control
+
+    control = asyncio.run(run())
+    # Neither a second cut nor a sample in the new window
+    assert control.allowed == 2 and control.samples.count == 0
+    assert [entry["action"] for entry in control.trace] == ["start", "decrease"]
+
+
+def test_limits_are_clamped():
+    async def run():
+        control = controller(initial=2, min_limit=2, max_limit=3, window=2)
+        await round_trip(control, latency=5.0)
+        low = control.allowed
+        for _ in range(3):
+            await round_trip(control, latency=0.1)
+        return low, control.allowed
+
+    assert asyncio.run(run()) == (2, 3)
+    with pytest.raises(ValueError):
+        AIMDController(target_latency=1.0, decrease=1.0)
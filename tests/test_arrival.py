@@ -0,0 +1,35 @@
+import argparse
+
+import pytest
+
+from arrival import ArrivalSchedule, add_arrival_arguments, schedule_from_args
+
+
+@pytest.mark.parametrize("options", [
+    {"arrival": "gamma", "gamma_shape": 0.0},
+    {"burst_factor": 0.0, "burst_period": 10.0, "burst_duration": 1.0},
+    {"burst_factor": -2.0},
+    {"burst_period": -1.0},
+    {"burst_duration": -1.0},
+])
+def test_invalid_options_fail_up_front(options):
+    with pytest.raises(ValueError):
+        ArrivalSchedule(rate=5.0, **options)
+
+
+def test_gamma_schedule_keeps_its_mean_rate():
+    schedule = ArrivalSchedule(rate=10.0, arrival="gamma", gamma_shape=0.5, seed=3)
+    offsets = list(schedule.offsets(20001))
+    assert offsets[-1] / 20000 == pytest.approx(0.1, rel=0.05)
+
+
+def test_schedule_from_args_reports_a_usage_error(capsys):
+    parser = argparse.ArgumentParser(prog="stress")
+    add_arrival_arguments(parser)
+    args = parser.parse_args(["--rate", "2", "--burst-factor", "0", "--burst-period", "5"])
+    with pytest.raises(SystemExit):
+        schedule_from_args(args, parser)
+    assert "burst factor must be positive" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        schedule_from_args(args)
+    assert schedule_from_args(parser.parse_args([]), parser) is None
@@ -0,0 +1,17 @@
+import numpy as np
+
+from embedding_cache_proxy import EmbeddingCacheProxy, VectorStore, input_key
+
+
+def test_disk_hit_survives_row_eviction(tmp_path):
+    store = VectorStore(str(tmp_path), capacity=1)
+    proxy = EmbeddingCacheProxy("http://127.0.0.1:1/v1/embeddings", store, memory_entries=1)
+    first, second = input_key("m", "first"), input_key("m", "second")
+    store.put(first, np.array([1.0, 2.0], dtype=np.float32), 3)
+
+    vector, tokens = proxy.lookup(first)
+    assert proxy.disk_hits == 1 and tokens == 3
+    # The single row is reused for the next input; the hit must not change with it
+    store.put(second, np.array([9.0, 9.0], dtype=np.float32), 5)
+    assert vector.tolist() == [1.0, 2.0]
+    assert proxy.memory[first][0] is vector
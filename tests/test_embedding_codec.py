@@ -0,0 +1,25 @@
+import base64
+
+import numpy as np
+import pytest
+
+from embedding_codec import decode_embeddings, encode_embeddings
+
+
+@pytest.mark.parametrize("encoding_format", ["float", "base64"])
+def test_decode_round_trip_out_of_order(encoding_format):
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    encoded = encode_embeddings(vectors, encoding_format)
+    # Servers may return entries in any order; rows follow their index
+    response = {"data": [{"index": i, "embedding": encoded[i]} for i in (2, 0, 1)]}
+    assert np.array_equal(decode_embeddings(response, encoding_format), vectors)
+
+
+def test_first_base64_vector_is_decoded_once(monkeypatch):
+    encoded = encode_embeddings(np.ones((3, 4), dtype=np.float32), "base64")
+    calls = []
+    decode = base64.b64decode
+    monkeypatch.setattr(base64, "b64decode", lambda value: calls.append(value) or decode(value))
+    matrix = decode_embeddings({"data": [{"index": i, "embedding": e} for i, e in enumerate(encoded)]}, "base64")
+    assert matrix.shape == (3, 4)
+    assert calls == encoded
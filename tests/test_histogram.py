@@ -0,0 +1,105 @@
+import json
+import math
+import random
+
+import pytest
+
+from histogram import PERCENTILES, LogHistogram, ResultAggregator
+
+
+def exact_percentile(values, q):
+    """Nearest-rank percentile, the definition LogHistogram approximates"""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+def latencies(seed: int, count: int):
+    rng = random.Random(seed)
+    # Long-tailed like request latencies, spanning several orders of magnitude
+    return [rng.lognormvariate(-2.0, 1.5) for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_percentiles_within_relative_error(seed):
+    values = latencies(seed, 20000)
+    histogram = LogHistogram()
+    for value in values:
+        histogram.record(value)
+    for q in PERCENTILES + (1, 25, 75, 100):
+        exact = exact_percentile(values, q)
+        assert abs(histogram.percentile(q) - exact) <= 0.01 * exact
+    assert histogram.count == len(values)
+    assert histogram.mean == pytest.approx(sum(values) / len(values))
+    assert (histogram.min, histogram.max) == (min(values), max(values))
+
+
+def test_zeros_and_empty_histogram():
+    histogram = LogHistogram()
+    assert histogram.percentile(50) == 0.0 and histogram.mean == 0.0
+    for value in (0.0, 0.0, 0.0, 2.0):
+        histogram.record(value)
+    assert histogram.zero_count == 3
+    assert histogram.percentile(50) == 0.0
+    assert histogram.percentile(100) == pytest.approx(2.0, rel=0.01)
+
+
+def test_merge_equals_recording_into_one_histogram():
+    parts = [latencies(seed, 3000) for seed in (4, 5, 6)]
+    combined = LogHistogram()
+    merged = LogHistogram()
+    for values in parts:
+        part = LogHistogram()
+        for value in values:
+            part.record(value)
+            combined.record(value)
+        merged.merge(part)
+    assert merged.buckets == combined.buckets
+    assert (merged.count, merged.zero_count, merged.min, merged.max) == \
+           (combined.count, combined.zero_count, combined.min, combined.max)
+    assert merged.total == pytest.approx(combined.total)
+    assert merged.percentiles() == combined.percentiles()
+    with pytest.raises(ValueError):
+        merged.merge(LogHistogram(relative_error=0.02))
+
+
+def test_histogram_dict_round_trip_is_lossless():
+    histogram = LogHistogram()
+    for value in latencies(7, 5000) + [0.0]:
+        histogram.record(value)
+    restored = LogHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert restored.to_dict() == histogram.to_dict()
+    assert restored.percentiles() == histogram.percentiles()
+    empty = LogHistogram.from_dict(json.loads(json.dumps(LogHistogram().to_dict())))
+    assert empty.count == 0 and empty.min == math.inf and empty.max == -math.inf
+
+
+def result(duration: float, status: str = "SUCCESS", **fields):
+    return dict({"status": status, "prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110,
+                 "duration": duration, "tokens_per_sec": 10 / duration}, **fields)
+
+
+def test_aggregator_merge_and_round_trip():
+    first, second, combined = ResultAggregator(sample_size=3), ResultAggregator(sample_size=3), ResultAggregator(sample_size=3)
+    for i in range(10):
+        r = result(0.1 * (i + 1), ttft=0.01 * (i + 1), inter_token_latencies=[0.02, 0.03],
+                   cached_tokens=0 if i % 2 else None)
+        (first if i < 4 else second).record(r)
+        combined.record(r)
+    failed = result(1.0, status="FAILED")
+    second.record(failed)
+    combined.record(failed)
+
+    first.merge(second)
+    assert (first.total_requests, first.successful_requests) == (11, 10)
+    assert len(first.samples) == 3
+    for name, histogram in combined.histograms.items():
+        assert first.histograms[name].buckets == histogram.buckets
+        assert first.histograms[name].count == histogram.count
+    # Only positive optional fields and reported (non-None) fields are recorded
+    assert first.histogram("tpot") is None
+    assert first.histograms["cached_tokens"].count == 5
+    assert first.histograms["inter_token_latency"].count == 20
+
+    restored = ResultAggregator.from_dict(json.loads(json.dumps(first.to_dict())))
+    assert restored.to_dict() == first.to_dict()
+    assert restored.sample_size == 3
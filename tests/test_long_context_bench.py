@@ -0,0 +1,45 @@
+import pytest
+
+from long_context_bench import find_cliffs, fit_polynomial, geometric_grid
+
+LENGTHS = [1024 * 2 ** i for i in range(8)]
+
+
+def test_geometric_grid():
+    assert geometric_grid(1024, 32768, 2) == [1024, 2048, 4096, 8192, 16384, 32768]
+    # The stop length is always measured, even off the geometric sequence
+    assert geometric_grid(1000, 5000, 1.5) == [1000, 1500, 2250, 3375, 5000]
+    assert geometric_grid(100, 100, 2) == [100]
+    # Small growth factors round to duplicates, which are measured once
+    assert geometric_grid(1, 10, 1.1) == list(range(1, 11))
+    with pytest.raises(ValueError):
+        geometric_grid(1024, 4096, 1.0)
+
+
+def test_find_cliffs_on_a_step():
+    cliffs = find_cliffs(LENGTHS, [1.0] * 4 + [2.0] * 4)
+    assert cliffs == [{"index": 4, "ratio": pytest.approx(2.0)}]
+
+
+def test_find_cliffs_reports_each_regime_once():
+    # A new regime must settle before it has a trend of its own, then the next step is a cliff again
+    cliffs = find_cliffs(LENGTHS, [1.0, 1.0, 1.0, 2.0, 2.0, 4.0, 4.0, 4.0])
+    assert [cliff["index"] for cliff in cliffs] == [3, 5]
+
+
+def test_find_cliffs_ignores_trends_and_fading_overheads():
+    # Per-token cost growing linearly with the context follows the trend
+    assert find_cliffs(LENGTHS, [1 + length / 8192 for length in LENGTHS]) == []
+    # Fixed overheads dominating the shortest contexts fade out
+    assert find_cliffs(LENGTHS, [5.0, 3.0, 2.0, 1.5, 1.5, 1.6, 1.7, 1.8]) == []
+    # Jumps below the threshold are noise
+    assert find_cliffs(LENGTHS, [1.0] * 4 + [1.2] * 4) == []
+    assert find_cliffs(LENGTHS, [1.0] * 4 + [1.2] * 4, threshold=0.1) != []
+
+
+def test_fit_polynomial():
+    xs = [1.0, 2.0, 3.0, 4.0]
+    fit = fit_polynomial(xs, [1 + 2 * x + 3 * x * x for x in xs], 2)
+    assert fit["coefficients"] == pytest.approx([1.0, 2.0, 3.0])
+    assert fit["r2"] == pytest.approx(1.0)
+    assert fit_polynomial([1.0, 2.0], [1.0, 2.0], 2) is None
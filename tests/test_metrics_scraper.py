@@ -0,0 +1,160 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+
+from metrics_scraper import MetricsScraper, parse_prometheus_line
+
+VLLM_METRICS = """\
+# HELP vllm:num_requests_running Number of requests in model execution batches.
+# TYPE vllm:num_requests_running gauge
+vllm:num_requests_running{{model_name="kCode"}} 3.0
+vllm:num_requests_waiting{{model_name="kCode"}} {waiting}
+vllm:kv_cache_usage_perc{{model_name="kCode"}} 0.25
+vllm:num_preemptions_total{{engine="0",model_name="kCode"}} {preemptions}
+vllm:num_preemptions_total{{engine="1",model_name="kCode"}} {preemptions}
+vllm:prefix_cache_queries_total{{model_name="kCode"}} {queries}
+vllm:prefix_cache_hits_total{{model_name="kCode"}} {hits}
+vllm:num_requests_running_created{{model_name="kCode"}} 1.7e9
+process_cpu_seconds_total 12.5
+"""
+
+LLAMA_METRICS = """\
+# HELP llamacpp:requests_processing Number of requests processing.
+llamacpp:requests_processing 2
+llamacpp:requests_deferred 5
+llamacpp:kv_cache_usage_ratio 0.5
+"""
+
+LLAMA_SLOTS = [{"id": 0, "is_processing": True}, {"id": 1, "is_processing": False},
+               {"id": 2, "is_processing": True}]
+
+
+class CannedServer:
+    """Stand-in server whose vLLM counters advance on every /metrics scrape"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.scrapes = 0
+
+    async def metrics(self, request: web.Request) -> web.StreamResponse:
+        if self.kind == "llama":
+            text = LLAMA_METRICS
+        else:
+            # Queue depth alternates 2 / 4; 2 preemptions per engine, 1000 queries and 250 hits per scrape
+            text = VLLM_METRICS.format(waiting=2 + 2 * (self.scrapes % 2), preemptions=2 * self.scrapes,
+                                       queries=1000 * self.scrapes, hits=250 * self.scrapes)
+        self.scrapes += 1
+        # Tiny chunks split lines mid-way, so the scraper must reassemble them
+        response = web.StreamResponse()
+        await response.prepare(request)
+        body = text.encode()
+        for start in range(0, len(body), 7):
+            await response.write(body[start:start + 7])
+        await response.write_eof()
+        return response
+
+    async def slots(self, request: web.Request) -> web.Response:
+        if self.kind != "llama":
+            raise web.HTTPNotFound()
+        return web.Response(text=json.dumps(LLAMA_SLOTS), content_type="application/json")
+
+    def app(self) -> web.Application:
+        application = web.Application()
+        application.router.add_get("/metrics", self.metrics)
+        application.router.add_get("/slots", self.slots)
+        return application
+
+
+async def scrape(kind: str, polls: int):
+    """Poll a stand-in server a few times, returning (scraper, server)"""
+    server = CannedServer(kind)
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    scraper = MetricsScraper(f"http://127.0.0.1:{port}/v1/chat/completions", interval=0.05)
+    try:
+        task = asyncio.create_task(scraper.poll())
+        while len(scraper.samples) < polls - 1:
+            await asyncio.sleep(0.01)
+        # poll() takes one last sample after the stop request
+        scraper.stop_event.set()
+        await asyncio.wait_for(task, timeout=5)
+    finally:
+        await runner.cleanup()
+    return scraper, server
+
+
+def test_parse_prometheus_line():
+    assert parse_prometheus_line('vllm:num_requests_waiting{model_name="kCode"} 4.0') == ("waiting", 4.0)
+    # Label values may contain spaces and braces; an optional timestamp follows the value
+    assert parse_prometheus_line('vllm:kv_cache_usage_perc{model_name="a b {c}"} 0.5 1700000000000') == ("kv_usage", 0.5)
+    assert parse_prometheus_line("llamacpp:requests_deferred 5") == ("waiting", 5.0)
+    assert parse_prometheus_line("process_cpu_seconds_total 1.25") == ("process_cpu", 1.25)
+    assert parse_prometheus_line("# TYPE vllm:num_requests_waiting gauge") is None
+    assert parse_prometheus_line("") is None
+    assert parse_prometheus_line('vllm:num_requests_running_created{model_name="kCode"} 1.7e9') is None
+    assert parse_prometheus_line("vllm:num_requests_waiting{} NaN-ish") is None
+
+
+def test_vllm_metrics_report():
+    scraper, server = asyncio.run(scrape("vllm", polls=4))
+    samples = scraper.samples
+    assert len(samples) == server.scrapes >= 4
+    assert scraper.errors == 0
+    # /slots answered 404 and was switched off after the first poll
+    assert scraper.endpoints == {"metrics": True, "slots": False}
+    assert all("slots_busy" not in sample for _, sample in samples)
+    first = samples[0][1]
+    # Lines arrived split across chunks and label sets are summed
+    assert first["running"] == 3.0
+    assert first["process_cpu"] == 12.5
+
+    report = scraper.report(samples[0][0], samples[-1][0])
+    assert report["samples"] == len(samples)
+    gauges = report["gauges"]
+    assert gauges["running"] == {"mean": 3.0, "max": 3.0}
+    assert gauges["kv_usage"]["max"] == 0.25
+    waiting = [2 + 2 * (i % 2) for i in range(len(samples))]
+    assert gauges["waiting"]["mean"] == pytest.approx(sum(waiting) / len(waiting))
+    assert gauges["waiting"]["max"] == 4.0
+    # Counters are reported as deltas over the run: 2 engines x 2 preemptions per scrape
+    assert report["counters"]["preemptions"] == 4 * (len(samples) - 1)
+    assert report["counters"]["prefix_queries"] == 1000 * (len(samples) - 1)
+    assert report["prefix_hit_rate"] == pytest.approx(0.25)
+
+
+def test_llama_metrics_and_slots_report():
+    scraper, _ = asyncio.run(scrape("llama", polls=3))
+    report = scraper.report()
+    gauges = report["gauges"]
+    assert gauges["running"]["mean"] == 2.0
+    assert gauges["waiting"]["mean"] == 5.0
+    assert gauges["kv_usage"]["mean"] == 0.5
+    assert gauges["slots_busy"] == {"mean": 2.0, "max": 2.0}
+    assert all(sample["slots_total"] == 3 for _, sample in scraper.samples)
+    assert "prefix_hit_rate" not in report
+    assert "preemptions" not in report["counters"]
+
+
+def test_report_window_and_prune():
+    scraper = MetricsScraper("http://127.0.0.1:1/v1/chat/completions", interval=1.0)
+    scraper.samples = [(100.0 + t, {"waiting": float(t), "preemptions": 10.0 * t}) for t in range(10)]
+
+    # One interval of slack on each side: samples at 104..107 for a 105..106 run
+    report = scraper.report(105.0, 106.0, timeline=True)
+    assert report["samples"] == 4
+    assert report["gauges"]["waiting"] == {"mean": 5.5, "max": 7.0}
+    assert report["counters"]["preemptions"] == 30.0
+    assert [row["t"] for row in report["timeline"]] == [-1.0, 0.0, 1.0, 2.0]
+    assert scraper.report(200.0, 210.0) is None
+
+    scraper.prune(106.0)
+    assert [t for t, _ in scraper.samples] == [106.0, 107.0, 108.0, 109.0]
+    # Pruning keeps the list object the polling thread appends to
+    samples = scraper.samples
+    scraper.prune(200.0)
+    assert scraper.samples is samples and samples == []
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class RecordingSubmitter:
+    """submit_batch that records each batch and answers every item with item * 10"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    async def __call__(self, items):
+        self.batches.append((time.perf_counter(), list(items)))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("server exploded")
+        return [item * 10 for item in items]
+
+
+def test_flushes_at_max_batch_size_and_fans_results_out_in_order():
+    async def run():
+        submitter = RecordingSubmitter()
+        # A wait this long never fires: only full batches may be flushed
+        batcher = MicroBatcher(submitter, max_batch_size=4, max_wait=60.0)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(8)))
+        await batcher.close()
+        return submitter, batcher, results
+
+    submitter, batcher, results = asyncio.run(run())
+    assert results == [i * 10 for i in range(8)]
+    assert [items for _, items in submitter.batches] == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert batcher.report()["batches"] == 2 and batcher.report()["average_batch_size"] == 4
+
+
+def test_partial_batch_flushes_after_max_wait():
+    async def run():
+        submitter = RecordingSubmitter()
+        batcher = MicroBatcher(submitter, max_batch_size=32, max_wait=0.05)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        return submitter, results, started
+
+    submitter, results, started = asyncio.run(run())
+    assert results == [0, 10, 20]
+    assert len(submitter.batches) == 1
+    assert submitter.batches[0][0] - started >= 0.04
+
+
+def test_batch_failure_reaches_every_waiter():
+    async def run():
+        batcher = MicroBatcher(RecordingSubmitter(fail=True), max_batch_size=3, max_wait=60.0)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) and str(result) == "server exploded" for result in results)
+    assert batcher.failed_batches == 1
+
+
+def test_wrong_result_count_fails_the_batch():
+    async def short(items):
+        return items[:-1]
+
+    async def run():
+        batcher = MicroBatcher(short, max_batch_size=2, max_wait=60.0)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    for result in asyncio.run(run()):
+        assert isinstance(result, RuntimeError) and "returned 1 results" in str(result)
+
+
+def test_close_drains_the_queue():
+    async def run():
+        submitter = RecordingSubmitter(delay=0.02)
+        batcher = MicroBatcher(submitter, max_batch_size=4, max_wait=60.0, max_concurrent_batches=1)
+        waiters = [asyncio.ensure_future(batcher.submit(i)) for i in range(10)]
+        await asyncio.sleep(0)  # Let every submit queue its item
+        await batcher.close()
+        # Nothing is left queued or in flight once close() returns
+        assert not batcher.pending and not batcher.tasks and batcher.timer is None
+        assert all(waiter.done() for waiter in waiters)
+        return submitter, [waiter.result() for waiter in waiters]
+
+    submitter, results = asyncio.run(run())
+    assert results == [i * 10 for i in range(10)]
+    assert [len(items) for _, items in submitter.batches] == [4, 4, 2]
+
+
+@pytest.mark.parametrize("max_concurrent_batches", [1, 2])
+def test_max_concurrent_batches_limits_batches_in_flight(max_concurrent_batches):
+    in_flight = []
+    peak = []
+
+    async def submit(items):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return items
+
+    async def run():
+        batcher = MicroBatcher(submit, max_batch_size=2, max_wait=60.0,
+                               max_concurrent_batches=max_concurrent_batches)
+        await asyncio.gather(*(batcher.submit(i) for i in range(12)))
+
+    asyncio.run(run())
+    assert max(peak) == max_concurrent_batches
@@ -0,0 +1,21 @@
+import os
+
+from mock_server import build_parser
+from server_args import read_args_file
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_llama_args_file_passes_through_unchanged():
+    args, ignored = build_parser().parse_known_args(read_args_file(os.path.join(REPO, "llama_args.sh")))
+    # --temp 0.7 must not be read as an abbreviation of --template-cost
+    assert args.template_cost == 0
+    assert "--temp" in ignored
+    assert args.max_num_seqs == 1
+    assert args.port == 8000
+
+
+def test_vllm_args_file_keeps_mock_defaults():
+    args, _ = build_parser().parse_known_args(read_args_file(os.path.join(REPO, "vllm_args.sh")))
+    assert args.template_cost == 0
+    assert args.aging == 0
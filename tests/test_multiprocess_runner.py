@@ -0,0 +1,57 @@
+import logging
+import os
+
+from multiprocess_runner import effective_workers, run_workers, shard_kwargs, split_count
+
+
+class CrashingTester:
+    """Tester stand-in whose first worker dies without sending a result"""
+
+    def __init__(self, total_requests: int, concurrent_requests: int, crash: bool = True, **kwargs):
+        self.total_requests = total_requests
+        self.crash = crash
+        self.start_barrier = None
+        self.merged = []
+
+    async def run_concurrent_requests(self):
+        if self.crash and self.total_requests == split_count(5, 2, 0):
+            os._exit(3)
+        if self.start_barrier:
+            self.start_barrier()
+
+    def export_state(self):
+        return self.total_requests
+
+    def merge_state(self, state):
+        self.merged.append(state)
+
+
+def test_dead_worker_is_reported(caplog):
+    with caplog.at_level(logging.ERROR, logger="multiprocess_runner"):
+        merged = run_workers(CrashingTester, {"total_requests": 5, "concurrent_requests": 2}, workers=2)
+    assert "Worker 0 died without a result (exit code 3)" in caplog.text
+    # The surviving worker was waiting on the barrier for the dead one, which is broken instead
+    assert "Worker 1 failed: BrokenBarrierError" in caplog.text
+    assert merged.merged == []
+
+
+def test_results_of_all_workers_are_merged():
+    merged = run_workers(CrashingTester, {"total_requests": 5, "concurrent_requests": 2, "crash": False}, workers=2)
+    assert sorted(merged.merged) == [2, 3]
+
+
+def test_workers_never_raise_closed_loop_concurrency():
+    kwargs = {"total_requests": 8, "concurrent_requests": 2}
+    assert effective_workers(kwargs, 4) == 2
+    assert sum(shard_kwargs(kwargs, 2, index)["concurrent_requests"] for index in range(2)) == 2
+    assert effective_workers(kwargs, 2) == 2
+    # Open-loop arrivals do not depend on the concurrency split
+    assert effective_workers(dict(kwargs, arrival_schedule=object()), 4) == 4
+
+
+def test_capped_run_keeps_every_request(caplog):
+    with caplog.at_level(logging.WARNING, logger="multiprocess_runner"):
+        merged = run_workers(CrashingTester, {"total_requests": 5, "concurrent_requests": 1, "crash": False},
+                             workers=3)
+    assert "using that many workers instead of 3" in caplog.text
+    assert merged.merged == [5]
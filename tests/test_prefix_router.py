@@ -0,0 +1,195 @@
+import asyncio
+import gzip
+import json
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+
+from mock_server import MockServer
+from prefix_router import PrefixRouter
+
+SYSTEM_PROMPT = "You are a careful assistant for the repository. " * 8
+
+
+async def start(application: web.Application):
+    """Serve an app on a free local port, returning (runner, base url)"""
+    runner = web.AppRunner(application)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+def closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def chat_body(system: str, user: str, max_tokens: int = 2, stream: bool = False) -> dict:
+    return {"model": "mock", "max_tokens": max_tokens, "stream": stream,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}]}
+
+
+async def with_router(test, backends=3, extra_urls=(), decode_rate=1000.0, **router_kwargs):
+    """Run test(router, router_url, session) against mock backends behind a router"""
+    runners = []
+    try:
+        urls = []
+        for _ in range(backends):
+            runner, url = await start(MockServer(prefill_rate=1e7, decode_rate=decode_rate, max_num_seqs=8,
+                                                 tool_call_rate=0.0).app())
+            runners.append(runner)
+            urls.append(url)
+        router_kwargs.setdefault("block_size", 8)
+        router_kwargs.setdefault("affinity_blocks", 4)
+        router = PrefixRouter(urls + list(extra_urls), **router_kwargs)
+        runner, router_url = await start(router.app())
+        runners.append(runner)
+        async with aiohttp.ClientSession() as session:
+            return await test(router, router_url, session)
+    finally:
+        for runner in reversed(runners):
+            await runner.cleanup()
+
+
+async def post(session, url, body):
+    async with session.post(url + "/v1/chat/completions", json=body) as response:
+        assert response.status == 200
+        return await response.read()
+
+
+def test_shared_prefix_sticks_to_one_backend():
+    async def test(router, url, session):
+        for i in range(6):
+            await post(session, url, chat_body(SYSTEM_PROMPT, f"question {i}"))
+        # Distinct prefixes spread over the backends
+        for i in range(12):
+            await post(session, url, chat_body(f"{i} " + SYSTEM_PROMPT, "question"))
+        return router.stats()["backends"]
+
+    backends = asyncio.run(with_router(test))
+    assert sum(b["requests"] for b in backends) == 18
+    assert sum(b["affinity_routes"] for b in backends) == 18
+    assert max(b["requests"] for b in backends) >= 6
+    assert sum(1 for b in backends if b["requests"]) > 1
+
+
+def test_falls_back_to_least_loaded_beyond_max_imbalance():
+    async def test(router, url, session):
+        # Slow decodes keep all three requests in flight while they are routed
+        bodies = [chat_body(SYSTEM_PROMPT, f"question {i}", max_tokens=5) for i in range(3)]
+        tasks = []
+        for body in bodies:
+            tasks.append(asyncio.create_task(post(session, url, body)))
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*tasks)
+        return router.stats()["backends"]
+
+    backends = asyncio.run(with_router(test, backends=2, decode_rate=20.0, max_imbalance=1))
+    preferred, other = sorted(backends, key=lambda b: -b["affinity_routes"])
+    # The third request would put the preferred backend 2 ahead of the idle one
+    assert preferred["affinity_routes"] == 2 and preferred["requests"] == 2
+    assert other["fallback_routes"] == 1 and other["requests"] == 1
+
+
+def test_stream_is_passed_through_chunk_by_chunk():
+    async def test(router, url, session):
+        started = time.perf_counter()
+        arrivals = []
+        async with session.post(url + "/v1/chat/completions",
+                                json=chat_body(SYSTEM_PROMPT, "stream", max_tokens=8, stream=True)) as response:
+            assert response.headers["Content-Type"].startswith("text/event-stream")
+            async for line in response.content:
+                if line.startswith(b"data: "):
+                    arrivals.append((time.perf_counter() - started, line))
+        return arrivals
+
+    arrivals = asyncio.run(with_router(test, backends=1, decode_rate=20.0))
+    assert arrivals[-1][1].strip() == b"data: [DONE]"
+    tokens = [t for t, line in arrivals if b'"content": "tok "' in line]
+    assert len(tokens) == 8
+    # 7 decode steps of 50 ms: a buffered response would deliver every token at the very end
+    assert tokens[-1] - tokens[0] > 0.25
+
+
+def test_unreachable_backend_is_marked_unhealthy_and_skipped():
+    dead = closed_port_url()
+
+    async def test(router, url, session):
+        statuses = []
+        for i in range(8):
+            async with session.post(url + "/v1/chat/completions",
+                                    json=chat_body(f"{i} " + SYSTEM_PROMPT, "question")) as response:
+                statuses.append(response.status)
+        async with session.get(url + "/health") as response:
+            assert response.status == 200
+        return statuses, router.stats()["backends"]
+
+    statuses, (live, down) = asyncio.run(with_router(test, backends=1, extra_urls=[dead], health_interval=60))
+    assert down["url"] == dead and not down["healthy"]
+    # Either the first health check or a failed forward takes it out; a forward that
+    # fails is answered 502 (not retried), and every later request skips the backend
+    assert down["requests"] <= 1 and down["requests"] == down["errors"]
+    assert statuses.count(502) == down["requests"]
+    assert live["healthy"] and live["requests"] == statuses.count(200) == 8 - down["requests"]
+
+
+def test_stats_and_metrics_agree():
+    async def test(router, url, session):
+        for i in range(5):
+            await post(session, url, chat_body(SYSTEM_PROMPT if i % 2 else "short", f"question {i}"))
+        async with session.get(url + "/stats") as response:
+            stats = await response.json()
+        async with session.get(url + "/metrics") as response:
+            metrics = await response.text()
+        return stats, metrics
+
+    stats, metrics = asyncio.run(with_router(test, backends=2))
+    samples = {}
+    for line in metrics.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    assert sum(b["requests"] for b in stats["backends"]) == 5
+    for backend in stats["backends"]:
+        label = f'{{backend="{backend["url"]}"}}'
+        assert samples["router_backend_requests_total" + label] == backend["requests"]
+        assert samples["router_backend_affinity_routes_total" + label] == backend["affinity_routes"]
+        assert samples["router_backend_fallback_routes_total" + label] == backend["fallback_routes"]
+        assert samples["router_backend_bytes_out_total" + label] == backend["bytes_out"]
+        assert samples["router_backend_healthy" + label] == 1
+        assert samples["router_backend_in_flight" + label] == 0
+
+
+def test_compressed_upstream_keeps_its_content_encoding():
+    payload = {"choices": [{"message": {"content": "compressed " * 50}}]}
+
+    async def gzipped(request: web.Request) -> web.Response:
+        assert "gzip" in request.headers.get("Accept-Encoding", "")
+        return web.Response(body=gzip.compress(json.dumps(payload).encode()),
+                            headers={"Content-Encoding": "gzip", "Content-Type": "application/json"})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="OK")
+
+    async def run():
+        upstream = web.Application()
+        upstream.router.add_post("/v1/chat/completions", gzipped)
+        upstream.router.add_get("/health", health)
+        upstream_runner, upstream_url = await start(upstream)
+        router_runner, router_url = await start(PrefixRouter([upstream_url]).app())
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(router_url + "/v1/chat/completions",
+                                        json=chat_body("system", "hi")) as response:
+                    return response.headers.get("Content-Encoding"), await response.json()
+        finally:
+            await router_runner.cleanup()
+            await upstream_runner.cleanup()
+
+    encoding, body = asyncio.run(run())
+    assert encoding == "gzip"
+    assert body == payload
@@ -0,0 +1,42 @@
+import json
+
+from prompt_pool import PromptPool
+
+
+def embedding_body(content):
+    return {"model": "embed", "input": content}
+
+
+def test_estimated_tokens_follow_input_text_not_json():
+    pool = PromptPool(4, 100, embedding_body, seed=1, batch_size=3).build()
+    for _ in range(4):
+        body, tokens = pool.next_request()
+        inputs = json.loads(body)["input"]
+        assert tokens == sum(len(text) // 4 for text in inputs)
+        # The serialized body carries quoting and keys on top of the text
+        assert tokens < len(body) // 4
+
+
+def test_exact_token_counts_take_precedence():
+    pool = PromptPool(2, 50, embedding_body, seed=1, count_tokens=lambda text: 7).build()
+    assert pool.next_request()[1] == 7
+
+
+def test_only_second_and_later_repeats_are_warm():
+    pool = PromptPool(2, 20, embedding_body, seed=1).build()
+    sent = []
+    for _ in range(3):
+        for _ in range(2):
+            sent.append((pool.repeat_is_warm(), pool.next_request(repeat=True)[0]))
+    # The first round only warms each entry, later rounds resend the same bytes
+    assert [warm for warm, _ in sent] == [False, False, True, True, True, True]
+    assert sent[0][1] == sent[2][1] == sent[4][1] and sent[0][1] != sent[1][1]
+    # Fresh handouts in between neither use nor disturb the fixed nonce
+    assert pool.next_request()[0] != sent[0][1]
+
+
+def test_fixed_prompt_entries_are_warm_after_one_handout():
+    pool = PromptPool(1, 20, embedding_body, unique=False, fixed_prompt="hello").build()
+    assert not pool.repeat_is_warm()
+    pool.next_request()
+    assert pool.repeat_is_warm()
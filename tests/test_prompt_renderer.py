@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("jinja2")
+pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+from prompt_renderer import ConversationRenderer  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(REPO, "templates", "qwen3coder.jinja2")
+SPECIAL_TOKENS = ["<|im_start|>", "<|im_end|>", "<|endoftext|>"]
+
+TOOLS = [{"type": "function", "function": {
+    "name": "read_file", "description": "Read a file from the repository",
+    "parameters": {"type": "object", "properties": {"path": {"type": "string", "description": "File path"}},
+                   "required": ["path"]}}}]
+
+
+def tool_call(call_id: str, path: str) -> dict:
+    return {"id": call_id, "type": "function",
+            "function": {"name": "read_file", "arguments": json.dumps({"path": path})}}
+
+
+CONVERSATION = [
+    {"role": "system", "content": "You are a coding agent working in a large repository."},
+    {"role": "user", "content": "Find where the prompt pool hands out request bodies."},
+    {"role": "assistant", "content": "Let me look at the pool.", "tool_calls": [tool_call("call_1", "prompt_pool.py")]},
+    {"role": "tool", "tool_call_id": "call_1", "content": "def next_request(self, repeat=False):\n    ..."},
+    {"role": "assistant", "content": "", "tool_calls": [tool_call("call_2", "stress_test_llm.py"),
+                                                        tool_call("call_3", "stress_test_embedding.py")]},
+    {"role": "tool", "tool_call_id": "call_2", "content": "body = self.prompt_pool.next_body()"},
+    {"role": "tool", "tool_call_id": "call_3", "content": "body, tokens = self.prompt_pool.next_request()"},
+    {"role": "assistant", "content": "Both testers take pre-serialized bodies from next_request."},
+    {"role": "user", "content": "Now explain how repeats are counted.\n\nKeep it short."},
+]
+
+
+@pytest.fixture(scope="module")
+def tokenizer_path(tmp_path_factory):
+    """A small byte-level BPE tokenizer with the template's special tokens, trained on its renders"""
+    from transformers import PreTrainedTokenizerFast
+
+    texts = [ConversationRenderer(TEMPLATE).render_text(CONVERSATION[:k], TOOLS) for k in range(2, len(CONVERSATION) + 1)]
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(vocab_size=600, special_tokens=SPECIAL_TOKENS,
+                                             initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet())
+    tokenizer.train_from_iterator(texts * 4, trainer)
+    path = tmp_path_factory.mktemp("tokenizer")
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|im_end|>",
+                            additional_special_tokens=SPECIAL_TOKENS).save_pretrained(str(path))
+    return str(path)
+
+
+def test_incremental_ids_match_whole_prompt_tokenization(tokenizer_path):
+    renderer = ConversationRenderer(TEMPLATE, tokenizer_path)
+    hits = []
+    for k in range(2, len(CONVERSATION) + 1):
+        before = renderer.prefix_hits
+        text, ids = renderer.render("session", CONVERSATION[:k], TOOLS)
+        hits.append(renderer.prefix_hits - before)
+        assert text == renderer.render_text(CONVERSATION[:k], TOOLS)
+        assert ids == renderer.encode(text)
+    # Every extension reuses the cached prefix, except a second tool reply in a row: the
+    # template closes the tool block only after the last one, so the cached text is no prefix
+    assert hits == [0, 1, 1, 1, 1, 0, 1, 1]
+    assert renderer.reused_tokens > renderer.encoded_tokens
+
+
+def test_edited_conversation_misses_the_prefix_cache(tokenizer_path):
+    renderer = ConversationRenderer(TEMPLATE, tokenizer_path)
+    renderer.render("session", CONVERSATION[:-1], TOOLS)
+    edited = [dict(CONVERSATION[0], content="You are a careful reviewer.")] + CONVERSATION[1:]
+    text, ids = renderer.render("session", edited, TOOLS)
+    assert renderer.prefix_hits == 0
+    assert ids == renderer.encode(text)
+    # The edited text is cached from now on
+    text, ids = renderer.render("session", edited + [{"role": "assistant", "content": "Done."}], TOOLS)
+    assert renderer.prefix_hits == 1
+    assert ids == renderer.encode(text)
@@ -0,0 +1,37 @@
+import asyncio
+import os
+
+from repo_ingest import CHARS_PER_TOKEN, Chunker, IngestIndex, RepoIngest
+
+
+def test_spans_report_tokens_of_kept_chunks():
+    chunker = Chunker(chunk_tokens=64, overlap_tokens=8)
+    text = "".join(f"line {i:04d} of the file\n" for i in range(200)) + "\n   \n\t\n"
+    spans, tokens = chunker.spans(text)
+    assert spans and all(text[start:end].strip() for start, end in spans)
+    assert tokens == sum(max(1, (end - start) // CHARS_PER_TOKEN) for start, end in spans)
+    assert chunker.spans(" \n\t\n") == ([], 0)
+
+
+def test_whitespace_only_file_is_recorded_without_rows(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "blank.py").write_text("\n   \n\t\n")
+    stat = os.stat(root / "blank.py")
+    index = IngestIndex(str(tmp_path / "index"))
+    ingest = RepoIngest(str(root), index, Chunker(chunk_tokens=64, overlap_tokens=8))
+
+    # No chunks means nothing is sent to the (absent) batcher
+    asyncio.run(ingest.process_file(None, "blank.py", stat))
+    record = index.files["blank.py"]
+    assert record["rows"] == 0 and not record.get("deleted")
+    assert ingest.embedded == 0 and ingest.tokens == 0
+    index.close()
+
+    # The next run finds the record and skips the file without reading it
+    reopened = IngestIndex(str(tmp_path / "index"))
+    assert reopened.files["blank.py"]["rows"] == 0 and reopened.rows == 0
+    again = RepoIngest(str(root), reopened, Chunker(chunk_tokens=64, overlap_tokens=8))
+    asyncio.run(again.process_file(None, "blank.py", stat))
+    assert again.unchanged == 1
+    reopened.close()
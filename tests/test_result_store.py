@@ -0,0 +1,104 @@
+import math
+import os
+import random
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import compare_runs  # noqa: E402
+from result_store import ResultWriter, load_run, run_metadata, write_run_metadata  # noqa: E402
+
+
+def result(request_id: int, duration: float, status: str = "SUCCESS", **fields) -> dict:
+    return dict({"request_id": request_id, "start_time": 1000.0 + request_id, "status": status,
+                 "duration": duration, "ttft": duration / 4, "tpot": 0.01, "tokens_per_sec": 100 / duration,
+                 "prompt_tokens": 500, "completion_tokens": 100, "cached_tokens": None}, **fields)
+
+
+def store_run(directory: str, durations, shards: int = 1, batch_size: int = 7):
+    write_run_metadata(directory, run_metadata("stress_test_llm", "generate", None, "mock"))
+    writers = [ResultWriter(directory, shard, batch_size=batch_size) for shard in range(shards)]
+    for i, duration in enumerate(durations):
+        writers[i % shards].append(result(i, duration))
+    for writer in writers:
+        writer.close()
+
+
+def test_write_load_round_trip(tmp_path):
+    directory = str(tmp_path / "run")
+    write_run_metadata(directory, run_metadata("stress_test_llm", "generate", None, "mock"))
+    writer = ResultWriter(directory, batch_size=4)
+    results = [result(i, 0.5 + i / 10, cached_tokens=i * 16) for i in range(9)]
+    results.append(result(9, 2.0, status="FAILED", ttft=0, tpot=None, tokens_per_sec=None))
+    for r in results:
+        writer.append(r)
+    writer.close()
+
+    run = load_run(directory)
+    columns = run["columns"]
+    assert run["rows"] == 10 and run["meta"]["served_model"] == "mock"
+    assert isinstance(columns["duration"], np.memmap)
+    assert columns["request_id"].tolist() == list(range(10))
+    assert columns["start_time"].tolist() == [r["start_time"] for r in results]
+    assert columns["success"].tolist() == [1] * 9 + [0]
+    assert np.allclose(columns["duration"], [r["duration"] for r in results])
+    assert columns["cached_tokens"].tolist() == [i * 16 for i in range(9)] + [-1]
+    # Unmeasured values come back as NaN
+    assert math.isnan(columns["ttft"][9]) and math.isnan(columns["tpot"][9])
+    assert math.isnan(columns["tokens_per_sec"][9])
+
+    with pytest.raises(ValueError):
+        write_run_metadata(directory, run_metadata("stress_test_llm", "generate", None, "mock"))
+
+
+def test_shards_are_concatenated_and_torn_rows_dropped(tmp_path):
+    directory = str(tmp_path / "run")
+    store_run(directory, [0.1 * (i + 1) for i in range(20)], shards=2)
+    # A worker killed mid-flush leaves one column a row longer than the others
+    with open(os.path.join(directory, "duration-1.bin"), "ab") as f:
+        f.write(np.float32(9.0).tobytes())
+
+    run = load_run(directory)
+    assert run["rows"] == 20
+    assert sorted(run["columns"]["request_id"].tolist()) == list(range(20))
+    assert 9.0 not in run["columns"]["duration"].tolist()
+
+
+def compare(monkeypatch, *directories):
+    monkeypatch.setattr(sys, "argv", ["compare_runs.py", *directories,
+                                      "--metrics", "duration", "--bootstrap", "200"])
+    compare_runs.main()
+
+
+def test_bootstrap_flags_a_regression_with_exit_code(tmp_path, monkeypatch, capsys):
+    rng = random.Random(0)
+    baseline = [rng.lognormvariate(0, 0.2) for _ in range(400)]
+    same = [rng.lognormvariate(0, 0.2) for _ in range(400)]
+    store_run(str(tmp_path / "baseline"), baseline)
+    store_run(str(tmp_path / "same"), same)
+    store_run(str(tmp_path / "slower"), [value * 1.3 for value in same])
+
+    # Another sample from the same distribution is no regression
+    compare(monkeypatch, str(tmp_path / "baseline"), str(tmp_path / "same"))
+    assert "No significant regressions" in capsys.readouterr().out
+
+    with pytest.raises(SystemExit) as exit_info:
+        compare(monkeypatch, str(tmp_path / "baseline"), str(tmp_path / "slower"))
+    assert exit_info.value.code == 1
+    output = capsys.readouterr().out
+    assert output.count("REGRESSION") == 3  # p50, p90 and p99
+
+    # The other way around it is an improvement, which passes
+    compare(monkeypatch, str(tmp_path / "slower"), str(tmp_path / "baseline"))
+    assert "IMPROVED" in capsys.readouterr().out
+
+
+def test_verdict_respects_direction_and_threshold():
+    slower = {"delta": 0.2, "ci_low": 0.1, "ci_high": 0.3}
+    assert compare_runs.verdict(slower, higher_is_better=False, threshold=0.05) == "REGRESSION"
+    assert compare_runs.verdict(slower, higher_is_better=True, threshold=0.05) == "IMPROVED"
+    assert compare_runs.verdict(slower, higher_is_better=False, threshold=0.25) == ""
+    # An interval straddling zero is never significant
+    assert compare_runs.verdict({"delta": 0.2, "ci_low": -0.1, "ci_high": 0.5}, False, 0.05) == ""
@@ -0,0 +1,56 @@
+import argparse
+import random
+
+import pytest
+
+from soak_test import format_duration, mann_kendall, parse_duration, theil_sen
+
+
+def test_mann_kendall_on_a_known_trend():
+    # n=5 strictly increasing: S=10, Var(S)=50/3, z=(10-1)/sqrt(50/3)
+    z, p = mann_kendall([1.0, 2.0, 3.0, 4.0, 5.0])
+    assert z == pytest.approx(2.2045, abs=1e-4)
+    assert p == pytest.approx(0.0275, abs=1e-4)
+    z, p = mann_kendall([10.0 - i for i in range(10)])
+    assert z == pytest.approx(-3.9355, abs=1e-4)
+    assert p == pytest.approx(8.30e-5, rel=1e-3)
+
+
+def test_mann_kendall_ignores_spikes_and_handles_ties():
+    rng = random.Random(3)
+    flat = [1.0 + rng.gauss(0, 0.05) for _ in range(60)]
+    flat[10] = flat[40] = 50.0  # Latency spikes, not a trend
+    assert mann_kendall(flat)[1] > 0.05
+    drifting = [1.0 + 0.01 * i + rng.gauss(0, 0.05) for i in range(60)]
+    assert mann_kendall(drifting)[1] < 0.01
+    assert mann_kendall([2.0] * 8) == (0.0, 1.0)
+    # Three tied pairs: S=12, Var(S)=(6*5*17 - 3*2*1*9)/18
+    assert mann_kendall([1, 1, 2, 2, 3, 3])[0] == pytest.approx(11 / (456 / 18) ** 0.5)
+
+
+def test_theil_sen_recovers_the_line_despite_outliers():
+    xs = [float(x) for x in range(20)]
+    ys = [2.0 * x + 1.0 for x in xs]
+    ys[3], ys[15] = 100.0, -100.0
+    slope, intercept = theil_sen(xs, ys)
+    assert slope == pytest.approx(2.0)
+    assert intercept == pytest.approx(1.0)
+    assert theil_sen([1.0, 1.0], [0.0, 5.0]) == (0.0, 2.5)
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("8h", 28800), ("90m", 5400), ("1h30m", 5400), ("1.5h", 5400), ("2d", 172800),
+    ("3600", 3600), ("45s", 45), (" 90M ", 5400),
+])
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "h", "1x", "-5", "1h 30m", "0", "0s0m", "m5"])
+def test_parse_duration_rejects(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration(text)
+
+
+def test_format_duration():
+    assert [format_duration(s) for s in (5, 65, 3600, 5430.4)] == ["5s", "1m05s", "1h00m", "1h30m"]
@@ -0,0 +1,17 @@
+from stress_test_llm import LLMStressTester
+
+
+def count_tokens(text: str) -> int:
+    # Stand-in for the local tokenizer, denser than the 4-characters-per-token estimate
+    return len(text) // 3
+
+
+def test_fixed_prefix_is_fitted_with_a_tokenizer():
+    tester = LLMStressTester(server_url="http://127.0.0.1:1/v1/chat/completions", context_size=300, mode="tg")
+    tester.token_counter = lambda: count_tokens
+    assert abs(count_tokens(tester.generate_fixed_prefix()) - 300) <= 3
+
+
+def test_fixed_prefix_is_estimated_without_a_tokenizer():
+    tester = LLMStressTester(server_url="http://127.0.0.1:1/v1/chat/completions", context_size=300, mode="tg")
+    assert len(tester.generate_fixed_prefix()) == 300 * 4
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from histogram import ResultAggregator
+from server_args import apply_overrides
+from server_launcher import create_launcher
+from sweep import SweepRunner, find_knee
+from throughput_timeline import ThroughputTimeline
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def finished(start: float, tokens: int = 100) -> dict:
+    return {"status": "SUCCESS", "start_time": start, "duration": 0.0, "prompt_tokens": 10,
+            "completion_tokens": tokens, "total_tokens": 10 + tokens, "tokens_per_sec": 1.0}
+
+
+def test_measure_trims_ramp_up_and_drain():
+    # 2 s of ramp-up at 2 req/s, 20 s plateau at 10 req/s, then a 4 s drain tail of 1 req/s
+    run_start = 1000.0
+    rates = [2] * 2 + [10] * 20 + [1] * 4
+    tester = SimpleNamespace(aggregator=ResultAggregator(), timeline=ThroughputTimeline(),
+                             run_start=run_start, wall_duration=float(len(rates)))
+    for second, rate in enumerate(rates):
+        for i in range(rate):
+            result = finished(run_start + second + (i + 0.5) / rate)
+            tester.aggregator.record(result)
+            tester.timeline.record(result)
+
+    point = SweepRunner("http://127.0.0.1:1/v1/chat/completions", [4]).measure(tester, 4, 1)
+    assert point["steady_seconds"] is not None and point["steady_seconds"] >= 15
+    # Steady-state detection tolerates edge buckets within 15% of the plateau
+    assert point["request_rate"] == pytest.approx(10.0, rel=0.1)
+    assert point["throughput"] == pytest.approx(100 * point["request_rate"])
+    # The whole-run average would include ramp-up and drain
+    assert sum(rates) / len(rates) < 0.9 * point["request_rate"]
+
+
+def test_find_knee():
+    assert find_knee([1, 2, 4, 8, 16], [10, 20, 38, 44, 45]) == 2
+    assert find_knee([1, 2, 4], [10, 20, 40]) is None
+
+
+def test_tiny_sweep_through_mock_launcher():
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/v1/chat/completions"
+    launcher = create_launcher("mock", os.path.join(REPO, "vllm_args.sh"), url, startup_timeout=60)
+
+    async def sweep():
+        await launcher.wait_ready()
+        runner = SweepRunner(url, [1, 2], requests_per_point=6, max_runs=1,
+                             context_size=200, max_tokens=16, request_timeout=30)
+        await runner.run()
+        return runner
+
+    launcher.start(["--port", str(port), "--max-num-seqs", "2", "--prefill-rate", "200000",
+                    "--decode-rate", "400"])
+    try:
+        runner = asyncio.run(sweep())
+    finally:
+        launcher.stop()
+
+    assert [point["load"] for point in runner.points] == [1, 2]
+    for point in runner.points:
+        assert point["requests"] == max(6, point["load"] * 4)
+        assert point["success_rate"] == 1.0
+        assert point["throughput"] > 0 and point["request_rate"] > 0
+        assert "ttft" in point["latency"]
+    summary = runner.summarize()
+    assert summary["peak"] in runner.points
+    assert summary["best_within_slo"] is not None
+
+
+def test_apply_overrides_keeps_negative_values():
+    assert apply_overrides(['--foo', '1'], ['--foo', '-1']) == ['--foo', '-1']
+    assert apply_overrides(['-c', '4096'], ['-c', '-1', '--n-gpu-layers', '-2']) == ['-c', '-1', '--n-gpu-layers', '-2']
+    # Flags, short or long, still start a new override
+    assert apply_overrides(['--foo', '1'], ['--enable-x', '-np', '4']) == ['--foo', '1', '--enable-x', '-np', '4']
+    assert apply_overrides(['--foo', '1'], ['--bar', '-.5e-3']) == ['--foo', '1', '--bar', '-.5e-3']
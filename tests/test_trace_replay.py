@@ -0,0 +1,25 @@
+import json
+
+from trace_replay import TraceReplay
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    messages = [{"role": "user", "content": "hi"}]
+    lines = [
+        json.dumps({"timestamp": 10.0, "messages": messages}),
+        json.dumps({"timestamp": None, "messages": messages}),
+        "42",
+        json.dumps(["not", "a", "record"]),
+        json.dumps({"timestamp": [1], "messages": messages}),
+        json.dumps({"timestamp": 12.5, "messages": "not a list"}),
+        "{broken",
+        json.dumps({"offset": 11.5, "messages": messages}),
+    ]
+    trace = tmp_path / "trace.jsonl"
+    trace.write_text("\n".join(lines) + "\n")
+
+    replay = TraceReplay(str(trace))
+    records = list(replay.iter_records())
+    assert [offset for offset, _ in records] == [0.0, 1.5]
+    assert replay.lines_read == 8
+    assert replay.lines_skipped == 6
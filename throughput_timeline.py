@@ -0,0 +1,255 @@
+"""
+Wall-clock throughput accounting for the stress testers
+Requests finished and tokens completed are counted into fixed one-second (by default)
+buckets of wall-clock time, alongside periodic in-flight samples. The resulting time series
+drives an optional live terminal view, and steady state is detected on it so ramp-up and
+drain can be excluded from the final throughput numbers.
+"""
+
+import asyncio
+import logging
+import math
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 1.0
+ROLLING_WINDOW = 10.0  # Seconds averaged by the live view and by steady-state detection
+STEADY_TOLERANCE = 0.15  # Rolling throughput within this fraction of the plateau counts as steady
+MIN_STEADY_BUCKETS = 3
+
+
+class ThroughputTimeline:
+    def __init__(self, bucket_seconds: float = BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        # Buckets are keyed by absolute wall-clock time, so timelines from workers merge by addition
+        self.requests: Dict[int, int] = {}
+        self.failures: Dict[int, int] = {}
+        self.prompt_tokens: Dict[int, int] = {}
+        self.completion_tokens: Dict[int, int] = {}
+        self.in_flight: Dict[int, int] = {}  # Last in-flight sample taken in each bucket
+
+    def bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def record(self, result: Dict):
+        """Count a finished request in the bucket it completed in"""
+        index = self.bucket(result["start_time"] + result["duration"])
+        if result.get("status") != "SUCCESS":
+            self.failures[index] = self.failures.get(index, 0) + 1
+            return
+        self.requests[index] = self.requests.get(index, 0) + 1
+        self.prompt_tokens[index] = self.prompt_tokens.get(index, 0) + (result.get("prompt_tokens") or 0)
+        self.completion_tokens[index] = self.completion_tokens.get(index, 0) + (result.get("completion_tokens") or 0)
+
+    def sample_in_flight(self, timestamp: float, in_flight: int):
+        self.in_flight[self.bucket(timestamp)] = in_flight
+
+    def merge(self, other: "ThroughputTimeline"):
+        """Add another worker's timeline into this one"""
+        if other.bucket_seconds != self.bucket_seconds:
+            raise ValueError("Cannot merge timelines with different bucket sizes")
+        for name in ("requests", "failures", "prompt_tokens", "completion_tokens", "in_flight"):
+            series = getattr(self, name)
+            for index, value in getattr(other, name).items():
+                series[index] = series.get(index, 0) + value
+
+    def prune(self, before: float):
+        """Drop the buckets before a timestamp, keeping memory flat on endless runs"""
+        first = self.bucket(before)
+        for name in ("requests", "failures", "prompt_tokens", "completion_tokens", "in_flight"):
+            series = getattr(self, name)
+            for index in [index for index in series if index < first]:
+                del series[index]
+
+    def series(self, start: float, end: float) -> Dict[str, List[int]]:
+        """Per-bucket series covering [start, end]"""
+        first, last = self.bucket(start), self.bucket(end)
+        indices = range(first, last + 1)
+        return {name: [getattr(self, name).get(i, 0) for i in indices]
+                for name in ("requests", "failures", "prompt_tokens", "completion_tokens", "in_flight")}
+
+    def rolling_rate(self, name: str, now: float, window: float = ROLLING_WINDOW, since: float = 0.0) -> float:
+        """Per-second rate of a series over the last `window` seconds of complete buckets after `since`"""
+        series = getattr(self, name)
+        last = self.bucket(now) - 1
+        first = max(last - max(1, int(round(window / self.bucket_seconds))) + 1, self.bucket(since))
+        if last < first:
+            return 0.0
+        total = sum(series.get(i, 0) for i in range(first, last + 1))
+        return total / ((last - first + 1) * self.bucket_seconds)
+
+    def report(self, run_start: float, run_end: float, warmup: Optional[float] = None,
+               cooldown: Optional[float] = None, window: float = ROLLING_WINDOW,
+               tolerance: float = STEADY_TOLERANCE) -> Optional[Dict]:
+        """Full-run and steady-state wall-clock throughput
+
+        Steady state is trimmed by fixed warmup/cooldown seconds when given, otherwise it is
+        the span where rolling throughput stays within `tolerance` of its median plateau.
+        """
+        if run_end <= run_start:
+            return None
+        series = self.series(run_start, run_end)
+        tokens = [p + c for p, c in zip(series["prompt_tokens"], series["completion_tokens"])]
+        buckets = len(tokens)
+        first_offset = self.bucket(run_start) * self.bucket_seconds - run_start
+
+        if warmup is not None or cooldown is not None:
+            # Only whole buckets inside the trimmed span count
+            first = math.ceil(((warmup or 0.0) - first_offset) / self.bucket_seconds)
+            last = math.floor((run_end - run_start - (cooldown or 0.0) - first_offset) / self.bucket_seconds) - 1
+            method = "fixed"
+        else:
+            first, last = find_steady_state(tokens, max(1, int(round(window / self.bucket_seconds))), tolerance)
+            method = "auto"
+        first = max(0, first)
+        last = min(buckets - 1, last)
+
+        report = {
+            "bucket_seconds": self.bucket_seconds,
+            "full": self.window_summary(series, 0, buckets - 1, run_end - run_start),
+            "steady": None,
+            "method": method,
+            "series": series,
+            "run_start": run_start
+        }
+        if last - first + 1 >= MIN_STEADY_BUCKETS:
+            # Bucket edges relative to the run start (the first bucket may begin before it)
+            start = max(0.0, first_offset + first * self.bucket_seconds)
+            end = min(run_end - run_start, first_offset + (last + 1) * self.bucket_seconds)
+            report["steady"] = dict(self.window_summary(series, first, last, end - start), start=start, end=end)
+        return report
+
+    @staticmethod
+    def window_summary(series: Dict[str, List[int]], first: int, last: int, seconds: float) -> Dict:
+        """Totals and per-second rates over buckets first..last"""
+        totals = {name: sum(values[first:last + 1]) for name, values in series.items() if name != "in_flight"}
+        in_flight = series["in_flight"][first:last + 1]
+        return {
+            "seconds": seconds,
+            "requests": totals["requests"],
+            "failures": totals["failures"],
+            "request_rate": totals["requests"] / seconds if seconds > 0 else 0.0,
+            "prompt_tokens_per_sec": totals["prompt_tokens"] / seconds if seconds > 0 else 0.0,
+            "completion_tokens_per_sec": totals["completion_tokens"] / seconds if seconds > 0 else 0.0,
+            "mean_in_flight": statistics.fmean(in_flight) if in_flight else 0.0
+        }
+
+
+def find_steady_state(values: List[float], window: int, tolerance: float) -> Tuple[int, int]:
+    """First and last bucket of the span whose rolling throughput stays near its median plateau"""
+    if not values:
+        return 0, -1
+    half = window // 2
+    rolling = []
+    for i in range(len(values)):
+        span = values[max(0, i - half):i + half + 1]
+        rolling.append(sum(span) / len(span))
+    # Ramp-up and drain are short compared to the run, so the median sits on the plateau
+    plateau = statistics.median(rolling)
+    if plateau <= 0:
+        return 0, -1
+    low = (1 - tolerance) * plateau
+    # The start is judged on the window after it and the end on the window before it,
+    # so edge buckets are never vouched for by plateau buckets on their far side
+    first = next((i for i in range(len(values))
+                  if sum(values[i:i + window]) / len(values[i:i + window]) >= low), 0)
+    last = next((i for i in range(len(values) - 1, -1, -1)
+                 if sum(values[max(0, i - window + 1):i + 1]) / len(values[max(0, i - window + 1):i + 1]) >= low),
+                -1)
+    return first, last
+
+
+class TimelineMonitor:
+    def __init__(self, timeline: ThroughputTimeline, probe: Callable[[], Tuple[int, int]],
+                 total_requests: Optional[int] = None, live: bool = False,
+                 window: float = ROLLING_WINDOW, label: str = ""):
+        self.timeline = timeline
+        self.probe = probe  # Returns (requests in flight, requests finished)
+        self.total_requests = total_requests
+        self.live = live  # Render a status line every bucket
+        self.window = window
+        self.label = label
+        self.tty = sys.stderr.isatty()
+        self.run_start = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def status_line(self, now: float) -> str:
+        in_flight, finished = self.probe()
+        progress = f"{finished}/{self.total_requests}" if self.total_requests else f"{finished}"
+        timeline = self.timeline
+        return (f"{self.label}[{now - self.run_start:6.0f}s] "
+                f"{timeline.rolling_rate('requests', now, self.window, self.run_start):7.2f} req/s, "
+                f"{timeline.rolling_rate('prompt_tokens', now, self.window, self.run_start):9.0f} prompt tok/s, "
+                f"{timeline.rolling_rate('completion_tokens', now, self.window, self.run_start):8.0f} gen tok/s "
+                f"(last {self.window:g}s) | in flight {in_flight:4d} | done {progress}")
+
+    async def monitor(self):
+        interval = self.timeline.bucket_seconds
+        while True:
+            await asyncio.sleep(interval - (time.time() - self.run_start) % interval)
+            now = time.time()
+            self.timeline.sample_in_flight(now, self.probe()[0])
+            if self.live:
+                if self.tty:
+                    sys.stderr.write("\r\033[K" + self.status_line(now))
+                    sys.stderr.flush()
+                else:
+                    logger.info(self.status_line(now))
+
+    def start(self, run_start: float):
+        """Start sampling (and rendering) on the running event loop"""
+        self.run_start = run_start
+        self.task = asyncio.get_running_loop().create_task(self.monitor())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            if self.live and self.tty:
+                sys.stderr.write("\n")
+
+
+def print_throughput_report(report: Optional[Dict]):
+    """Print full-run and steady-state wall-clock throughput"""
+    if not report:
+        return
+    print("\nWall-Clock Throughput:")
+    rows = [("Full Run", report["full"])]
+    if report["steady"]:
+        rows.append(("Steady State", report["steady"]))
+    print(f"  {'Window':<14}{'Seconds':>10}{'Requests':>10}{'Req/s':>10}{'Prompt Tok/s':>14}"
+          f"{'Gen Tok/s':>12}{'In Flight':>11}")
+    for label, window in rows:
+        print(f"  {label:<14}{window['seconds']:>10.1f}{window['requests']:>10}{window['request_rate']:>10.2f}"
+              f"{window['prompt_tokens_per_sec']:>14.1f}{window['completion_tokens_per_sec']:>12.1f}"
+              f"{window['mean_in_flight']:>11.1f}")
+    steady = report["steady"]
+    if steady:
+        how = "fixed warmup/cooldown" if report["method"] == "fixed" else "auto-detected"
+        print(f"  Steady state ({how}): {steady['start']:.1f}s - {steady['end']:.1f}s of the run; "
+              f"ramp-up and drain excluded")
+    else:
+        print("  No steady state found (run too short or throughput never settled); use the full-run numbers")
+
+
+def add_timeline_arguments(parser):
+    """Register the throughput timeline options shared by the stress testers"""
+    parser.add_argument('--live', action='store_true',
+                       help='Show a live rolling throughput / in-flight line during the run '
+                            '(per-request lines are then logged at debug level)')
+    parser.add_argument('--rolling-window', type=float, default=ROLLING_WINDOW,
+                       help=f'Seconds averaged by the live view and steady-state detection (default: {ROLLING_WINDOW:g})')
+    parser.add_argument('--warmup-seconds', type=float, default=None,
+                       help='Exclude this many seconds from the start of the steady-state numbers '
+                            '(default: detect steady state automatically)')
+    parser.add_argument('--cooldown-seconds', type=float, default=None,
+                       help='Exclude this many seconds from the end of the steady-state numbers '
+                            '(default: detect steady state automatically)')
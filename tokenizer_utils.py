@@ -0,0 +1,165 @@
+"""
+Exact client-side token accounting for the stress testers
+Loads the served model's tokenizer (transformers) and renders the server's chat template
+(jinja2, e.g. templates/qwen3coder.jinja2) so prompt lengths can be counted exactly as the
+server will see them, and tunes generated prompts to hit a target token count.
+Both dependencies are optional and only imported when exact token accounting is enabled.
+"""
+
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from server_args import get_arg, read_args_file
+
+logger = logging.getLogger(__name__)
+
+# Relative tolerance when fitting a prompt to a target token count
+FIT_TOLERANCE = 0.01
+FIT_MAX_ITERATIONS = 12
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(name: str):
+    """Load (once per process) a Hugging Face tokenizer by name or local path"""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError("Exact token accounting requires transformers: pip install transformers")
+    logger.info(f"Loading tokenizer {name}...")
+    return AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+
+
+@lru_cache(maxsize=None)
+def load_chat_template(path: str):
+    """Compile (once per process) a jinja2 chat template the same way transformers does"""
+    try:
+        from jinja2.sandbox import ImmutableSandboxedEnvironment
+    except ImportError:
+        raise ImportError("Chat template rendering requires jinja2: pip install jinja2")
+
+    def raise_exception(message):
+        raise ValueError(message)
+
+    def tojson(value, ensure_ascii=False, indent=None, separators=None, sort_keys=False):
+        return json.dumps(value, ensure_ascii=ensure_ascii, indent=indent,
+                          separators=separators, sort_keys=sort_keys)
+
+    env = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+    env.filters['tojson'] = tojson
+    env.globals['raise_exception'] = raise_exception
+    with open(path) as f:
+        return env.from_string(f.read())
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_name: str, chat_template: Optional[str] = None):
+        self.tokenizer_name = tokenizer_name
+        self.chat_template = chat_template  # Path to a jinja2 template, None for raw text
+        self.tokenizer = load_tokenizer(tokenizer_name)
+        self.template = load_chat_template(chat_template) if chat_template else None
+
+    def render(self, messages: List[Dict], tools: Optional[List[Dict]] = None,
+               add_generation_prompt: bool = True) -> str:
+        """Render a conversation to the exact prompt text the server will tokenize"""
+        if self.template is None:
+            raise ValueError("No chat template configured")
+        return self.template.render(
+            messages=messages,
+            tools=tools or [],
+            add_generation_prompt=add_generation_prompt,
+            bos_token=self.tokenizer.bos_token or "",
+            eos_token=self.tokenizer.eos_token or ""
+        )
+
+    def encode(self, text: str, add_special_tokens: bool = False) -> List[int]:
+        """Tokenize text into token ids"""
+        return self.tokenizer.encode(text, add_special_tokens=add_special_tokens)
+
+    def count_text(self, text: str) -> int:
+        """Count tokens of a raw input (e.g. an embedding input, special tokens included)"""
+        return len(self.encode(text, add_special_tokens=True))
+
+    def count_messages(self, messages: List[Dict], tools: Optional[List[Dict]] = None) -> int:
+        """Count prompt tokens of a chat request after template rendering"""
+        return len(self.encode(self.render(messages, tools)))
+
+    def count_user_message(self, content: str) -> int:
+        """Count prompt tokens of a single-user-message chat request"""
+        return self.count_messages([{"role": "user", "content": content}])
+
+
+def fit_to_tokens(text: str, target_tokens: int, count: Callable[[str], int],
+                  tolerance: float = FIT_TOLERANCE) -> str:
+    """Truncate text so that count(text) lands within tolerance of target_tokens
+
+    Starts from the 1 token = 4 characters estimate and rescales the character budget by
+    the observed chars/token ratio until the count converges. The text must be long enough
+    to reach the target.
+    """
+    chars = min(len(text), target_tokens * 4)
+    best = text[:chars]
+    best_error = None
+    for _ in range(FIT_MAX_ITERATIONS):
+        candidate = text[:chars]
+        tokens = count(candidate)
+        error = abs(tokens - target_tokens)
+        if best_error is None or error < best_error:
+            best, best_error = candidate, error
+        if error <= max(1, target_tokens * tolerance):
+            break
+        next_chars = min(len(text), max(1, round(chars * target_tokens / max(tokens, 1))))
+        if next_chars == chars:
+            # Rescaling stalled (e.g. text too short), nudge by a token's worth of characters
+            next_chars = min(len(text), chars + (4 if tokens < target_tokens else -4))
+            if next_chars == chars:
+                break
+        chars = next_chars
+    if best_error > target_tokens * tolerance:
+        logger.warning(f"Prompt fitted to {target_tokens} +/- {best_error} tokens, outside the "
+                       f"{tolerance:.0%} tolerance")
+    return best
+
+
+def default_tokenizer_settings(args_file: str) -> Dict[str, Optional[str]]:
+    """Read the tokenizer and chat template a vLLM args file serves with"""
+    if not os.path.exists(args_file):
+        return {"tokenizer": None, "chat_template": None}
+    server_args = read_args_file(args_file)
+    chat_template = get_arg(server_args, '--chat-template')
+    if chat_template and not os.path.isabs(chat_template):
+        # Template paths are relative to the directory the run script is started from
+        chat_template = os.path.join(os.path.dirname(os.path.abspath(args_file)), chat_template)
+    return {
+        "tokenizer": get_arg(server_args, '--tokenizer', default=get_arg(server_args, '--model')),
+        "chat_template": chat_template
+    }
+
+
+def add_tokenizer_arguments(parser, default_args_file: str):
+    """Register the exact token accounting options shared by the stress testers"""
+    parser.add_argument('--exact-tokens', action='store_true',
+                       help='Count tokens with the local tokenizer (and chat template) and tune prompts '
+                            'to hit --context-size within 1%% (requires transformers, jinja2)')
+    parser.add_argument('--tokenizer', type=str, default=None,
+                       help=f'Tokenizer name or path (default: --tokenizer/--model from {default_args_file})')
+    parser.add_argument('--chat-template', type=str, default=None,
+                       help=f'Chat template file (default: --chat-template from {default_args_file})')
+    parser.add_argument('--server-args', type=str, default=default_args_file,
+                       help=f'Server args file to take tokenizer defaults from (default: {default_args_file})')
+
+
+def tokenizer_settings_from_args(args, use_chat_template: bool = True) -> Optional[Dict[str, Optional[str]]]:
+    """Resolve tokenizer settings from parsed arguments, or None if exact tokens are disabled"""
+    if not args.exact_tokens:
+        return None
+    defaults = default_tokenizer_settings(args.server_args)
+    settings = {
+        "tokenizer": args.tokenizer or defaults["tokenizer"],
+        "chat_template": (args.chat_template or defaults["chat_template"]) if use_chat_template else None
+    }
+    if not settings["tokenizer"]:
+        raise ValueError(f"No tokenizer given and none found in {args.server_args}")
+    return settings
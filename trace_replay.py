@@ -0,0 +1,121 @@
+"""
+Timestamp-faithful trace replay for the LLM stress tester
+Streams a JSONL trace one line at a time and dispatches every request at its recorded
+arrival offset, optionally sped up or slowed down, looped and sampled.
+
+Each trace line is a JSON object:
+    {"offset": 12.5, "messages": [...], "max_tokens": 256, "tools": [...]}
+"offset" (or "arrival_offset" / "timestamp") is in seconds; offsets are made relative to
+the first line, so absolute timestamps work too. "max_tokens" and "tools" are optional.
+"""
+
+import json
+import logging
+import random
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OFFSET_KEYS = ('offset', 'arrival_offset', 'timestamp')
+
+
+class TraceReplay:
+    def __init__(self, path: str, time_scale: float = 1.0, loops: int = 1,
+                 sample: float = 1.0, seed: Optional[int] = None,
+                 workers: int = 1, worker_index: int = 0):
+        if time_scale <= 0:
+            raise ValueError("time_scale must be positive")
+        self.path = path
+        self.time_scale = time_scale  # Multiplies offsets: 0.5 replays twice as fast
+        self.loops = loops  # Number of passes over the trace
+        self.sample = sample  # Fraction of lines to keep
+        self.seed = seed
+        self.workers = workers  # Lines are sharded round-robin across worker processes
+        self.worker_index = worker_index
+
+        self.lines_read = 0
+        self.lines_skipped = 0
+        self.pass_duration = 0.0  # Offset of the last valid line in the trace
+        self.requests_dispatched = 0
+
+    def split(self, workers: int, index: int) -> "TraceReplay":
+        """Return this worker's share of the trace when the load is split across processes"""
+        return TraceReplay(self.path, self.time_scale, self.loops, self.sample,
+                           seed=None if self.seed is None else self.seed * workers + index,
+                           workers=workers, worker_index=index)
+
+    def iter_records(self) -> Iterator[Tuple[float, Dict]]:
+        """Yield (relative offset, record) for one pass over the trace, reading lazily"""
+        first_offset = None
+        with open(self.path) as f:
+            for line_number, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                self.lines_read += 1
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("not a JSON object")
+                    offset = next(float(record[key]) for key in OFFSET_KEYS if key in record)
+                    if not isinstance(record.get('messages'), list):
+                        raise ValueError("missing messages")
+                except (ValueError, TypeError, StopIteration) as e:
+                    # TypeError: a null or non-numeric timestamp
+                    self.lines_skipped += 1
+                    logger.debug(f"Skipping trace line {line_number + 1}: {e}")
+                    continue
+                if first_offset is None:
+                    first_offset = offset
+                self.pass_duration = max(self.pass_duration, offset - first_offset)
+                if line_number % self.workers != self.worker_index:
+                    continue
+                yield offset - first_offset, record
+
+    def schedule(self, build_body: Callable[[Dict], bytes]) -> Iterator[Tuple[float, bytes]]:
+        """Yield (scaled offset, serialized body) for every sampled request of every loop"""
+        rng = random.Random(self.seed)
+        loop_start = 0.0
+        for _ in range(self.loops):
+            for offset, record in self.iter_records():
+                if self.sample < 1.0 and rng.random() >= self.sample:
+                    continue
+                self.requests_dispatched += 1
+                yield (loop_start + offset) * self.time_scale, build_body(record)
+            if self.lines_read == self.lines_skipped:
+                logger.error(f"Trace {self.path} contains no replayable lines")
+                return
+            # The next loop starts right after the last request of this one
+            loop_start += self.pass_duration
+
+    def describe(self) -> str:
+        """Short human-readable description for the configuration log"""
+        text = f"{self.path} at {1 / self.time_scale:g}x speed"
+        if self.loops > 1:
+            text += f", {self.loops} loops"
+        if self.sample < 1.0:
+            text += f", sampling {self.sample:.0%}"
+        return text
+
+
+def add_replay_arguments(parser):
+    """Register the trace replay options"""
+    parser.add_argument('--replay', type=str, default=None,
+                       help='Replay a JSONL trace of {"offset", "messages", "max_tokens"} lines at their '
+                            'recorded arrival offsets instead of generating prompts')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                       help='Multiply trace offsets by this factor, e.g. 0.5 replays twice as fast (default: 1.0)')
+    parser.add_argument('--replay-loops', type=int, default=1,
+                       help='Number of passes over the trace (default: 1)')
+    parser.add_argument('--replay-sample', type=float, default=1.0,
+                       help='Fraction of trace lines to replay, sampled at random (default: 1.0)')
+    parser.add_argument('--replay-seed', type=int, default=None,
+                       help='Random seed for --replay-sample (default: random)')
+
+
+def replay_from_args(args) -> Optional[TraceReplay]:
+    """Build a TraceReplay from parsed arguments, or None when not replaying"""
+    if args.replay is None:
+        return None
+    return TraceReplay(args.replay, time_scale=args.time_scale, loops=args.replay_loops,
+                       sample=args.replay_sample, seed=args.replay_seed)